@@ -4,9 +4,7 @@ from .column_generater_module import connection_node_cnt
 from .column_generater_module import angle_deltas
 from .column_generater_module import elevation
 from .column_generater_module import min_elevation
-from .column_generater_module import elevation_smooth
-from .column_generater_module import elevation_height
-from .column_generater_module import elevation_fluctuation
+from .column_generater_module import elevation_profile
 from .column_generater_module import elevation_unevenness_count
 from .column_generater_module import google_map_url
 from .column_generater_module import google_earth_url
@@ -27,7 +25,6 @@ from .column_generater_module import score
 from .column_generater_module import eye_measured_width
 from .column_generater_module import geometry_meter_list
 from .column_generater_module import elevation_infra_regulator
-from .column_generater_module import elevation_adjuster
 from .column_generater_module import steering_wheel_angle
 from .column_generater_module import corners_group
 from .column_generater_module import locations
@@ -36,7 +33,6 @@ from .column_generater_module import score_building
 from .column_generater_module import score_elevation_deviation
 from .column_generater_module import score_tunnel_outside
 from .column_generater_module import road_section
-from .column_generater_module import elevation_segment_list
 from .column_generater_module import tunnel_length
 from .column_generater_module import elevation_unevenness
 from .column_generater_module import elevation_unevenness_sections
@@ -47,4 +43,3 @@ from .column_generater_module import video_elevation_segment_list
 from .column_generater_module import score_claude_center_line_section
 from .column_generater_module import score_claude_center_line_section_detail
 from .column_generater_module import infra_sections
-from .column_generater_module import elevation_section
@@ -1,24 +1,24 @@
+import numpy as np
 from geopandas import GeoDataFrame
 from pandas import Series
 
-from .core.calculate_angle_between_vectors import calculate_angle_between_vectors
+from .core import ragged
+from .core.calculate_angle_between_vectors import calculate_angles_between_vectors
 
 
 def generate(gdf: GeoDataFrame) -> Series:
     # 座標間の角度の変化の合計値を求める
-    def func(row):
-        coords = list(row.geometry.coords)
-        angle_total = 0
-        for i in range(1, len(coords) - 1):
-            result = calculate_angle_between_vectors(
-                            coords[i - 1], coords[i], coords[i + 1]
-                        )
-            if result is None:
-                continue
-            else:
-                angle = result[0]
-                angle_total += angle
-        return angle_total
+    # 全エッジの座標を1本の配列にして、隣り合う3点のなす角をまとめて計算する
+    coords, offsets = ragged.from_geometries(gdf.geometry.values)
+    index, rows = ragged.inner_indexes(offsets, 1, 1)
+    angles, valid = calculate_angles_between_vectors(coords[index - 1], coords[index], coords[index + 1])
+    # bincountは先頭から順に足すので、エッジ毎にPythonで順に足したのと同じ値になる
+    angle_total = np.bincount(rows[valid], weights=angles[valid], minlength=len(gdf))
+    return Series(angle_total, index=gdf.index)
 
-    series = gdf.apply(func, axis=1)
-    return series
+
+# targetsの行だけ計算し直し、それ以外の行は今のangle_deltasのままにする
+def update(gdf: GeoDataFrame, targets: np.ndarray) -> Series:
+    angle_deltas = gdf["angle_deltas"].to_numpy(dtype=float, copy=True)
+    angle_deltas[targets] = generate(gdf[targets]).to_numpy()
+    return Series(angle_deltas, index=gdf.index)
@@ -1,36 +1,102 @@
 from geopandas import GeoDataFrame
 from pandas import Series
+import numpy as np
+import shapely
 from tqdm import tqdm
-from shapely import wkt
 from ...core.db import get_db_session
-from .core.linstring_to_polygon import create_vertical_polygon
+from .core.linstring_to_polygon import create_vertical_polygons
 
 from sqlalchemy import text
 
+# 道路からの距離(m)
+DISTANCE = 15
+# 1回のクエリで送るエッジの数
+CHUNK_SIZE = 2000
+# 範囲外にはみ出したエッジのbboxに重なる建物もデータのバージョンに含めるために範囲を広げる量(度)
+EXPAND_DEGREE = 0.0003
+
 # 道路の周辺15m以内にある建物の数をカウントする
-def generate(gdf: GeoDataFrame) -> Series:
+# エッジのbboxに重なり、かつ道路の左右にDISTANCE(m)ずらしたポリゴン(create_vertical_polygon)に重なる建物を数える(1エッジ毎に計算していた時と同じ結果)
+# mode="db": エッジのbboxとポリゴン(WKB)をまとめてPostGISに送り、両方に重なる建物の件数をエッジ番号毎に受け取る
+# mode="local": エッジ全体のbbox内の建物をWKBで1回だけ取得し、STRtreeを使ってエッジのbboxとポリゴンとの重なりを判定する
+def generate(gdf: GeoDataFrame, mode: str = "db") -> Series:
+    if gdf.empty:
+        return Series([], index=gdf.index, dtype=int)
+    session = get_db_session()
+    try:
+        if mode == "local":
+            counts = _count_local(session, gdf.geometry.values)
+        else:
+            counts = _count_db(session, gdf.geometry.values)
+    finally:
+        session.close()
+    return Series(counts, index=gdf.index)
+
+
+# 範囲内の建物の件数と最終更新日時。チェックポイントのキーに含め、建物が更新されたら再計算する
+def generate_data_version(search_area_polygon) -> str:
+    query = text("""
+    SELECT count(*), max(updated_at)
+    FROM buildings
+    WHERE geometry && ST_MakeEnvelope(:min_longitude, :min_latitude, :max_longitude, :max_latitude, :srid);
+    """)
+    min_longitude, min_latitude, max_longitude, max_latitude = search_area_polygon.bounds
     session = get_db_session()
+    try:
+        count, updated_at = session.execute(query, {
+            'min_longitude': min_longitude - EXPAND_DEGREE,
+            'min_latitude': min_latitude - EXPAND_DEGREE,
+            'max_longitude': max_longitude + EXPAND_DEGREE,
+            'max_latitude': max_latitude + EXPAND_DEGREE,
+            'srid': 4326
+        }).one()
+    finally:
+        session.close()
+    return f"buildings:{count}:{updated_at}"
 
-    def func(row):
-        bbox = row.geometry.bounds
-        polygon = create_vertical_polygon(row.geometry.coords, 15)
-        buildings = _get_buildings_in_bbox(session, bbox[0], bbox[1], bbox[2], bbox[3])
-        return sum(1 for b in buildings if b.intersects(polygon))
 
-    tqdm.pandas()
-    series = gdf.progress_apply(func, axis=1)
-    session.close()
+def _count_db(session, geometries) -> np.ndarray:
+    query = text("""
+    WITH edges AS (
+        SELECT t.edge_id,
+               ST_MakeEnvelope(t.min_longitude, t.min_latitude, t.max_longitude, t.max_latitude, 4326) AS bbox,
+               ST_GeomFromWKB(t.corridor, 4326) AS corridor
+        FROM unnest(
+            CAST(:edge_ids AS int[]), CAST(:min_longitudes AS float8[]), CAST(:min_latitudes AS float8[]),
+            CAST(:max_longitudes AS float8[]), CAST(:max_latitudes AS float8[]), CAST(:corridors AS bytea[])
+        ) AS t(edge_id, min_longitude, min_latitude, max_longitude, max_latitude, corridor)
+    )
+    SELECT e.edge_id, count(*)
+    FROM edges e
+    JOIN buildings b
+      ON ST_Intersects(b.geometry, e.bbox)
+     AND ST_Intersects(b.geometry, e.corridor)
+    GROUP BY e.edge_id;
+    """)
+    counts = np.zeros(len(geometries), dtype=int)
+    bounds = shapely.bounds(geometries)
+    for st in tqdm(range(0, len(geometries), CHUNK_SIZE)):
+        ed = min(st + CHUNK_SIZE, len(geometries))
+        corridors = shapely.to_wkb(create_vertical_polygons(geometries[st:ed], DISTANCE))
+        result = session.execute(query, {
+            'edge_ids': list(range(st, ed)),
+            'min_longitudes': bounds[st:ed, 0].tolist(),
+            'min_latitudes': bounds[st:ed, 1].tolist(),
+            'max_longitudes': bounds[st:ed, 2].tolist(),
+            'max_latitudes': bounds[st:ed, 3].tolist(),
+            'corridors': [bytes(x) for x in corridors],
+        })
+        for edge_id, count in result:
+            counts[edge_id] = count
+    return counts
 
-    return series
 
-def _get_buildings_in_bbox(session, min_longitude, min_latitude, max_longitude, max_latitude):
+def _count_local(session, geometries) -> np.ndarray:
+    min_longitude, min_latitude, max_longitude, max_latitude = shapely.total_bounds(geometries)
     query = text("""
-    SELECT ST_AsText(geometry) as geometry
+    SELECT ST_AsBinary(geometry) as geometry
     FROM buildings
-    WHERE ST_Intersects(
-    geometry,
-    ST_MakeEnvelope(:min_longitude, :min_latitude, :max_longitude, :max_latitude, :srid)
-    );
+    WHERE ST_Intersects(geometry, ST_MakeEnvelope(:min_longitude, :min_latitude, :max_longitude, :max_latitude, :srid));
     """)
     result = session.execute(query, {
         'min_longitude': float(min_longitude),
@@ -39,4 +105,22 @@ def _get_buildings_in_bbox(session, min_longitude, min_latitude, max_longitude,
         'max_latitude': float(max_latitude),
         'srid': 4326
     })
-    return [wkt.loads(row[0]) for row in result.fetchall()]
+    buildings = shapely.from_wkb([bytes(row[0]) for row in result])
+    return count_nearby(buildings, geometries)
+
+
+# 建物(経度緯度)のうち、各エッジのbboxとcreate_vertical_polygonのポリゴンの両方に重なるものを数える
+def count_nearby(buildings, geometries) -> np.ndarray:
+    counts = np.zeros(len(geometries), dtype=int)
+    if len(buildings) == 0 or len(geometries) == 0:
+        return counts
+
+    # bboxが重なる組をSTRtreeで絞り込んでから、bbox(PostGISのST_MakeEnvelopeと同じ矩形)とポリゴンとの重なりを判定する
+    bboxes = shapely.box(*shapely.bounds(geometries).T)
+    edge_index, building_index = shapely.STRtree(buildings).query(bboxes)
+    hits = shapely.intersects(buildings[building_index], bboxes[edge_index])
+    edge_index, building_index = edge_index[hits], building_index[hits]
+    polygons = create_vertical_polygons(geometries, DISTANCE)
+    hits = shapely.intersects(buildings[building_index], polygons[edge_index])
+    counts += np.bincount(edge_index[hits], minlength=len(geometries))
+    return counts
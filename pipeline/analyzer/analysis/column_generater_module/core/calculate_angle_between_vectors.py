@@ -23,3 +23,22 @@ def calculate_angle_between_vectors(A, B, C) -> Optional[Tuple[float, str]]:
     else:
         horizontalVector = "right"
     return angle_deg, horizontalVector
+
+
+# 複数の組のベクトル間の角度(度)をまとめて計算する。A, B, Cは(n, 2)の配列
+# 長さ0のベクトルがある組(calculate_angle_between_vectorsがNoneを返す組)はvalidがFalseになる
+def calculate_angles_between_vectors(A: np.ndarray, B: np.ndarray, C: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    vector_AB = B - A
+    vector_BC = C - B
+
+    # np.dot, np.linalg.normはBLASで内積を求める(FMAで丸めが変わる)ので、同じ値になるようにmatmulで内積を求める
+    # 角度が0度に近いとarccosで丸めの違いが大きくなるため
+    dot_product = np.matmul(vector_AB[:, None, :], vector_BC[:, :, None])[:, 0, 0]
+    norm_AB = np.sqrt(np.matmul(vector_AB[:, None, :], vector_AB[:, :, None])[:, 0, 0])
+    norm_BC = np.sqrt(np.matmul(vector_BC[:, None, :], vector_BC[:, :, None])[:, 0, 0])
+
+    valid = (norm_AB != 0) & (norm_BC != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosine_theta = np.clip(dot_product / (norm_AB * norm_BC), -1.0, 1.0)
+    angle_deg = np.degrees(np.arccos(cosine_theta))
+    return angle_deg, valid
@@ -1,67 +1,160 @@
+import os
+import fcntl
+from collections import OrderedDict
+from functools import cache
 import numpy as np
 import rasterio
-from rasterio.warp import calculate_default_transform, reproject, Resampling
 from pyproj import CRS
+from ....core.env import getEnv
 
+# タイル化されていないTIFを読む時のブロックサイズ(px)
+DEFAULT_BLOCK_SIZE = 512
 
+
+# 標高TIFから座標の標高を取得する
+# tif_pathはdem_prepareで変換済みのCOG(EPSG:4326)で、読み取り専用で開く。
+# ブロック(COGのタイル)単位で読み込んでLRUでキャッシュするので、エッジのbbox全体を読み込まない。
+# mmap=Trueの場合はバンド全体を.npyに書き出してメモリマップで参照し、触れたページだけを読み込む。
 class ElevationService:
-    def __init__(self, tif_path):
-        self.dataset = rasterio.open(tif_path)
-        src_crs = self.dataset.crs
-        if src_crs is None or CRS(src_crs).to_epsg() != 4326:
-            epsg = CRS(src_crs).to_epsg() if src_crs else "unknown"
-            print(f"EPSG: {epsg} → EPSG: 4326")
-            dst_crs = "EPSG:4326"
-            transform, width, height = calculate_default_transform(
-                src_crs, dst_crs, self.dataset.width, self.dataset.height, *self.dataset.bounds
-            )
-            profile = self.dataset.profile.copy()
-            profile.update(crs=dst_crs, transform=transform, width=width, height=height)
-            data = np.empty((1, height, width), dtype=self.dataset.dtypes[0])
-            reproject(
-                source=rasterio.band(self.dataset, 1),
-                destination=data[0],
-                src_transform=self.dataset.transform,
-                src_crs=src_crs,
-                dst_transform=transform,
-                dst_crs=dst_crs,
-                resampling=Resampling.nearest,
-            )
+    # cache_blocks: LRUでキャッシュするブロック数。未指定の場合はDEM_CACHE_BLOCKS
+    def __init__(self, tif_path, mmap: bool = False, cache_blocks: int | None = None):
+        self.dataset = rasterio.open(tif_path, "r")
+        if self.dataset.crs is None or CRS(self.dataset.crs).to_epsg() != 4326:
             self.dataset.close()
-            with rasterio.open(tif_path, "w", **profile) as dst:
-                dst.write(data)
-            self.dataset = rasterio.open(tif_path)
+            raise ValueError(f"{tif_path} is not EPSG:4326. prepare it with analyzer.core.dem_prepare")
+        self.transform = self.dataset.transform
+        self.height = self.dataset.height
+        self.width = self.dataset.width
+        self.nodata = self.dataset.nodata
+        if self.dataset.profile.get("tiled"):
+            self.block_height, self.block_width = self.dataset.block_shapes[0]
+        else:
+            self.block_height, self.block_width = DEFAULT_BLOCK_SIZE, DEFAULT_BLOCK_SIZE
+        self.block_cols = -(-self.width // self.block_width)
+        self.cache_blocks = cache_blocks if cache_blocks is not None else getEnv()["DEM_CACHE_BLOCKS"]
+        self.blocks = OrderedDict()
+        self.memmap = load_memmap(self.dataset, tif_path) if mmap else None
 
     def get_elevation(self, lat: int, lon: int) -> int | None:
         if self.dataset is None or self.dataset.closed:
             return None
         row, col = self.dataset.index(lon, lat)
-        if row < 0 or col < 0 or row >= self.dataset.height or col >= self.dataset.width:
+        if row < 0 or col < 0 or row >= self.height or col >= self.width:
             return None
-        band = self.dataset.read(1, window=rasterio.windows.Window(col, row, 1, 1))
-        return band[0, 0]
+        return self.read_pixels(np.array([row]), np.array([col]))[0]
 
-    def get_elevations_batch(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
-        """複数座標の標高を一括取得（1点ずつのread()を廃止しwindow一括読みに）"""
+    # 複数座標の標高を一括取得(範囲外の座標は端の画素の値になる)
+    def get_elevations_batch(self, lats: np.ndarray, lons: np.ndarray, bilinear: bool = False) -> np.ndarray:
         if self.dataset is None or self.dataset.closed:
-            return np.zeros(lats.shape)
-        lats = np.asarray(lats)
-        lons = np.asarray(lons)
-        t = self.dataset.transform
+            return np.zeros(np.shape(lats))
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        t = self.transform
         # アフィン逆変換でピクセル座標を算出（dataset.index()と同等）
-        cols = np.floor((lons - t.c) / t.a).astype(int)
-        rows = np.floor((lats - t.f) / t.e).astype(int)
-        row_min = max(0, int(rows.min()))
-        row_max = min(self.dataset.height - 1, int(rows.max()))
-        col_min = max(0, int(cols.min()))
-        col_max = min(self.dataset.width - 1, int(cols.max()))
-        window = rasterio.windows.Window(col_min, row_min, col_max - col_min + 1, row_max - row_min + 1)
-        data = self.dataset.read(1, window=window)
-        local_rows = np.clip(rows - row_min, 0, data.shape[0] - 1).astype(int)
-        local_cols = np.clip(cols - col_min, 0, data.shape[1] - 1).astype(int)
-        return data[local_rows, local_cols]
+        cols = (lons - t.c) / t.a
+        rows = (lats - t.f) / t.e
+        nearest = self.read_pixels(np.floor(rows).astype(int), np.floor(cols).astype(int))
+        if not bilinear:
+            return nearest
+
+        # 周囲4画素の中心からの距離で重み付けする
+        row0 = np.floor(rows - 0.5).astype(int)
+        col0 = np.floor(cols - 0.5).astype(int)
+        dr = rows - 0.5 - row0
+        dc = cols - 0.5 - col0
+        z00 = self.read_pixels(row0, col0).astype(float)
+        z01 = self.read_pixels(row0, col0 + 1).astype(float)
+        z10 = self.read_pixels(row0 + 1, col0).astype(float)
+        z11 = self.read_pixels(row0 + 1, col0 + 1).astype(float)
+        result = (z00 * (1 - dr) * (1 - dc) + z01 * (1 - dr) * dc + z10 * dr * (1 - dc) + z11 * dr * dc)
+        # 周囲にnodataがある場合は補間せずに最寄りの画素の値を使う
+        if self.nodata is not None:
+            has_nodata = (z00 == self.nodata) | (z01 == self.nodata) | (z10 == self.nodata) | (z11 == self.nodata)
+            result = np.where(has_nodata, nearest, result)
+        return result
+
+    # 画素(行, 列)の値をまとめて取得する。画素はブロック毎にまとめて読む。
+    def read_pixels(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        shape = np.shape(rows)
+        rows = np.clip(np.ravel(rows), 0, self.height - 1)
+        cols = np.clip(np.ravel(cols), 0, self.width - 1)
+        if self.memmap is not None:
+            return np.asarray(self.memmap[rows, cols]).reshape(shape)
+
+        values = np.empty(len(rows), dtype=self.dataset.dtypes[0])
+        if len(rows) == 0:
+            return values.reshape(shape)
+        block_ids = (rows // self.block_height) * self.block_cols + cols // self.block_width
+        order = np.argsort(block_ids, kind="stable")
+        unique_ids, starts = np.unique(block_ids[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for block_id, start, end in zip(unique_ids.tolist(), starts, ends):
+            block_row, block_col = divmod(block_id, self.block_cols)
+            block = self.get_block(block_row, block_col)
+            target = order[start:end]
+            values[target] = block[
+                rows[target] - block_row * self.block_height,
+                cols[target] - block_col * self.block_width,
+            ]
+        return values.reshape(shape)
+
+    def get_block(self, block_row: int, block_col: int) -> np.ndarray:
+        key = (block_row, block_col)
+        block = self.blocks.get(key)
+        if block is not None:
+            self.blocks.move_to_end(key)
+            return block
+        window = rasterio.windows.Window(
+            block_col * self.block_width,
+            block_row * self.block_height,
+            min(self.block_width, self.width - block_col * self.block_width),
+            min(self.block_height, self.height - block_row * self.block_height),
+        )
+        block = self.dataset.read(1, window=window)
+        self.blocks[key] = block
+        if len(self.blocks) > self.cache_blocks:
+            self.blocks.popitem(last=False)
+        return block
 
     def __del__(self):
         if self.dataset and not self.dataset.closed:
             self.dataset.close()
         self.dataset = None
+
+
+# プロセス内で共有するインスタンス。ステージ間でブロックのキャッシュを使い回す。
+@cache
+def get_elevation_service(tif_path: str, mmap: bool = False) -> ElevationService:
+    return ElevationService(tif_path, mmap)
+
+
+# バンド1を.npyに書き出してメモリマップで開く。TIFの方が新しい場合は書き出し直す。
+# 並列実行時は.lockファイルのロックを取った1つのプロセスだけが書き出し、他のプロセスは書き出し終わるのを待って同じファイルを開く。
+def load_memmap(dataset, tif_path: str) -> np.ndarray:
+    npy_path = f"{tif_path}.band1.npy"
+    if is_stale_memmap(npy_path, tif_path):
+        with open(f"{npy_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # ロックを待っている間に他のプロセスが書き出した場合はそのまま使う
+            if is_stale_memmap(npy_path, tif_path):
+                write_memmap(dataset, npy_path)
+    return np.load(npy_path, mmap_mode="r")
+
+
+def is_stale_memmap(npy_path: str, tif_path: str) -> bool:
+    return not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(tif_path)
+
+
+def write_memmap(dataset, npy_path: str):
+    tmp_path = f"{npy_path}.{os.getpid()}.tmp.npy"
+    try:
+        memmap = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dataset.dtypes[0], shape=(dataset.height, dataset.width))
+        # ブロック行毎に書き込んでバンド全体をメモリに載せない
+        for _, window in dataset.block_windows(1):
+            memmap[window.row_off:window.row_off + window.height, window.col_off:window.col_off + window.width] = dataset.read(1, window=window)
+        memmap.flush()
+        del memmap
+        os.replace(tmp_path, npy_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,102 @@
+from geopandas import GeoDataFrame
+import numpy as np
+import shapely
+
+# 道路と重なるインフラ(トンネル、橋)のエッジを求める
+# 座標が2つ以上一致するインフラのエッジを重なっているとみなす。
+# 道路とインフラの全座標を座標値でハッシュ結合するので、道路毎に空間インデックスを引いたり座標をリストで探したりしない。
+#
+# 戻り値は道路の行番号順(同じ道路内はインフラの行番号順)に並んだ列形式のdict
+#   road: 道路の行番号(iloc)
+#   infra: インフラの行番号(iloc)
+#   start_index, end_index: インフラの始点と終点に最も近いインフラ外の道路の座標のindex(start_index <= end_index)
+def match(gdf: GeoDataFrame, infra_edges: GeoDataFrame) -> dict[str, np.ndarray]:
+    road_coords, road_rows = shapely.get_coordinates(gdf.geometry.values, return_index=True)
+    infra_coords, infra_rows = shapely.get_coordinates(infra_edges.geometry.values, return_index=True)
+    road_offsets = np.concatenate([[0], np.cumsum(np.bincount(road_rows, minlength=len(gdf)))])
+    infra_offsets = np.concatenate([[0], np.cumsum(np.bincount(infra_rows, minlength=len(infra_edges)))])
+
+    # 座標値(経度, 緯度)を一意な番号にする
+    _, codes = np.unique(
+        np.concatenate([road_coords, infra_coords]).view(np.complex128).ravel(), return_inverse=True
+    )
+    codes = codes.ravel()
+    code_count = max(int(codes.max()) + 1 if len(codes) else 0, 1)
+    road_codes = codes[:len(road_coords)]
+    infra_codes = codes[len(road_coords):]
+
+    # 道路毎の座標(重複なし)と、その座標が道路内で最初に出てくるindex
+    road_keys, road_first_positions = np.unique(road_rows * code_count + road_codes, return_index=True)
+    road_key_rows, road_key_codes = np.divmod(road_keys, code_count)
+
+    # インフラの座標毎に同じ座標を持つ道路を結合し、(道路, インフラ)毎に一致した座標数を数える
+    # インフラ側は重複した座標もそれぞれ数える
+    order = np.argsort(road_key_codes, kind="stable")
+    sorted_codes = road_key_codes[order]
+    lo = np.searchsorted(sorted_codes, infra_codes, side="left")
+    join_counts = np.searchsorted(sorted_codes, infra_codes, side="right") - lo
+    join_offsets = np.cumsum(join_counts) - join_counts
+    within = np.arange(join_counts.sum()) - np.repeat(join_offsets, join_counts)
+    join_roads = road_key_rows[order[np.repeat(lo, join_counts) + within]]
+    join_infras = np.repeat(infra_rows, join_counts)
+    infra_count = max(len(infra_edges), 1)
+    pair_keys, pair_counts = np.unique(join_roads * infra_count + join_infras, return_counts=True)
+    roads, infras = np.divmod(pair_keys[pair_counts >= 2], infra_count)
+    if len(roads) == 0:
+        return {"road": roads, "infra": infras, "start_index": roads.copy(), "end_index": roads.copy()}
+
+    start_index, end_index = generate_index_ranges(
+        roads, infras, road_coords, road_codes, road_offsets, infra_coords, infra_codes, infra_offsets,
+        code_count, road_keys, road_first_positions,
+    )
+    return {
+        "road": roads,
+        "infra": infras,
+        "start_index": start_index,
+        "end_index": end_index,
+    }
+
+
+# (道路, インフラ)の組毎に、インフラの始点と終点に最も近いインフラ外の道路の座標のindexを求める
+# インフラの中間の座標(先頭と末尾以外)を除いた道路の座標から、平面上の距離が最も近い座標を選ぶ。
+# 道路とインフラの座標列が完全に一致する場合は道路の全座標から選ぶ。
+def generate_index_ranges(
+    roads, infras, road_coords, road_codes, road_offsets, infra_coords, infra_codes, infra_offsets,
+    code_count, road_keys, road_first_positions,
+) -> tuple[np.ndarray, np.ndarray]:
+    road_counts = road_offsets[roads + 1] - road_offsets[roads]
+    infra_counts = infra_offsets[infras + 1] - infra_offsets[infras]
+    # 組 × 道路の座標に展開する
+    pair_ids = np.repeat(np.arange(len(roads)), road_counts)
+    pair_starts = np.cumsum(road_counts) - road_counts
+    positions = np.arange(len(pair_ids)) - pair_starts[pair_ids]
+    coord_index = road_offsets[roads][pair_ids] + positions
+    coords = road_coords[coord_index]
+    codes = road_codes[coord_index]
+
+    # 道路とインフラの座標列が完全に一致する組
+    same_length = (road_counts == infra_counts)[pair_ids]
+    infra_position = np.where(same_length, infra_offsets[infras][pair_ids] + positions, 0)
+    mismatch = ~same_length | (infra_codes[infra_position] != codes)
+    is_same = (road_counts == infra_counts) & (np.bincount(pair_ids, weights=mismatch, minlength=len(roads)) == 0)
+
+    # インフラの中間の座標に含まれる道路の座標を除く
+    infra_pair_ids = np.repeat(np.arange(len(roads)), infra_counts)
+    infra_positions = np.arange(len(infra_pair_ids)) - (np.cumsum(infra_counts) - infra_counts)[infra_pair_ids]
+    is_middle = (infra_positions > 0) & (infra_positions < infra_counts[infra_pair_ids] - 1)
+    middle_keys = infra_pair_ids[is_middle] * code_count + infra_codes[infra_offsets[infras][infra_pair_ids] + infra_positions][is_middle]
+    excluded = np.isin(pair_ids * code_count + codes, middle_keys) & ~is_same[pair_ids]
+
+    def nearest_index(points: np.ndarray) -> np.ndarray:
+        dx = coords[:, 0] - points[pair_ids, 0]
+        dy = coords[:, 1] - points[pair_ids, 1]
+        distances = np.where(excluded, np.inf, np.sqrt(dx * dx + dy * dy))
+        # 距離が同じ場合は道路の先頭に近い座標
+        nearest = np.lexsort((positions, distances, pair_ids))[pair_starts]
+        # 座標が道路内で最初に出てくるindex
+        keys = roads * code_count + codes[nearest]
+        return road_first_positions[np.searchsorted(road_keys, keys)] - road_offsets[roads]
+
+    a_index = nearest_index(infra_coords[infra_offsets[infras]])
+    b_index = nearest_index(infra_coords[infra_offsets[infras + 1] - 1])
+    return np.minimum(a_index, b_index), np.maximum(a_index, b_index)
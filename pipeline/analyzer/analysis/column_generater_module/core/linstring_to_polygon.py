@@ -1,6 +1,8 @@
 from shapely.geometry import Polygon
 import math
-from geopy.distance import geodesic
+import numpy as np
+import shapely
+from ....core import distance_service
 
 def calculate_bearing(lat1, lon1, lat2, lon2):
     """
@@ -31,35 +33,55 @@ def offset_latlon(lat, lon, distance_meters, bearing):
     :param bearing: 方位角（0: 北, 90: 東, 180: 南, 270: 西）
     :return: 新しい緯度経度
     """
-    origin = (lat, lon)
-    destination = geodesic(meters=distance_meters).destination(origin, bearing)
-    return destination.latitude, destination.longitude
+    lons, lats = distance_service.destinations(lon, lat, distance_meters, bearing)
+    return float(lats), float(lons)
 
 # linestringから垂直にオフセットしたポリゴンを作成
 def create_vertical_polygon(coords, offset_distance):
-    # 元の座標を上下にオフセット
-    offset_coords_up = []
-    offset_coords_down = []
+    coords = np.asarray(coords, dtype=float)
+    lons1, lats1 = coords[:-1, 0], coords[:-1, 1]
+    lons2, lats2 = coords[1:, 0], coords[1:, 1]
 
-    for i in range(len(coords) - 1):
-        lon1, lat1  = coords[i]
-        lon2, lat2 = coords[i + 1]
-        
-        # 2座標間の方位角を計算
-        bearing = calculate_bearing(lat1, lon1, lat2, lon2)
-        
-        # 左側と右側に90度と270度の方向にオフセット
-        lat_up1, lon_up1 = offset_latlon(lat1, lon1, offset_distance, bearing + 90)
-        lat_up2, lon_up2 = offset_latlon(lat2, lon2, offset_distance, bearing + 90)
-        offset_coords_up.append((lon_up1, lat_up1))
-        offset_coords_up.append((lon_up2, lat_up2))
-        
-        lat_down1, lon_down1 = offset_latlon(lat1, lon1, offset_distance, bearing - 90)
-        lat_down2, lon_down2 = offset_latlon(lat2, lon2, offset_distance, bearing - 90)
-        offset_coords_down.append((lon_down1, lat_down1))
-        offset_coords_down.append((lon_down2, lat_down2))
+    # 2座標間の方位角を計算
+    bearing = distance_service.bearings(lons1, lats1, lons2, lats2)
+
+    # 各区間の始点と終点を左側と右側に90度と270度の方向にオフセット
+    # 区間毎に(始点, 終点)の順に並べる
+    lons = np.column_stack([lons1, lons2]).ravel()
+    lats = np.column_stack([lats1, lats2]).ravel()
+    bearing = np.repeat(bearing, 2)
+    lon_up, lat_up = distance_service.destinations(lons, lats, offset_distance, bearing + 90)
+    lon_down, lat_down = distance_service.destinations(lons, lats, offset_distance, bearing - 90)
+    offset_coords_up = list(zip(lon_up.tolist(), lat_up.tolist()))
+    offset_coords_down = list(zip(lon_down.tolist(), lat_down.tolist()))
 
     # オフセットされた座標を使ってポリゴンを作成
     all_coords = offset_coords_up + offset_coords_down[::-1]  # 上のラインと下のラインを結合
     polygon = Polygon(all_coords)
-    return polygon
\ No newline at end of file
+    return polygon
+
+
+# create_vertical_polygonをLineStringの配列に対してまとめて行う(座標は1本ずつ作った場合と同じ)
+# 全エッジの区間の方位角とオフセットした座標をまとめて求め、エッジ毎に上のラインと逆順の下のラインを並べたリングにする
+def create_vertical_polygons(geometries, offset_distance) -> np.ndarray:
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    same_line = index[1:] == index[:-1]
+    starts = coords[:-1][same_line]
+    ends = coords[1:][same_line]
+    bearing = np.repeat(distance_service.bearings(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1]), 2)
+    lons = np.column_stack([starts[:, 0], ends[:, 0]]).ravel()
+    lats = np.column_stack([starts[:, 1], ends[:, 1]]).ravel()
+    point_index = np.repeat(index[1:][same_line], 2)
+    lon_up, lat_up = distance_service.destinations(lons, lats, offset_distance, bearing + 90)
+    lon_down, lat_down = distance_service.destinations(lons, lats, offset_distance, bearing - 90)
+
+    # エッジ毎に上のラインを順に、下のラインを逆順に並べる
+    positions = np.arange(len(point_index))
+    order = np.lexsort((
+        np.concatenate([positions, -positions]),
+        np.repeat([0, 1], len(point_index)),
+        np.concatenate([point_index, point_index]),
+    ))
+    ring_coords = np.column_stack([np.concatenate([lon_up, lon_down]), np.concatenate([lat_up, lat_down])])[order]
+    rings = shapely.linearrings(ring_coords, indices=np.concatenate([point_index, point_index])[order])
+    return shapely.polygons(rings)
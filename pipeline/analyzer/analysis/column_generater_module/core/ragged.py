@@ -0,0 +1,102 @@
+from itertools import chain
+import numpy as np
+import shapely
+
+# 長さの違うリストの集まりを1本の配列(values)と各リストの開始位置(offsets)で扱う
+# i番目のリストはvalues[offsets[i]:offsets[i + 1]]
+
+
+def from_lists(lists, dtype=float) -> tuple[np.ndarray, np.ndarray]:
+    counts = np.fromiter((len(x) for x in lists), dtype=np.int64, count=len(lists))
+    offsets = counts_to_offsets(counts)
+    values = np.fromiter(chain.from_iterable(lists), dtype=dtype, count=int(offsets[-1]))
+    return values, offsets
+
+
+def counts_to_offsets(counts: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+# リストに戻す。digitsを指定した場合はround(x, digits)で丸める
+def to_lists(values: np.ndarray, offsets: np.ndarray, digits: int | None = None) -> list[list]:
+    items = values.tolist()
+    if digits is not None:
+        items = [round(x, digits) for x in items]
+    return [items[st:ed] for st, ed in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+# LineString等のジオメトリの座標を1本の(n, 2)の配列(values)と各ジオメトリの開始位置(offsets)にする
+def from_geometries(geometries) -> tuple[np.ndarray, np.ndarray]:
+    values = shapely.get_coordinates(geometries)
+    offsets = counts_to_offsets(shapely.get_num_coordinates(geometries))
+    return values, offsets
+
+
+# 前にbefore件、後ろにafter件の要素があるリスト内の要素の位置(valuesでの位置)と、その要素が何番目のリストに属するか
+# values[index - k], values[index], values[index + k]で、リスト内の前後の要素とまとめて計算するのに使う
+def inner_indexes(offsets: np.ndarray, before: int, after: int) -> tuple[np.ndarray, np.ndarray]:
+    inner_counts = np.maximum(np.diff(offsets) - before - after, 0)
+    inner_offsets = counts_to_offsets(inner_counts)
+    rows = row_ids(inner_offsets)
+    index = np.arange(len(rows)) - inner_offsets[rows] + offsets[:-1][rows] + before
+    return index, rows
+
+
+# 各要素が何番目のリストに属するか
+def row_ids(offsets: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+# 位置j毎に、countsがjより大きいリストのstarts + jを返す
+# 前の要素の結果に依存する計算(累積和や傾斜の補正)を、位置毎に全リストまとめて行うのに使う
+def iter_positions(starts: np.ndarray, counts: np.ndarray):
+    order = np.argsort(-counts, kind="stable")
+    sorted_counts = counts[order]
+    starts = starts[order]
+    for j in range(int(sorted_counts[0]) if len(sorted_counts) else 0):
+        active = np.searchsorted(-sorted_counts, -j, side="left")
+        yield j, starts[:active] + j
+
+
+# リスト毎の累積和。Pythonで先頭から順に足したのと同じ値になる
+def cumsum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    result = values.astype(float)
+    for j, index in iter_positions(offsets[:-1], np.diff(offsets)):
+        if j > 0:
+            result[index] = result[index - 1] + values[index]
+    return result
+
+
+# リスト毎の二分探索(bisect_left)。queriesはquery_rows番目のリストから探し、リスト内の位置を返す
+def searchsorted(values: np.ndarray, offsets: np.ndarray, queries: np.ndarray, query_rows: np.ndarray) -> np.ndarray:
+    rows = np.concatenate([row_ids(offsets), query_rows])
+    keys = np.concatenate([values, queries])
+    # 同じ値の場合は探索値を先に並べて、探索値未満の要素数を数える
+    kinds = np.concatenate([np.ones(len(values), dtype=np.int8), np.zeros(len(queries), dtype=np.int8)])
+    order = np.lexsort((kinds, keys, rows))
+    value_count_before = np.cumsum(kinds[order])
+    positions = np.empty(len(keys), dtype=np.int64)
+    positions[order] = value_count_before
+    return positions[len(values):] - offsets[query_rows]
+
+
+# リスト毎の移動平均(core.smoother.generate_moving_averageと同じ)
+# 末尾のwindow_size-1件は残りの要素の平均で補完して長さを維持する。window_sizeより短いリストは空になる。
+def moving_average(values: np.ndarray, offsets: np.ndarray, window_size: int) -> tuple[np.ndarray, np.ndarray]:
+    counts = np.diff(offsets)
+    result_counts = np.where(counts >= window_size, counts, 0)
+    result_offsets = counts_to_offsets(result_counts)
+    rows = row_ids(result_offsets)
+    positions = np.arange(len(rows)) - result_offsets[rows]
+    counts = counts[rows]
+    # 平均する範囲の先頭と要素数
+    tail = positions > counts - window_size
+    starts = offsets[rows] + np.where(tail, positions - 1, positions)
+    sizes = np.where(tail, offsets[rows] + counts - starts, window_size)
+    sums = values[starts].astype(float)
+    for k in range(1, window_size):
+        target = sizes > k
+        sums[target] += values[starts[target] + k]
+    return sums / sizes, result_offsets
@@ -5,13 +5,13 @@ import matplotlib.pyplot as plt
 import warnings
 from shapely.geometry import Point, LineString
 import time
-from pyproj import Transformer
 from shapely.ops import nearest_points
 import glob
 from rtree import Rtree
 import pickle
 import os
 from shapely.geometry import MultiPoint
+from ....core import projection_service
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
@@ -22,9 +22,12 @@ class RoadWidthCalculator:
     road_edge_s: gpd.GeoSeries
     road_edge_i: Rtree
 
-    def __init__(self, center_path: str, edge_path: str):
+    def __init__(self, center_path: str, edge_path: str, plane_epsg_code: int):
+        # 県の平面直角座標系で距離を扱う。キャッシュは座標系毎に分けて保存する。
+        self.plane_epsg_code = plane_epsg_code
+        epsg_code = int(plane_epsg_code or projection_service.DEFAULT_PLANE_EPSG_CODE)
         file_list = glob.glob(f"{center_path}/*.geojson")
-        path = f"{os.path.dirname(os.path.abspath(__file__))}/center_gdf"
+        path = f"{os.path.dirname(os.path.abspath(__file__))}/center_gdf_{epsg_code}"
         # print(path)
         if os.path.exists(path):
             print("  load center_gdf")
@@ -35,7 +38,7 @@ class RoadWidthCalculator:
             gdf_list = [gpd.read_file(file) for file in file_list]
             road_center_df = gpd.GeoDataFrame(
                 pd.concat(gdf_list, ignore_index=True)
-            ).to_crs("EPSG:6677")
+            ).to_crs(epsg=epsg_code)
             # 保存する
             with open(path, "wb") as f:
                 pickle.dump(road_center_df, f)
@@ -44,7 +47,7 @@ class RoadWidthCalculator:
 
         file_list = glob.glob(f"{edge_path}/*.xml")
         # print(file_list)
-        path = f"{os.path.dirname(os.path.abspath(__file__))}/edge_gdf"
+        path = f"{os.path.dirname(os.path.abspath(__file__))}/edge_gdf_{epsg_code}"
         if os.path.exists(path):
             print("  load edge_gdf")
             with open(path, "rb") as f:
@@ -54,7 +57,7 @@ class RoadWidthCalculator:
             gdf_list = [gpd.read_file(file) for file in file_list]
             road_edge_df = gpd.GeoDataFrame(
                 pd.concat(gdf_list, ignore_index=True)
-            ).to_crs("EPSG:6677")
+            ).to_crs(epsg=epsg_code)
             # 保存する
             with open(path, "wb") as f:
                 pickle.dump(road_edge_df, f)
@@ -62,15 +65,24 @@ class RoadWidthCalculator:
         self.road_edge_i = self.road_edge_s.sindex
         print("  Loading completed")
 
+    # 読み込み済みの中央線と道路縁(平面直角座標系のGeoSeries)から作る
+    @classmethod
+    def from_geoseries(cls, road_center_s: gpd.GeoSeries, road_edge_s: gpd.GeoSeries, plane_epsg_code: int):
+        calculator = cls.__new__(cls)
+        calculator.plane_epsg_code = plane_epsg_code
+        calculator.road_center_s = road_center_s
+        calculator.road_center_i = road_center_s.sindex
+        calculator.road_edge_s = road_edge_s
+        calculator.road_edge_i = road_edge_s.sindex
+        return calculator
+
     def _to_latlon(self, x, y):
-        tr = Transformer.from_proj(6677, 6668)
-        lat, lon = tr.transform(y, x)
-        return lon, lat
+        lons, lats = projection_service.to_lonlat([x], [y], self.plane_epsg_code)
+        return lons[0], lats[0]
 
     def _to_xy(self, lon, lat):
-        tr = Transformer.from_proj(6668, 6677)
-        y, x = tr.transform(lat, lon)
-        return x, y
+        xs, ys = projection_service.to_plane([lon], [lat], self.plane_epsg_code)
+        return xs[0], ys[0]
 
     # 1. 指定座標に最も近い中央線を探す
     def _search_nearest_center_line(self, point: Point) -> LineString | None:
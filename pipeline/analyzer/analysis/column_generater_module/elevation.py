@@ -1,20 +1,20 @@
 from geopandas import GeoDataFrame
 from pandas import Series
 import numpy as np
+import shapely
 from .core import elevation_service
 
 # 標高の変化量を取得する
-def generate(gdf: GeoDataFrame, tif_path: str) -> Series:
-    elevation_service_ins = elevation_service.ElevationService(tif_path)
+# 全エッジの全座標をまとめて1回で取得し、エッジ毎のリストに分ける
+def generate(gdf: GeoDataFrame, tif_path: str, bilinear: bool = False, mmap: bool = False) -> Series:
+    if len(gdf) == 0:
+        return Series([], index=gdf.index, dtype=object)
+    elevation_service_ins = elevation_service.get_elevation_service(tif_path, mmap)
 
-    def func(row) -> list:
-        coords = np.array(list(row.geometry.coords))
-        # coords[:,1]=lat, coords[:,0]=lon でバッチ取得（1点ずつのget_elevation()を廃止）
-        elevations = elevation_service_ins.get_elevations_batch(coords[:, 1], coords[:, 0])
-        return elevations.tolist()
+    coords, index = shapely.get_coordinates(gdf.geometry.values, return_index=True)
+    # coords[:,1]=lat, coords[:,0]=lon
+    elevations = elevation_service_ins.get_elevations_batch(coords[:, 1], coords[:, 0], bilinear)
+    counts = np.bincount(index, minlength=len(gdf))
+    results = [x.tolist() for x in np.split(elevations, np.cumsum(counts)[:-1])]
 
-    results = gdf.apply(func, axis=1)
-
-    del elevation_service_ins
-
-    return results
+    return Series(results, index=gdf.index)
@@ -0,0 +1,216 @@
+from geopandas import GeoDataFrame
+from pandas import DataFrame
+import math
+import numpy as np
+import shapely
+from .core import ragged
+from ...core import distance_service
+
+# 標高の補正 → 平準化 → 高さ → アップダウン量 → 50m毎の標高リスト → 500m毎の勾配区間をまとめて求める
+# 全エッジの標高を1本の配列(values + offsets)で持ち、各処理は全エッジまとめてnumpyで計算する
+
+# 国土地理院の標高モデルはレーザー計測でそこから建物の高さを引いたものを標高値としている。
+# https://www.gsi.go.jp/KIDS/KIDS16.html#:~:text=%E8%88%AA%E7%A9%BA%E3%83%AC%E3%83%BC%E3%82%B6%E6%B8%AC%E9%87%8F%E3%81%AF%E3%80%81%20%E8%88%AA%E7%A9%BA%E6%A9%9F,%E6%A8%99%E9%AB%98%E3%82%92%E5%87%BA%E3%81%97%E3%81%A6%E3%81%84%E3%81%BE%E3%81%99%E3%80%82
+# 道路の標高が計測されている所もあればさえていない所もある。
+# 橋、トンネルの区間なら調整可能だが、調整可能な目印がない場合もありこの処理はその道を調整するためのもの。
+# 道路の勾配は、国の道路構造令により全国一律で「最大12％」100m進むと12m上がる傾斜が最大。
+# 長崎県は最大17％.
+# https://trafficnews.jp/post/122278
+
+# 国基基準だと12~17%だが、補正を強くしたいのでとりあえず8%にしておく。
+METER_AND_ELEVATION_RATIO = 0.08
+# 標高の平準化の移動平均のサンプリングサイズ
+SMOOTH_WINDOW_SIZE = 5
+# 標高の変化量が40m以上の場合はtif範囲外を見ている可能性がある
+FLUCTUATION_WARNING_DIFF = 40
+# 標高リストの間隔(m)と移動平均のサンプリングサイズ
+SEGMENT_INTERVAL = 50
+SEGMENT_WINDOW_SIZE = 5
+# 勾配区間の間隔(m)と勾配(%)の区分
+SECTION_INTERVAL = 500
+FLAT_MAX = 1.0
+GENTLE_MAX = 3.0
+STEEP_MIN = 7.0
+
+COLUMNS = ["elevation", "elevation_smooth", "elevation_height", "elevation_fluctuation", "elevation_segment_list", "elevation_section"]
+
+
+def generate(gdf: GeoDataFrame) -> DataFrame:
+    if len(gdf) == 0:
+        return DataFrame({column: [] for column in COLUMNS}, index=gdf.index, dtype=object)
+    elevations, offsets = ragged.from_lists(gdf["elevation"].values)
+    coords, coord_rows = shapely.get_coordinates(gdf.geometry.values, return_index=True)
+    if not np.array_equal(np.bincount(coord_rows, minlength=len(gdf)), np.diff(offsets)):
+        raise ValueError("elevation and geometry must have the same number of points")
+
+    # 国の基準に合わせて傾斜を調整する
+    elevations = adjust_slope(elevations, offsets, coords)
+
+    # 標高の平準化を行う(少数第1桁以下を切り捨てる)
+    smooth, smooth_offsets = ragged.moving_average(elevations, offsets, SMOOTH_WINDOW_SIZE)
+    smooth_lists = ragged.to_lists(smooth, smooth_offsets, 1)
+    smooth = np.fromiter((x for row in smooth_lists for x in row), dtype=float, count=len(smooth))
+
+    # 標高の高さ(最小値と最大値の差)とアップダウン量を求める
+    height = generate_height(smooth, smooth_offsets)
+    fluctuation_up, fluctuation_down = generate_fluctuation(smooth, smooth_offsets)
+
+    # 50m毎の標高リスト(z軸の凹凸の判定に使用)
+    segment_list = generate_segment_list(gdf, smooth, smooth_offsets)
+
+    # 500m毎の勾配区間
+    section = generate_section(gdf, smooth, smooth_offsets)
+
+    return DataFrame({
+        "elevation": ragged.to_lists(elevations, offsets),
+        "elevation_smooth": smooth_lists,
+        "elevation_height": height,
+        "elevation_fluctuation": list(zip(fluctuation_up.round(2), fluctuation_down.round(2))),
+        "elevation_segment_list": segment_list,
+        "elevation_section": section,
+    }, index=gdf.index)
+
+
+# 座標間の傾斜がMETER_AND_ELEVATION_RATIOを超える場合は次の座標の標高を補正する
+# 補正は前の座標の補正結果に依存するので、座標の位置毎に全エッジまとめて行う
+def adjust_slope(elevations: np.ndarray, offsets: np.ndarray, coords: np.ndarray) -> np.ndarray:
+    elevations = elevations.astype(float)
+    # 座標間の距離(各エッジの最後の座標と次のエッジの先頭の座標の距離は使わない)
+    distances = np.zeros(len(coords))
+    if len(coords) > 1:
+        distances[:-1] = distance_service.distances(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    segment_counts = np.maximum(np.diff(offsets) - 1, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _, index in ragged.iter_positions(offsets[:-1], segment_counts):
+            elevation = elevations[index]
+            next_point_elevation = elevations[index + 1]
+            distance = distances[index]
+            slope_per_meter = np.abs(elevation - next_point_elevation) / distance
+            up = elevation + (distance * METER_AND_ELEVATION_RATIO)
+            down = elevation - (distance * METER_AND_ELEVATION_RATIO)
+            down = np.where(down < 0, 0, down)
+            adjusted = np.where(elevation < next_point_elevation, up, down)
+            elevations[index + 1] = np.where(slope_per_meter > METER_AND_ELEVATION_RATIO, adjusted, next_point_elevation)
+    return elevations
+
+
+# 標高の高さ(最小値と最大値の差)。標高がない場合はnan
+def generate_height(smooth: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    counts = np.diff(offsets)
+    height = np.full(len(counts), np.nan)
+    has_elevation = counts > 0
+    if has_elevation.any():
+        starts = offsets[:-1][has_elevation]
+        height[has_elevation] = np.maximum.reduceat(smooth, starts) - np.minimum.reduceat(smooth, starts)
+    return height
+
+
+# 標高の上りと下りの合計
+def generate_fluctuation(smooth: np.ndarray, offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    row_count = len(offsets) - 1
+    rows = ragged.row_ids(offsets)
+    same_row = rows[1:] == rows[:-1]
+    diffs = (smooth[1:] - smooth[:-1])[same_row]
+    diff_rows = rows[1:][same_row]
+    warning_count = np.count_nonzero(np.abs(diffs) >= FLUCTUATION_WARNING_DIFF)
+    if warning_count > 0:
+        print(f"The change in elevation is over {FLUCTUATION_WARNING_DIFF} meters: {warning_count} points")
+    up = diffs > 0
+    total_up = np.bincount(diff_rows[up], weights=diffs[up], minlength=row_count).astype(float)
+    total_down = np.bincount(diff_rows[~up], weights=np.abs(diffs[~up]), minlength=row_count).astype(float)
+    return total_up, total_down
+
+
+# SEGMENT_INTERVAL毎の標高リスト(core.segmnet.generate_segment_original_index_listと同じ座標を選ぶ)
+# lengthの区間毎にラインを補間した点から最も近い元の座標の標高を取り、移動平均で平準化する
+def generate_segment_list(gdf: GeoDataFrame, smooth: np.ndarray, smooth_offsets: np.ndarray) -> list[list]:
+    geometries = gdf.geometry.values
+    coords, coord_rows = shapely.get_coordinates(geometries, return_index=True)
+    coord_counts = np.bincount(coord_rows, minlength=len(gdf))
+    coord_offsets = ragged.counts_to_offsets(coord_counts)
+    # 標高がないエッジは空にする
+    target_rows = np.flatnonzero((np.diff(smooth_offsets) > 0) & (coord_counts > 0))
+
+    # 区間の点の、ラインの始点からの距離
+    lengths = gdf["length"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        segment_counts = np.zeros(len(gdf), dtype=np.int64)
+        segment_counts[target_rows] = (lengths[target_rows] // SEGMENT_INTERVAL).astype(np.int64) + 1
+        segment_offsets = ragged.counts_to_offsets(segment_counts)
+        rows = ragged.row_ids(segment_offsets)
+        ratios = np.minimum((np.arange(len(rows)) - segment_offsets[rows]) * SEGMENT_INTERVAL / lengths[rows], 1)
+    # 補間した点はライン上にあるので、line.project(line.interpolate(x))はxと同じになる
+    distances = ratios * shapely.length(geometries)[rows]
+
+    # 元の座標の始点からの累積距離
+    xy = coords[1:] - coords[:-1]
+    segment_lengths = np.zeros(len(coords))
+    segment_lengths[1:] = np.sqrt(xy[:, 0] * xy[:, 0] + xy[:, 1] * xy[:, 1])
+    segment_lengths[coord_offsets[:-1][coord_counts > 0]] = 0.0
+    chainages = ragged.cumsum(segment_lengths, coord_offsets)
+
+    # 区間の点に最も近い座標(同じ距離なら前側)
+    j = ragged.searchsorted(chainages, coord_offsets, distances, rows)
+    n = coord_counts[rows]
+    prev_index = coord_offsets[rows] + np.clip(j - 1, 0, n - 1)
+    next_index = coord_offsets[rows] + np.clip(j, 0, n - 1)
+    use_prev = (distances - chainages[prev_index]) <= (chainages[next_index] - distances)
+    index = np.where(j <= 0, 0, np.where(j >= n, n - 1, np.where(use_prev, j - 1, j)))
+
+    # 移動平均で平準化して少数第1桁以下を切り捨てる
+    values = smooth[smooth_offsets[rows] + index]
+    values, value_offsets = ragged.moving_average(values, segment_offsets, SEGMENT_WINDOW_SIZE)
+    return ragged.to_lists(values, value_offsets, 1)
+
+
+# SECTION_INTERVAL毎の勾配区間のリスト(geometry_listの緯度経度から簡易的に距離を求める)
+def generate_section(gdf: GeoDataFrame, smooth: np.ndarray, smooth_offsets: np.ndarray) -> list[list]:
+    geometry_lists = gdf["geometry_list"].values
+    geo_counts = np.fromiter((len(x) for x in geometry_lists), dtype=np.int64, count=len(gdf))
+    geo_offsets = ragged.counts_to_offsets(geo_counts)
+    geo = np.array([point for geometry_list in geometry_lists for point in geometry_list], dtype=float).reshape(-1, 2)
+    target = (geo_counts >= 2) & (np.diff(smooth_offsets) >= 2)
+
+    # 座標の始点からの累積距離
+    lat0, lng0, lat1, lng1 = geo[:-1, 0], geo[:-1, 1], geo[1:, 0], geo[1:, 1]
+    cos_lat0 = np.fromiter(map(math.cos, (lat0 * math.pi / 180).tolist()), dtype=float, count=len(lat0))
+    dlat = (lat1 - lat0) * 111320
+    dlng = (lng1 - lng0) * 111320 * cos_lat0
+    segment_lengths = np.zeros(len(geo))
+    segment_lengths[1:] = np.sqrt(dlat * dlat + dlng * dlng)
+    segment_lengths[geo_offsets[:-1][geo_counts > 0]] = 0.0
+    cum_dists = ragged.cumsum(segment_lengths, geo_offsets)
+
+    # 区間毎の始点と終点の距離
+    total_dists = np.zeros(len(gdf))
+    total_dists[target] = cum_dists[geo_offsets[1:][target] - 1]
+    section_counts = np.where(target, np.maximum(1, (total_dists // SECTION_INTERVAL).astype(np.int64)), 0)
+    section_offsets = ragged.counts_to_offsets(section_counts)
+    rows = ragged.row_ids(section_offsets)
+    positions = (np.arange(len(rows)) - section_offsets[rows]).astype(float)
+    d0 = positions * SECTION_INTERVAL
+    d1 = np.minimum((positions + 1) * SECTION_INTERVAL, total_dists[rows])
+    e0 = interpolate_elevation(cum_dists, geo_offsets, smooth, smooth_offsets, d0, rows)
+    e1 = interpolate_elevation(cum_dists, geo_offsets, smooth, smooth_offsets, d1, rows)
+    seg_len = d1 - d0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grad = np.where(seg_len > 0, np.abs(e1 - e0) / seg_len * 100, 0)
+    levels = np.array(["flat", "gentle", "moderate", "steep"])[np.searchsorted([FLAT_MAX, GENTLE_MAX, STEEP_MIN], grad, side="right")]
+    sections = [{"level": level} for level in levels.tolist()]
+    return [sections[st:ed] for st, ed in zip(section_offsets[:-1].tolist(), section_offsets[1:].tolist())]
+
+
+# 累積距離targetの位置の標高を前後の座標の標高から線形補間する。targetが全長を超える場合は最後の標高
+def interpolate_elevation(cum_dists, geo_offsets, smooth, smooth_offsets, targets, rows) -> np.ndarray:
+    n = np.diff(geo_offsets)[rows]
+    i = np.maximum(ragged.searchsorted(cum_dists, geo_offsets, targets, rows), 1)
+    inside = i < n
+    i = np.minimum(i, n - 1)
+    d0 = cum_dists[geo_offsets[rows] + i - 1]
+    d1 = cum_dists[geo_offsets[rows] + i]
+    elev0 = smooth[smooth_offsets[rows] + i - 1]
+    elev1 = smooth[smooth_offsets[rows] + i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interpolated = np.where(d1 == d0, elev1, elev0 + (elev1 - elev0) * ((targets - d0) / (d1 - d0)))
+    last = smooth[smooth_offsets[rows + 1] - 1]
+    return np.where(inside, interpolated, last)
@@ -1,7 +1,7 @@
 from geopandas import GeoDataFrame
 from pandas import Series
 from shapely.geometry import LineString, Point
-from geopy.distance import geodesic
+from ...core import distance_service
 # こいつを使いたい所だが、dbのlocationsの座標と合わなくなるので使えない。
 # from .core.segmnet import generate_segment_list
 
@@ -18,19 +18,18 @@ def generate(gdf: GeoDataFrame) -> Series:
 
 
 def interpolate_points(line: LineString, interval: int, length:int) -> list[list[Point, Point]]:
-    points = [line.coords[0]]
+    coords = list(line.coords)
+    points = [coords[0]]
     distance = 0
-    for index, point in enumerate(line.coords):
-        # x, y = point
-        if index + 1 >= len(line.coords):
-            if distance >= 0:
-                points.append(line.coords[-1])
-            continue
-        next_point = line.coords[index + 1]
-        distance += geodesic((point[1], point[0]), (next_point[1], next_point[0])).meters
+    # 座標間の距離はまとめて求める
+    segment_distances = distance_service.segment_distances(coords).tolist()
+    for index, segment_distance in enumerate(segment_distances):
+        distance += segment_distance
         if distance > interval:
-            points.append(next_point)
+            points.append(coords[index + 1])
             # 500以上を持ち越す。0以下の場合は0にリセットが正しいが、そうすると全ての座標のマップングをし直す必要があるため、持ち越しとする
             # distance = distance - interval if distance - interval > 0 else 0
             distance = 0
-    return points
\ No newline at end of file
+    if distance >= 0:
+        points.append(coords[-1])
+    return points
@@ -1,28 +1,15 @@
 from geopandas import GeoDataFrame
 from pandas import Series
-from pyproj import Proj, Transformer
+import numpy as np
+import shapely
+from ...core import projection_service
 
+# 各座標を平面直角座標(m)に変換したリストを生成する。値は従来通り(南北方向, 東西方向)の整数。
 def generate(gdf: GeoDataFrame, plane_epsg_code: int) -> Series:
-    def func(row):
-        # 緯度経度のリスト
-        coords = row.geometry_list
+    coords, index = shapely.get_coordinates(gdf.geometry.values, return_index=True)
+    # 全エッジの座標をまとめて変換する
+    xs, ys = projection_service.to_plane(coords[:, 0], coords[:, 1], plane_epsg_code)
+    transformed_coords = list(zip(ys.astype(int).tolist(), xs.astype(int).tolist()))
 
-        # WGS84 (緯度経度) 座標系
-        wgs84 = Proj('epsg:4326')
-
-        # 日本の平面直角座標系（ここではゾーン9を例とする）
-        japan_plane = Proj(f"epsg:{plane_epsg_code}")
-
-        # Transformer オブジェクトの作成
-        transformer = Transformer.from_proj(wgs84, japan_plane)
-
-        # itransform を使用して座標リスト全体を変換
-        transformed_coords = list(transformer.itransform(coords))
-
-        # transformed_coordsのxとyを整数に変換
-        transformed_coords = [(int(x), int(y)) for x, y in transformed_coords]
-        return transformed_coords
-
-    series = gdf.apply(func, axis=1)
-
-    return series
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(index, minlength=len(gdf)))])
+    return Series([transformed_coords[st:ed] for st, ed in zip(offsets[:-1], offsets[1:])], index=gdf.index)
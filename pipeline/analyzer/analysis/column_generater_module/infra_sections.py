@@ -1,22 +1,17 @@
 from geopandas import GeoDataFrame
 from pandas import Series
+import shapely
 
 
-def generate(gdf: GeoDataFrame, infra_edge_gdf: GeoDataFrame) -> Series:
-    infra_sindex = infra_edge_gdf["geometry"].sindex
+# 道路と重なるインフラのエッジの座標リスト([緯度, 経度]のリスト)を道路毎に返す
+# infra_matchesはcore.infra_matcher.matchの結果
+def generate(gdf: GeoDataFrame, infra_edge_gdf: GeoDataFrame, infra_matches: dict) -> Series:
+    coords, index = shapely.get_coordinates(infra_edge_gdf.geometry.values, return_index=True)
+    infra_coords = [[] for _ in range(len(infra_edge_gdf))]
+    for i, (lng, lat) in zip(index.tolist(), coords.tolist()):
+        infra_coords[i].append([lat, lng])
 
-    def func(row):
-        base_edge_coords = list(row.geometry.coords)
-        candidates = list(infra_sindex.intersection(row.geometry.bounds))
-        if not candidates:
-            return []
-        infra_in_bbox = infra_edge_gdf.iloc[candidates]
-        sections = []
-        for _, infra_edge in infra_in_bbox.iterrows():
-            num_match = sum(1 for coord in infra_edge.geometry.coords if coord in base_edge_coords)
-            if num_match >= 2:
-                coords = list(infra_edge.geometry.coords)
-                sections.append([[c[1], c[0]] for c in coords])
-        return sections
-
-    return gdf.apply(func, axis=1)
+    results = [[] for _ in range(len(gdf))]
+    for road, infra in zip(infra_matches["road"].tolist(), infra_matches["infra"].tolist()):
+        results[road].append(infra_coords[infra])
+    return Series(results, index=gdf.index)
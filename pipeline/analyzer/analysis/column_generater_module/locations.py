@@ -1,49 +1,75 @@
 from geopandas import GeoDataFrame
 from pandas import Series
+import numpy as np
+import shapely
 
 from sqlalchemy import text
 from ...core.db import get_db_session
 
+# 1回のクエリで送る座標の数
+CHUNK_SIZE = 100000
 
-# 開始、中央、終了地点からgoogleMapのルートURLを作成する
+
+# geometryの各座標に一致する位置データをDBから取得する
+# 全エッジの座標を(エッジ番号, 座標番号, 経度, 緯度)の配列でまとめて送り、座標が完全に一致するlocationsとJOINする。
+# 結果はエッジ番号、座標番号の順で返ってくるので、そのままエッジ毎にまとめる。
 def generate(gdf: GeoDataFrame) -> Series:
-    def func(row):
-        coords = list(row.geometry.coords)
-        min_longitude = coords[0][0]
-        max_longitude = coords[0][0]
-        min_latitude = coords[0][1]
-        max_latitude = coords[0][1]
-
-        for point in coords:
-            if point[0] < min_longitude:
-                min_longitude = point[0]
-            if point[0] > max_longitude:
-                max_longitude = point[0]
-            if point[1] < min_latitude:
-                min_latitude = point[1]
-            if point[1] > max_latitude:
-                max_latitude = point[1]
-        srid = 4326
-        locations = []
-        # SQLクエリを実行
-        result = session.execute(text(
-            f"SELECT ST_X(point) AS longitude, ST_Y(point) AS latitude, road_width_type, has_center_line, claude_center_line, claude_center_line_score, claude_road_width_type "
-            f"FROM locations "
-            f"WHERE ST_Intersects(ST_MakeEnvelope({min_longitude}, {min_latitude}, {max_longitude}, {max_latitude}, {srid}), locations.point)"
-        ))
-        result = result.fetchall()
-        # print(f"coords: {len(coords)}")
-        # print(f"db_result: {len(rows)}")
-        # geometryの座標に一致するデータのみ取り出す
-        for coord in coords:
-            for data in result:
-                if data.longitude == coord[0] and data.latitude == coord[1]:
-                    locations.append(data._asdict())
-
-        return locations
+    query = text("""
+    WITH coords AS (
+        SELECT t.edge_id, t.seq, t.longitude, t.latitude, ST_SetSRID(ST_MakePoint(t.longitude, t.latitude), 4326) AS point
+        FROM unnest(
+            CAST(:edge_ids AS int[]), CAST(:seqs AS int[]), CAST(:longitudes AS float8[]), CAST(:latitudes AS float8[])
+        ) AS t(edge_id, seq, longitude, latitude)
+    )
+    SELECT c.edge_id, ST_X(l.point) AS longitude, ST_Y(l.point) AS latitude, l.road_width_type, l.has_center_line, l.claude_center_line, l.claude_center_line_score, l.claude_road_width_type
+    FROM coords c
+    JOIN locations l
+      ON l.point && c.point
+     AND ST_X(l.point) = c.longitude
+     AND ST_Y(l.point) = c.latitude
+    ORDER BY c.edge_id, c.seq;
+    """)
+
+    coords, edge_index = shapely.get_coordinates(gdf.geometry.values, return_index=True)
+    # エッジ内の座標番号
+    coord_offsets = np.concatenate([[0], np.cumsum(np.bincount(edge_index, minlength=len(gdf)))])
+    seqs = np.arange(len(coords)) - coord_offsets[edge_index]
+
+    locations = [[] for _ in range(len(gdf))]
+    session = get_db_session()
+    try:
+        for st in range(0, len(coords), CHUNK_SIZE):
+            ed = min(st + CHUNK_SIZE, len(coords))
+            result = session.execute(query, {
+                'edge_ids': edge_index[st:ed].tolist(),
+                'seqs': seqs[st:ed].tolist(),
+                'longitudes': coords[st:ed, 0].tolist(),
+                'latitudes': coords[st:ed, 1].tolist(),
+            }, execution_options={"stream_results": True})
+            for row in result:
+                data = row._asdict()
+                locations[data.pop('edge_id')].append(data)
+    finally:
+        session.close()
+    return Series(locations, index=gdf.index)
+
+
+# 範囲内のlocationsの件数と最終更新日時。チェックポイントのキーに含め、中央線の推論等でlocationsが更新されたら再計算する
+def generate_data_version(search_area_polygon) -> str:
+    query = text("""
+    SELECT count(*), max(updated_at)
+    FROM locations
+    WHERE point && ST_MakeEnvelope(:min_longitude, :min_latitude, :max_longitude, :max_latitude, 4326);
+    """)
+    min_longitude, min_latitude, max_longitude, max_latitude = search_area_polygon.bounds
     session = get_db_session()
     try:
-        series = gdf.apply(func, axis=1)
+        count, updated_at = session.execute(query, {
+            'min_longitude': min_longitude,
+            'min_latitude': min_latitude,
+            'max_longitude': max_longitude,
+            'max_latitude': max_latitude,
+        }).one()
     finally:
         session.close()
-    return series
+    return f"locations:{count}:{updated_at}"
@@ -1,8 +1,9 @@
 from geopandas import GeoDataFrame
 from pandas import Series
-from geopy.distance import geodesic
+from ...core import distance_service
+from ...core.calc_steering_wheel_angle import DIRECTION_STRAIGHT, DIRECTION_NAMES
 import matplotlib.pyplot as plt
-import copy
+import numpy as np
 from typing import Literal
 
 STRAIGHT_DISTANCE = 100
@@ -12,62 +13,78 @@ WEEK_CORNER_ANGLE_MAX = 45
 MEDIUM_CORNER_ANGLE_MIN = 45
 MEDIUM_CORNER_ANGLE_MAX = 80
 STRONG_CORNER_ANGLE_MIN = 80
+DIRECTION_CODES = {name: code for code, name in DIRECTION_NAMES.items()}
 #
 # 右左コーナー、ストレートの情報を抽出する
 # ストレートはステアリング角度が8度以下で50m以上の区間とする。
 #
+# セクションの分割と結合は全エッジのsteering_wheel_angle_infoを1本の配列(方向コード, 角度, 距離)にして
+# 連続する同じ方向をまとめたラン単位で行い、出力する時だけ辞書にする。
 def generate(gdf: GeoDataFrame) -> Series:
-    def func(row):
-        # 連続する左コーナー、右コーナー、ストレートをグループ化してセクションとする
-        sections = group_continuous_section(row['steering_wheel_angle_info'])
-
-        # ストレート区間が100m未満の場合は半分に分割して前後のセクションと結合する ※1
-        sections = merge_min_straight_section(sections)
-
-        # # 連続する同一方向のセクションをマージ(※1で結合した場合に同一方向のコーナーが連続する場合があるため)
-        sections = merge_continuous_section_section(sections)
-
-        # データを整形
-        datas = []
-        for section in sections:
-            steering_angle_info = section['steering_angle_info']
-            # セクション内の座標を1つにまとめる
-            points = []
-            for x in steering_angle_info:
-                points.append(x['start'])
-                points.append(x['center'])
-                points.append(x['end'])
-            points = list(dict.fromkeys(points))
-
-            # セクションの距離を計算
-            distance = 0
-            for i in range(len(points) - 1):
-                distance += geodesic(reversed(points[i]), reversed(points[i+1])).meters
-
-            # ステアリング角度の最大値、平均値を取得
-            max_steering_angle = max(steering_angle_info, key=lambda x: x['steering_angle'])['steering_angle']
-            avg_steering_angle = sum([x['steering_angle'] for x in steering_angle_info]) / len(steering_angle_info)
-
-            # ステアリング角度を調整する
-            adjusted_steering_angle, elevation_height = adjust_steering_angle(max_steering_angle, points, row.elevation, distance, row.geometry.coords)
-
-            datas.append({
-                'max_steering_angle': max_steering_angle,
-                'avg_steering_angle': avg_steering_angle,
-                'adjusted_steering_angle': adjusted_steering_angle,
-                'elevation_height_and_distance_ratio': elevation_height / distance,
-                'section_type': section['type'],
-                'steering_direction': steering_angle_info[0]['direction'],
-                'points': points,
-                'section_info': steering_angle_info,
-                'corner_level': generate_corner_level(max_steering_angle),
-                'distance': distance,
-                'elevation_height': elevation_height,
-            })
-
-        return datas
-
-    series = gdf.apply(func, axis=1)
+    infos = [info for steering_wheel_angle_info in gdf['steering_wheel_angle_info'] for info in steering_wheel_angle_info]
+    info_counts = np.fromiter((len(x) for x in gdf['steering_wheel_angle_info']), dtype=np.int64, count=len(gdf))
+    rows = np.repeat(np.arange(len(gdf)), info_counts)
+    directions = np.fromiter((DIRECTION_CODES[x['direction']] for x in infos), dtype=np.int8, count=len(infos))
+    angles = np.fromiter((x['steering_angle'] for x in infos), dtype=float, count=len(infos))
+    distances = np.fromiter((x['distance'] for x in infos), dtype=float, count=len(infos))
+
+    # 各ステアリング角がどのセクションに入るか(セクションはinfosの連続した範囲になる)
+    section_ids, section_types = generate_section_ids(rows, directions, angles, distances)
+    section_starts = np.flatnonzero(np.r_[True, section_ids[1:] != section_ids[:-1]])[:len(section_types)]
+    section_ends = np.r_[section_starts[1:], len(infos)].astype(np.int64)
+    section_rows = rows[section_starts].tolist()
+    section_types = [DIRECTION_NAMES[x] for x in section_types.tolist()]
+    # ステアリング角度の最大値、平均値を取得
+    max_steering_angles = np.maximum.reduceat(angles, section_starts).tolist() if len(infos) else []
+    # 平均値は従来と同じくセクション毎にsum()で合計する(Python 3.12のsumは誤差を補正するのでnp.bincountの合計とは一致しない)
+    angle_list = angles.tolist()
+    avg_steering_angles = [
+        sum(angle_list[st:ed]) / (ed - st) for st, ed in zip(section_starts.tolist(), section_ends.tolist())
+    ]
+
+    # セクション内の座標を1つにまとめる
+    section_points = []
+    for st, ed in zip(section_starts.tolist(), section_ends.tolist()):
+        points = []
+        for x in infos[st:ed]:
+            points.append(x['start'])
+            points.append(x['center'])
+            points.append(x['end'])
+        section_points.append(list(dict.fromkeys(points)))
+    # セクションの距離を全セクションまとめて計算
+    section_distances = generate_path_lengths(section_points)
+
+    results = [[] for _ in range(len(gdf))]
+    geometries = gdf.geometry.values
+    elevations = gdf['elevation'].values
+    coord_index_row, coord_index = None, None
+    for i, (row, st, ed, points, distance) in enumerate(zip(section_rows, section_starts.tolist(), section_ends.tolist(), section_points, section_distances)):
+        # 座標 → 最初に出てくるindexの索引はエッジ毎に1回だけ作る(セクションは行の順に並んでいる)
+        if row != coord_index_row:
+            coord_index_row, coord_index = row, generate_coord_index(geometries[row].coords)
+        steering_angle_info = infos[st:ed]
+        max_steering_angle = max_steering_angles[i]
+
+        # ステアリング角度を調整する
+        adjusted_steering_angle, elevation_height = adjust_steering_angle(
+            max_steering_angle, points, elevations[row], distance, coord_index
+        )
+
+        results[row].append({
+            'max_steering_angle': max_steering_angle,
+            'avg_steering_angle': avg_steering_angles[i],
+            'adjusted_steering_angle': adjusted_steering_angle,
+            'elevation_height_and_distance_ratio': elevation_height / distance,
+            'section_type': section_types[i],
+            'steering_direction': steering_angle_info[0]['direction'],
+            'points': points,
+            'section_info': steering_angle_info,
+            'corner_level': generate_corner_level(max_steering_angle),
+            'distance': distance,
+            'elevation_height': elevation_height,
+        })
+
+    series = Series(results, index=gdf.index)
 
     # # 色の設定: セクションタイプごとの色
     # color_map = {
@@ -97,31 +114,72 @@ def generate(gdf: GeoDataFrame) -> Series:
 
     return series
 
-# 連続する左コーナー、右コーナー、ストレートをグループ化
-def group_continuous_section(target):
-    # ステアリングの方向が変わる毎にグループ化
-    old_direction = target[0]['direction']
-    sections = []
-    # 右左コーナーの情報
-    section_work = [target[0]]
-    for i in range(1, len(target)):
-        current_segment = target[i]
-        angle = current_segment['steering_angle']
-        distance = current_segment['distance']
-        direction = current_segment['direction']
-        if angle < STRAIGHT_ANGLE:
-            direction = 'straight'
-
-        if direction == old_direction:
-            section_work.append(current_segment)
-        else:
-            sections.append({'type': old_direction, 'steering_angle_info': section_work})
-            section_work = [current_segment]
-            old_direction = direction
-    # 最後の未処理のセグメントを追加
-    if len(section_work) > 0:
-        sections.append({'type': old_direction, 'steering_angle_info': section_work})
-    return sections
+# 各ステアリング角が入るセクションの番号と、各セクションのタイプを返す
+# 1. 連続する左コーナー、右コーナー、ストレートをランとしてまとめる
+# 2. ストレート区間が100m未満の場合は半分に分割して前後のランと結合する ※1
+# 3. 連続する同一方向のランを1つのセクションにまとめる(※1で結合した場合に同一方向のコーナーが連続する場合があるため)
+# ストレートの前後は必ずコーナーなので、短いストレートは他のストレートの結合の影響を受けず、1回ずつ処理すればよい。
+def generate_section_ids(rows: np.ndarray, directions: np.ndarray, angles: np.ndarray, distances: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8)
+    is_row_start = np.r_[True, rows[1:] != rows[:-1]]
+    # 先頭以外はステアリング角度が小さければストレートとみなす
+    types = np.where(~is_row_start & (angles < STRAIGHT_ANGLE), DIRECTION_STRAIGHT, directions).astype(np.int8)
+
+    # 1. ステアリングの方向が変わる毎にランにする
+    is_run_start = is_row_start | np.r_[True, types[1:] != types[:-1]]
+    run_ids = np.cumsum(is_run_start) - 1
+    run_starts = np.flatnonzero(is_run_start)
+    run_lengths = np.diff(np.r_[run_starts, len(rows)])
+    run_types = types[run_starts]
+    run_distances = np.bincount(run_ids, weights=distances)
+    run_is_first = is_row_start[run_starts]
+    run_is_last = np.r_[run_is_first[1:], True]
+
+    # 2. 100m未満のストレートを前後のランに割り振る
+    # 前後のランがない(ストレートだけの)エッジはそのままにする
+    is_short_straight = (run_types == DIRECTION_STRAIGHT) & (run_distances < STRAIGHT_DISTANCE) & ~(run_is_first & run_is_last)
+    positions = np.arange(len(rows)) - run_starts[run_ids]
+    lengths = run_lengths[run_ids]
+    # 先頭なら次、末尾なら前、それ以外は前半を前、後半を次に結合する(1件だけの場合は前)
+    to_next = np.where(
+        run_is_first[run_ids],
+        True,
+        np.where(run_is_last[run_ids], False, (lengths >= 2) & (positions >= lengths // 2)),
+    )
+    target_runs = np.where(is_short_straight[run_ids], np.where(to_next, run_ids + 1, run_ids - 1), run_ids)
+
+    # 3. 残ったランのうち、連続する同じタイプのランを1つのセクションにする
+    kept_runs = np.flatnonzero(~is_short_straight)
+    kept_rows = rows[run_starts[kept_runs]]
+    kept_types = run_types[kept_runs]
+    is_section_start = np.r_[True, (kept_rows[1:] != kept_rows[:-1]) | (kept_types[1:] != kept_types[:-1])]
+    section_of_run = np.zeros(len(run_starts), dtype=np.int64)
+    section_of_run[kept_runs] = np.cumsum(is_section_start) - 1
+    return section_of_run[target_runs], kept_types[is_section_start]
+
+
+# セクション毎の座標列の長さ(m)。座標間の距離はまとめて求め、セクション毎に合計する
+def generate_path_lengths(section_points: list[list]) -> list[float]:
+    counts = np.fromiter((len(x) for x in section_points), dtype=np.int64, count=len(section_points))
+    coords = np.array([point for points in section_points for point in points], dtype=float).reshape(-1, 2)
+    segment_distances = np.zeros(0)
+    if len(coords) > 1:
+        segment_distances = distance_service.distances(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    # セクション内の座標間だけを合計する(distance_service.path_lengthと同じ合計の仕方)
+    offsets = np.r_[0, np.cumsum(counts)]
+    return [
+        float(segment_distances[st:max(st, ed - 1)].sum())
+        for st, ed in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    ]
+
+
+# 座標 → 最初に出てくるindexの索引
+def generate_coord_index(coords) -> dict:
+    coord_index = {}
+    for i, coord in enumerate(coords):
+        coord_index.setdefault(coord, i)
+    return coord_index
 
 
 # 線形変換: 0.05~0.125 を 1~1.25 の範囲に変換
@@ -133,84 +191,14 @@ def scale_to_range(val):
     else:
         return 1 + (val - 0.05) * (1.25 - 1) / (0.11 - 0.05)
 
-# 短いストレート区間をコーナーセクションにマージ
-def merge_min_straight_section(sections):
-    # ストレート区間が100m未満の場合は半分に分割して前後のコーナーと結合する
-    adjusted_sections = copy.deepcopy(sections)
-    is_not_exists_min_straight = True
-    while is_not_exists_min_straight:
-        # ストレートを抽出
-        straights = [x for x in adjusted_sections if x['type'] == 'straight']
-        # 100m以下のストレートを抽出
-        min_straights = [x for x in straights if sum([y['distance'] for y in x['steering_angle_info']]) < STRAIGHT_DISTANCE]
-        if len(min_straights) == 0:
-            is_not_exists_min_straight = False
-            break
-        min_straight_first = min_straights[0]
-        # 100m未満の先頭indexを取得
-        min_straight_first_index = adjusted_sections.index(min_straight_first)
-        steering_angle_info = min_straight_first['steering_angle_info']
-        # 前後のコーナーを取得
-        if min_straight_first_index == 0:
-            # 先頭のコーナーの処理
-            next_section = copy.deepcopy(adjusted_sections[min_straight_first_index + 1])
-            next_section['steering_angle_info'] = steering_angle_info + next_section['steering_angle_info']
-            adjusted_sections[min_straight_first_index + 1] = next_section
-        elif min_straight_first_index == len(adjusted_sections) - 1:
-            # 末尾のコーナーの処理
-            previous_section = copy.deepcopy(adjusted_sections[min_straight_first_index - 1])
-            previous_section['steering_angle_info'] += steering_angle_info
-            adjusted_sections[min_straight_first_index - 1] = previous_section
-        else:
-            if(len(steering_angle_info)) >= 2:
-                # 前後のコーナーにマージ
-                previous_section = copy.deepcopy(adjusted_sections[min_straight_first_index - 1])
-                next_section = copy.deepcopy(adjusted_sections[min_straight_first_index + 1])
-                # 厳密にストレートの距離の半分を分割するべきだが、一旦は要素数から分割
-                previous_section['steering_angle_info'] += steering_angle_info[:len(steering_angle_info)//2]
-                next_section['steering_angle_info'] = steering_angle_info[len(steering_angle_info)//2:] + next_section['steering_angle_info']
-
-                adjusted_sections[min_straight_first_index - 1] = previous_section
-                adjusted_sections[min_straight_first_index + 1] = next_section
-            else:
-                # 1件だけの場合は直前のコーナーにマージ
-                previous_section = copy.deepcopy(adjusted_sections[min_straight_first_index - 1])
-                previous_section['steering_angle_info'] += steering_angle_info
-                adjusted_sections[min_straight_first_index - 1] = previous_section
-
-        # ストレートを削除
-        adjusted_sections.remove(min_straight_first)
-    return adjusted_sections
-
-
-# 連続する同一方向のコーナーをマージ
-# 同じ方向のコーナーが連続する場合は結合する。
-def merge_continuous_section_section(road_sections):
-    merged_lst = []
-    i = 0
-    target_sections = road_sections
-    while i < len(target_sections):
-        current_section = target_sections[i].copy()  # 現在のセクションをコピーして使用
-        # 次のセクションが同じタイプか確認
-        while i + 1 < len(target_sections) and target_sections[i]['type'] == target_sections[i + 1]['type']:
-            # 次のセクションが同じタイプであれば、steering_angle_infoを結合
-            current_section['steering_angle_info'] += target_sections[i + 1]['steering_angle_info']
-            i += 1  # 次のセクションをスキップ
-
-        # 結合したセクション（または単一のセクション）をリストに追加
-        merged_lst.append(current_section)
-        i += 1  # 次のセクションに移動
-    return merged_lst
-
 # ステアリング角度を調整する
-def adjust_steering_angle(steering_angle, points, elevation, distance, coords) -> tuple[float, float]:
+def adjust_steering_angle(steering_angle, points, elevation, distance, coord_index: dict) -> tuple[float, float]:
     # 標高の変化量を計算する。始点と終点を間の値を使っているためindex番号をずらす。
     point_st = points[1]
     point_end = points[-2]
-    coords = list(coords)
 
-    index_st = coords.index(point_st)
-    index_end = coords.index(point_end)
+    index_st = coord_index[point_st]
+    index_end = coord_index[point_end]
     elevation_section = elevation[index_st:index_end+1]
     # 始点と終点の間の標高値を追加(ステアリング切れ角の座標は中間点なのでそれを補完するためのもの)
     elevation_section.insert(0, (elevation[index_st - 1] + elevation[index_st]) / 2)
@@ -1,6 +1,8 @@
 from geopandas import GeoDataFrame
 from pandas import Series
-from geopy.distance import geodesic
+import numpy as np
+import shapely
+from ...core import distance_service
 from .road_section import STRAIGHT_ANGLE, WEEK_CORNER_ANGLE_MIN, WEEK_CORNER_ANGLE_MAX, MEDIUM_CORNER_ANGLE_MIN, MEDIUM_CORNER_ANGLE_MAX, STRONG_CORNER_ANGLE_MIN
 
 # 各コーナー種別の間のゾーン値(±5度)
@@ -12,19 +14,17 @@ CORNER_TRANSITION_ZOON = 5
 # MAX_DISTANCE = 450  # 最大距離
 
 def generate(gdf: GeoDataFrame) -> tuple[Series, Series, Series]:
+    # オリジナルの開始地点と終了地点はコーナーに含まれないのでその分の距離を全行まとめて計算する
+    st_between_distances, ed_between_distances = generate_between_distances(gdf)
+    st_between_distances = st_between_distances.to_dict()
+    ed_between_distances = ed_between_distances.to_dict()
+
     def func(x):
         road_section = x.road_section
         length = sum(item['distance'] for item in road_section) 
-        section_st_p = road_section[0]['points'][0]
-        section_ed_p = road_section[-1]['points'][-1]
         coords = list(x.geometry.coords)
-        # オリジナルの開始地点と終了地点はコーナーに含まれないのでその分の距離を計算する
-        st_between_distance = 0
-        ed_between_distance = 0
-        if section_st_p != coords[0]:
-            st_between_distance = geodesic(reversed(coords[0]), reversed(section_st_p)).meters
-        if section_ed_p != coords[-1]:
-            ed_between_distance = geodesic(reversed(coords[-1]), reversed(section_ed_p)).meters
+        st_between_distance = st_between_distances[x.name]
+        ed_between_distance = ed_between_distances[x.name]
         if(x.length / (length + st_between_distance + ed_between_distance) < 0.97):
             print('★★コーナーの距離と誤差あり。要確認')
             print(f"誤差: {x.length / (length + st_between_distance + ed_between_distance)} original:{x.length}, new:{length + st_between_distance + ed_between_distance}")
@@ -82,3 +82,18 @@ def generate(gdf: GeoDataFrame) -> tuple[Series, Series, Series]:
     score_corner_none = results[3]
 
     return score_corner_week, score_corner_medium, score_corner_strong, score_corner_none
+
+
+# エッジの始点(終点)と最初(最後)のセクションの始点(終点)の間の距離(m)を求める
+def generate_between_distances(gdf: GeoDataFrame) -> tuple[Series, Series]:
+    geometries = gdf.geometry.values
+    coords_st = shapely.get_coordinates(shapely.get_point(geometries, 0))
+    coords_ed = shapely.get_coordinates(shapely.get_point(geometries, -1))
+    section_st = np.array([road_section[0]['points'][0] for road_section in gdf["road_section"]], dtype=float).reshape(-1, 2)
+    section_ed = np.array([road_section[-1]['points'][-1] for road_section in gdf["road_section"]], dtype=float).reshape(-1, 2)
+    st_distances = distance_service.distances(coords_st[:, 0], coords_st[:, 1], section_st[:, 0], section_st[:, 1])
+    ed_distances = distance_service.distances(coords_ed[:, 0], coords_ed[:, 1], section_ed[:, 0], section_ed[:, 1])
+    # 一致する場合は0にする
+    st_distances[(coords_st == section_st).all(axis=1)] = 0
+    ed_distances[(coords_ed == section_ed).all(axis=1)] = 0
+    return Series(st_distances, index=gdf.index), Series(ed_distances, index=gdf.index)
@@ -1,62 +1,80 @@
 from geopandas import GeoDataFrame
 from pandas import Series
 import numpy as np
-from pyproj import Transformer
-from ...core.calc_steering_wheel_angle import calc_steering_wheel_angle
+import shapely
+from ...core.calc_steering_wheel_angle import calc_steering_wheel_angles, DIRECTION_NAMES
+from ...core import projection_service
+
+WHEELBASE = 2.5  # 一般的な車のホイールベース（メートル）
+STEERING_RATIO = 15  # 一般的なステアリングギア比
 
 # 各座標毎のステアリング角を計算する
-def generate(gdf: GeoDataFrame) -> Series:
-    wheelbase = 2.5  # 一般的な車のホイールベース（メートル）
-    steering_ratio = 15  # 一般的なステアリングギア比
-
-    def func(row):
-        angles_info = []
-        coords = row['geometry'].coords
-        adjustedCoords = [coords[0]]
-        # 各座標間の中間点を求めて追加する
-        for i in range(1, len(coords)):
-            p1 = coords[i - 1]
-            p2 = coords[i]
-            betweenPoint = ((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2)
-            adjustedCoords.append(betweenPoint)
-            adjustedCoords.append(p2)
-
-        # 計算を行いやすくするために平面座標系(m単位)に変換
-        xy_adjustedCoords = generate_xy_coords(adjustedCoords)
-
-        group_size = 3
-        for i in range(1, len(xy_adjustedCoords) - group_size, 2):
-            group = xy_adjustedCoords[i:i + group_size]
-            if len(group) < group_size:
-                print("break")
-                break
-            p1 = group[0]
-            p2 = group[1]
-            p3 = group[2]
-            
-            angle, radius, center, direction = calc_steering_wheel_angle(p1, p2, p3, wheelbase, steering_ratio)
-            # p1, p2, p3の距離を求める
-            distance = np.linalg.norm(p1 - p2) + np.linalg.norm(p2 - p3)
-            # print(f"direction: {direction}")
-            # print(f"distance {distance}")
-            angles_info.append({'start':adjustedCoords[i],
-                                'center': adjustedCoords[i+1],
-                                'end': adjustedCoords[i+2],
-                                'steering_angle': angle,
-                                'radius': radius,
-                                'distance': distance,
-                                'direction': direction})
-        # # 結果を出力
-        # for info in angles_info:
-        #     print(f"座標 {info['center']} でのステアリングホイールの回転角度: {info['steering_angle']:.2f} 度")
-        return angles_info
-    results = gdf.apply(func, axis=1)
-    return results
+def generate(gdf: GeoDataFrame, plane_epsg_code: int) -> Series:
+    columns = generate_columns(gdf, plane_epsg_code)
+
+    # 列形式の結果を行毎の辞書のリストに変換する
+    starts = list(map(tuple, columns["start"].tolist()))
+    centers = list(map(tuple, columns["center"].tolist()))
+    ends = list(map(tuple, columns["end"].tolist()))
+    angles = columns["steering_angle"].tolist()
+    radiuses = columns["radius"].tolist()
+    distances = columns["distance"].tolist()
+    directions = [DIRECTION_NAMES[x] for x in columns["direction"].tolist()]
+    offsets = columns["offsets"]
+
+    results = []
+    for st, ed in zip(offsets[:-1], offsets[1:]):
+        results.append([
+            {'start': starts[i],
+             'center': centers[i],
+             'end': ends[i],
+             'steering_angle': angles[i],
+             'radius': radiuses[i],
+             'distance': distances[i],
+             'direction': directions[i]}
+            for i in range(st, ed)
+        ])
+    return Series(results, index=gdf.index)
+
+# GeoDataFrame全体のステアリング角を列形式でまとめて計算する
+# 各座標の前後に中間点を置き、(前の中間点, 座標, 次の中間点)の3点を通過するステアリング角を求める。
+# 戻り値のoffsetsは行毎の範囲で、i行目の結果は[offsets[i]:offsets[i + 1]]に格納される。
+def generate_columns(gdf: GeoDataFrame, plane_epsg_code: int) -> dict[str, np.ndarray]:
+    coords, edge_index = shapely.get_coordinates(gdf.geometry.values, return_index=True)
+    n_coords = np.bincount(edge_index, minlength=len(gdf))
+    coord_offsets = np.concatenate([[0], np.cumsum(n_coords)])
+
+    # 先頭と末尾を除いた座標がステアリング角の計算対象(座標数が3未満の行は対象なし)
+    n_triples = np.maximum(n_coords - 2, 0)
+    offsets = np.concatenate([[0], np.cumsum(n_triples)])
+    edge = np.repeat(np.arange(len(gdf)), n_triples)
+    center_index = np.arange(offsets[-1]) - offsets[edge] + coord_offsets[edge] + 1
+
+    # 各座標間の中間点を求める
+    center = coords[center_index]
+    start = (coords[center_index - 1] + center) / 2
+    end = (center + coords[center_index + 1]) / 2
+
+    # 計算を行いやすくするために平面直角座標系(m単位)にまとめて変換
+    xy = generate_xy_coords(np.concatenate([start, center, end]), plane_epsg_code)
+    xy_start, xy_center, xy_end = np.split(xy, 3)
+
+    angle, radius, direction = calc_steering_wheel_angles(xy_start, xy_center, xy_end, WHEELBASE, STEERING_RATIO)
+    # p1, p2, p3の距離を求める
+    distance = np.hypot(*(xy_start - xy_center).T) + np.hypot(*(xy_center - xy_end).T)
+
+    return {
+        "offsets": offsets,
+        "start": start,
+        "center": center,
+        "end": end,
+        "steering_angle": angle,
+        "radius": radius,
+        "distance": distance,
+        "direction": direction,
+    }
 
 # 平面直角座標に変換
-def generate_xy_coords(coords: list):
-    # MEMO: 東京の平面直角座標のEPSGだが本当によいのか？値はそれっぽいが。
-    # https://lemulus.me/column/epsg-list-gis
-    transformer = Transformer.from_crs(4326, 6677)
-    trans_coords = transformer.itransform(coords, switch=True)
-    return np.array(list(trans_coords))
\ No newline at end of file
+# coordsは(経度, 緯度)の(N, 2)のarrayで、(東西方向, 南北方向)の(N, 2)のarrayを返す
+def generate_xy_coords(coords: np.ndarray, plane_epsg_code: int) -> np.ndarray:
+    return projection_service.to_plane_coords(coords, plane_epsg_code)
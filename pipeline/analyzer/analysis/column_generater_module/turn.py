@@ -1,142 +1,122 @@
-from geopandas import GeoDataFrame, GeoSeries
+from geopandas import GeoDataFrame
 from pandas import Series
-import pandas as pd
+import numpy as np
 import osmnx as ox
 import networkx as nx
+import shapely
 from shapely.geometry import Point, LineString
+from tqdm import tqdm
 from .core.calculate_angle_between_vectors import calculate_angle_between_vectors
 
 from ..remover import reverse_edge
-from geopy.distance import geodesic
+from ...core import distance_service
+
+# 曲がり角とみなす最寄りノードまでの距離(m)
+NEAREST_NODE_DISTANCE = 10
 
 
 def generate(gdf: GeoDataFrame, graph: nx.Graph) -> Series:
-    all_nodes, all_edges = ox.graph_to_gdfs(graph, nodes=True, edges=True)
+    all_nodes = ox.graph_to_gdfs(graph, nodes=True, edges=False)
+    adjacency = generate_adjacency_index(graph)
 
-    def func(row):
-        turn_points = []
-        for turn_candidate in row["turn_candidate_points"]:
-            a = turn_candidate["a"]
-            b = turn_candidate["b"]
-            c = turn_candidate["c"]
-            angle_ab_bc = turn_candidate["angle_ab_bc"]
-            b_point = Point(b)
-            # bの座標から最も近いノードを取得
-            b_node_indexs = all_nodes.sindex.nearest(b_point).tolist()
-            # 入れ子のリストをフラットにする
-            b_node_indexs = [item for sublist in b_node_indexs for item in sublist]
-            # 先頭に不要なindexが含まれるので消す。
-            b_node_index = b_node_indexs[1:]
-            b_node = all_nodes.iloc[b_node_index]
-            b_node_id = b_node.index[0]
-            b_geometry = b_node.iloc[0].geometry
+    # 全ての曲がり角の候補を(行番号, 候補)のリストにする
+    candidates = [
+        (i, turn_candidate)
+        for i, turn_candidates in enumerate(gdf["turn_candidate_points"])
+        for turn_candidate in turn_candidates
+    ]
+    turn_points = [[] for _ in range(len(gdf))]
+    if len(candidates) == 0:
+        return Series(turn_points, index=gdf.index)
 
-            # print(f"center_node_id: {b_node_id}")
-            # print(f"center_geometry: {b_geometry}")
-            # print(f"center_distance: {distance_nearest_node}")
+    # bの座標から最も近いノードを全候補まとめて取得
+    b_coords = np.array([turn_candidate["b"] for _, turn_candidate in candidates], dtype=float).reshape(-1, 2)
+    input_index, tree_index = all_nodes.sindex.nearest(shapely.points(b_coords), return_all=False)
+    nearest_node_iloc = np.empty(len(candidates), dtype=int)
+    nearest_node_iloc[input_index] = tree_index
+    node_ids = all_nodes.index.values[nearest_node_iloc]
+    node_xs = all_nodes["x"].to_numpy()[nearest_node_iloc]
+    node_ys = all_nodes["y"].to_numpy()[nearest_node_iloc]
+    distances = distance_service.distances(b_coords[:, 0], b_coords[:, 1], node_xs, node_ys)
 
-            # 指定座標周辺10m以内にノードがなければ曲がり角ではない。
-            distance_nearest_node = geodesic(
-                (b[1], b[0]), (b_geometry.y, b_geometry.x)
-            ).meters
-            if distance_nearest_node > 10:
-                # print("指定座標の周辺にノードが存在ませんでした。")
-                continue
+    for (i, turn_candidate), b_node_id, distance_nearest_node in tqdm(zip(candidates, node_ids, distances), total=len(candidates)):
+        # 指定座標周辺10m以内にノードがなければ曲がり角ではない。
+        if distance_nearest_node > NEAREST_NODE_DISTANCE:
+            continue
+        if is_turn(turn_candidate, adjacency.get(b_node_id, [])):
+            turn_points[i].append(turn_candidate["b"])
 
-            # bに連結するエッジを取得
-            b_connected_edges = []
-            for u, v, k, data in graph.edges(keys=True, data=True):
-                if u == b_node_id or v == b_node_id:
-                    b_connected_edges.append(
-                        {
-                            "key": (u, v, k),
-                            "data": data,
-                        }
-                    )
+    return Series(turn_points, index=gdf.index)
 
-            # エッジからabとbcを除いてdataframe用のリストを作成
-            b_connected_edge_keys = []
-            b_connected_edge_values = []
-            for b_connected_edge in b_connected_edges:
-                # print(b_connected_edge)
-                key = b_connected_edge["key"]
-                data = b_connected_edge["data"]
 
-                # simplify=Trueの影響でgeometryがない場合があるので簡易的に生成する
-                if "geometry" not in data:
-                    node = graph.nodes[b_connected_edge["key"][0]]
-                    st_node = (node["x"], node["y"])
-                    node = graph.nodes[b_connected_edge["key"][1]]
-                    ed_node = (node["x"], node["y"])
-                    data["geometry"] = LineString([st_node, ed_node])
-                    # print(f'create geometry: {data["geometry"]}')
+# ノードID → 接続するエッジ(u, v, k, geometry, highway)のリストの索引を作成する
+# エッジの並びはgraph.edges()の順と同じにする
+def generate_adjacency_index(graph: nx.Graph) -> dict:
+    adjacency = {}
+    for u, v, k, data in graph.edges(keys=True, data=True):
+        geometry = data.get("geometry")
+        # simplify=Trueの影響でgeometryがない場合があるので簡易的に生成する
+        if geometry is None:
+            st_node = graph.nodes[u]
+            ed_node = graph.nodes[v]
+            geometry = LineString([(st_node["x"], st_node["y"]), (ed_node["x"], ed_node["y"])])
+        edge = (u, v, k, geometry, data["highway"])
+        adjacency.setdefault(u, []).append(edge)
+        if v != u:
+            adjacency.setdefault(v, []).append(edge)
+    return adjacency
 
-                # aとcにかさならないedgesを抽出
-                edge_geometry = data["geometry"]
-                if not edge_geometry.intersects(
-                    Point(a)
-                ) and not edge_geometry.intersects(Point(c)):
-                    b_connected_edge_keys.append(b_connected_edge["key"])
-                    b_connected_edge_values.append(
-                        [key[0], key[1], data["geometry"], data["highway"]]
-                    )
-            # データフレームを作成
-            multi_index = pd.MultiIndex.from_tuples(
-                b_connected_edge_keys, names=["u", "v", "k"]
-            )
-            gdf_branch_edges = pd.DataFrame(
-                b_connected_edge_values,
-                index=multi_index,
-                columns=["start_node", "end_node", "geometry", "highway"],
-            )
-            # 逆方向のエッジを削除
-            # print(f"before: {len(gdf_branch_edges)}")
-            gdf_branch_edges = reverse_edge.remove(gdf_branch_edges)
-            # print(f"after: {len(gdf_branch_edges)}")
 
-            # 各エッジのabとbxの角度を計算し、angle_ab_bcより小さい値があればab_bcを曲がり角として登録
-            x_angles = []
-            for _, branch_edge in gdf_branch_edges.iterrows():
-                bx_geometry = branch_edge["geometry"]
-                if len(list(bx_geometry.coords)) < 3:
-                    # エッジの座標が2つしかない場合は、bと開始位置が被ってしまうのでいい感じに調整する
-                    bx_st_point = Point(bx_geometry.coords[0])
-                    bx_ed_point = Point(bx_geometry.coords[1])
-                    if bx_st_point == b_point:
-                        nearest_point = bx_ed_point
-                    else:
-                        nearest_point = bx_st_point
-                else:
-                    # bxの端から1つとばした座標で角度を計算した方がいい感じになる
-                    bx_st_point = Point(bx_geometry.coords[1])
-                    bx_ed_point = Point(bx_geometry.coords[-2])
-                    # geometryの頭と尾でbに最も近い点を取得.
-                    if b_point.distance(bx_st_point) < b_point.distance(bx_ed_point):
-                        nearest_point = bx_st_point
-                    else:
-                        nearest_point = bx_ed_point
-                # print(f"nearest_point: {nearest_point}")
-                angle_ab_bx = calculate_angle_between_vectors(
-                    a,
-                    b,
-                    (nearest_point.x, nearest_point.y),
-                )
-                if(angle_ab_bx == None):
-                    continue
-                angle_ab_bx = angle_ab_bx[0]
+# bに接続するエッジのうち、abとの角度がangle_ab_bc以下になるエッジがあればbを曲がり角とする
+def is_turn(turn_candidate: dict, b_connected_edges: list) -> bool:
+    a = turn_candidate["a"]
+    b = turn_candidate["b"]
+    c = turn_candidate["c"]
+    angle_ab_bc = turn_candidate["angle_ab_bc"]
+    b_point = Point(b)
+    a_point = Point(a)
+    c_point = Point(c)
 
-                # print(f"discoved turn point: {b}")
-                # print(f"highway: x:{row_['highway']}, base:{row.highway}")
-                # print(f"angle_ab_bx: {angle_ab_bx}, angle_ab_bc: {angle_ab_bc}")
+    # aとcにかさならないedgesを抽出
+    branch_edges = [
+        edge for edge in b_connected_edges
+        if not edge[3].intersects(a_point) and not edge[3].intersects(c_point)
+    ]
+    # 逆方向のエッジを削除
+    keep = reverse_edge.generate_keep_mask([(u, v, k) for u, v, k, _, _ in branch_edges])
+    branch_edges = [edge for edge, is_keep in zip(branch_edges, keep) if is_keep]
 
-                # residentialは薄い道なので対象外にする。
-                if branch_edge["highway"] != "residential":
-                    x_angles.append(angle_ab_bx)
-                    continue
-            # angle_ab_bcが１番小さい値出ない場合は曲がり角として登録
-            if len(x_angles) != 0 and min(x_angles) <= angle_ab_bc:
-                turn_points.append(b)
-        return turn_points
+    # 各エッジのabとbxの角度を計算し、angle_ab_bcより小さい値があればab_bcを曲がり角として登録
+    x_angles = []
+    for _, _, _, bx_geometry, highway in branch_edges:
+        if len(bx_geometry.coords) < 3:
+            # エッジの座標が2つしかない場合は、bと開始位置が被ってしまうのでいい感じに調整する
+            bx_st_point = Point(bx_geometry.coords[0])
+            bx_ed_point = Point(bx_geometry.coords[1])
+            if bx_st_point == b_point:
+                nearest_point = bx_ed_point
+            else:
+                nearest_point = bx_st_point
+        else:
+            # bxの端から1つとばした座標で角度を計算した方がいい感じになる
+            bx_st_point = Point(bx_geometry.coords[1])
+            bx_ed_point = Point(bx_geometry.coords[-2])
+            # geometryの頭と尾でbに最も近い点を取得.
+            if b_point.distance(bx_st_point) < b_point.distance(bx_ed_point):
+                nearest_point = bx_st_point
+            else:
+                nearest_point = bx_ed_point
+        angle_ab_bx = calculate_angle_between_vectors(
+            a,
+            b,
+            (nearest_point.x, nearest_point.y),
+        )
+        if angle_ab_bx is None:
+            continue
+        angle_ab_bx = angle_ab_bx[0]
 
-    series = gdf.progress_apply(func, axis=1)
-    return series
+        # residentialは薄い道なので対象外にする。
+        if highway != "residential":
+            x_angles.append(angle_ab_bx)
+    # angle_ab_bcが１番小さい値出ない場合は曲がり角として登録
+    return len(x_angles) != 0 and min(x_angles) <= angle_ab_bc
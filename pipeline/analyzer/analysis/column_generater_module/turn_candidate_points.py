@@ -1,31 +1,21 @@
 from geopandas import GeoDataFrame
 from pandas import Series
-from .core.calculate_angle_between_vectors import calculate_angle_between_vectors
 
+from .core import ragged
+from .core.calculate_angle_between_vectors import calculate_angles_between_vectors
 
-def generate(gdf: GeoDataFrame) -> Series:
-    def func(row):
-        candidates = []
-        coords = list(row.geometry.coords)
-        # 5つの点が必要なので、少なくともその長さが必要
-        if len(coords) < 5:
-            return candidates
 
-        for j in range(2, len(coords) - 2):
-            a = coords[j - 2]
-            b = coords[j]
-            c = coords[j + 2]
-            angle_ab_bc = calculate_angle_between_vectors(
-                a,
-                b,
-                c,
-            )[0]
-            if angle_ab_bc is None:
-                continue
-            if angle_ab_bc > 80:
-                # print(f"a: {a}, b: {b}, c: {c}")
-                candidates.append({"a": a, "b": b, "c": c, "angle_ab_bc": angle_ab_bc})
-        return candidates
+def generate(gdf: GeoDataFrame) -> Series:
+    # 全エッジの座標を1本の配列にして、2つ前の点a, 点b, 2つ先の点cのなす角をまとめて計算する
+    # 5つの点が必要なので、前後に2つずつ点がある点だけが対象
+    coords, offsets = ragged.from_geometries(gdf.geometry.values)
+    index, rows = ragged.inner_indexes(offsets, 2, 2)
+    angles, valid = calculate_angles_between_vectors(coords[index - 2], coords[index], coords[index + 2])
+    target = valid & (angles > 80)
 
-    series = gdf.apply(func, axis=1)
-    return series
+    candidates = [[] for _ in range(len(gdf))]
+    index = index[target]
+    points = zip(coords[index - 2].tolist(), coords[index].tolist(), coords[index + 2].tolist())
+    for row, (a, b, c), angle_ab_bc in zip(rows[target].tolist(), points, angles[target]):
+        candidates[row].append({"a": tuple(a), "b": tuple(b), "c": tuple(c), "angle_ab_bc": angle_ab_bc})
+    return Series(candidates, index=gdf.index, dtype=object)
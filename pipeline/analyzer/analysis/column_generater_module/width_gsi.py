@@ -1,32 +1,42 @@
 from geopandas import GeoDataFrame
 from pandas import Series
 import os
-from pyproj import Transformer
+import glob
 from shapely.geometry import Point, LineString
 from ...core.convert_linestrings_to_geojson import convert
 from ...core.write_file import write
+from ...core import projection_service
 from tqdm import tqdm
 
 # 道幅計算モジュールを読み込む
 from .core import road_width_calculator
 
+# 国土地理院の道路中心線(_center/*.geojson)と道路縁(_rdedg/*.xml)のディレクトリ
+CENTER_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/_center"
+RDEDG_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/_rdedg"
+
 
 # エッジの幅を求める
-def generate(gdf: GeoDataFrame) -> tuple[Series, Series]:
+# calclatorを指定しない場合は_center, _rdedgの国土地理院のデータを読み込む
+def generate(gdf: GeoDataFrame, plane_epsg_code: int, calclator: road_width_calculator.RoadWidthCalculator | None = None) -> tuple[Series, Series]:
     # 国土地理院のデータから道幅を求める
-    avg_series, min_series = generate_from_gsi(gdf)
+    avg_series, min_series = generate_from_gsi(gdf, plane_epsg_code, calclator)
 
     return avg_series, min_series
 
 
+# 国土地理院のデータのファイル一覧(チェックポイントのキーに含め、ファイルを置き換えたら再計算する)
+def get_source_files() -> list[str]:
+    return sorted(glob.glob(f"{CENTER_PATH}/*.geojson")) + sorted(glob.glob(f"{RDEDG_PATH}/*.xml"))
+
+
 # 国土地理院のデータから道幅を求める
-def generate_from_gsi(gdf: GeoDataFrame) -> tuple[Series, Series] | None:
-    center_path = f"{os.path.dirname(os.path.abspath(__file__))}/_center"
-    rdedg_path = f"{os.path.dirname(os.path.abspath(__file__))}/_rdedg"
-    calclator = road_width_calculator.RoadWidthCalculator(center_path, rdedg_path)
+def generate_from_gsi(gdf: GeoDataFrame, plane_epsg_code: int, calclator: road_width_calculator.RoadWidthCalculator | None = None) -> tuple[Series, Series] | None:
+    if calclator is None:
+        calclator = road_width_calculator.RoadWidthCalculator(CENTER_PATH, RDEDG_PATH, plane_epsg_code)
 
     geometry_series = gdf["geometry"].apply(
-        lambda x: interpolate_points_with_offset(x, 50, 1)
+        lambda x: interpolate_points_with_offset(x, 50, 1, plane_epsg_code)
     )
     # print(series)
     geometry_width_avg_list = []
@@ -78,13 +88,10 @@ def generate_from_gsi(gdf: GeoDataFrame) -> tuple[Series, Series] | None:
 
 
 def interpolate_points_with_offset(
-    line: LineString, interval: int, offset: int
+    line: LineString, interval: int, offset: int, plane_epsg_code: int
 ) -> list[list[Point, Point]]:
     # lineStringを平面直角座標系に変換
-    transformer = Transformer.from_crs(4326, 6677)
-    # LineString内のpyprojが扱える形式に変換(y(経度), x(緯度))する
-    trans_coords = transformer.itransform(line.coords, switch=True)
-    line = LineString(trans_coords)
+    line = projection_service.to_plane_line(line, plane_epsg_code)
     length = line.length
 
     # 指定した間隔で点を生成し、さらにオフセット分進んだ点も生成
@@ -102,12 +109,13 @@ def interpolate_points_with_offset(
     # print
     # print(points)
     # 平面直角座標系から緯度経度系に変換
-    transformer = Transformer.from_crs(6677, 4326, always_xy=True)
+    if len(points) == 0:
+        return points
+    xs = [p.x for pair in points for p in pair]
+    ys = [p.y for pair in points for p in pair]
+    lons, lats = projection_service.to_lonlat(xs, ys, plane_epsg_code)
     points = [
-        [
-            Point(transformer.transform(p[0].x, p[0].y)),
-            Point(transformer.transform(p[1].x, p[1].y)),
-        ]
-        for p in points
+        [Point(lons[i], lats[i]), Point(lons[i + 1], lats[i + 1])]
+        for i in range(0, len(lons), 2)
     ]
     return points
@@ -1,5 +1,7 @@
 import osmnx as ox
 from geopandas import GeoDataFrame
+from . import osm_pbf
+from ..core.env import getEnv
 
 # 建物のジオメトリーを取得する
 def fetch_gdf(
@@ -8,14 +10,20 @@ def fetch_gdf(
     # キャッシュを使う
     ox.settings.use_cache = True
     ox.settings.log_console = False
+    env = getEnv()
+    kwargs = dict(
+        north=max(latitude_start, latitude_end),
+        south=min(latitude_start, latitude_end),
+        east=max(longitude_start, longitude_end),
+        west=min(longitude_start, longitude_end),
+        tags={'building': True}
+    )
     try:
-        gdf_buildings = ox.features_from_bbox(
-            north=max(latitude_start, latitude_end),
-            south=min(latitude_start, latitude_end),
-            east=max(longitude_start, longitude_end),
-            west=min(longitude_start, longitude_end),
-            tags={'building': True}
-        )
+        # OSM_SOURCE=pbfの場合はローカルのpbfから取得する
+        if env["OSM_SOURCE"] == "pbf":
+            gdf_buildings = osm_pbf.call(env["OSM_PBF_PATH"], ox.features_from_bbox, **kwargs)
+        else:
+            gdf_buildings = ox.features_from_bbox(**kwargs)
     except Exception as e:
         print(f"エラーが発生しました: {e}")
         return None
@@ -3,15 +3,19 @@ import networkx as nx
 from shapely.geometry import MultiPolygon
 from .overpass_fallback import call_with_fallback
 
+# 全道路のグラフの取得条件(キャッシュのキーにもなる)
+GRAPH_OPTIONS = {
+    "network_type": "drive",
+    "simplify": True,
+    "retain_all": True,
+}
+
 def fetch_graph(search_area_polygon : MultiPolygon, refresh_cache=False) -> nx.Graph:
-    ox.settings.use_cache = True
     ox.settings.log_console = False
 
     return call_with_fallback(
         ox.graph_from_polygon,
         search_area_polygon,
-        network_type="drive",
-        simplify=True,
-        retain_all=True,
         refresh_cache=refresh_cache,
+        **GRAPH_OPTIONS,
     )
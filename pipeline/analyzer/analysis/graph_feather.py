@@ -1,22 +1,34 @@
 import osmnx as ox
 import networkx as nx
 from shapely.geometry import MultiPolygon
-from .overpass_fallback import call_with_fallback
+from .overpass_fallback import call_with_fallback, load_cache
+
+# 解析対象の道路のグラフの取得条件(キャッシュのキーにもなる)
+GRAPH_OPTIONS = {
+    "network_type": "drive",
+    "simplify": True,
+    "retain_all": True,
+    "custom_filter": '["highway"~"secondary|secondary_link|primary|primary_link|trunk|trunk_link|tertiary"]["lanes"!=1]',
+}
 
 def fetch_graph(
     search_area_polygon : MultiPolygon,
     refresh_cache=False,
 ) -> nx.Graph:
-    ox.settings.use_cache = True
     ox.settings.log_console = False
-    ox.settings.useful_tags_way += ["yh:WIDTH"] + ["source"] + ["tunnel"] + ["bridge"]
+    add_useful_tags()
 
     return call_with_fallback(
         ox.graph_from_polygon,
         search_area_polygon,
-        network_type="drive",
-        simplify=True,
-        retain_all=True,
-        custom_filter='["highway"~"secondary|secondary_link|primary|primary_link|trunk|trunk_link|tertiary"]["lanes"!=1]',
         refresh_cache=refresh_cache,
+        **GRAPH_OPTIONS,
     )
+
+# エッジの属性に追加するタグ(先読みの子プロセスでも同じタグで取得する)
+def add_useful_tags():
+    ox.settings.useful_tags_way += [tag for tag in ["yh:WIDTH", "source", "tunnel", "bridge"] if tag not in ox.settings.useful_tags_way]
+
+# キャッシュ済みのグラフを返す(取得はしない)。キャッシュがない場合はNone
+def load_cached_graph(search_area_polygon: MultiPolygon) -> nx.Graph | None:
+    return load_cache(ox.graph_from_polygon, search_area_polygon, **GRAPH_OPTIONS)
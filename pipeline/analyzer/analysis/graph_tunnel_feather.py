@@ -4,21 +4,25 @@ from typing import Union
 from shapely.geometry import MultiPolygon
 from .overpass_fallback import call_with_fallback
 
+# トンネルのグラフの取得条件(キャッシュのキーにもなる)
+GRAPH_OPTIONS = {
+    "network_type": "drive",
+    "simplify": True,
+    "retain_all": True,
+    "custom_filter": '["highway"~"secondary|secondary_link|primary|primary_link|trunk|trunk_link|tertiary"]["lanes"!=1]["tunnel"="yes"]',
+}
+
 def fetch_graph(
     search_area_polygon : MultiPolygon,
     refresh_cache=False,
 ) -> Union[nx.Graph, None]:
-    ox.settings.use_cache = True
     ox.settings.log_console = False
     try:
         return call_with_fallback(
             ox.graph_from_polygon,
             search_area_polygon,
-            network_type="drive",
-            simplify=True,
-            retain_all=True,
-            custom_filter='["highway"~"secondary|secondary_link|primary|primary_link|trunk|trunk_link|tertiary"]["lanes"!=1]["tunnel"="yes"]',
             refresh_cache=refresh_cache,
+            **GRAPH_OPTIONS,
         )
     except Exception:
         return None
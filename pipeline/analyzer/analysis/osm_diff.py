@@ -0,0 +1,95 @@
+import gzip
+import xml.etree.ElementTree as ET
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import shapely
+from geopandas import GeoDataFrame, GeoSeries
+from shapely.geometry import Polygon, MultiPolygon
+
+# OSMの変更箇所を求める
+# 1. キャッシュ済みのグラフと取得し直したグラフのエッジを比較する(diff_graphs)
+# 2. OSMの変更ファイル(osmChange形式の.oscまたは.osc.gz)から変更されたway, nodeを読む(read_change_file)
+# どちらも変更のあったエッジのジオメトリ(EPSG:4326)を返し、generate_affected_areaで再解析する範囲にする。
+
+# エッジの比較に使うタグ(解析結果に影響するもの)
+EDGE_TAGS = ["highway", "lanes", "name", "width", "yh:WIDTH", "tunnel", "bridge", "oneway", "maxspeed"]
+
+
+# グラフのエッジ毎の比較用の値(ジオメトリのWKBとタグの値を繋げた文字列)
+def generate_edge_signatures(gdf_edges: GeoDataFrame) -> np.ndarray:
+    signatures = shapely.to_wkb(gdf_edges.geometry.values, hex=True).astype(object)
+    for tag in EDGE_TAGS:
+        if tag in gdf_edges.columns:
+            signatures = signatures + "|" + gdf_edges[tag].astype(str).to_numpy(dtype=object)
+    return signatures
+
+
+# 2つのグラフで異なるエッジ(削除されたエッジと追加、変更されたエッジ)のジオメトリを返す
+def diff_graphs(old_graph: nx.MultiDiGraph, new_graph: nx.MultiDiGraph) -> np.ndarray:
+    old_edges = ox.graph_to_gdfs(old_graph, nodes=False, edges=True)
+    new_edges = ox.graph_to_gdfs(new_graph, nodes=False, edges=True)
+    old_signatures = generate_edge_signatures(old_edges)
+    new_signatures = generate_edge_signatures(new_edges)
+    removed = ~np.isin(old_signatures, new_signatures)
+    added = ~np.isin(new_signatures, old_signatures)
+    return np.concatenate([old_edges.geometry.values[removed], new_edges.geometry.values[added]])
+
+
+# osmChangeファイルから変更されたwayのidと、変更されたnode(wayの構成nodeを含む)のidと座標を読む
+def read_change_file(path) -> tuple[set[int], set[int], np.ndarray]:
+    opener = gzip.open if str(path).endswith(".gz") else open
+    way_ids = set()
+    node_ids = set()
+    points = []
+    with opener(path, "rb") as f:
+        for _, element in ET.iterparse(f):
+            if element.tag == "node":
+                node_ids.add(int(element.get("id")))
+                # 削除されたnodeは座標がない場合がある
+                if element.get("lat") is not None and element.get("lon") is not None:
+                    points.append((float(element.get("lon")), float(element.get("lat"))))
+                element.clear()
+            elif element.tag == "way":
+                way_ids.add(int(element.get("id")))
+                node_ids.update(int(nd.get("ref")) for nd in element.iter("nd"))
+                element.clear()
+            elif element.tag == "relation":
+                element.clear()
+    return way_ids, node_ids, np.array(points, dtype=float).reshape(-1, 2)
+
+
+# osmChangeファイルで変更されたwayとnodeに接するグラフのエッジと、変更されたnodeの座標のジオメトリを返す
+def generate_changed_geometries(graph: nx.MultiDiGraph | None, path) -> np.ndarray:
+    way_ids, node_ids, points = read_change_file(path)
+    geometries = [shapely.points(points)]
+    if graph is not None and len(graph.edges) > 0:
+        gdf_edges = ox.graph_to_gdfs(graph, nodes=False, edges=True)
+        # 単純化したエッジのosmidは複数のwayのリストになっている場合がある
+        osmids = gdf_edges["osmid"].to_numpy(dtype=object)
+        is_changed_way = np.fromiter(
+            (bool(way_ids.intersection(x if isinstance(x, list) else [x])) for x in osmids),
+            dtype=bool, count=len(osmids),
+        )
+        u = gdf_edges.index.get_level_values("u").to_numpy()
+        v = gdf_edges.index.get_level_values("v").to_numpy()
+        node_id_array = np.fromiter(node_ids, dtype=np.int64, count=len(node_ids))
+        is_changed_node = np.isin(u, node_id_array) | np.isin(v, node_id_array)
+        geometries.append(gdf_edges.geometry.values[is_changed_way | is_changed_node])
+    return np.concatenate([np.asarray(x, dtype=object) for x in geometries])
+
+
+# 変更箇所をbuffer_meters広げた範囲をsearch_area_polygon内に限って返す。変更箇所がない場合はNone
+def generate_affected_area(
+    geometries: np.ndarray, search_area_polygon: Polygon | MultiPolygon, plane_epsg_code: int, buffer_meters: float
+) -> Polygon | MultiPolygon | None:
+    geometries = geometries[shapely.intersects(geometries, search_area_polygon)] if len(geometries) else geometries
+    if len(geometries) == 0:
+        return None
+    buffered = GeoSeries(geometries, crs="EPSG:4326").to_crs(epsg=int(plane_epsg_code)).buffer(buffer_meters)
+    area = GeoSeries([shapely.union_all(buffered.values)], crs=buffered.crs).to_crs(epsg=4326).iloc[0]
+    # 県境で切った結果に線や点が混ざる場合はポリゴンだけを使う
+    polygons = [x for x in shapely.get_parts(area.intersection(search_area_polygon)) if x.geom_type == "Polygon"]
+    if len(polygons) == 0:
+        return None
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
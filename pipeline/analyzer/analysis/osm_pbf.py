@@ -0,0 +1,255 @@
+import re
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import shapely
+from osmnx import _overpass, settings
+from .column_generater_module.core import ragged
+
+# ローカルのOSM抽出ファイル(.osm.pbf)をOverpassの代わりに使う
+# osmnxのOverpassへの問い合わせ(_overpass._download_overpass_network, _download_overpass_features)だけを差し替えて、
+# グラフの作成、範囲での切り取り、単純化はOverpassから取得した場合と同じ処理を使う。
+# ファイルは1回だけ読み、道路(highway)と建物(building)のwayとnodeを取り出して全てのグラフと建物の取得で共有する。
+# pyosmium(osmium)が必要: uv pip install osmium
+
+# 相対パスの基準(リポジトリのルート)
+ROOT_DIR = Path(__file__).resolve().parents[3]
+# ファイルから取り出すwayのタグ
+EXTRACT_WAY_TAGS = ["highway", "building"]
+# 読み込む範囲を取得範囲のbboxから広げる量(度)。graph_from_polygonが取得範囲を500m広げるため、それより大きい値にする
+EXTRACT_MARGIN_DEGREE = 0.01
+
+# Overpassのタグの条件(["key"], ["key"="value"], ["key"!=value], ["key"~"regex"], ["key"!~"regex"])
+FILTER_PATTERN = re.compile(r'\[\s*"([^"]+)"\s*(?:(!=|!~|=|~)\s*(?:"([^"]*)"|([^\]"]+)))?\s*\]')
+
+# 読み込み済みのデータ(取得範囲が読み込んだ範囲に含まれる場合は読み直さない)
+_extract = None
+
+
+# pbf_pathのファイルを使ってosmnxの関数を実行する
+def call(pbf_path, func, *args, **kwargs):
+    with local_overpass(pbf_path):
+        return func(*args, **kwargs)
+
+
+@contextmanager
+def local_overpass(pbf_path):
+    download_network = _overpass._download_overpass_network
+    download_features = _overpass._download_overpass_features
+    _overpass._download_overpass_network = lambda polygon, network_type, custom_filter: generate_network_responses(
+        load_extract(pbf_path, polygon.bounds), polygon, network_type, custom_filter
+    )
+    _overpass._download_overpass_features = lambda polygon, tags: generate_feature_responses(
+        load_extract(pbf_path, polygon.bounds), polygon, tags
+    )
+    try:
+        yield
+    finally:
+        _overpass._download_overpass_network = download_network
+        _overpass._download_overpass_features = download_features
+
+
+def resolve_path(pbf_path) -> Path:
+    pbf_path = Path(pbf_path)
+    return pbf_path if pbf_path.is_absolute() else ROOT_DIR / pbf_path
+
+
+# チェックポイントのキーに使う値(ファイルを置き換えたら変わる)
+def generate_source_key(pbf_path) -> str:
+    pbf_path = resolve_path(pbf_path)
+    stat = pbf_path.stat()
+    return f"pbf:{pbf_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_extract(pbf_path, bounds) -> dict:
+    global _extract
+    pbf_path = str(resolve_path(pbf_path))
+    if _extract is None or _extract["path"] != pbf_path or not contains_bounds(_extract["bounds"], bounds):
+        west, south, east, north = bounds
+        _extract = read_pbf(pbf_path, (
+            west - EXTRACT_MARGIN_DEGREE, south - EXTRACT_MARGIN_DEGREE,
+            east + EXTRACT_MARGIN_DEGREE, north + EXTRACT_MARGIN_DEGREE,
+        ))
+    return _extract
+
+
+def contains_bounds(outer, inner) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+# bounds(西, 南, 東, 北)にnodeが1つでも含まれるwayと、そのnodeの座標を読み込む
+# nodeはタグを持つものだけを残す(wayの構成nodeの座標はwayと一緒に持つ)
+def read_pbf(pbf_path: str, bounds) -> dict:
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError("OSM_SOURCE=pbf requires pyosmium: uv pip install osmium") from e
+
+    if not Path(pbf_path).exists():
+        raise FileNotFoundError(f"OSM_PBF_PATH not found: {pbf_path}")
+
+    print(f"  📂 Read pbf: {pbf_path}")
+    west, south, east, north = bounds
+    node_keys = set(EXTRACT_WAY_TAGS) | set(settings.useful_tags_node)
+    node_ids, node_lons, node_lats, node_tags = [], [], [], []
+    way_ids, way_tags, refs, lons, lats, counts = [], [], [], [], [], []
+
+    # 座標のキャッシュは全nodeを対象にし、タグで絞り込んだ要素だけを受け取る
+    processor = (
+        osmium.FileProcessor(pbf_path, osmium.osm.NODE | osmium.osm.WAY)
+        .with_locations()
+        .with_filter(osmium.filter.KeyFilter(*node_keys))
+    )
+    for obj in processor:
+        if obj.is_node():
+            location = obj.location
+            if location.valid() and west <= location.lon <= east and south <= location.lat <= north:
+                node_ids.append(obj.id)
+                node_lons.append(location.lon)
+                node_lats.append(location.lat)
+                node_tags.append({tag.k: tag.v for tag in obj.tags})
+            continue
+
+        if not any(key in obj.tags for key in EXTRACT_WAY_TAGS):
+            continue
+        # 抽出ファイルの範囲外で座標がないnodeは除く(Overpassでも返らない)
+        way_nodes = [(x.ref, x.location.lon, x.location.lat) for x in obj.nodes if x.location.valid()]
+        if not any(west <= lon <= east and south <= lat <= north for _, lon, lat in way_nodes):
+            continue
+        way_ids.append(obj.id)
+        way_tags.append({tag.k: tag.v for tag in obj.tags})
+        counts.append(len(way_nodes))
+        for ref, lon, lat in way_nodes:
+            refs.append(ref)
+            lons.append(lon)
+            lats.append(lat)
+
+    print(f"  📂 Extracted ways: {len(way_ids)}, tagged nodes: {len(node_ids)}")
+    return {
+        "path": pbf_path,
+        "bounds": bounds,
+        "node_ids": np.array(node_ids, dtype=np.int64),
+        "node_lons": np.array(node_lons, dtype=float),
+        "node_lats": np.array(node_lats, dtype=float),
+        "node_tags": node_tags,
+        "way_ids": np.array(way_ids, dtype=np.int64),
+        "way_tags": way_tags,
+        "offsets": ragged.counts_to_offsets(np.array(counts, dtype=np.int64)),
+        "refs": np.array(refs, dtype=np.int64),
+        "lons": np.array(lons, dtype=float),
+        "lats": np.array(lats, dtype=float),
+    }
+
+
+# Overpassのwayのフィルタ文字列を(キー, 演算子, 値)のリストにする
+def parse_filter(way_filter: str) -> list[tuple[str, str | None, str | None]]:
+    clauses = []
+    position = 0
+    for match in FILTER_PATTERN.finditer(way_filter):
+        if way_filter[position:match.start()].strip():
+            raise ValueError(f"unsupported overpass filter: {way_filter}")
+        key, op, quoted, unquoted = match.groups()
+        clauses.append((key, op, quoted if quoted is not None else (unquoted.strip() if unquoted else None)))
+        position = match.end()
+    if way_filter[position:].strip():
+        raise ValueError(f"unsupported overpass filter: {way_filter}")
+    return clauses
+
+
+# Overpassと同じ意味でタグが条件を満たすか(!=, !~はタグがない場合も満たす)
+def match_filter(tags: dict, clauses) -> bool:
+    for key, op, value in clauses:
+        tag = tags.get(key)
+        if op is None:
+            matched = tag is not None
+        elif op == "=":
+            matched = tag == value
+        elif op == "!=":
+            matched = tag != value
+        elif op == "~":
+            matched = tag is not None and re.search(value, tag) is not None
+        else:
+            matched = tag is None or re.search(value, tag) is None
+        if not matched:
+            return False
+    return True
+
+
+# osmnxのfeaturesのtags({"building": True}等)をタグが満たすか
+def match_tags(tags: dict, query_tags: dict) -> bool:
+    for key, value in query_tags.items():
+        if key not in tags:
+            continue
+        if value is True or (isinstance(value, str) and tags[key] == value) or (isinstance(value, list) and tags[key] in value):
+            return True
+    return False
+
+
+# nodeが1つでもpolygonに含まれるwayか
+def generate_way_in_polygon(extract: dict, polygon) -> np.ndarray:
+    inside = shapely.contains_xy(polygon, extract["lons"], extract["lats"])
+    way_count = len(extract["way_ids"])
+    return np.bincount(ragged.row_ids(extract["offsets"])[inside], minlength=way_count)[:way_count] > 0
+
+
+# 選んだwayとその構成node、追加するnodeをOverpassのレスポンス(JSON)と同じ形式にする
+# Overpassのoutと同じくnode, wayの順にそれぞれidの昇順で並べる
+def generate_response(extract: dict, way_indexes: np.ndarray, node_indexes: np.ndarray | None = None) -> dict:
+    offsets = extract["offsets"]
+    way_indexes = way_indexes[np.argsort(extract["way_ids"][way_indexes], kind="stable")]
+    nodes = {}
+    ways = []
+    for i in way_indexes.tolist():
+        st, ed = offsets[i], offsets[i + 1]
+        way_refs = extract["refs"][st:ed].tolist()
+        nodes.update(zip(way_refs, zip(extract["lats"][st:ed].tolist(), extract["lons"][st:ed].tolist())))
+        ways.append({"type": "way", "id": int(extract["way_ids"][i]), "nodes": way_refs, "tags": extract["way_tags"][i]})
+
+    tagged_nodes = dict(zip(extract["node_ids"].tolist(), range(len(extract["node_ids"]))))
+    if node_indexes is not None:
+        for i in node_indexes.tolist():
+            nodes[int(extract["node_ids"][i])] = (float(extract["node_lats"][i]), float(extract["node_lons"][i]))
+
+    elements = []
+    for node_id in sorted(nodes):
+        lat, lon = nodes[node_id]
+        element = {"type": "node", "id": node_id, "lat": lat, "lon": lon}
+        if node_id in tagged_nodes:
+            element["tags"] = extract["node_tags"][tagged_nodes[node_id]]
+        elements.append(element)
+    return {"elements": elements + ways}
+
+
+# _overpass._download_overpass_networkの代わり。way_filter毎に1つのレスポンスを返す
+def generate_network_responses(extract: dict, polygon, network_type: str, custom_filter: str | list[str] | None):
+    if isinstance(custom_filter, list):
+        way_filters = custom_filter
+    elif isinstance(custom_filter, str):
+        way_filters = [custom_filter]
+    else:
+        way_filters = [_overpass._get_network_filter(network_type)]
+
+    way_in_polygon = generate_way_in_polygon(extract, polygon)
+    for way_filter in way_filters:
+        clauses = parse_filter(way_filter)
+        way_indexes = np.array([
+            i for i in np.flatnonzero(way_in_polygon).tolist() if match_filter(extract["way_tags"][i], clauses)
+        ], dtype=np.int64)
+        yield generate_response(extract, way_indexes)
+
+
+# _overpass._download_overpass_featuresの代わり。条件を満たすnodeとwayを1つのレスポンスで返す(relationは含まない)
+def generate_feature_responses(extract: dict, polygon, tags: dict):
+    unsupported = [key for key in tags if key not in EXTRACT_WAY_TAGS]
+    if unsupported:
+        raise ValueError(f"tags not extracted from pbf: {unsupported}")
+
+    way_in_polygon = generate_way_in_polygon(extract, polygon)
+    way_indexes = np.array([
+        i for i in np.flatnonzero(way_in_polygon).tolist() if match_tags(extract["way_tags"][i], tags)
+    ], dtype=np.int64)
+    node_in_polygon = shapely.contains_xy(polygon, extract["node_lons"], extract["node_lats"])
+    node_indexes = np.array([
+        i for i in np.flatnonzero(node_in_polygon).tolist() if match_tags(extract["node_tags"][i], tags)
+    ], dtype=np.int64)
+    yield generate_response(extract, way_indexes, node_indexes)
@@ -0,0 +1,408 @@
+import gc
+import io
+import os
+import json
+import operator
+import time
+import fcntl
+import pickle
+import zipfile
+from hashlib import sha1
+from pathlib import Path
+from contextlib import contextmanager
+from itertools import chain, compress, repeat
+import networkx as nx
+import numpy as np
+import shapely
+
+# Overpassの取得結果(グラフ)のキャッシュ
+# data/cache_overpass/{キー}.graph.zip に、グラフのノード、エッジの属性を列毎に分けてzip(deflate)で圧縮して保存する。
+#   meta.json: 形式のバージョン、作成日時、グラフの属性、列の一覧
+#   nodes.*.npy, edges.*.npy: ノードID、エッジのu, v, keyと属性の列(encode_columns)
+#   geometry.*.npy: エッジのジオメトリの座標(ragged配列)
+# pickleのようにジオメトリや属性の辞書を1つずつ復元せず、列からまとめて作るので読み込みが速い。
+# キーは取得条件(関数名、範囲のポリゴン、引数)から作る。ポリゴンは正規化したWKBを使うので座標の並び順の違いでは変わらない。
+# ファイルの更新日時を最終利用日時とし、容量の上限を超えたら古いものから削除する(LRU)。作成から有効期限を過ぎたものは使わない。
+# 並列実行時に同じグラフを複数のプロセスで取得しないように、取得から保存までの間はlocks/{キー}.lockのロックを持つ(lock)。
+
+FORMAT_VERSION = 1
+CACHE_DIR = Path(__file__).resolve().parents[3] / "data" / "cache_overpass"
+FILE_SUFFIX = ".graph.zip"
+# 旧形式(グラフのpickle)のファイル。見つかった場合は新形式に変換する
+LEGACY_FILE_SUFFIX = ".pkl"
+# プロセス間で共有するロックファイル(キー毎の取得中のロック、エンドポイント毎の同時実行数と問い合わせ間隔)のディレクトリ名
+LOCK_DIR_NAME = "locks"
+
+METRICS = {"hit": 0, "miss": 0, "expired": 0, "evicted": 0, "migrated": 0, "load_seconds": 0.0, "written_bytes": 0}
+
+
+def generate_key(func, args, kwargs) -> str:
+    parts = [f"v{FORMAT_VERSION}", func.__name__]
+    for a in args:
+        if hasattr(a, "wkb"):
+            parts.append(shapely.to_wkb(shapely.normalize(a), hex=True))
+        else:
+            parts.append(str(a))
+    for k in sorted(kwargs.keys()):
+        parts.append(f"{k}={kwargs[k]}")
+    return sha1("|".join(parts).encode()).hexdigest()
+
+
+# 旧形式のキー(ポリゴンのWKTから作る)
+def generate_legacy_key(func, args, kwargs) -> str:
+    parts = [func.__name__]
+    for a in args:
+        if hasattr(a, "wkt"):
+            parts.append(a.wkt)
+        else:
+            parts.append(str(a))
+    for k in sorted(kwargs.keys()):
+        parts.append(f"{k}={kwargs[k]}")
+    return sha1("|".join(parts).encode()).hexdigest()
+
+
+def get_path(key: str, cache_dir=CACHE_DIR) -> Path:
+    return Path(cache_dir) / f"{key}{FILE_SUFFIX}"
+
+
+# キャッシュを読み込む。ない場合、有効期限(ttl_seconds)を過ぎている場合はNone
+def load(key: str, ttl_seconds: float | None = None, legacy_key: str | None = None, cache_dir=CACHE_DIR, max_bytes: int | None = None):
+    path = get_path(key, cache_dir)
+    if not path.exists() and legacy_key is not None:
+        migrate_legacy(legacy_key, key, cache_dir, max_bytes)
+    if not path.exists():
+        METRICS["miss"] += 1
+        return None
+
+    st = time.time()
+    try:
+        with zipfile.ZipFile(path) as zf:
+            meta = json.loads(zf.read("meta.json"))
+            if is_expired(meta, ttl_seconds):
+                METRICS["expired"] += 1
+                METRICS["miss"] += 1
+                return None
+            result = read_result(zf, meta)
+    except FileNotFoundError:
+        # 並列実行中に他のプロセスが削除した場合
+        METRICS["miss"] += 1
+        return None
+    METRICS["load_seconds"] += time.time() - st
+    METRICS["hit"] += 1
+    # 最終利用日時を更新する
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return result
+
+
+def get_lock_dir(cache_dir=CACHE_DIR) -> Path:
+    return Path(cache_dir) / LOCK_DIR_NAME
+
+
+# keyを取得中であることを示すロックを取る(flockなのでプロセスが落ちた場合も解放される)
+# blocking=Falseの場合は他のプロセスが持っていれば待たずにFalseを返す
+@contextmanager
+def lock(key: str, cache_dir=CACHE_DIR, blocking: bool = True):
+    lock_dir = get_lock_dir(cache_dir)
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / f"{key}.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+# キャッシュのメタデータ(形式のバージョン、作成日時)だけを読み込む。ない場合はNone
+def load_meta(key: str, cache_dir=CACHE_DIR) -> dict | None:
+    try:
+        with zipfile.ZipFile(get_path(key, cache_dir)) as zf:
+            return json.loads(zf.read("meta.json"))
+    except FileNotFoundError:
+        return None
+
+
+# メタデータがない、形式のバージョンが違う、有効期限(ttl_seconds)を過ぎている場合はTrue
+def is_expired(meta: dict | None, ttl_seconds: float | None = None) -> bool:
+    return meta is None or meta.get("version") != FORMAT_VERSION or (ttl_seconds is not None and time.time() - meta["created_at"] > ttl_seconds)
+
+
+# 有効なキャッシュがあるか(loadで読み込めるか)。データは読み込まない
+def is_valid(key: str, ttl_seconds: float | None = None, cache_dir=CACHE_DIR) -> bool:
+    return not is_expired(load_meta(key, cache_dir), ttl_seconds)
+
+
+# キャッシュを書き込み、容量の上限(max_bytes)を超えた分を古いものから削除する
+def store(key: str, result, cache_dir=CACHE_DIR, max_bytes: int | None = None) -> Path:
+    path = get_path(key, cache_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        write_result(zf, result)
+    os.replace(tmp_path, path)
+    METRICS["written_bytes"] += path.stat().st_size
+    if max_bytes is not None:
+        evict(max_bytes, cache_dir, keep=path)
+    return path
+
+
+def migrate_legacy(legacy_key: str, key: str, cache_dir=CACHE_DIR, max_bytes: int | None = None) -> None:
+    legacy_path = Path(cache_dir) / f"{legacy_key}{LEGACY_FILE_SUFFIX}"
+    if not legacy_path.exists():
+        return
+    store(key, pickle.loads(legacy_path.read_bytes()), cache_dir, max_bytes)
+    legacy_path.unlink(missing_ok=True)
+    METRICS["migrated"] += 1
+    print(f"  📦 Migrated: {legacy_path.name} -> {get_path(key, cache_dir).name}")
+
+
+# 最終利用日時の古いものから容量の上限以下になるまで削除する
+def evict(max_bytes: int, cache_dir=CACHE_DIR, keep: Path | None = None) -> int:
+    entries = []
+    for path in Path(cache_dir).glob(f"*{FILE_SUFFIX}"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries, key=lambda x: x[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    METRICS["evicted"] += evicted
+    return evicted
+
+
+def format_metrics() -> str:
+    return (
+        f"hit: {METRICS['hit']}, miss: {METRICS['miss']}, expired: {METRICS['expired']}, evicted: {METRICS['evicted']}, "
+        f"load: {round(METRICS['load_seconds'], 2)}s, written: {round(METRICS['written_bytes'] / 1024 ** 2, 1)}MB"
+    )
+
+
+def write_result(zf: zipfile.ZipFile, result) -> None:
+    meta = {"version": FORMAT_VERSION, "created_at": time.time()}
+    # osmnxのグラフ(ノードID、エッジのキーが整数)以外の結果はpickleで保存する
+    if not is_int_graph(result):
+        zf.writestr("meta.json", json.dumps({**meta, "type": "pickle"}))
+        zf.writestr("result.pkl", pickle.dumps(result))
+        return
+
+    # result.edges(keys=True, data=True)と同じ並び順で、隣接の辞書から直接取り出す
+    node_ids, node_records = zip(*result._node.items()) if len(result) > 0 else ((), ())
+    edges = [(u, v, key, record) for u, nbrs in result._succ.items() for v, key_dict in nbrs.items() for key, record in key_dict.items()]
+    us, vs, keys, edge_records = zip(*edges) if len(edges) > 0 else ((), (), (), ())
+    geometry_edges = [i for i, record in enumerate(edge_records) if "geometry" in record]
+    coords, offsets = generate_coords([edge_records[i]["geometry"] for i in geometry_edges])
+    arrays = {
+        "nodes.id": np.array(node_ids, dtype=np.int64),
+        "edges.u": np.array(us, dtype=np.int64),
+        "edges.v": np.array(vs, dtype=np.int64),
+        "edges.key": np.array(keys, dtype=np.int64),
+        "geometry.coords": coords,
+        "geometry.offsets": offsets,
+        "geometry.edges": np.array(geometry_edges, dtype=np.int64),
+    }
+    columns = {
+        "nodes": encode_columns("nodes", node_records, arrays, zf),
+        "edges": encode_columns("edges", edge_records, arrays, zf, exclude={"geometry"}),
+    }
+    zf.writestr("meta.json", json.dumps({**meta, "type": "graph", "graph": result.graph, "columns": columns}, default=to_json_value))
+    for name, array in arrays.items():
+        buffer = io.BytesIO()
+        np.save(buffer, array)
+        zf.writestr(f"{name}.npy", buffer.getvalue())
+
+
+def read_result(zf: zipfile.ZipFile, meta: dict):
+    if meta["type"] == "pickle":
+        return pickle.loads(zf.read("result.pkl"))
+
+    # 属性の辞書を大量に作るので、途中で循環参照のGCが何度も走らないように止めておく(作るものに循環参照はない)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return read_graph(zf, meta)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def read_graph(zf: zipfile.ZipFile, meta: dict) -> nx.MultiDiGraph:
+    read_array = lambda name: np.load(io.BytesIO(zf.read(f"{name}.npy")))
+    node_ids = read_array("nodes.id").tolist()
+    us, vs, keys = (read_array(f"edges.{name}").tolist() for name in ("u", "v", "key"))
+    node_records = generate_records(len(node_ids), read_columns("nodes", meta["columns"]["nodes"], len(node_ids), read_array, zf))
+    edge_columns = read_columns("edges", meta["columns"]["edges"], len(us), read_array, zf)
+    coords, offsets, geometry_edges = (read_array(f"geometry.{name}") for name in ("coords", "offsets", "edges"))
+    if len(geometry_edges) > 0:
+        # ジオメトリは座標の配列からまとめて作り、属性の列の1つとして辞書に入れる
+        present = np.zeros(len(us), dtype=bool)
+        present[geometry_edges] = True
+        row_values = np.full(len(us), None, dtype=object)
+        row_values[geometry_edges] = shapely.linestrings(coords, indices=np.repeat(np.arange(len(geometry_edges)), np.diff(offsets)))
+        edge_columns.append(("geometry", present, row_values.tolist()))
+    edge_records = generate_records(len(us), edge_columns)
+
+    # add_edges_fromはエッジ毎に引数の確認や属性の更新を行うので、MultiDiGraphの隣接の辞書に直接入れる
+    # (succ[u][v]とpred[v][u]はどちらも同じ{キー: 属性}の辞書。辞書はmapでまとめて作り、ループでは入れるだけにする)
+    graph = nx.MultiDiGraph(**meta["graph"])
+    graph._node.update(zip(node_ids, node_records))
+    succ = graph._succ
+    pred = graph._pred
+    succ.update(zip(node_ids, map(dict, repeat((), len(node_ids)))))
+    pred.update(zip(node_ids, map(dict, repeat((), len(node_ids)))))
+    for u, v, key, record, key_dict in zip(us, vs, keys, edge_records, map(dict, zip(zip(keys, edge_records)))):
+        succ_u = succ[u]
+        if v in succ_u:
+            # 同じu, vの2本目以降のエッジ(平行なエッジ)
+            succ_u[v][key] = record
+        else:
+            succ_u[v] = pred[v][u] = key_dict
+    return graph
+
+
+def is_int_graph(result) -> bool:
+    return isinstance(result, nx.MultiDiGraph) and all(
+        isinstance(x, (int, np.integer)) for x in result.nodes
+    ) and all(isinstance(k, (int, np.integer)) for _, _, k in result.edges(keys=True))
+
+
+# 属性の辞書のリストを列毎に保存する。列の値の種類は
+#   float, int: 数値の配列(values)
+#   json: 値のJSONの一覧(uniques)と一覧の番号の配列(codes)
+# 属性がない行がある列は、属性があるかどうかの配列(present)も保存する
+def encode_columns(table: str, records, arrays: dict, zf: zipfile.ZipFile, exclude=frozenset()) -> list[dict]:
+    keys = [key for key in dict.fromkeys(chain.from_iterable(records)) if key not in exclude]
+    columns = []
+    for i, key in enumerate(keys):
+        name = f"{table}.{i}"
+        present = np.fromiter(map(operator.contains, records, repeat(key)), dtype=bool, count=len(records))
+        has_missing = not present.all()
+        if has_missing:
+            arrays[f"{name}.present"] = present
+            values = list(map(operator.itemgetter(key), compress(records, present.tolist())))
+        else:
+            values = list(map(operator.itemgetter(key), records))
+        # 値の型の一覧で列の種類を決める
+        value_types = set(map(type, values))
+        if all(t is float or issubclass(t, np.floating) for t in value_types):
+            kind = "float"
+            arrays[f"{name}.values"] = np.array(values, dtype=float)
+        elif all((t is int or issubclass(t, np.integer)) for t in value_types):
+            kind = "int"
+            arrays[f"{name}.values"] = np.array(values, dtype=np.int64)
+        else:
+            kind = "json"
+            # 値を(型, 値)で重複を除いてから一覧の値だけをJSONにする(リスト等のハッシュできない値はJSONの文字列で比べる)
+            value_keys = list(zip(map(type, values), values))
+            if list in value_types or dict in value_types:
+                is_unhashable = np.fromiter(map(isinstance, values, repeat((list, dict))), dtype=bool, count=len(values))
+                for row in np.flatnonzero(is_unhashable).tolist():
+                    value_keys[row] = (list, json.dumps(values[row], default=to_json_value))
+            # 同じキーの値は同じなので、キー毎の値の一覧はまとめて1回でJSONにする
+            uniques = dict(zip(value_keys, values))
+            codes = dict(zip(uniques, range(len(uniques))))
+            arrays[f"{name}.codes"] = np.fromiter(map(codes.__getitem__, value_keys), dtype=np.int32, count=len(value_keys))
+            zf.writestr(f"{name}.uniques.json", json.dumps(list(uniques.values()), default=to_json_value, separators=(",", ":")))
+        columns.append({
+            "key": key, "kind": kind, "has_missing": has_missing,
+            "has_list": kind == "json" and list in value_types,
+        })
+    return columns
+
+
+# encode_columnsで保存した列を(キー, 属性があるか, 行毎の値のリスト)のリストで返す
+def read_columns(table: str, columns: list[dict], count: int, read_array, zf: zipfile.ZipFile) -> list[tuple[str, np.ndarray, list]]:
+    result = []
+    for i, column in enumerate(columns):
+        name = f"{table}.{i}"
+        present = read_array(f"{name}.present") if column["has_missing"] else np.ones(count, dtype=bool)
+        if column["kind"] == "json":
+            uniques = json.loads(zf.read(f"{name}.uniques.json"))
+            codes = read_array(f"{name}.codes")
+            column_values = list(map(uniques.__getitem__, codes.tolist()))
+            # リストの値は行毎に別のオブジェクトにする(同じ値の2行目以降をコピーし、行間で共有しない)
+            if column["has_list"]:
+                is_copied = np.fromiter(map(isinstance, uniques, repeat(list)), dtype=bool, count=len(uniques))[codes]
+                # 一覧は最初に出てきた順に番号を振っているので、それまでの最大の番号を超える行が各値の1行目
+                if len(codes) > 0:
+                    running_max = np.maximum.accumulate(codes)
+                    is_copied[0] = False
+                    is_copied[1:] &= running_max[1:] == running_max[:-1]
+                for row in np.flatnonzero(is_copied).tolist():
+                    column_values[row] = list(column_values[row])
+        else:
+            column_values = read_array(f"{name}.values").tolist()
+        # 属性がない行はNoneで埋めて行の位置に合わせる
+        if column["has_missing"]:
+            row_values = np.full(count, None, dtype=object)
+            row_values[present] = np.fromiter(column_values, dtype=object, count=len(column_values))
+            column_values = row_values.tolist()
+        result.append((column["key"], present, column_values))
+    return result
+
+
+# 列から属性の辞書のリストを作る
+# 属性のある列の組み合わせ毎に、generate_record_builderの関数をmapで呼んでまとめて作る(行毎のPythonのループを回さない)
+def generate_records(count: int, columns: list[tuple[str, np.ndarray, list]]) -> list[dict]:
+    if count == 0:
+        return []
+    if len(columns) == 0:
+        return list(map(dict, repeat((), count)))
+    # 全ての行に全ての属性がある場合
+    if all(present.all() for _, present, _ in columns):
+        return list(map(generate_record_builder([key for key, _, _ in columns]), *(row_values for _, _, row_values in columns)))
+    # 行毎の属性の有無をバイト列にまとめて組み合わせを求める
+    packed = np.packbits(np.stack([present for _, present, _ in columns], axis=1), axis=1)
+    patterns, first_rows, inverse = np.unique(
+        np.ascontiguousarray(packed).view(f"V{packed.shape[1]}").reshape(-1), return_index=True, return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    records = np.empty(count, dtype=object)
+    for pattern_index, first_row in enumerate(first_rows.tolist()):
+        rows = np.flatnonzero(inverse == pattern_index)
+        pattern_columns = [(key, row_values) for key, present, row_values in columns if present[first_row]]
+        if len(pattern_columns) == 0:
+            pattern_records = map(dict, repeat((), len(rows)))
+        else:
+            row_list = rows.tolist()
+            pattern_values = [list(map(row_values.__getitem__, row_list)) for _, row_values in pattern_columns]
+            pattern_records = map(generate_record_builder([key for key, _ in pattern_columns]), *pattern_values)
+        records[rows] = np.fromiter(pattern_records, dtype=object, count=len(rows))
+    return records.tolist()
+
+
+# キーの一覧から、列の値を引数に取って属性の辞書を返す関数を作る
+# lambda v0, v1: {"highway": v0, "length": v1} のような辞書のリテラルを返す関数で、dict(zip(キー, 値))より速い
+# キーはmeta.jsonの列の一覧(JSONの文字列、数値)なので、reprでリテラルにできる
+def generate_record_builder(keys: list):
+    args = ", ".join(f"v{i}" for i in range(len(keys)))
+    items = ", ".join(f"{key!r}: v{i}" for i, key in enumerate(keys))
+    return eval(f"lambda {args}: {{{items}}}")
+
+
+# LineStringのリストを座標の配列と各LineStringの開始位置にする
+def generate_coords(geometries) -> tuple[np.ndarray, np.ndarray]:
+    if len(geometries) == 0:
+        return np.empty((0, 2), dtype=float), np.zeros(1, dtype=np.int64)
+    coords, indices = shapely.get_coordinates(np.array(geometries, dtype=object), return_index=True)
+    offsets = np.zeros(len(geometries) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=len(geometries)), out=offsets[1:])
+    return coords, offsets
+
+
+# numpyの数値などJSONにできない値を変換する
+def to_json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
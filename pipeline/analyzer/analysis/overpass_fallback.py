@@ -1,9 +1,7 @@
-import osmnx as ox
 import time
-import pickle
 import requests as _requests
-from hashlib import sha1
-from pathlib import Path
+from . import osm_pbf, overpass_cache, overpass_scheduler, tile_partitioner
+from ..core.env import getEnv
 
 OVERPASS_ENDPOINTS = [
     "https://overpass-api.de/api",
@@ -11,9 +9,9 @@ OVERPASS_ENDPOINTS = [
     "https://maps.mail.ru/osm/tools/overpass/api",
 ]
 
-CACHE_DIR = Path(__file__).resolve().parents[3] / "data" / "cache_overpass"
-
-_active_endpoint = None
+# 問い合わせ先の振り分け(get_poolで作る)と先読み(prefetch_graphsで作る)
+_pool = None
+_prefetcher = None
 
 
 def _health_check(endpoint, timeout=15):
@@ -28,80 +26,147 @@ def _health_check(endpoint, timeout=15):
         return False
 
 
-def _select_endpoint():
-    global _active_endpoint
-    if _active_endpoint and _health_check(_active_endpoint):
-        return _active_endpoint
-    for ep in OVERPASS_ENDPOINTS:
-        print(f"  🔍 Health check: {ep} ...", end=" ", flush=True)
-        if _health_check(ep):
-            print("OK")
-            _active_endpoint = ep
-            return ep
-        print("NG")
-    _active_endpoint = OVERPASS_ENDPOINTS[0]
-    print(f"  ⚠️ No healthy endpoint, falling back to: {_active_endpoint}")
-    return _active_endpoint
-
-
-def _cache_key(func, args, kwargs):
-    parts = [func.__name__]
-    for a in args:
-        if hasattr(a, "wkt"):
-            parts.append(a.wkt)
-        else:
-            parts.append(str(a))
-    for k in sorted(kwargs.keys()):
-        parts.append(f"{k}={kwargs[k]}")
-    return sha1("|".join(parts).encode()).hexdigest()
+def get_pool():
+    global _pool
+    if _pool is None:
+        env = getEnv()
+        _pool = overpass_scheduler.EndpointPool(
+            OVERPASS_ENDPOINTS,
+            _health_check,
+            max_concurrency=env["OVERPASS_MAX_CONCURRENCY"],
+            min_interval_seconds=env["OVERPASS_MIN_INTERVAL_SECONDS"],
+            health_ttl_seconds=env["OVERPASS_HEALTH_TTL_SECONDS"],
+            # 並列実行時の県毎のプロセスとエンドポイント毎の上限を共有する
+            lock_dir=overpass_cache.get_lock_dir(),
+        )
+    return _pool
+
+
+# キャッシュの有効期限(秒)と容量の上限(バイト)。未設定の場合は無期限、上限なし
+def _cache_limits():
+    env = getEnv()
+    ttl_days = env["OVERPASS_CACHE_TTL_DAYS"]
+    max_gb = env["OVERPASS_CACHE_MAX_GB"]
+    return (
+        ttl_days * 24 * 60 * 60 if ttl_days is not None else None,
+        int(max_gb * 1024 ** 3) if max_gb is not None else None,
+    )
+
+
+def _load(func, args, kwargs):
+    ttl_seconds, max_bytes = _cache_limits()
+    return overpass_cache.load(
+        overpass_cache.generate_key(func, args, kwargs),
+        ttl_seconds=ttl_seconds,
+        legacy_key=overpass_cache.generate_legacy_key(func, args, kwargs),
+        max_bytes=max_bytes,
+    )
+
+
+# キャッシュ済みの結果だけを返す(Overpassには問い合わせない)。キャッシュがない場合はNone
+def load_cache(func, *args, **kwargs):
+    return _load(func, args, kwargs)
+
+
+# 次に解析する範囲の道路、全道路、トンネル、橋のグラフを子プロセスで取得してキャッシュに保存しておく
+# 有効なキャッシュ(有効期限内)があるグラフは取得しない
+# OVERPASS_PREFETCH=1でOverpassから取得する場合だけ行う
+def prefetch_graphs(search_area_polygon):
+    global _prefetcher
+    env = getEnv()
+    if not env["OVERPASS_PREFETCH"] or env["OSM_SOURCE"] == "pbf" or env["REFRESH_CACHE"]:
+        return []
+    # 各グラフの取得条件はそれぞれのモジュールにあるため、ここで読み込む(循環importを避ける)
+    import osmnx as ox
+    from . import graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_feather, tile_graph
+
+    if _prefetcher is None:
+        _prefetcher = overpass_scheduler.Prefetcher(
+            get_pool(),
+            workers=env["OVERPASS_PREFETCH_WORKERS"],
+            ttl_seconds=_cache_limits()[0],
+            max_bytes=_cache_limits()[1],
+        )
+    # タイルに分けて解析する範囲は、道路、トンネル、橋をタイル毎の取得範囲で先読みする(全道路はタイルの解析範囲で取得するので先読みしない)
+    if tile_partitioner.needs_split(search_area_polygon, env["TILE_SIZE_DEGREE"]):
+        requests = [
+            request
+            for module in [graph_feather, graph_tunnel_feather, graph_bridge_feather]
+            for request in tile_graph.generate_prefetch_requests(search_area_polygon, module.GRAPH_OPTIONS, env["TILE_SIZE_DEGREE"])
+        ]
+    else:
+        requests = [
+            (ox.graph_from_polygon, (search_area_polygon,), module.GRAPH_OPTIONS)
+            for module in [graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_feather]
+        ]
+    futures = _prefetcher.prefetch(requests)
+    if futures:
+        print(f"  ⏩ Prefetch: {len(futures)} graphs")
+    return futures
+
+
+# キャッシュ済みの結果のバージョン(キーと作成日時)。チェックポイントのキーに含め、キャッシュを取得し直したら再計算する
+# キャッシュがない、有効期限を過ぎている、refresh_cache=Trueの場合は取得してキャッシュに保存してから返す(ステージでは保存したキャッシュを読む)
+# OSM_SOURCE=pbfの場合はpbfのキーがチェックポイントの入力値に含まれるので空文字を返す
+def generate_cache_version(func, *args, refresh_cache=False, **kwargs) -> str:
+    env = getEnv()
+    if env["OSM_SOURCE"] == "pbf":
+        return ""
+    key = overpass_cache.generate_key(func, args, kwargs)
+    if _prefetcher is not None:
+        _prefetcher.wait(key)
+    ttl_seconds, _ = _cache_limits()
+    meta = overpass_cache.load_meta(key)
+    expired = overpass_cache.is_expired(meta, ttl_seconds)
+    if refresh_cache or expired:
+        call_with_fallback(func, *args, refresh_cache=refresh_cache, **kwargs)
+        meta = overpass_cache.load_meta(key)
+    # 保存した直後に他のプロセスが容量の上限で削除した場合
+    if meta is None:
+        return f"{key}:none"
+    return f"{key}:{meta['created_at']}"
+
+
+def shutdown_prefetch():
+    global _prefetcher
+    if _prefetcher is not None:
+        _prefetcher.shutdown()
+        _prefetcher = None
 
 
 def call_with_fallback(func, *args, max_retries_per_endpoint=2, refresh_cache=False, **kwargs):
-    global _active_endpoint
-    last_error = None
-
-    key = _cache_key(func, args, kwargs)
-    cache_path = CACHE_DIR / f"{key}.pkl"
-
-    if not refresh_cache and cache_path.exists():
-        print(f"  📦 Cache hit: {cache_path.name}")
-        return pickle.loads(cache_path.read_bytes())
-
-    alive = _select_endpoint()
-    print(f"  ✅ Overpass endpoint selected: {alive}")
-    endpoints_ordered = [alive] + [ep for ep in OVERPASS_ENDPOINTS if ep != alive]
-
-    for endpoint in endpoints_ordered:
-        ox.settings.overpass_url = endpoint
-        ox.settings.overpass_rate_limit = False
-
-        for attempt in range(max_retries_per_endpoint):
-            try:
-                print(f"  🌐 Overpass: {endpoint} (attempt {attempt + 1})")
-                result = func(*args, **kwargs)
-                _active_endpoint = endpoint
-
-                CACHE_DIR.mkdir(parents=True, exist_ok=True)
-                cache_path.write_bytes(pickle.dumps(result))
-                print(f"  💾 Cached: {cache_path.name}")
-
-                return result
-            except Exception as e:
-                error_msg = str(e)
-                is_connection_issue = (
-                    "ConnectionError" in type(e).__name__
-                    or "Timeout" in type(e).__name__
-                    or "Connection refused" in error_msg
-                    or "Max retries exceeded" in error_msg
-                    or "timed out" in error_msg.lower()
-                )
-                if not is_connection_issue:
-                    raise
-                last_error = e
-                print(f"  ⚠️ {endpoint} failed: {type(e).__name__}")
-                if attempt < max_retries_per_endpoint - 1:
-                    time.sleep(5)
-
-        print(f"  ❌ {endpoint} exhausted, trying next...")
-
-    raise last_error
+    # OSM_SOURCE=pbfの場合はOverpassに問い合わせずローカルのpbfから作る(キャッシュも使わない)
+    env = getEnv()
+    if env["OSM_SOURCE"] == "pbf":
+        print(f"  📂 Local pbf: {env['OSM_PBF_PATH']}")
+        return osm_pbf.call(env["OSM_PBF_PATH"], func, *args, **kwargs)
+
+    key = overpass_cache.generate_key(func, args, kwargs)
+    if not refresh_cache:
+        # 先読み中の場合は終わるのを待ってキャッシュから読む
+        if _prefetcher is not None:
+            _prefetcher.wait(key)
+        st = time.time()
+        result = _load(func, args, kwargs)
+        if result is not None:
+            print(f"  📦 Cache hit: {overpass_cache.get_path(key).name} ({round(time.time() - st, 2)}s)")
+            print(f"  📊 Overpass cache: {overpass_cache.format_metrics()}")
+            return result
+
+    # 接続エラーの場合はエンドポイントを変えて再試行する(サーキットブレーカーが開いたエンドポイントは使わない)
+    # 他のプロセス(並列実行時の別の県、先読み)が同じグラフを取得中の場合は終わるのを待ってキャッシュから読む
+    pool = get_pool()
+    st = time.time()
+    result, cached = overpass_scheduler.fetch_to_cache(
+        pool, func, args, kwargs, key, max_retries_per_endpoint * len(OVERPASS_ENDPOINTS),
+        load=lambda: _load(func, args, kwargs),
+        max_bytes=_cache_limits()[1],
+        refresh_cache=refresh_cache,
+    )
+    if cached:
+        print(f"  📦 Cache hit: {overpass_cache.get_path(key).name} ({round(time.time() - st, 2)}s)")
+    else:
+        print(f"  📊 Overpass endpoints: {pool.format_stats()}")
+        print(f"  💾 Cached: {overpass_cache.get_path(key).name}")
+    print(f"  📊 Overpass cache: {overpass_cache.format_metrics()}")
+    return result
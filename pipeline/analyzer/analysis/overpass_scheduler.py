@@ -0,0 +1,340 @@
+import time
+import fcntl
+import threading
+import multiprocessing
+from hashlib import sha1
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future
+import osmnx as ox
+from . import overpass_cache
+
+# Overpassのエンドポイントの振り分けと、グラフの先読み
+# EndpointPool: 同時実行数が少なく、次に問い合わせられる時刻が早いエンドポイントを選ぶ。
+#   エンドポイント毎に同時実行数の上限と問い合わせの最小間隔を守る。
+#   ヘルスチェックの結果はhealth_ttl_seconds秒の間使い回す。
+#   接続エラーがFAILURE_THRESHOLD回続いたエンドポイントはCIRCUIT_COOLDOWN_SECONDS秒使わない(サーキットブレーカー)。
+#   経過後は1件だけ試し、成功したら元に戻す。
+#   lock_dirを指定した場合は、同時実行数と問い合わせの間隔をlock_dirのファイル(flock)でプロセス間で共有する。
+#   並列実行時の県毎のプロセスと先読みのプロセスを合わせて、エンドポイント毎の上限を守る。
+# Prefetcher: 次の県の4つのグラフ(道路、全道路、トンネル、橋)を子プロセスで取得してoverpass_cacheに保存する。
+#   取得中はoverpass_cacheのキー毎のロックを持つので、並列実行時に県のプロセスが同じグラフを取得する場合は先読みが終わるのを待つ。
+#   osmnxの接続先(ox.settings.overpass_url)はプロセス全体の設定なので、スレッドではなくプロセスで並列に取得する。
+
+# サーキットブレーカーを開く連続失敗回数
+FAILURE_THRESHOLD = 3
+# サーキットブレーカーを開いておく時間(秒)
+CIRCUIT_COOLDOWN_SECONDS = 120
+# 接続エラーの後、同じエンドポイントに問い合わせるまで待つ時間(秒)
+RETRY_DELAY_SECONDS = 5
+# 他のプロセスがエンドポイントを上限まで使っている場合に、空くのを待つ間隔(秒)
+SHARED_POLL_SECONDS = 0.2
+
+
+# 接続できなかったことによるエラーか(それ以外のエラーは再試行しない)
+def is_connection_issue(e: Exception) -> bool:
+    error_msg = str(e)
+    return (
+        "ConnectionError" in type(e).__name__
+        or "Timeout" in type(e).__name__
+        or "Connection refused" in error_msg
+        or "Max retries exceeded" in error_msg
+        or "timed out" in error_msg.lower()
+    )
+
+
+class EndpointPool:
+    def __init__(self, endpoints: list[str], health_check, max_concurrency: int = 2, min_interval_seconds: float = 1.0, health_ttl_seconds: float = 300, lock_dir=None):
+        self.endpoints = list(endpoints)
+        self.health_check = health_check
+        self.max_concurrency = max_concurrency
+        self.min_interval_seconds = min_interval_seconds
+        self.health_ttl_seconds = health_ttl_seconds
+        self.lock_dir = Path(lock_dir) if lock_dir is not None else None
+        if self.lock_dir is not None:
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+        # プロセス間で共有する同時実行数の枠(問い合わせ中に持っているロックファイル)
+        self.slots = {endpoint: [] for endpoint in self.endpoints}
+        self.condition = threading.Condition()
+        self.states = {
+            endpoint: {
+                "in_flight": 0, "next_start": 0.0, "failures": 0, "opened_at": None, "half_open": False,
+                "healthy": None, "checked_at": None, "checking": False, "requests": 0, "errors": 0, "opened": 0,
+            }
+            for endpoint in self.endpoints
+        }
+
+    # 問い合わせるエンドポイントを返す。問い合わせが終わったらreleaseを呼ぶ
+    def acquire(self) -> str:
+        while True:
+            self._check_health()
+            with self.condition:
+                now = time.monotonic()
+                # 他のプロセスが上限まで使っているエンドポイントは飛ばして次の候補を選ぶ
+                skipped = set()
+                while True:
+                    endpoint, wait_seconds = self._select(now, skipped)
+                    if endpoint is None or self._acquire_slot(endpoint):
+                        break
+                    skipped.add(endpoint)
+                if endpoint is None:
+                    self.condition.wait(timeout=SHARED_POLL_SECONDS if skipped else wait_seconds)
+                    continue
+                state = self.states[endpoint]
+                start = max(state["next_start"], now)
+                state["next_start"] = start + self.min_interval_seconds
+                state["in_flight"] += 1
+                state["requests"] += 1
+                if state["opened_at"] is not None:
+                    state["half_open"] = True
+            # 最小間隔を守るために予約した時刻まで待つ(プロセス間で共有する場合は他のプロセスの予約の後)
+            wait_seconds = start - now
+            if self.lock_dir is not None:
+                wait_seconds = max(wait_seconds, self._reserve_shared_start(endpoint, 0) - time.time())
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+            return endpoint
+
+    def release(self, endpoint: str, ok: bool) -> None:
+        if self.lock_dir is not None and not ok:
+            self._reserve_shared_start(endpoint, RETRY_DELAY_SECONDS)
+        with self.condition:
+            state = self.states[endpoint]
+            state["in_flight"] -= 1
+            self._release_slot(endpoint)
+            now = time.monotonic()
+            if ok:
+                state.update(failures=0, opened_at=None, half_open=False, healthy=True, checked_at=now)
+            else:
+                state["errors"] += 1
+                state["failures"] += 1
+                state["next_start"] = max(state["next_start"], now + RETRY_DELAY_SECONDS)
+                if state["half_open"] or state["failures"] >= FAILURE_THRESHOLD:
+                    if state["opened_at"] is None or state["half_open"]:
+                        state["opened"] += 1
+                        print(f"  🚧 Circuit open: {endpoint} ({CIRCUIT_COOLDOWN_SECONDS}s)")
+                    state.update(opened_at=now, half_open=False)
+            self.condition.notify_all()
+
+    # 使えるエンドポイントのうち、同時実行数が少なく、次に問い合わせられる時刻が早いものを選ぶ。
+    # ない場合は(None, 待つ時間)を返す
+    def _select(self, now: float, skipped=()) -> tuple[str | None, float | None]:
+        closed = [endpoint for endpoint in self.endpoints if not self._is_open(endpoint, now)]
+        if not closed:
+            reopen_at = min(self.states[x]["opened_at"] + CIRCUIT_COOLDOWN_SECONDS for x in self.endpoints)
+            return None, max(reopen_at - now, 0.01)
+        # ヘルスチェックがNGのエンドポイントは、他に使えるものがない場合だけ使う
+        healthy = [endpoint for endpoint in closed if self.states[endpoint]["healthy"] is not False]
+        candidates = [endpoint for endpoint in healthy or closed if endpoint not in skipped and self._has_capacity(endpoint, now)]
+        if not candidates:
+            return None, None
+        return min(candidates, key=lambda x: (self.states[x]["in_flight"], self.states[x]["next_start"], self.endpoints.index(x))), None
+
+    def _is_open(self, endpoint: str, now: float) -> bool:
+        opened_at = self.states[endpoint]["opened_at"]
+        return opened_at is not None and now - opened_at < CIRCUIT_COOLDOWN_SECONDS
+
+    def _has_capacity(self, endpoint: str, now: float) -> bool:
+        state = self.states[endpoint]
+        # サーキットブレーカーを閉じるかどうかは1件だけで試す
+        limit = 1 if state["opened_at"] is not None else self.max_concurrency
+        return state["in_flight"] < limit
+
+    def _get_lock_path(self, endpoint: str, name: str) -> Path:
+        return self.lock_dir / f"endpoint_{sha1(endpoint.encode()).hexdigest()[:16]}.{name}"
+
+    # プロセス間で共有する同時実行数の枠を1つ取る。lock_dirがない場合は常にTrue、全て使われている場合はFalse
+    def _acquire_slot(self, endpoint: str) -> bool:
+        if self.lock_dir is None:
+            return True
+        for i in range(self.max_concurrency):
+            slot_file = open(self._get_lock_path(endpoint, f"slot{i}.lock"), "w")
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot_file.close()
+                continue
+            self.slots[endpoint].append(slot_file)
+            return True
+        return False
+
+    def _release_slot(self, endpoint: str) -> None:
+        if self.slots[endpoint]:
+            # closeでflockも解放される
+            self.slots[endpoint].pop().close()
+
+    # プロセス間で共有する次に問い合わせられる時刻(time.time())を予約して、この問い合わせを始める時刻を返す
+    # delay_secondsを指定した場合は今からその時間が経つまで問い合わせない(接続エラーの後)
+    def _reserve_shared_start(self, endpoint: str, delay_seconds: float) -> float:
+        with open(self._get_lock_path(endpoint, "next"), "a+") as next_file:
+            fcntl.flock(next_file, fcntl.LOCK_EX)
+            next_file.seek(0)
+            text = next_file.read()
+            next_start = float(text) if text else 0.0
+            now = time.time()
+            if delay_seconds > 0:
+                start = next_start
+                next_start = max(next_start, now + delay_seconds)
+            else:
+                start = max(next_start, now)
+                next_start = start + self.min_interval_seconds
+            next_file.seek(0)
+            next_file.truncate()
+            next_file.write(repr(next_start))
+        return start
+
+    # 結果が古いエンドポイントのヘルスチェックを行う(問い合わせ中はロックを持たない)
+    def _check_health(self) -> None:
+        with self.condition:
+            now = time.monotonic()
+            targets = [
+                endpoint for endpoint in self.endpoints
+                if not self.states[endpoint]["checking"] and not self._is_open(endpoint, now) and (
+                    self.states[endpoint]["checked_at"] is None or now - self.states[endpoint]["checked_at"] > self.health_ttl_seconds
+                )
+            ]
+            for endpoint in targets:
+                self.states[endpoint]["checking"] = True
+        if not targets:
+            return
+        # エンドポイント毎のタイムアウトを待たないように同時に確認する
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            results = list(executor.map(self.health_check, targets))
+        with self.condition:
+            for endpoint, healthy in zip(targets, results):
+                print(f"  🔍 Health check: {endpoint} ... {'OK' if healthy else 'NG'}")
+                self.states[endpoint].update(healthy=healthy, checked_at=time.monotonic(), checking=False)
+            self.condition.notify_all()
+
+    def format_stats(self) -> str:
+        return ", ".join(
+            f"{endpoint}: requests {state['requests']}, errors {state['errors']}, opened {state['opened']}"
+            for endpoint, state in self.states.items()
+        )
+
+
+# poolから選んだエンドポイントでfunc(*args, **kwargs)を実行する。接続エラーの場合は別のエンドポイントで再試行する
+def fetch(pool: EndpointPool, func, args, kwargs, max_attempts: int):
+    last_error = None
+    for attempt in range(max_attempts):
+        endpoint = pool.acquire()
+        ox.settings.overpass_url = endpoint
+        ox.settings.overpass_rate_limit = False
+        # 結果はoverpass_cacheに保存するので、osmnxのHTTPキャッシュ(data/cache)には同じデータを保存しない
+        ox.settings.use_cache = False
+        try:
+            print(f"  🌐 Overpass: {endpoint} (attempt {attempt + 1})")
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if not is_connection_issue(e):
+                pool.release(endpoint, ok=True)
+                raise
+            pool.release(endpoint, ok=False)
+            last_error = e
+            print(f"  ⚠️ {endpoint} failed: {type(e).__name__}")
+            continue
+        pool.release(endpoint, ok=True)
+        return result
+    raise last_error
+
+
+# keyの取得中のロックを取り、poolから選んだエンドポイントで取得してキャッシュに保存する。戻り値は(結果, キャッシュから読んだか)
+# 他のプロセス(並列実行時の別の県、先読み)が同じkeyを取得中の場合は終わるのを待ち、保存されたキャッシュをload()で読む
+# refresh_cache=Trueの場合はロックを取れたら既存のキャッシュを読まずに取得し直す
+def fetch_to_cache(pool: EndpointPool, func, args, kwargs, key: str, max_attempts: int, load, cache_dir=overpass_cache.CACHE_DIR, max_bytes: int | None = None, refresh_cache: bool = False):
+    def fetch_and_store():
+        result = fetch(pool, func, args, kwargs, max_attempts)
+        overpass_cache.store(key, result, cache_dir, max_bytes)
+        return result
+
+    with overpass_cache.lock(key, cache_dir, blocking=False) as locked:
+        if locked:
+            # 呼び出し元がキャッシュを確認してからロックを取るまでに、他のプロセスが保存して解放した場合
+            result = None if refresh_cache else load()
+            if result is not None:
+                return result, True
+            return fetch_and_store(), False
+    print(f"  ⏳ Waiting for another process: {overpass_cache.get_path(key, cache_dir).name}")
+    with overpass_cache.lock(key, cache_dir):
+        result = load()
+        if result is not None:
+            return result, True
+        return fetch_and_store(), False
+
+
+# 子プロセスで指定のエンドポイントからグラフを取得してキャッシュに保存する。戻り値は"ok", "skipped", "connection_error", "error"
+# 他のプロセスが同じkeyを取得中の場合は取得しない(skipped)
+def _fetch_in_process(endpoint: str, func, args, kwargs, key: str, cache_dir, max_bytes, ttl_seconds=None) -> str:
+    from .graph_feather import add_useful_tags
+
+    ox.settings.log_console = False
+    ox.settings.overpass_url = endpoint
+    ox.settings.overpass_rate_limit = False
+    ox.settings.use_cache = False
+    # 解析と同じく道路のグラフの追加のタグを全てのグラフで取得する
+    add_useful_tags()
+    with overpass_cache.lock(key, cache_dir, blocking=False) as locked:
+        if not locked or overpass_cache.is_valid(key, ttl_seconds, cache_dir):
+            return "skipped"
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_connection_issue(e):
+                return "connection_error"
+            # トンネル、橋がない場合など。キャッシュせずに解析時の取得に任せる
+            print(f"  ⚠️ prefetch failed: {type(e).__name__}: {e}")
+            return "error"
+        overpass_cache.store(key, result, cache_dir, max_bytes)
+        return "ok"
+
+
+class Prefetcher:
+    def __init__(self, pool: EndpointPool, workers: int = 2, max_attempts: int = 6, cache_dir=overpass_cache.CACHE_DIR, ttl_seconds: float | None = None, max_bytes: int | None = None):
+        self.pool = pool
+        self.max_attempts = max_attempts
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # spawnで起動してfork時のGDAL/スレッド状態の引き継ぎを避ける
+        self.processes = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        # エンドポイントの割り当てと再試行を行うスレッド(取得は子プロセスで行う)
+        self.threads = ThreadPoolExecutor(max_workers=workers)
+        self.futures: dict[str, Future] = {}
+        self.lock = threading.Lock()
+
+    # requests([(関数, 引数のタプル, キーワード引数)])のうち有効なキャッシュ(有効期限内)がないものを先読みする
+    def prefetch(self, requests) -> list[Future]:
+        futures = []
+        for func, args, kwargs in requests:
+            key = overpass_cache.generate_key(func, args, kwargs)
+            with self.lock:
+                if key in self.futures or overpass_cache.is_valid(key, self.ttl_seconds, self.cache_dir):
+                    continue
+                self.futures[key] = self.threads.submit(self._run, func, args, kwargs, key)
+                futures.append(self.futures[key])
+        return futures
+
+    def _run(self, func, args, kwargs, key) -> str:
+        status = "connection_error"
+        for _ in range(self.max_attempts):
+            endpoint = self.pool.acquire()
+            try:
+                status = self.processes.submit(_fetch_in_process, endpoint, func, args, kwargs, key, self.cache_dir, self.max_bytes, self.ttl_seconds).result()
+            except Exception as e:
+                # 子プロセスが落ちた場合
+                print(f"  ⚠️ prefetch process failed: {type(e).__name__}: {e}")
+                status = "error"
+            self.pool.release(endpoint, ok=status != "connection_error")
+            if status != "connection_error":
+                break
+        return status
+
+    # keyを先読み中の場合は終わるまで待つ
+    def wait(self, key: str) -> None:
+        with self.lock:
+            future = self.futures.get(key)
+        if future is not None:
+            future.result()
+
+    def shutdown(self) -> None:
+        self.threads.shutdown(wait=True)
+        self.processes.shutdown(wait=True)
@@ -1,15 +1,38 @@
 from geopandas import GeoDataFrame
+import numpy as np
+import pandas as pd
 
 
 # 逆方向のエッジを削除する
+# 先頭から順に見て、同じ2点間(u, vの向きは問わない)のkey=0のエッジを残した後に出てくるエッジを削除する
+# key=0のエッジが出てくるまでの平行なエッジ(key>=1)は残る。同じ(u, v, k)が複数ある場合は1つでも残れば全て残す
 def remove(gdf: GeoDataFrame) -> GeoDataFrame:
-    drop_target = []
-    for index, row in gdf.iterrows():
-        # drop_indexにindex[1], index[0]が存在する場合はなにもしない
-        if (index[1], index[0], 0) in drop_target:
-            continue
-        if (index[0], index[1], 0) in drop_target:
+    if len(gdf) == 0:
+        return gdf
+    u = gdf.index.get_level_values(0).to_numpy()
+    v = gdf.index.get_level_values(1).to_numpy()
+    k = gdf.index.get_level_values(2).to_numpy()
+    pairs, _ = pd.MultiIndex.from_arrays([np.minimum(u, v), np.maximum(u, v)]).factorize()
+    positions = np.arange(len(gdf))
+    # 2点間毎の最初のkey=0のエッジの位置(ない場合は末尾の次)
+    first_zero = np.full(pairs.max() + 1, len(gdf))
+    is_zero = k == 0
+    np.minimum.at(first_zero, pairs[is_zero], positions[is_zero])
+    keep = positions <= first_zero[pairs]
+    if gdf.index.has_duplicates:
+        keep = gdf.index.isin(gdf.index[keep])
+    return gdf[keep]
+
+
+# (u, v, k)のリストから逆方向のエッジを除いて残すエッジのマスクを返す(removeと同じ規則)
+def generate_keep_mask(keys: list[tuple]) -> list[bool]:
+    kept = set()
+    kept_zero_pairs = set()
+    for u, v, k in keys:
+        pair = (min(u, v), max(u, v))
+        if pair in kept_zero_pairs:
             continue
-        drop_target.append(index)
-    result = gdf[gdf.index.isin(drop_target)]
-    return result
+        kept.add((u, v, k))
+        if k == 0:
+            kept_zero_pairs.add(pair)
+    return [key in kept for key in keys]
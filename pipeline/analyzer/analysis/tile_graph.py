@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+import numpy as np
+import osmnx as ox
+import networkx as nx
+from osmnx import _overpass, projection
+from shapely.geometry import Polygon, MultiPolygon, box
+from .overpass_fallback import call_with_fallback, generate_cache_version
+
+# タイルに分けて解析する範囲の道路、トンネル、橋のグラフを、タイル毎のOverpassへの問い合わせから作る
+# graph_from_polygonは範囲全体を1回で問い合わせるので、北海道等ではOverpassの上限(時間、メモリ)を超える。
+# タイル毎にwayとその全てのnodeを取得してキャッシュし(切り取り、単純化はしない)、重複を除いて1つのレスポンスにまとめる。
+# まとめたレスポンスでgraph_from_polygonを実行するので、範囲での切り取り、単純化、street_countは範囲全体で取得した場合と同じになり、
+# タイルの境界をまたぐ道路も途中で切れずに1本のエッジになる。
+
+# タイルの取得範囲を広げる量(m)。graph_from_polygonが範囲を500m広げて取得するため、それより大きい値にする
+FETCH_BUFFER_METERS = 600
+
+
+# タイル毎のwayの取得(キャッシュの単位)。Overpassのレスポンスのリストを返す
+def download_network(polygon: Polygon | MultiPolygon, network_type: str, custom_filter: str | list[str] | None) -> list[dict]:
+    return list(_overpass._download_overpass_network(polygon, network_type, custom_filter))
+
+
+# 範囲をFETCH_BUFFER_METERS広げてtile_size_degree毎の格子で分けた取得範囲
+def generate_fetch_areas(search_area_polygon: Polygon | MultiPolygon, tile_size_degree: float) -> list[Polygon | MultiPolygon]:
+    polygon_proj, crs_utm = projection.project_geometry(search_area_polygon)
+    buffered, _ = projection.project_geometry(polygon_proj.buffer(FETCH_BUFFER_METERS), crs=crs_utm, to_latlong=True)
+    west, south, east, north = buffered.bounds
+    areas = []
+    for x in np.arange(west, east, tile_size_degree):
+        for y in np.arange(south, north, tile_size_degree):
+            area = buffered.intersection(box(x, y, min(x + tile_size_degree, east), min(y + tile_size_degree, north)))
+            if not area.is_empty and area.geom_type in ("Polygon", "MultiPolygon"):
+                areas.append(area)
+    return areas
+
+
+# タイル毎のレスポンスを1つにまとめる。Overpassのoutと同じくnode, wayの順にそれぞれidの昇順で並べる
+def merge_responses(responses: list[dict]) -> dict:
+    nodes = {}
+    ways = {}
+    for response in responses:
+        for element in response["elements"]:
+            if element["type"] == "node":
+                nodes[element["id"]] = element
+            elif element["type"] == "way":
+                ways[element["id"]] = element
+    return {"elements": [nodes[x] for x in sorted(nodes)] + [ways[x] for x in sorted(ways)]}
+
+
+# graph_from_polygonのOverpassへの問い合わせを、まとめたレスポンスに差し替える
+@contextmanager
+def merged_overpass(response: dict):
+    download_network = _overpass._download_overpass_network
+    _overpass._download_overpass_network = lambda polygon, network_type, custom_filter: iter([response])
+    try:
+        yield
+    finally:
+        _overpass._download_overpass_network = download_network
+
+
+# graph_optionsはgraph_feather等のGRAPH_OPTIONS
+def fetch_graph(search_area_polygon: Polygon | MultiPolygon, graph_options: dict, tile_size_degree: float, refresh_cache=False) -> nx.Graph:
+    ox.settings.log_console = False
+    areas = generate_fetch_areas(search_area_polygon, tile_size_degree)
+    responses = []
+    for i, area in enumerate(areas):
+        print(f"  🧩 fetch area {i + 1}/{len(areas)}")
+        responses.extend(call_with_fallback(
+            download_network,
+            area,
+            refresh_cache=refresh_cache,
+            network_type=graph_options["network_type"],
+            custom_filter=graph_options["custom_filter"],
+        ))
+    response = merge_responses(responses)
+    del responses
+    with merged_overpass(response):
+        return ox.graph_from_polygon(search_area_polygon, **graph_options)
+
+
+# タイル毎のキャッシュのバージョンをまとめたもの(チェックポイントのキーに含める)。OSM_SOURCE=pbfの場合は空文字
+def generate_version(search_area_polygon: Polygon | MultiPolygon, graph_options: dict, tile_size_degree: float) -> str:
+    versions = [
+        generate_cache_version(download_network, area, network_type=graph_options["network_type"], custom_filter=graph_options["custom_filter"])
+        for area in generate_fetch_areas(search_area_polygon, tile_size_degree)
+    ]
+    return ",".join(x for x in versions if x)
+
+
+# 先読みする取得(overpass_scheduler.Prefetcher.prefetchの引数)
+def generate_prefetch_requests(search_area_polygon: Polygon | MultiPolygon, graph_options: dict, tile_size_degree: float) -> list[tuple]:
+    return [
+        (download_network, (area,), {"network_type": graph_options["network_type"], "custom_filter": graph_options["custom_filter"]})
+        for area in generate_fetch_areas(search_area_polygon, tile_size_degree)
+    ]
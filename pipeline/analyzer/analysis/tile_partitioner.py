@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+from shapely.geometry import Polygon, MultiPolygon
+from . import osm_diff
+from .turn_edge_spliter import NEW_NODE_ID_START
+
+# 広い範囲(北海道等)をタイルに分けて解析する
+# タイルは範囲の南西端を原点にしたtile_size_degree毎の格子で、エッジはジオメトリのbboxの中心を含むタイルが担当する。
+# 逆方向のエッジはbboxが同じなので同じタイルが担当し、タイル毎の逆方向のエッジの削除の結果が範囲全体の場合と変わらない。
+# 道路、トンネル、橋のグラフはタイル毎に取得したwayから範囲全体で1つのグラフとして作るため(tile_graph)、
+# タイルの境界をまたぐ道路も途中で切れずに1本のエッジになる。タイルには担当するエッジと、それに重なるトンネル、橋のエッジだけを渡す。
+# タイルの解析範囲は担当するエッジをoverlap_meters広げた範囲で、全道路(交差点の接続数、曲がり角)と建物はこの範囲で取得する。
+# 隣のタイルと重なる部分の道路は周囲の情報として使うだけで、結果には担当するタイルの行だけが入る。
+
+
+# エッジのジオメトリのbboxの中心を含むタイルの(列, 行)
+def generate_tile_indexes(geometries: np.ndarray, origin: tuple[float, float], tile_size_degree: float) -> np.ndarray:
+    bounds = shapely.bounds(geometries)
+    center_x = (bounds[:, 0] + bounds[:, 2]) / 2
+    center_y = (bounds[:, 1] + bounds[:, 3]) / 2
+    return np.stack([
+        np.floor((center_x - origin[0]) / tile_size_degree),
+        np.floor((center_y - origin[1]) / tile_size_degree),
+    ], axis=1).astype(np.int64)
+
+
+# タイルが担当するエッジか
+def select_tile_edges(geometries: np.ndarray, tile: dict) -> np.ndarray:
+    if len(geometries) == 0:
+        return np.zeros(0, dtype=bool)
+    indexes = generate_tile_indexes(geometries, tile["origin"], tile["size"])
+    return (indexes[:, 0] == tile["index"][0]) & (indexes[:, 1] == tile["index"][1])
+
+
+# タイルが担当するエッジに重なるエッジ(トンネル、橋)。道路との対応は座標の一致で求めるので、重ならないエッジは使われない
+def select_context_edges(context_geometries: np.ndarray, geometries: np.ndarray) -> np.ndarray:
+    mask = np.zeros(len(context_geometries), dtype=bool)
+    if len(context_geometries) == 0 or len(geometries) == 0:
+        return mask
+    _, indexes = shapely.STRtree(context_geometries).query(geometries, predicate="intersects")
+    mask[indexes] = True
+    return mask
+
+
+# 範囲がタイル1つに収まらないか
+def needs_split(search_area_polygon: Polygon | MultiPolygon, tile_size_degree: float | None) -> bool:
+    if tile_size_degree is None:
+        return False
+    west, south, east, north = search_area_polygon.bounds
+    return east - west > tile_size_degree or north - south > tile_size_degree
+
+
+# 道路のエッジをタイルに分け、エッジがあるタイル毎に{"index", "origin", "size", "edge_count", "analysis_area"}を返す
+def generate_tiles(
+    geometries: np.ndarray, search_area_polygon: Polygon | MultiPolygon, plane_epsg_code: int, tile_size_degree: float, overlap_meters: float
+) -> list[dict]:
+    origin = search_area_polygon.bounds[:2]
+    if len(geometries) == 0:
+        return []
+    indexes = generate_tile_indexes(geometries, origin, tile_size_degree)
+    unique_indexes, inverse = np.unique(indexes, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    tiles = []
+    for i, index in enumerate(unique_indexes):
+        tile_geometries = geometries[inverse == i]
+        # 範囲全体で解析した場合と同じく、周囲の道路等は範囲内のものだけを使う
+        analysis_area = osm_diff.generate_affected_area(tile_geometries, search_area_polygon, plane_epsg_code, overlap_meters)
+        tiles.append({
+            "index": (int(index[0]), int(index[1])),
+            "origin": (float(origin[0]), float(origin[1])),
+            "size": tile_size_degree,
+            "edge_count": len(tile_geometries),
+            "analysis_area": analysis_area,
+        })
+    return tiles
+
+
+# タイル毎の結果を1つにまとめる
+# 分割点のnode_idはタイル毎に同じ値から振られるので、タイルをまたいで重複しないように振り直す
+def stitch(results: list[GeoDataFrame]) -> GeoDataFrame:
+    results = [x for x in results if x is not None and not x.empty]
+    if len(results) == 0:
+        return GeoDataFrame()
+    offset = 0
+    stitched = []
+    for gdf in results:
+        u = gdf.index.get_level_values(0).to_numpy(dtype=np.int64)
+        v = gdf.index.get_level_values(1).to_numpy(dtype=np.int64)
+        k = gdf.index.get_level_values(2).to_numpy()
+        generated = np.concatenate([u[u >= NEW_NODE_ID_START], v[v >= NEW_NODE_ID_START]])
+        if len(generated) == 0:
+            stitched.append(gdf)
+            continue
+        base = int(generated.min())
+        u = np.where(u >= NEW_NODE_ID_START, u - base + NEW_NODE_ID_START + offset, u)
+        v = np.where(v >= NEW_NODE_ID_START, v - base + NEW_NODE_ID_START + offset, v)
+        offset += int(generated.max()) - base + 1
+        gdf = gdf.copy()
+        gdf.index = pd.MultiIndex.from_arrays([u, v, k], names=gdf.index.names)
+        stitched.append(gdf)
+    gdf_edges = pd.concat(stitched)
+    # タイルは担当するエッジだけを返すので重複しないが、同じエッジが入った場合は1つだけ残す
+    return gdf_edges[~gdf_edges.index.duplicated(keep="first")]
@@ -1,71 +1,85 @@
-from geopandas import GeoDataFrame
+from collections import Counter
+from geopandas import GeoDataFrame, GeoSeries
+import numpy as np
+import pandas as pd
 import shapely as sp
-import pyproj as proj
+from ..core import projection_service
 
+# 分割で新しく作るノードのID。osmのnode_idとかぶらなさそうな値から順に割り振る
+NEW_NODE_ID_START = 100000000000
 
-def split(gdf: GeoDataFrame) -> GeoDataFrame:
-    base_gdf = gdf.copy()
-    for index, row in base_gdf.iterrows():
-        turn_points = list(row.turn_points)
-        if len(row.turn_points) == 0:
-            continue
-        # geometryを曲がり角のポイント毎に分割する
-        geometrys = []
-        slice_ranges = []
-        coords = list(row.geometry.coords)
-        cut_start = 0
-        cut_end = 0
-        for coord_i, coord in enumerate(coords):
-            cut_end = coord_i + 1
-            for turn_point in row.turn_points:
-                # 一致する点がある場合
-                if coord == turn_point:
-                    geometrys.append(coords[cut_start:cut_end])
-                    slice_ranges.append((cut_start, cut_end))
-                    # turn_pointsから削除
-                    turn_points.remove(turn_point)
-                    cut_start = cut_end - 1
-                    break
-        geometrys.append(coords[cut_start:cut_end])
-        slice_ranges.append((cut_start, cut_end))
 
+def split(gdf: GeoDataFrame, plane_epsg_code: int) -> GeoDataFrame:
+    # 分割するエッジの行番号と、座標の分割範囲を先に全て求める
+    positions = []
+    split_ranges = []
+    for position, (geometry, turn_points) in enumerate(zip(gdf.geometry.values, gdf["turn_points"].values)):
+        if len(turn_points) == 0:
+            continue
+        slice_ranges = generate_slice_ranges(list(geometry.coords), turn_points)
         ## 1件だけなら何もしない。多分この判定は使われなさそうだけど念の為。
-        if len(geometrys) == 1:
+        if len(slice_ranges) == 1:
             continue
+        positions.append(position)
+        split_ranges.append(slice_ranges)
+    if len(positions) == 0:
+        return gdf
+
+    # 分割したエッジの行をまとめて作る
+    pieces = gdf.iloc[np.repeat(positions, [len(slice_ranges) for slice_ranges in split_ranges])].copy()
+    new_node_id = max(NEW_NODE_ID_START, generate_max_node_id(gdf) + 1)
+    new_index = []
+    geometries = []
+    geo_lists = []
+    geo_meter_lists = []
+    for position, slice_ranges in zip(positions, split_ranges):
+        st_node, ed_node, _ = gdf.index[position]
+        coords = list(gdf.geometry.values[position].coords)
+        geo_list = gdf["geometry_list"].values[position]
+        geo_meter_list = gdf["geometry_meter_list"].values[position]
+        # 分割点には全体で重複しないnode_idを割り振る
+        nodes = [st_node, *range(new_node_id, new_node_id + len(slice_ranges) - 1), ed_node]
+        new_node_id += len(slice_ranges) - 1
+        for i, (s, e) in enumerate(slice_ranges):
+            new_index.append((nodes[i], nodes[i + 1], 0))
+            geometries.append(sp.LineString(coords[s:e]))
+            geo_lists.append(geo_list[s:e])
+            geo_meter_lists.append(geo_meter_list[s:e])
+
+    pieces.index = pd.MultiIndex.from_tuples(new_index, names=gdf.index.names)
+    pieces[gdf.geometry.name] = GeoSeries(geometries, index=pieces.index, crs=gdf.crs)
+    pieces["length"] = projection_service.line_lengths(geometries, plane_epsg_code)
+    pieces["geometry_list"] = geo_lists
+    pieces["geometry_meter_list"] = geo_meter_lists
+
+    # 元の行を削除し、分割した行を末尾に追加する
+    keep = np.ones(len(gdf), dtype=bool)
+    keep[positions] = False
+    return pd.concat([gdf[keep], pieces])
+
+
+# 座標を曲がり角のポイント毎に分割した範囲[(start, end), ...]を返す
+# 分割点の座標は前後の両方の範囲に含める
+def generate_slice_ranges(coords: list, turn_points: list) -> list[tuple[int, int]]:
+    remaining = Counter(tuple(turn_point) for turn_point in turn_points)
+    slice_ranges = []
+    cut_start = 0
+    for coord_i, coord in enumerate(coords):
+        # 一致する点がある場合
+        if remaining[coord] > 0:
+            remaining[coord] -= 1
+            slice_ranges.append((cut_start, coord_i + 1))
+            cut_start = coord_i
+    slice_ranges.append((cut_start, len(coords)))
+    return slice_ranges
 
-        geo_list = row["geometry_list"]
-        geo_meter_list = row["geometry_meter_list"]
 
-        # 分割したGeometryにあわせてGeoDataFrame更新する
-        st_node = index[0]
-        ## osmのnode_idとかぶらなさそうなIDを割り振る
-        new_node_id = 100000000000
-        ed_node = new_node_id
-        for i, geometry in enumerate(geometrys):
-            new_index = (st_node, ed_node, 0)
-            new_row = row.copy()
-            new_row.geometry = sp.LineString(geometry)
-            new_row.length = get_cartesian_length_from_coordinate(new_row.geometry)
-            s, e = slice_ranges[i]
-            new_row["geometry_list"] = geo_list[s:e]
-            new_row["geometry_meter_list"] = geo_meter_list[s:e]
-            gdf.loc[new_index] = new_row
-            st_node = ed_node
-            ## iが最後のindexでない場合は新しいnode_idを割り振る
-            if i != len(geometrys) - 1:
-                ed_node = new_node_id
-                new_node_id += 1
-            else:
-                ed_node = index[1]
-        ## 元の行を削除
-        gdf.drop(index, inplace=True)
-    return gdf
+def generate_max_node_id(gdf: GeoDataFrame) -> int:
+    if len(gdf) == 0:
+        return 0
+    return int(max(gdf.index.get_level_values(0).max(), gdf.index.get_level_values(1).max()))
 
 
-def get_cartesian_length_from_coordinate(line_string: sp.LineString) -> int:
-    # MEMO: 東京の平面直角座標のEPSGだが本当によいのか？値はそれっぽいが。
-    # https://lemulus.me/column/epsg-list-gis
-    transformer = proj.Transformer.from_crs(4326, 6677)
-    # LineString内のpyprojが扱える形式に変換(y(経度), x(緯度))する
-    trans_coords = transformer.itransform(line_string.coords, switch=True)
-    return sp.LineString(trans_coords).length
+def get_cartesian_length_from_coordinate(line_string: sp.LineString, plane_epsg_code: int) -> float:
+    # 県の平面直角座標系で長さ(m)を求める
+    return projection_service.to_plane_line(line_string, plane_epsg_code).length
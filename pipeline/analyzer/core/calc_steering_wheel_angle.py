@@ -110,4 +110,63 @@ def offset_point(p1, p2, p3, direction):
         p2_adjusted = np.array(p2) + v_perpendicular_unit * offset_distance
     elif direction == "right":
         p2_adjusted = np.array(p2) - v_perpendicular_unit * offset_distance
-    return p2_adjusted
\ No newline at end of file
+    return p2_adjusted
+
+# 方向をarrayで扱うためのコード
+DIRECTION_STRAIGHT = 0
+DIRECTION_LEFT = 1
+DIRECTION_RIGHT = -1
+DIRECTION_NAMES = {DIRECTION_STRAIGHT: "straight", DIRECTION_LEFT: "left", DIRECTION_RIGHT: "right"}
+
+# calc_steering_wheel_angleを3座標の組み合わせ全てに対してまとめて計算する
+# p1, p2, p3は平面直角座標系の(N, 2)のarrayであること
+# 戻り値はステアリング角、半径、方向コード(DIRECTION_*)のarray
+def calc_steering_wheel_angles(p1: np.ndarray
+                               , p2: np.ndarray
+                               , p3: np.ndarray
+                               , wheel_base: float
+                               , steering_ratio: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    p1 = np.asarray(p1, dtype=float)
+    p2 = np.asarray(p2, dtype=float)
+    p3 = np.asarray(p3, dtype=float)
+
+    # 3点の方向を計算
+    det = (p2[:, 0] - p1[:, 0]) * (p3[:, 1] - p2[:, 1]) - (p2[:, 1] - p1[:, 1]) * (p3[:, 0] - p2[:, 0])
+    direction = np.sign(det).astype(np.int8)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # p2をp1p3に垂直にオフセットする
+        v = p3 - p1
+        distance_p1_p3 = np.sqrt(v[:, 0] ** 2 + v[:, 1] ** 2)
+        offset_distance = np.where(distance_p1_p3 > 10, 0.7 / np.sqrt(distance_p1_p3 / 10), 0.7)
+        v_perpendicular = np.stack([-v[:, 1], v[:, 0]], axis=1)
+        v_perpendicular_unit = v_perpendicular / distance_p1_p3[:, None]
+        distance_to_line = np.abs(np.sum(v_perpendicular_unit * (p2 - p1), axis=1))
+        offset_distance = np.where(offset_distance > distance_to_line, distance_to_line * 0.8, offset_distance)
+        p2 = np.where((direction == DIRECTION_STRAIGHT)[:, None], p2, p2 + v_perpendicular_unit * (offset_distance * direction)[:, None])
+
+        # 3点を通る円の中心と半径を計算
+        temp = p2[:, 0] ** 2 + p2[:, 1] ** 2
+        bc = (p1[:, 0] ** 2 + p1[:, 1] ** 2 - temp) / 2
+        cd = (temp - p3[:, 0] ** 2 - p3[:, 1] ** 2) / 2
+        det = (p1[:, 0] - p2[:, 0]) * (p2[:, 1] - p3[:, 1]) - (p2[:, 0] - p3[:, 0]) * (p1[:, 1] - p2[:, 1])
+        cx = (bc * (p2[:, 1] - p3[:, 1]) - cd * (p1[:, 1] - p2[:, 1])) / det
+        cy = ((p1[:, 0] - p2[:, 0]) * cd - (p2[:, 0] - p3[:, 0]) * bc) / det
+        radius = np.sqrt((cx - p1[:, 0]) ** 2 + (cy - p1[:, 1]) ** 2)
+
+        # ステアリング切れ角を計算
+        angle = steering_angle(wheel_base, radius, steering_ratio)
+
+    # 3点が直線上にある場合はステアリング角を0とする
+    collinear = np.abs(det) < 1.0e-10
+    angle[collinear] = 0
+    radius[collinear] = 0
+    direction[collinear] = DIRECTION_STRAIGHT
+
+    # 一般的はステアリングがまっすぐの状態で左右に1.7回転切れる。よって片側の回転角度の最大値は612度。
+    # osmのラインの形状がおかしいと思われるので、一旦異常値として10度にしておく
+    abnormal = angle > 612
+    for i in np.flatnonzero(abnormal):
+        print(f"  🚨 ステアリング角が異常値です。ステアリング角: {angle[i]}, 座標: {p2[i]}")
+    angle[abnormal] = 10
+    return angle, radius, direction
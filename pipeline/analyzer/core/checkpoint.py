@@ -0,0 +1,164 @@
+import os
+import shutil
+import pickle
+import inspect
+from hashlib import sha1
+from pathlib import Path
+from typing import Callable
+
+from geopandas import GeoDataFrame
+
+from . import stage_profiler
+
+CHECKPOINT_DIR = Path(__file__).resolve().parents[3] / "data" / "checkpoints"
+
+
+# 解析の1ステージ。funcは前ステージのGeoDataFrameを受け取り、次ステージに渡すGeoDataFrameを返す。
+# modulesとfilesはステージの結果に影響するソースコードとファイル。変更があればステージを再計算する。
+# dataはステージが読む外部データ(DBのテーブル、Overpassのキャッシュ等)のバージョンを返す関数。返す値が変わればステージを再計算する。
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[GeoDataFrame | None], GeoDataFrame],
+        modules: list | None = None,
+        files: list[str] | None = None,
+        data: list[Callable[[], str]] | None = None,
+    ):
+        self.name = name
+        self.func = func
+        self.modules = modules or []
+        self.files = files or []
+        self.data = data or []
+
+    # ステージのバージョン(ステージ関数と依存モジュールのソース、依存ファイルの更新日時とサイズ、外部データのバージョンのハッシュ)
+    def version(self) -> str:
+        parts = [inspect.getsource(self.func)]
+        for module in self.modules:
+            parts.append(inspect.getsource(module))
+        for file in self.files:
+            if os.path.exists(file):
+                stat = os.stat(file)
+                parts.append(f"{file}:{stat.st_size}:{stat.st_mtime_ns}")
+        for generate_data_version in self.data:
+            parts.append(generate_data_version())
+        return sha1("|".join(parts).encode()).hexdigest()
+
+
+# 入力値からチェックポイントのキーを生成する
+def generate_input_key(*inputs) -> str:
+    parts = []
+    for x in inputs:
+        if hasattr(x, "wkb"):
+            parts.append(x.wkb.hex())
+        else:
+            parts.append(str(x))
+    return sha1("|".join(parts).encode()).hexdigest()
+
+
+# 全県のキー毎のディレクトリの合計がmax_bytesを超えた場合に、最終利用日時(ディレクトリの更新日時)の古いものから削除する(LRU)
+# 入力値(範囲、DEM、pbf、差分更新の範囲等)が変わる毎にキーが増えるので、上限がないと夜間の実行の度に増え続ける
+def evict(max_bytes: int, checkpoint_dir=CHECKPOINT_DIR, keep: Path | None = None) -> int:
+    entries = []
+    for key_dir in Path(checkpoint_dir).glob("*/*"):
+        try:
+            size = sum(path.stat().st_size for path in key_dir.iterdir())
+            mtime = key_dir.stat().st_mtime
+        except FileNotFoundError:
+            # 並列実行中に他のプロセスが削除した場合
+            continue
+        entries.append((mtime, size, key_dir))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, key_dir in sorted(entries, key=lambda x: x[0]):
+        if total <= max_bytes:
+            break
+        if keep is not None and key_dir == keep:
+            continue
+        shutil.rmtree(key_dir, ignore_errors=True)
+        total -= size
+        evicted += 1
+    if evicted:
+        print(f"  🧹 Checkpoint evicted: {evicted} dirs ({round(total / 1024 ** 3, 2)}GB left)")
+    return evicted
+
+
+# ステージ毎の出力をチェックポイントとして保存し、最後に有効なチェックポイントから処理を再開する
+# チェックポイントのキーは「前ステージのキー + ステージ名 + ステージのバージョン」のハッシュなので、
+# スコアの計算式だけを変えた場合はスコアのステージ以降だけが再計算される。
+# 同じく、locationsが更新された場合はlocationsのステージ以降、Overpassのキャッシュを取得し直した場合はそのグラフを使うステージ以降が再計算される。
+# max_bytesを指定した場合は、実行後に全県のチェックポイントの合計が上限以下になるまで古いキーのディレクトリを削除する。
+class StageRunner:
+    def __init__(self, prefecture_code: str, input_key: str, enabled: bool = True, refresh: bool = False, max_bytes: int | None = None):
+        self.checkpoint_dir = CHECKPOINT_DIR / prefecture_code / input_key[:16]
+        self.prefecture_code = prefecture_code
+        self.input_key = input_key
+        self.enabled = enabled
+        self.refresh = refresh
+        self.max_bytes = max_bytes
+
+    def run(self, stages: list[Stage]) -> GeoDataFrame:
+        # 各ステージのキーを求める(チェックポイントを使わない場合は外部データのバージョンも問い合わせない)
+        plan = []
+        key = self.input_key
+        for i, stage in enumerate(stages):
+            if self.enabled:
+                key = sha1(f"{key}|{stage.name}|{stage.version()}".encode()).hexdigest()
+            plan.append((i, stage, key))
+
+        # 後ろから有効なチェックポイントを探す
+        gdf = None
+        start = 0
+        if self.enabled and not self.refresh:
+            for i, stage, key in reversed(plan):
+                gdf = self._load(i, stage, key)
+                if gdf is not None:
+                    print(f"  📦 Checkpoint hit: {stage.name} ({key[:12]})")
+                    start = i + 1
+                    break
+
+        for i, stage, key in plan[start:]:
+            if gdf is not None and gdf.empty:
+                break
+            # ステージ毎の実行時間、メモリ、行数を計測する
+            with stage_profiler.measure(stage.name, self.prefecture_code, rows_in=len(gdf) if gdf is not None else None) as measurement:
+                gdf = stage.func(gdf)
+                measurement["rows_out"] = len(gdf)
+            if self.enabled:
+                self._save(i, stage, key, gdf)
+
+        if self.enabled:
+            # 最終利用日時を更新してから上限を超えた分を削除する
+            if self.checkpoint_dir.exists():
+                os.utime(self.checkpoint_dir)
+            if self.max_bytes is not None:
+                evict(self.max_bytes, self.checkpoint_dir.parents[1], keep=self.checkpoint_dir)
+
+        if gdf.empty:
+            print("gdf_edges is empty. exit process.")
+        return gdf
+
+    def _path(self, i: int, stage: Stage, key: str) -> Path:
+        return self.checkpoint_dir / f"{i:02d}_{stage.name}_{key}.pkl"
+
+    def _load(self, i: int, stage: Stage, key: str) -> GeoDataFrame | None:
+        path = self._path(i, stage, key)
+        if not path.exists():
+            return None
+        try:
+            return pickle.loads(path.read_bytes())
+        except Exception as e:
+            # 書き込み途中で落ちた等で壊れている場合は削除して前のチェックポイントを探す
+            print(f"  ⚠️ Broken checkpoint: {path.name} ({type(e).__name__})")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _save(self, i: int, stage: Stage, key: str, gdf: GeoDataFrame):
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        # 同じステージの古いチェックポイントを削除する
+        for old_path in self.checkpoint_dir.glob(f"{i:02d}_{stage.name}_*.pkl"):
+            old_path.unlink(missing_ok=True)
+        path = self._path(i, stage, key)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(pickle.dumps(gdf))
+        os.replace(tmp_path, path)
@@ -1,15 +1,123 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+import io
+import csv
+import uuid
+import weakref
+from contextlib import contextmanager
+from functools import cache
+
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# analyzer, centerline, postprocessで共通して使うDBアクセス層
+# 接続はプロセス毎にプールして使い回す。接続先は環境変数で上書きできる。
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", "5432")),
+    "dbname": os.getenv("DB_NAME", "speedia"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "postgres"),
+}
+# プールする接続数
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 5)
+# サーバーサイドカーソルで1回に取得する行数
+STREAM_ITERSIZE = 10000
+# 接続毎に登録済みのプリペアドステートメント名
+_prepared_names = weakref.WeakKeyDictionary()
+
+
+def get_url() -> str:
+    return f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
+
+
+# SQLAlchemyのエンジン。プロセス内で1つだけ生成し、接続はエンジンのプールから取得する。
+@cache
+def get_engine():
+    from sqlalchemy import create_engine
+    return create_engine(get_url(), pool_size=POOL_SIZE, max_overflow=POOL_SIZE, pool_pre_ping=True)
+
+
+@cache
+def _get_sessionmaker():
+    from sqlalchemy.orm import sessionmaker
+    return sessionmaker(bind=get_engine())
+
 
 def get_db_session():
-    username = "postgres"
-    password = "postgres"
-    dbname = "speedia"
-    host = "localhost"
-    port = "5432"
-    
-    # データベースエンジンとセッションのセットアップ
-    engine = create_engine(f"postgresql://{username}:{password}@{host}:{port}/{dbname}")
-    Session = sessionmaker(bind=engine)
-    
-    return Session()
\ No newline at end of file
+    # セッションを閉じると接続はプールに返される
+    return _get_sessionmaker()()
+
+
+# psycopg2の接続プール
+@cache
+def get_pool() -> ThreadedConnectionPool:
+    return ThreadedConnectionPool(1, POOL_SIZE, **DB_CONFIG)
+
+
+# プールから接続を借りる。正常終了ならcommit、例外ならrollbackしてプールに返す。
+@contextmanager
+def get_connection():
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+# サーバーサイドカーソルで大きな結果を少しずつ取得する
+# 全件をクライアントのメモリに載せずにitersize行ずつ受け取る。トランザクション内でのみ使える。
+def stream(conn, query: str, params=None, itersize: int = STREAM_ITERSIZE, cursor_factory=None):
+    with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=cursor_factory) as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+        yield from cur
+
+
+# 繰り返し実行するクエリをプリペアドステートメントとして登録する(接続毎に1回だけ)
+# queryのパラメータは$1, $2...で記述する
+def prepare(cur, name: str, query: str):
+    names = _prepared_names.setdefault(cur.connection, set())
+    if name in names:
+        return
+    cur.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (name,))
+    if cur.fetchone() is None:
+        cur.execute(f"PREPARE {name} AS {query}")
+    names.add(name)
+
+
+def execute_prepared(cur, name: str, params: tuple):
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}", params)
+
+
+# COPYで行をまとめてテーブルに書き込む
+def copy_rows(cur, table: str, columns: list[str], rows) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if x is None else x for x in row])
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+# COPYで一時テーブルに書き込んでから1回のUPDATEでまとめて更新する
+# columnsは一時テーブルの{列名: 型}、set_columnsは{更新する列: 一時テーブル(s)の値}、whereはtableをt、一時テーブルをsとした結合条件。
+def copy_update(cur, table: str, columns: dict[str, str], rows, set_columns: dict[str, str], where: str) -> int:
+    tmp_table = f"tmp_{uuid.uuid4().hex[:16]}"
+    cur.execute(
+        f"CREATE TEMP TABLE {tmp_table} ({', '.join(f'{name} {type}' for name, type in columns.items())}) ON COMMIT DROP"
+    )
+    copy_rows(cur, tmp_table, list(columns.keys()), rows)
+    cur.execute(f"ANALYZE {tmp_table}")
+    cur.execute(
+        f"UPDATE {table} t SET {', '.join(f'{name} = {value}' for name, value in set_columns.items())} "
+        f"FROM {tmp_table} s WHERE {where}"
+    )
+    return cur.rowcount
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import hashlib
+from pathlib import Path
+
+import rasterio
+import rasterio.shutil
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import calculate_default_transform, Resampling
+from rasterio.windows import Window
+from pyproj import CRS
+
+# 標高TIFを解析用のCOG(EPSG:4326, タイル化, 圧縮, オーバービュー付き)に変換する
+# 元のTIFは上書きせず、別ファイル(elevation.cog.tif)に書き出す。変換はウィンドウ毎に行うので全国のTIFでもメモリに載せない。
+# 変換元のSHA-256をelevation.cog.tif.jsonに記録し、変換元が変わっていなければ変換を省略する。
+# usage: cd pipeline && python -m analyzer.core.dem_prepare [変換元のTIF] [--force]
+
+SOURCE_TIF_PATH = Path(__file__).resolve().parents[3] / "data" / "elevation.tif"
+DST_CRS = "EPSG:4326"
+# 変換処理を変えた場合は上げる(変換済みのCOGを作り直す)
+PREPARE_VERSION = 1
+# 1回に変換するウィンドウのサイズ(px)
+CHUNK_SIZE = 4096
+# COGのタイルサイズ(px)
+BLOCK_SIZE = 512
+# チェックサムを計算する時に1回に読むバイト数
+HASH_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def get_prepared_path(source_path) -> str:
+    source_path = str(source_path)
+    return f"{os.path.splitext(source_path)[0]}.cog.tif"
+
+
+def get_manifest_path(source_path) -> str:
+    return f"{get_prepared_path(source_path)}.json"
+
+
+# 変換済みのCOGのパスを返す。変換されていない、または変換元が変わっている場合はエラーにする。
+# 解析ではこのパスだけを読み取り専用で開く。
+def get_checked_prepared_path(source_path) -> str:
+    if not is_prepared(source_path):
+        raise FileNotFoundError(
+            f"{get_prepared_path(source_path)} is not prepared. run: cd pipeline && python -m analyzer.core.dem_prepare {source_path}"
+        )
+    return get_prepared_path(source_path)
+
+
+# 変換済みのCOGが変換元と一致するか
+# サイズと更新日時が記録と同じなら一致とみなし、違う場合だけSHA-256を計算して比較する
+def is_prepared(source_path) -> bool:
+    prepared_path = get_prepared_path(source_path)
+    manifest_path = get_manifest_path(source_path)
+    if not os.path.exists(prepared_path) or not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != PREPARE_VERSION:
+        return False
+    stat = os.stat(source_path)
+    if manifest["size"] == stat.st_size and manifest["mtime_ns"] == stat.st_mtime_ns:
+        return True
+    if manifest["sha256"] != calculate_sha256(source_path):
+        return False
+    # 中身が同じなら更新日時だけ記録し直す
+    write_manifest(source_path, manifest["sha256"])
+    return True
+
+
+def calculate_sha256(path) -> str:
+    hash_object = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            hash_object.update(chunk)
+    return hash_object.hexdigest()
+
+
+def write_manifest(source_path, sha256: str) -> None:
+    stat = os.stat(source_path)
+    manifest = {
+        "version": PREPARE_VERSION,
+        "source": os.path.basename(str(source_path)),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": sha256,
+    }
+    tmp_path = f"{get_manifest_path(source_path)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, get_manifest_path(source_path))
+
+
+# 変換元のTIFをCOGに変換する。変換済みの場合は何もしない。
+def prepare(source_path=SOURCE_TIF_PATH, force: bool = False) -> str:
+    prepared_path = get_prepared_path(source_path)
+    if not force and is_prepared(source_path):
+        return prepared_path
+
+    print(f"🏔️ prepare {prepared_path}")
+    sha256 = calculate_sha256(source_path)
+    tiled_path = f"{prepared_path}.tiled.tmp.tif"
+    cog_path = f"{prepared_path}.tmp.tif"
+    try:
+        write_tiled(source_path, tiled_path)
+        # タイル化済みのファイルからCOGを作る(オーバービューもCOGドライバで作る)
+        rasterio.shutil.copy(
+            tiled_path,
+            cog_path,
+            driver="COG",
+            COMPRESS="DEFLATE",
+            PREDICTOR="YES",
+            BLOCKSIZE=BLOCK_SIZE,
+            OVERVIEWS="AUTO",
+            OVERVIEW_RESAMPLING="AVERAGE",
+            BIGTIFF="IF_SAFER",
+            NUM_THREADS="ALL_CPUS",
+        )
+        os.replace(cog_path, prepared_path)
+    finally:
+        for path in (tiled_path, cog_path):
+            if os.path.exists(path):
+                os.remove(path)
+    write_manifest(source_path, sha256)
+    return prepared_path
+
+
+# EPSG:4326のタイル化したTIFにウィンドウ毎に書き出す
+def write_tiled(source_path, tiled_path: str) -> None:
+    with rasterio.open(source_path) as src:
+        src_crs = src.crs
+        if src_crs is not None and CRS(src_crs).to_epsg() == 4326:
+            transform, width, height = src.transform, src.width, src.height
+        else:
+            epsg = CRS(src_crs).to_epsg() if src_crs else "unknown"
+            print(f"  EPSG: {epsg} → EPSG: 4326")
+            transform, width, height = calculate_default_transform(
+                src_crs, DST_CRS, src.width, src.height, *src.bounds
+            )
+        profile = src.profile.copy()
+        profile.update(
+            driver="GTiff",
+            crs=DST_CRS,
+            transform=transform,
+            width=width,
+            height=height,
+            count=1,
+            tiled=True,
+            blockxsize=BLOCK_SIZE,
+            blockysize=BLOCK_SIZE,
+            compress="deflate",
+            BIGTIFF="IF_SAFER",
+        )
+        with WarpedVRT(
+            src,
+            crs=DST_CRS,
+            transform=transform,
+            width=width,
+            height=height,
+            resampling=Resampling.nearest,
+        ) as vrt, rasterio.open(tiled_path, "w", **profile) as dst:
+            for row_off in range(0, height, CHUNK_SIZE):
+                for col_off in range(0, width, CHUNK_SIZE):
+                    window = Window(col_off, row_off, min(CHUNK_SIZE, width - col_off), min(CHUNK_SIZE, height - row_off))
+                    dst.write(vrt.read(1, window=window), 1, window=window)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    prepare(args[0] if args else SOURCE_TIF_PATH, force="--force" in sys.argv)
@@ -0,0 +1,79 @@
+import numpy as np
+import shapely
+from pyproj import Geod
+
+# WGS84楕円体上の測地線。geopyのgeodesicと同じKarneyのアルゴリズムをC実装で配列毎にまとめて計算する。
+GEOD = Geod(ellps="WGS84")
+# haversineで使う地球の平均半径(m)
+EARTH_RADIUS = 6371008.8
+
+
+# 2点間の距離(m)をまとめて求める。引数は経度、緯度の順でスカラーでもarrayでもよい。
+def distances(lons1, lats1, lons2, lats2) -> np.ndarray:
+    _, _, dist = GEOD.inv(
+        np.asarray(lons1, dtype=float), np.asarray(lats1, dtype=float),
+        np.asarray(lons2, dtype=float), np.asarray(lats2, dtype=float),
+    )
+    return np.asarray(dist)
+
+
+# 2点間の距離(m)。p1, p2は(経度, 緯度)
+def distance(p1, p2) -> float:
+    return float(distances(p1[0], p1[1], p2[0], p2[1]))
+
+
+# 隣接する座標間の距離(m)のarrayを求める。coordsは(経度, 緯度)の(N, 2)のarrayで、戻り値の長さはN-1
+def segment_distances(coords) -> np.ndarray:
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) < 2:
+        return np.zeros(0)
+    return distances(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+
+
+# 座標列の長さ(m)
+def path_length(coords) -> float:
+    return float(segment_distances(coords).sum())
+
+
+# LineStringの長さ(m)をまとめて求める
+def line_lengths(geometries) -> np.ndarray:
+    geometries = np.asarray(geometries, dtype=object)
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    lengths = np.zeros(len(geometries))
+    if len(coords) < 2:
+        return lengths
+    # 同じLineString内の隣接する座標間の距離だけを合計する
+    same_line = index[1:] == index[:-1]
+    dist = distances(coords[:-1, 0][same_line], coords[:-1, 1][same_line], coords[1:, 0][same_line], coords[1:, 1][same_line])
+    np.add.at(lengths, index[1:][same_line], dist)
+    return lengths
+
+
+# 2点間の方位角(度, 0: 北, 90: 東)を球面上でまとめて求める
+def bearings(lons1, lats1, lons2, lats2) -> np.ndarray:
+    lat1 = np.radians(lats1)
+    lat2 = np.radians(lats2)
+    d_lon = np.radians(np.asarray(lons2) - np.asarray(lons1))
+    x = np.sin(d_lon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(d_lon)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+# 指定した方位角に指定距離(m)だけ進んだ座標をまとめて求める。戻り値は(経度, 緯度)
+def destinations(lons, lats, distance_meters, bearing) -> tuple[np.ndarray, np.ndarray]:
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    distance_meters = np.broadcast_to(np.asarray(distance_meters, dtype=float), lons.shape)
+    bearing = np.broadcast_to(np.asarray(bearing, dtype=float), lons.shape)
+    dest_lons, dest_lats, _ = GEOD.fwd(lons, lats, bearing, distance_meters)
+    return np.asarray(dest_lons), np.asarray(dest_lats)
+
+
+# 球面近似(haversine)の2点間の距離(m)。楕円体との差は最大0.5%程度だが、大量の概算に使う
+def haversine_distances(lons1, lats1, lons2, lats2) -> np.ndarray:
+    lat1 = np.radians(lats1)
+    lat2 = np.radians(lats2)
+    d_lat = lat2 - lat1
+    d_lon = np.radians(np.asarray(lons2) - np.asarray(lons1))
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
@@ -16,6 +16,33 @@ def getEnv():
     CREATE_VIDEO = os.getenv("CREATE_VIDEO")
     CREATE_TERRAIN = os.getenv("CREATE_TERRAIN")
     REFRESH_CACHE = os.getenv("REFRESH_CACHE")
+    USE_CHECKPOINT = os.getenv("USE_CHECKPOINT")
+    CHECKPOINT_MAX_GB = os.getenv("CHECKPOINT_MAX_GB")
+    PARALLEL_WORKERS = os.getenv("PARALLEL_WORKERS")
+    PARALLEL_MEMORY_GB = os.getenv("PARALLEL_MEMORY_GB")
+    BUILDING_NEARBY_CNT_MODE = os.getenv("BUILDING_NEARBY_CNT_MODE")
+    DEM_INTERPOLATION = os.getenv("DEM_INTERPOLATION")
+    DEM_MMAP = os.getenv("DEM_MMAP")
+    DEM_CACHE_BLOCKS = os.getenv("DEM_CACHE_BLOCKS")
+    TARGET_LEGACY_JSON = os.getenv("TARGET_LEGACY_JSON")
+    INCREMENTAL = os.getenv("INCREMENTAL")
+    OSM_CHANGE_FILE = os.getenv("OSM_CHANGE_FILE")
+    OSM_SOURCE = os.getenv("OSM_SOURCE")
+    OSM_PBF_PATH = os.getenv("OSM_PBF_PATH")
+    OVERPASS_CACHE_TTL_DAYS = os.getenv("OVERPASS_CACHE_TTL_DAYS")
+    OVERPASS_CACHE_MAX_GB = os.getenv("OVERPASS_CACHE_MAX_GB")
+    OVERPASS_PREFETCH = os.getenv("OVERPASS_PREFETCH")
+    OVERPASS_PREFETCH_WORKERS = os.getenv("OVERPASS_PREFETCH_WORKERS")
+    OVERPASS_MAX_CONCURRENCY = os.getenv("OVERPASS_MAX_CONCURRENCY")
+    OVERPASS_MIN_INTERVAL_SECONDS = os.getenv("OVERPASS_MIN_INTERVAL_SECONDS")
+    OVERPASS_HEALTH_TTL_SECONDS = os.getenv("OVERPASS_HEALTH_TTL_SECONDS")
+    TILE_SIZE_DEGREE = os.getenv("TILE_SIZE_DEGREE")
+    TILE_OVERLAP_METERS = os.getenv("TILE_OVERLAP_METERS")
+    TILE_WORKERS = os.getenv("TILE_WORKERS")
+    PROFILE = os.getenv("PROFILE")
+    PROFILE_TRACE = os.getenv("PROFILE_TRACE")
+    PROFILE_STAGE = os.getenv("PROFILE_STAGE")
+    PROFILE_STAGE_PROFILER = os.getenv("PROFILE_STAGE_PROFILER")
     return {
         "USE_CUSTOM_AREA": True if USE_CUSTOM_AREA == "1" else False,
         "CUSTOM_AREA_POINT_ST": CUSTOM_AREA_POINT_ST.replace(" ", "").split(","),
@@ -27,4 +54,31 @@ def getEnv():
         "CREATE_VIDEO": True if CREATE_VIDEO == "1" else False,
         "CREATE_TERRAIN": True if CREATE_TERRAIN == "1" else False,
         "REFRESH_CACHE": True if REFRESH_CACHE == "1" else False,
+        "USE_CHECKPOINT": True if USE_CHECKPOINT == "1" else False,
+        "CHECKPOINT_MAX_GB": float(CHECKPOINT_MAX_GB) if CHECKPOINT_MAX_GB else None,
+        "PARALLEL_WORKERS": int(PARALLEL_WORKERS) if PARALLEL_WORKERS else 1,
+        "PARALLEL_MEMORY_GB": float(PARALLEL_MEMORY_GB) if PARALLEL_MEMORY_GB else None,
+        "BUILDING_NEARBY_CNT_MODE": BUILDING_NEARBY_CNT_MODE if BUILDING_NEARBY_CNT_MODE in ("db", "local") else "db",
+        "DEM_INTERPOLATION": DEM_INTERPOLATION if DEM_INTERPOLATION in ("nearest", "bilinear") else "nearest",
+        "DEM_MMAP": True if DEM_MMAP == "1" else False,
+        "DEM_CACHE_BLOCKS": int(DEM_CACHE_BLOCKS) if DEM_CACHE_BLOCKS else 256,
+        "TARGET_LEGACY_JSON": False if TARGET_LEGACY_JSON == "0" else True,
+        "INCREMENTAL": True if INCREMENTAL == "1" else False,
+        "OSM_CHANGE_FILE": OSM_CHANGE_FILE or None,
+        "OSM_SOURCE": OSM_SOURCE if OSM_SOURCE in ("overpass", "pbf") else "overpass",
+        "OSM_PBF_PATH": OSM_PBF_PATH or "data/japan-latest.osm.pbf",
+        "OVERPASS_CACHE_TTL_DAYS": float(OVERPASS_CACHE_TTL_DAYS) if OVERPASS_CACHE_TTL_DAYS else None,
+        "OVERPASS_CACHE_MAX_GB": float(OVERPASS_CACHE_MAX_GB) if OVERPASS_CACHE_MAX_GB else None,
+        "OVERPASS_PREFETCH": True if OVERPASS_PREFETCH == "1" else False,
+        "OVERPASS_PREFETCH_WORKERS": int(OVERPASS_PREFETCH_WORKERS) if OVERPASS_PREFETCH_WORKERS else 2,
+        "OVERPASS_MAX_CONCURRENCY": int(OVERPASS_MAX_CONCURRENCY) if OVERPASS_MAX_CONCURRENCY else 2,
+        "OVERPASS_MIN_INTERVAL_SECONDS": float(OVERPASS_MIN_INTERVAL_SECONDS) if OVERPASS_MIN_INTERVAL_SECONDS else 1.0,
+        "OVERPASS_HEALTH_TTL_SECONDS": float(OVERPASS_HEALTH_TTL_SECONDS) if OVERPASS_HEALTH_TTL_SECONDS else 300.0,
+        "TILE_SIZE_DEGREE": float(TILE_SIZE_DEGREE) if TILE_SIZE_DEGREE else None,
+        "TILE_OVERLAP_METERS": float(TILE_OVERLAP_METERS) if TILE_OVERLAP_METERS else 1000.0,
+        "TILE_WORKERS": int(TILE_WORKERS) if TILE_WORKERS else 1,
+        "PROFILE": True if PROFILE == "1" else False,
+        "PROFILE_TRACE": True if PROFILE_TRACE == "1" else False,
+        "PROFILE_STAGE": PROFILE_STAGE or None,
+        "PROFILE_STAGE_PROFILER": PROFILE_STAGE_PROFILER if PROFILE_STAGE_PROFILER in ("cprofile", "pyinstrument") else "cprofile",
     }
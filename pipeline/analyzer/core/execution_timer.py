@@ -2,30 +2,36 @@ import time
 
 from enum import Enum
 
+from . import stage_profiler
+
 
 class ExecutionType(Enum):
     FETCH = 1
     PROC = 2
 
 
+# 区間毎の実行時間を表示し、stage_profilerに記録する(prefecture_codeは記録に付ける県コード)
 class ExecutionTimer:
     fetch_time = 0
     execution_time = 0
     execution_type = ExecutionType.PROC
 
-    def __init__(self):
+    def __init__(self, prefecture_code: str | None = None):
         self.first_time = time.time()
+        self.prefecture_code = prefecture_code
 
     def start(self, msg: str, execution_type: ExecutionType = ExecutionType.PROC):
         print("[st] " + msg)
         self.start_time = time.time()
         self.msg = msg
         self.execution_type = execution_type
+        self.measurement = stage_profiler.start(msg, self.prefecture_code, execution_type=execution_type.name)
 
-    def stop(self):
+    def stop(self, rows: int | None = None):
+        record = stage_profiler.stop(self.measurement, rows_out=rows)
         # 数値と文字列を結合して表示する
         execution_time = round(time.time() - self.start_time, 4)
-        print("  ⏰ " + str(execution_time) + " seconds")
+        print("  ⏰ " + str(execution_time) + " seconds (cpu " + str(record["cpu_seconds"]) + " seconds, peak rss +" + str(record["peak_rss_delta_mb"]) + " MB)")
         print("[ed] " + self.msg)
         if self.execution_type == ExecutionType.FETCH:
             self.fetch_time += execution_time
@@ -37,3 +43,8 @@ class ExecutionTimer:
         print("  ⏰ total: " + str(round(time.time() - self.first_time, 4)) + " seconds")
         print("  🛠️ proc : " + str(round(self.execution_time, 4)) + " seconds")
         print("  📦 fetch: " + str(round(self.fetch_time, 4)) + " seconds")
+        print("  🧠 peak rss: " + str(round(stage_profiler.get_peak_rss_mb(), 1)) + " MB")
+        # PROFILE=1の場合はここまでの計測結果を書き出す
+        profile_path = stage_profiler.write(self.prefecture_code)
+        if profile_path is not None:
+            print("  📊 profile: " + str(profile_path))
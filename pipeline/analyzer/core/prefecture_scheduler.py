@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from .epsg_service import generate_epsg_code
+from .prefecture_polygon import find_prefecture_polygon
+from ..analysis import overpass_fallback
+
+# 1県あたりの推定メモリ使用量(GB) = ベース + 探索ポリゴンの面積(度^2) × 係数
+# 北海道(約10度^2)は20GB強、長野(約1.5度^2)は4.5GB前後、香川(約0.2度^2)は2GB弱を見込む
+BASE_MEMORY_GB = 1.5
+MEMORY_GB_PER_SQUARE_DEGREE = 2.0
+# メモリ上限が未設定の場合に使う物理メモリの割合
+DEFAULT_MEMORY_RATIO = 0.8
+
+
+# ポリゴンの面積から1県の処理に必要なメモリ量(GB)を見積もる
+def estimate_memory_gb(search_area_polygon) -> float:
+    return BASE_MEMORY_GB + search_area_polygon.area * MEMORY_GB_PER_SQUARE_DEGREE
+
+
+# 物理メモリの総量(GB)を取得する
+def get_total_memory_gb() -> float:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**3
+
+
+# 1県分の解析を行う。子プロセスで実行され、標準出力は県毎のログファイルに書き出す。
+def run_prefecture(prefecture_name: str, prefecture_code: str, prefectures_geojson_path: str, log_path: str, cache_folder: str, incremental_mode: bool = False, change_file: str | None = None) -> dict:
+    import osmnx as ox
+    from ..main import main
+    from .. import incremental
+
+    ox.settings.cache_folder = cache_folder
+    started_at = time.time()
+    result = {
+        "prefecture_name": prefecture_name,
+        "prefecture_code": prefecture_code,
+        "status": "success",
+        "seconds": 0,
+        "rows": 0,
+        "log_path": log_path,
+        "error": None,
+    }
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "w") as log_file, redirect_stdout(log_file), redirect_stderr(log_file):
+        try:
+            plane_epsg_code = generate_epsg_code(prefecture_name)
+            print(f"  prefecture_name: {prefecture_name}, prefecture_code: {prefecture_code}, plane_epsg_code: {plane_epsg_code}")
+            search_area_polygon = find_prefecture_polygon(prefectures_geojson_path, prefecture_name)
+            if incremental_mode:
+                # 差分更新の場合は置き換えたルート数
+                result["rows"] = incremental.run(search_area_polygon, plane_epsg_code, prefecture_code, change_file)["added"]
+            else:
+                gdf = main(search_area_polygon, plane_epsg_code, prefecture_code)
+                result["rows"] = len(gdf)
+        except Exception as e:
+            traceback.print_exc()
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = round(time.time() - started_at, 4)
+        print(f"  ⏰ prefecture total: {result['seconds']} seconds")
+    return result
+
+
+# 全都道府県をプロセスプールで並列に解析する
+# メモリ見積もりの大きい県から順に投入し、実行中の見積もり合計がメモリ上限を超えない範囲で次の県を投入する。
+def run_all(prefecture_codes: dict, prefectures_geojson_path: str, cache_folder: str, workers: int, memory_gb: float | None = None, incremental_mode: bool = False, change_file: str | None = None) -> list[dict]:
+    if memory_gb is None:
+        memory_gb = get_total_memory_gb() * DEFAULT_MEMORY_RATIO
+
+    started_at = time.time()
+    run_id = datetime.now().strftime('%Y-%m-%d-%H-%M')
+    log_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../../data/logs/{run_id}"
+    os.makedirs(log_dir, exist_ok=True)
+
+    # 県毎のメモリ使用量を見積もり、大きい順に並べる
+    pending = []
+    polygons = {}
+    for prefecture_name, prefecture_code in prefecture_codes.items():
+        search_area_polygon = find_prefecture_polygon(prefectures_geojson_path, prefecture_name)
+        polygons[prefecture_name] = search_area_polygon
+        pending.append((prefecture_name, prefecture_code, estimate_memory_gb(search_area_polygon)))
+    pending.sort(key=lambda x: x[2], reverse=True)
+
+    print(f"[parallel] workers: {workers}, memory limit: {round(memory_gb, 1)}GB, log: {log_dir}")
+    results = []
+    running = {}
+    # spawnで起動してfork時のGDAL/スレッド状態の引き継ぎを避ける。1県毎にプロセスを作り直してメモリを解放する。
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        while pending or running:
+            # 見積もりがメモリ上限に収まる県を投入する。実行中の県がない場合は上限を超えていても1県だけ投入する。
+            used_memory_gb = sum(memory for _, _, memory in running.values())
+            for item in list(pending):
+                if len(running) >= workers:
+                    break
+                prefecture_name, prefecture_code, memory = item
+                if running and used_memory_gb + memory > memory_gb:
+                    continue
+                log_path = f"{log_dir}/{prefecture_code}.log"
+                future = executor.submit(run_prefecture, prefecture_name, prefecture_code, prefectures_geojson_path, log_path, cache_folder, incremental_mode, change_file)
+                running[future] = item
+                used_memory_gb += memory
+                pending.remove(item)
+                print(f"[st] {prefecture_name}({prefecture_code}) estimated memory: {round(memory, 1)}GB")
+
+            # 実行中に次に投入する県のグラフを取得しておく(差分更新は最新のグラフとの比較のため行わない)
+            # 先読み中のグラフを県のプロセスが取得する場合は、overpass_cacheのキー毎のロックで先読みが終わるのを待つ
+            if pending and not incremental_mode:
+                overpass_fallback.prefetch_graphs(polygons[pending[0][0]])
+
+            done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                prefecture_name, prefecture_code, _ = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 子プロセスが落ちた場合(メモリ不足によるkill等)
+                    result = {
+                        "prefecture_name": prefecture_name,
+                        "prefecture_code": prefecture_code,
+                        "status": "failed",
+                        "seconds": 0,
+                        "rows": 0,
+                        "log_path": f"{log_dir}/{prefecture_code}.log",
+                        "error": f"{type(e).__name__}: {e}",
+                    }
+                results.append(result)
+                status = "✅" if result["status"] == "success" else "❌"
+                print(f"[ed] {status} {prefecture_name}({prefecture_code}) ⏰ {result['seconds']} seconds, 📑 row: {result['rows']}")
+
+    overpass_fallback.shutdown_prefetch()
+    results.sort(key=lambda x: x["prefecture_code"])
+    print_summary(results, time.time() - started_at)
+    with open(f"{log_dir}/summary.json", "w") as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+    return results
+
+
+def print_summary(results: list[dict], wall_seconds: float):
+    print("[summary] 🎉")
+    for result in results:
+        status = "✅" if result["status"] == "success" else "❌"
+        line = f"  {status} {result['prefecture_code']} {result['prefecture_name']}: {result['seconds']} seconds, 📑 row: {result['rows']}"
+        if result["error"]:
+            line += f", error: {result['error']} (log: {result['log_path']})"
+        print(line)
+    failed = [result for result in results if result["status"] != "success"]
+    print(f"  success: {len(results) - len(failed)}, failed: {len(failed)}")
+    print("  ⏰ total: " + str(round(wall_seconds, 4)) + " seconds")
+    print("  ⏰ sum of prefectures: " + str(round(sum(result["seconds"] for result in results), 4)) + " seconds")
@@ -0,0 +1,60 @@
+from functools import cache
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+WGS84_EPSG_CODE = 4326
+# 平面直角座標系のEPSGが決まらない場合(任意範囲で県が特定できない等)は従来通り東京(第IX系)を使う
+DEFAULT_PLANE_EPSG_CODE = 6677
+
+
+# 座標系の組み合わせ毎にTransformerを1つだけ生成して使い回す
+# always_xy=Trueの場合は緯度経度を(経度, 緯度)、平面直角座標を(東西方向, 南北方向)の順で扱う
+@cache
+def get_transformer(from_epsg_code: int, to_epsg_code: int, always_xy: bool = True) -> Transformer:
+    return Transformer.from_crs(from_epsg_code, to_epsg_code, always_xy=always_xy)
+
+
+def _plane(plane_epsg_code: int | str | None) -> int:
+    return int(plane_epsg_code) if plane_epsg_code else DEFAULT_PLANE_EPSG_CODE
+
+
+# 経度と緯度のarrayを平面直角座標(m)にまとめて変換する
+def to_plane(lons, lats, plane_epsg_code: int | str | None) -> tuple[np.ndarray, np.ndarray]:
+    transformer = get_transformer(WGS84_EPSG_CODE, _plane(plane_epsg_code))
+    xs, ys = transformer.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    return np.asarray(xs), np.asarray(ys)
+
+
+# 平面直角座標(m)のarrayを経度と緯度にまとめて変換する
+def to_lonlat(xs, ys, plane_epsg_code: int | str | None) -> tuple[np.ndarray, np.ndarray]:
+    transformer = get_transformer(_plane(plane_epsg_code), WGS84_EPSG_CODE)
+    lons, lats = transformer.transform(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+    return np.asarray(lons), np.asarray(lats)
+
+
+# (経度, 緯度)の(N, 2)のarrayを(東西方向, 南北方向)の(N, 2)のarrayに変換する
+def to_plane_coords(coords: np.ndarray, plane_epsg_code: int | str | None) -> np.ndarray:
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    xs, ys = to_plane(coords[:, 0], coords[:, 1], plane_epsg_code)
+    return np.column_stack([xs, ys])
+
+
+# 緯度経度のLineStringを平面直角座標のLineStringに変換する
+def to_plane_line(line: shapely.LineString, plane_epsg_code: int | str | None) -> shapely.LineString:
+    return shapely.LineString(to_plane_coords(shapely.get_coordinates(line), plane_epsg_code))
+
+
+# 緯度経度のLineStringの平面直角座標系での長さ(m)をまとめて求める
+def line_lengths(geometries, plane_epsg_code: int | str | None) -> np.ndarray:
+    geometries = np.asarray(geometries, dtype=object)
+    coords, index = shapely.get_coordinates(geometries, return_index=True)
+    lengths = np.zeros(len(geometries))
+    if len(coords) < 2:
+        return lengths
+    xy = to_plane_coords(coords, plane_epsg_code)
+    # 同じLineString内の隣接する座標間の距離だけを合計する
+    same_line = index[1:] == index[:-1]
+    segment_lengths = np.hypot(*(xy[1:] - xy[:-1]).T)
+    np.add.at(lengths, index[1:][same_line], segment_lengths[same_line])
+    return lengths
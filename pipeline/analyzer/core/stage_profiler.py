@@ -0,0 +1,169 @@
+import os
+import csv
+import sys
+import json
+import time
+import resource
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+
+from .env import getEnv
+
+PROFILE_DIR = Path(__file__).resolve().parents[3] / "data" / "profiles"
+CSV_COLUMNS = [
+    "prefecture_code", "name", "kind", "type", "pid", "started_at", "wall_seconds", "cpu_seconds",
+    "peak_rss_mb", "peak_rss_delta_mb", "rows_in", "rows_out", "rows_per_second",
+]
+
+# ステージ毎の計測結果(プロセス毎に溜めて、県の解析の終わりにwriteで書き出す)
+_records: list[dict] = []
+
+
+# プロセスの最大RSS(MB)。Linuxはru_maxrssがKB、macOSはバイト
+def get_peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+# 計測を開始する。kind: "stage"(StageRunnerのステージ) / "step"(ExecutionTimerの区間)
+# PROFILE_STAGEと同じ名前のステージはcProfile(またはpyinstrument)で関数毎の時間も計測する
+def start(name: str, prefecture_code: str | None = None, kind: str = "step", execution_type: str = "PROC", rows_in: int | None = None) -> dict:
+    measurement = {
+        "prefecture_code": prefecture_code or "",
+        "name": name,
+        "kind": kind,
+        "type": execution_type,
+        "pid": os.getpid(),
+        "started_at": time.time(),
+        "rows_in": rows_in,
+        "rows_out": None,
+        "_wall": time.perf_counter(),
+        "_cpu": time.process_time(),
+        "_rss": get_peak_rss_mb(),
+        "_profiler": None,
+    }
+    env = getEnv()
+    if kind == "stage" and env["PROFILE_STAGE"] == name:
+        measurement["_profiler"] = _start_profiler(env["PROFILE_STAGE_PROFILER"])
+    return measurement
+
+
+# 計測を終了して結果を記録する
+# CPU時間はプロセス全体(全スレッド)の時間で、子プロセスの時間は含まない
+# peak_rss_delta_mbは区間中に最大RSSが増えた量(最大RSSは減らないので、それまでの最大を超えた分だけが計上される)
+def stop(measurement: dict, rows_out: int | None = None) -> dict:
+    wall_seconds = time.perf_counter() - measurement.pop("_wall")
+    cpu_seconds = time.process_time() - measurement.pop("_cpu")
+    peak_rss_mb = get_peak_rss_mb()
+    profiler = measurement.pop("_profiler")
+    record = {
+        **{k: v for k, v in measurement.items() if not k.startswith("_")},
+        "wall_seconds": round(wall_seconds, 4),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "peak_rss_delta_mb": round(max(0.0, peak_rss_mb - measurement.pop("_rss")), 1),
+    }
+    if rows_out is not None:
+        record["rows_out"] = rows_out
+    # 入力がある場合は入力の行数、ない場合(最初のステージ)は出力の行数で1秒あたりの処理行数を求める
+    rows = record["rows_in"] if record["rows_in"] is not None else record["rows_out"]
+    record["rows_per_second"] = round(rows / wall_seconds, 1) if rows is not None and wall_seconds > 0 else None
+    if profiler is not None:
+        _stop_profiler(profiler, record)
+    _records.append(record)
+    return record
+
+
+# withの中で計測する。yieldした辞書のrows_outに出力の行数を入れる
+@contextmanager
+def measure(name: str, prefecture_code: str | None = None, kind: str = "stage", execution_type: str = "PROC", rows_in: int | None = None):
+    measurement = start(name, prefecture_code, kind, execution_type, rows_in)
+    try:
+        yield measurement
+    finally:
+        stop(measurement)
+
+
+def get_records() -> list[dict]:
+    return list(_records)
+
+
+# 溜めた計測結果をJSONとCSV(PROFILE_TRACE=1の場合はChromeのトレース形式も)で書き出し、溜めた結果を消す
+# data/profiles/<県コード>/<日時>_<pid>.json 等に書き出す。PROFILE=1でない場合は書き出さずに消すだけ
+def write(prefecture_code: str | None = None) -> Path | None:
+    records = get_records()
+    _records.clear()
+    env = getEnv()
+    if not env["PROFILE"] or len(records) == 0:
+        return None
+
+    output_dir = PROFILE_DIR / (prefecture_code or "all")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base_path = output_dir / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{os.getpid()}"
+
+    json_path = base_path.with_suffix(".json")
+    json_path.write_text(json.dumps({"prefecture_code": prefecture_code or "", "pid": os.getpid(), "records": records}, ensure_ascii=False, indent=2))
+
+    with open(base_path.with_suffix(".csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(records)
+
+    if env["PROFILE_TRACE"]:
+        write_trace(records, Path(f"{base_path}.trace.json"))
+    return json_path
+
+
+# Chromeのトレース形式(chrome://tracing, Perfetto)で書き出す
+# ステージ(stage)と区間(step)は同じスレッドに並べ、ステージの中の区間は入れ子で表示される
+def write_trace(records: list[dict], path: Path):
+    events = [
+        {
+            "name": record["name"],
+            "cat": f"{record['kind']},{record['type']}",
+            "ph": "X",
+            "ts": round(record["started_at"] * 1e6),
+            "dur": round(record["wall_seconds"] * 1e6),
+            "pid": record["pid"],
+            "tid": record["prefecture_code"] or "all",
+            "args": {k: record[k] for k in CSV_COLUMNS if k not in ("name", "pid", "started_at")},
+        }
+        for record in records
+    ]
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False))
+
+
+def _start_profiler(profiler_name: str):
+    if profiler_name == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ImportError("PROFILE_STAGE_PROFILER=pyinstrument requires pyinstrument: uv pip install pyinstrument") from e
+        profiler = Profiler()
+        profiler.start()
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler_name, profiler
+
+
+# 関数毎の計測結果を data/profiles/<県コード>/<日時>_<pid>_<ステージ名>.prof(cProfile) / .html(pyinstrument) に書き出す
+def _stop_profiler(profiler, record: dict):
+    profiler_name, profiler = profiler
+    output_dir = PROFILE_DIR / (record["prefecture_code"] or "all")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base_path = output_dir / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{record['pid']}_{record['name']}"
+    if profiler_name == "pyinstrument":
+        profiler.stop()
+        path = base_path.with_suffix(".html")
+        path.write_text(profiler.output_html())
+    else:
+        import pstats
+        profiler.disable()
+        path = base_path.with_suffix(".prof")
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    record["profile_path"] = str(path)
+    print(f"  🔬 profile: {record['name']} -> {path}")
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import heapq
+from pathlib import Path
+from typing import Callable, Iterator
+
+from pandas import DataFrame
+
+# 解析結果(ターゲット)の読み書き
+# data/targets/{都道府県コード}/target.ndjsonに1行1ルートのJSON(NDJSON)で書き出す。
+# 読み込み側は1行ずつ読むのでファイル全体をメモリに載せず、必要な列だけを取り出せる。
+# 従来のtarget.json(ルートの配列)はtarget.ndjsonを1行ずつ繋げて書き出す(export_legacy_json)。値はto_json(orient="records")と同じ。
+# usage: cd pipeline && python -m analyzer.core.target_store [都道府県コード ...]   # target.ndjsonからtarget.jsonを書き出す
+
+TARGETS_DIR = Path(__file__).resolve().parents[3] / "data" / "targets"
+FILE_NAME = "target.ndjson"
+LEGACY_FILE_NAME = "target.json"
+# 1回にJSONに変換する行数
+WRITE_CHUNK_ROWS = 5000
+
+
+def get_path(prefecture_code: str, targets_dir=TARGETS_DIR) -> Path:
+    return Path(targets_dir) / prefecture_code / FILE_NAME
+
+
+def get_legacy_path(prefecture_code: str, targets_dir=TARGETS_DIR) -> Path:
+    return Path(targets_dir) / prefecture_code / LEGACY_FILE_NAME
+
+
+# ターゲットがあるか(target.ndjsonか従来のtarget.json)
+def exists(prefecture_code: str, targets_dir=TARGETS_DIR) -> bool:
+    return get_path(prefecture_code, targets_dir).exists() or get_legacy_path(prefecture_code, targets_dir).exists()
+
+
+# DataFrameをNDJSONで書き出す。行をまとめてJSONに変換し、全体の文字列を作らない。
+def write(df: DataFrame, path) -> None:
+    write_lines(generate_lines(df), path)
+
+
+# DataFrameの各行をJSONの文字列にして返す
+def generate_lines(df: DataFrame) -> Iterator[str]:
+    for st in range(0, len(df), WRITE_CHUNK_ROWS):
+        yield from iter_lines(df.iloc[st:st + WRITE_CHUNK_ROWS].to_json(orient="records", lines=True).splitlines())
+
+
+def write_lines(lines, path) -> None:
+    path = str(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        for line in lines:
+            f.write(line)
+            f.write("\n")
+    os.replace(tmp_path, path)
+
+
+# 既存のtarget.ndjsonからis_replacedがTrueのルートを除き、dfのルートを加えて書き出す。戻り値は(除いた数, 加えた数)
+# どちらもscoreの降順に並んでいるので、1行ずつ読みながらscoreの降順にマージする。
+def merge(prefecture_code: str, df: DataFrame, is_replaced: Callable[[dict], bool], targets_dir=TARGETS_DIR) -> tuple[int, int]:
+    path = get_path(prefecture_code, targets_dir)
+    counts = {"removed": 0, "added": 0}
+
+    def existing_lines():
+        with open(path, encoding="utf-8") as f:
+            for line in iter_lines(f):
+                record = json.loads(line)
+                if is_replaced(record):
+                    counts["removed"] += 1
+                    continue
+                yield record.get("score"), line
+
+    def new_lines():
+        for line in generate_lines(df):
+            counts["added"] += 1
+            yield json.loads(line).get("score"), line
+
+    # scoreがないルートは末尾にする
+    merged = heapq.merge(existing_lines(), new_lines(), key=lambda x: -x[0] if x[0] is not None else float("inf"))
+    # 一時ファイルに書き終えてから置き換えるので、読み込み中のファイルを上書きしない
+    write_lines((line for _, line in merged), path)
+    return counts["removed"], counts["added"]
+
+
+# NDJSONを従来のJSON(ルートの配列)に変換する
+def export_legacy_json(path, legacy_path) -> None:
+    legacy_path = str(legacy_path)
+    os.makedirs(os.path.dirname(legacy_path), exist_ok=True)
+    tmp_path = f"{legacy_path}.tmp"
+    with open(path) as src, open(tmp_path, "w") as dst:
+        dst.write("[")
+        for i, line in enumerate(iter_lines(src)):
+            if i > 0:
+                dst.write(",")
+            dst.write(line)
+        dst.write("]")
+    os.replace(tmp_path, legacy_path)
+
+
+def iter_lines(f) -> Iterator[str]:
+    for line in f:
+        line = line.rstrip("\n")
+        if line:
+            yield line
+
+
+# ターゲットを1ルートずつ返す。columnsを指定した場合はその列だけのdictにする(ルートにない列は含めない)。
+# target.ndjsonがない場合は従来のtarget.jsonを読む(こちらは全体を読み込む)。
+def iter_records(prefecture_code: str, columns: list[str] | None = None, targets_dir=TARGETS_DIR) -> Iterator[dict]:
+    path = get_path(prefecture_code, targets_dir)
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            records = (json.loads(line) for line in iter_lines(f))
+            yield from project(records, columns)
+        return
+
+    legacy_path = get_legacy_path(prefecture_code, targets_dir)
+    if not legacy_path.exists():
+        raise FileNotFoundError(f"target not found: {path}")
+    with open(legacy_path, encoding="utf-8") as f:
+        records = json.load(f)
+    yield from project(records, columns)
+
+
+def project(records, columns: list[str] | None) -> Iterator[dict]:
+    if columns is None:
+        yield from records
+        return
+    for record in records:
+        yield {column: record[column] for column in columns if column in record}
+
+
+if __name__ == "__main__":
+    for prefecture_code in sys.argv[1:] or sorted(x.name for x in TARGETS_DIR.iterdir() if x.is_dir()):
+        path = get_path(prefecture_code)
+        if not path.exists():
+            print(f"[{prefecture_code}] SKIP ({FILE_NAME} not found)")
+            continue
+        export_legacy_json(path, get_legacy_path(prefecture_code))
+        print(f"[{prefecture_code}] {get_legacy_path(prefecture_code)}")
@@ -1,6 +1,6 @@
 import numpy as np
-from pyproj import Proj, Transformer
 from ..analysis.column_generater_module.core import elevation_service
+from . import projection_service
 import json
 from geopandas import GeoDataFrame
 import hashlib
@@ -8,18 +8,10 @@ import os
 from pandas import Series
 from tqdm import tqdm
 
-def generate_terrain_elevation(plane_epsg_code, tif_path, lat_min, lon_min, lat_max, lon_max) -> list:
-    # 緯度経度からEPSG:4326 (WGS84) に変換するための投影を設定
-    wgs84 = Proj('epsg:4326')  # WGS84 (緯度経度)
-    japan_plane = Proj(f"epsg:{plane_epsg_code}")  # 日本の平面直角座標系（ゾーン9を例とする）
-    
-      # Transformerを使って座標変換用のオブジェクトを作成
-    transformer_to_plane = Transformer.from_proj(wgs84, japan_plane)
-    transformer_to_wgs84 = Transformer.from_proj(japan_plane, wgs84)
-
+# bboxの範囲を平面直角座標系の10mメッシュに区切り、各メッシュの(南北方向, 東西方向, 標高)のリストを生成する
+def generate_terrain_elevation(plane_epsg_code, tif_path, lon_min, lat_min, lon_max, lat_max, mmap: bool = False) -> list:
     # BBoxの緯度経度を平面直角座標に変換
-    x_min, y_min = transformer_to_plane.transform(lon_min, lat_min)
-    x_max, y_max = transformer_to_plane.transform(lon_max, lat_max)
+    (x_min, x_max), (y_min, y_max) = projection_service.to_plane([lon_min, lon_max], [lat_min, lat_max], plane_epsg_code)
 
     expand_distance = 50  # 拡張する距離（メートル）
     x_min -= expand_distance
@@ -27,56 +19,36 @@ def generate_terrain_elevation(plane_epsg_code, tif_path, lat_min, lon_min, lat_
     y_min -= expand_distance
     y_max += expand_distance
 
-    # print(lat_min, lon_min)
-    # print(lat_max, lon_max)
-    # print(x_min, y_min, x_max, y_max)
-    
     # 指定間隔のグリッドを作成
     mesh_size = 10  # メッシュサイズ(m)
-    x_coords = np.arange(x_min, x_max, mesh_size)  # x方向
-    y_coords = np.arange(y_min, y_max, mesh_size)  # y方向
-    
-    # グリッドの座標を生成
-    grid_x, grid_y = np.meshgrid(x_coords, y_coords)
-    
-    # 平面直角座標から緯度経度に逆変換
-    lon_grid, lat_grid = transformer_to_wgs84.transform(grid_x, grid_y)
-    
-    # 緯度と経度のグリッドを1つの3次元配列に統合
-    lat_lon_grid = np.dstack((lat_grid, lon_grid))
+    x_coords = np.arange(x_min, x_max, mesh_size)  # 東西方向
+    y_coords = np.arange(y_min, y_max, mesh_size)  # 南北方向
 
-    # Elevation Serviceのインスタンスを作成
-    elevation_service_ins = elevation_service.ElevationService(tif_path)
+    # グリッドの座標を生成(行が東西方向、列が南北方向)
+    grid_y, grid_x = np.meshgrid(y_coords, x_coords)
 
-    # 1次元配列にするためのリスト
-    lat_lon_elev_grid = np.zeros((lat_grid.shape[0], lat_grid.shape[1], 3))
-
-    # グリッド全体の標高をwindow一括読みで取得（元の二重ループ+1px読みを廃止）
-    elevations = elevation_service_ins.get_elevations_batch(lat_lon_grid[:,:,1], lat_lon_grid[:,:,0])
-    lat_lon_elev_grid[:,:,0] = lat_lon_grid[:,:,1]
-    lat_lon_elev_grid[:,:,1] = lat_lon_grid[:,:,0]
-    lat_lon_elev_grid[:,:,2] = elevations.astype(int)
-    
-    # terrain_elevationsをNumPy配列に変換
-    # terrain_elevations = np.array(terrain_elevations)
+    # 平面直角座標から緯度経度に逆変換
+    lon_grid, lat_grid = projection_service.to_lonlat(grid_x, grid_y, plane_epsg_code)
 
-    # 緯度経度から平面直角座標に変換
-    flat_x, flat_y = transformer_to_plane.transform(lat_lon_elev_grid[:, :, 0], lat_lon_elev_grid[:, :, 1])
+    # 全エッジで共有するElevation Serviceのインスタンスを取得(TIFはエッジ毎に開き直さない)
+    elevation_service_ins = elevation_service.get_elevation_service(tif_path, mmap)
 
-    # 結果をlat_lon_elev_gridに反映 (緯度経度を平面直角座標に置き換え)
-    lat_lon_elev_grid[:, :, 0] = flat_x  # x座標（平面直角座標）
-    lat_lon_elev_grid[:, :, 1] = flat_y  # y座標（平面直角座標）
+    # グリッド全体の標高をブロック単位の読み込みで一括取得
+    elevations = elevation_service_ins.get_elevations_batch(lat_grid, lon_grid)
 
+    # (南北方向, 東西方向, 標高)の3次元配列にする
     # xとy座標を整数に変換(データサイズを減らすため)
-    lat_lon_elev_grid[:, :, 0] = lat_lon_elev_grid[:, :, 0].astype(int)
-    lat_lon_elev_grid[:, :, 1] = lat_lon_elev_grid[:, :, 1].astype(int)
+    plane_elev_grid = np.zeros((grid_x.shape[0], grid_x.shape[1], 3))
+    plane_elev_grid[:, :, 0] = grid_y.astype(int)
+    plane_elev_grid[:, :, 1] = grid_x.astype(int)
+    plane_elev_grid[:, :, 2] = elevations.astype(int)
 
-    return lat_lon_elev_grid.tolist()
+    return plane_elev_grid.tolist()
 
-def write_terrain_elevations_file(gdf_edges: GeoDataFrame, tif_path, plane_epsg_code:str):
+def write_terrain_elevations_file(gdf_edges: GeoDataFrame, tif_path, plane_epsg_code:str, mmap: bool = False):
     def func(row):
         bounds = row.geometry.bounds
-        terrain_elevations = generate_terrain_elevation(plane_epsg_code, tif_path, bounds[0], bounds[1], bounds[2], bounds[3])
+        terrain_elevations = generate_terrain_elevation(plane_epsg_code, tif_path, bounds[0], bounds[1], bounds[2], bounds[3], mmap)
 
         # ファイルに出力する
         output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../../data/{row['terrain_elevation_file_path'].lstrip("./")}"
@@ -0,0 +1,141 @@
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, MultiPolygon
+from .main import main, TARGET_COLUMNS
+from .analysis import graph_feather, osm_diff
+from .core import target_store, projection_service
+from .core.env import getEnv
+from .core.execution_timer import ExecutionTimer, ExecutionType
+
+# OSMの変更箇所だけを再解析して県のtarget.ndjsonにマージする
+# 変更箇所は次のどちらかで求める
+#   change_file指定あり: osmChangeファイル(.osc, .osc.gz)で変更されたway, nodeに接するエッジ
+#   change_file指定なし: data/cache_overpassのキャッシュ済みのグラフと取得し直したグラフの差分のエッジ(取得し直したグラフが次回の比較元になる)
+#   OSM_SOURCE=pbfの場合はpbfから作るグラフをキャッシュしないため比較元がない。change_fileがなければ県全体を解析する
+# 変更箇所に重なる既存のルートを除き、変更箇所と既存のルートを含む範囲を再解析して、変更箇所に重なるルートを加える。
+# 交差点がなくなってエッジがつながる等で変更後のルートが長くなり、再解析の範囲の境界で切れた可能性がある場合は、
+# そのルートを含むように範囲を広げて再解析する(MAX_EXPAND_ROUNDS回広げても切れる場合はそのルートを加えない)。
+# standard.csv等のランキングのCSVは県全体の解析結果から作るので更新しない。
+
+# 変更箇所とみなす範囲(変更されたエッジからの距離(m))
+CHANGED_BUFFER_METERS = 50
+# 再解析する範囲(変更箇所と置き換えるルートからの距離(m))。交差点の接続数や建物数の計算に周囲の道路を含める
+ANALYSIS_BUFFER_METERS = 1000
+# 再解析の範囲の境界(県境を除く)からこの距離(m)以内で終わるルートは、範囲で切れた可能性があるとみなす
+# 範囲外の道路はグラフから除かれるので、切れたルートは境界の手前の最後の交差点で終わる
+BOUNDARY_MARGIN_METERS = 500
+# 切れたルートを含むように再解析の範囲を広げる最大回数
+MAX_EXPAND_ROUNDS = 3
+
+
+# 県の差分更新を行う。差分更新できない場合(ターゲットやキャッシュがない)は県全体を解析する。
+def run(search_area_polygon: Polygon | MultiPolygon, plane_epsg_code: int, prefecture_code: str, change_file: str | None = None) -> dict:
+    execution_timer_ins = ExecutionTimer(prefecture_code)
+    result = {"prefecture_code": prefecture_code, "mode": "incremental", "removed": 0, "added": 0}
+
+    if not has_score(prefecture_code):
+        print(f"  ⚠️ {target_store.get_path(prefecture_code)} is missing or has no score. run full analysis")
+        gdf = main(search_area_polygon, plane_epsg_code, prefecture_code)
+        return {**result, "mode": "full", "added": len(gdf)}
+
+    if change_file is None and getEnv()["OSM_SOURCE"] == "pbf":
+        print("  ⚠️ OSM_SOURCE=pbf has no cached graph to compare. set OSM_CHANGE_FILE for incremental runs. run full analysis")
+        gdf = main(search_area_polygon, plane_epsg_code, prefecture_code)
+        return {**result, "mode": "full", "added": len(gdf)}
+
+    # 変更されたエッジを求める
+    execution_timer_ins.start("🔁 detect osm changes", ExecutionType.FETCH)
+    old_graph = graph_feather.load_cached_graph(search_area_polygon)
+    if change_file is not None:
+        changed_geometries = osm_diff.generate_changed_geometries(old_graph, change_file)
+    elif old_graph is not None:
+        new_graph = graph_feather.fetch_graph(search_area_polygon, refresh_cache=True)
+        changed_geometries = osm_diff.diff_graphs(old_graph, new_graph)
+    else:
+        changed_geometries = None
+    execution_timer_ins.stop()
+
+    if changed_geometries is None:
+        print("  ⚠️ no cached graph to compare. run full analysis")
+        gdf = main(search_area_polygon, plane_epsg_code, prefecture_code)
+        return {**result, "mode": "full", "added": len(gdf)}
+
+    changed_area = osm_diff.generate_affected_area(changed_geometries, search_area_polygon, plane_epsg_code, CHANGED_BUFFER_METERS)
+    print(f"  🔁 changed geometries: {len(changed_geometries)}")
+    if changed_area is None:
+        print("  ✅ no changes")
+        execution_timer_ins.finish()
+        return {**result, "mode": "unchanged"}
+
+    # 変更箇所に重なる既存のルートも含めて再解析する(ルートの途中で切れないように)
+    shapely.prepare(changed_area)
+    replaced_geometries = np.array([
+        line for line in (
+            generate_line(record) for record in target_store.iter_records(prefecture_code, ["geometry_list"])
+        )
+        if line is not None and changed_area.intersects(line)
+    ], dtype=object)
+    print(f"  🔁 replaced routes: {len(replaced_geometries)}")
+
+    # 変更箇所に重なるルートが再解析の範囲で切れていれば、範囲を広げて再解析する
+    geometries = np.concatenate([changed_geometries, replaced_geometries])
+    for expand_round in range(MAX_EXPAND_ROUNDS + 1):
+        analysis_area = osm_diff.generate_affected_area(geometries, search_area_polygon, plane_epsg_code, ANALYSIS_BUFFER_METERS)
+        print(f"  🔁 analysis area: {round(analysis_area.area / search_area_polygon.area * 100, 2)}% of prefecture")
+        # 一時的な範囲なのでチェックポイントを作らない(範囲毎にキーが増え続けるため)
+        gdf_edges = main(analysis_area, plane_epsg_code, prefecture_code, write_outputs=False, use_checkpoint=False)
+        if gdf_edges.empty:
+            break
+        gdf_edges = gdf_edges[gdf_edges.geometry.intersects(changed_area)]
+        cut = select_cut_edges(gdf_edges.geometry.values, analysis_area, search_area_polygon, plane_epsg_code)
+        if not cut.any():
+            break
+        if expand_round == MAX_EXPAND_ROUNDS:
+            print(f"  ⚠️ {int(cut.sum())} routes still end on the analysis area boundary. drop them")
+            gdf_edges = gdf_edges[~cut]
+            break
+        print(f"  🔁 {int(cut.sum())} routes end on the analysis area boundary. expand the area")
+        geometries = np.concatenate([geometries, gdf_edges.geometry.values[cut]])
+
+    # 変更箇所に重なるルートだけを置き換える
+    execution_timer_ins.start("🔁 merge targets")
+    removed, added = target_store.merge(
+        prefecture_code,
+        gdf_edges.reindex(columns=TARGET_COLUMNS),
+        lambda record: (line := generate_line(record)) is not None and changed_area.intersects(line),
+    )
+    if getEnv()["TARGET_LEGACY_JSON"]:
+        target_store.export_legacy_json(target_store.get_path(prefecture_code), target_store.get_legacy_path(prefecture_code))
+    print(f"  🔁 removed: {removed}, added: {added}")
+    execution_timer_ins.stop()
+    execution_timer_ins.finish()
+    return {**result, "removed": removed, "added": added}
+
+
+# 再解析の範囲の境界(県境を除く)からBOUNDARY_MARGIN_METERS以内に端点があるルート(範囲で切れた可能性があるもの)のマスク
+# 県境は県全体の解析でも同じ所で切れるので対象外(端点から最も近い範囲の境界が県境の場合)
+def select_cut_edges(geometries, analysis_area, search_area_polygon, plane_epsg_code: int) -> np.ndarray:
+    if len(geometries) == 0:
+        return np.zeros(0, dtype=bool)
+    to_plane = lambda xy: projection_service.to_plane_coords(xy, plane_epsg_code)
+    endpoints = shapely.transform(np.concatenate([shapely.get_point(geometries, 0), shapely.get_point(geometries, -1)]), to_plane)
+    area_distances = shapely.distance(endpoints, shapely.transform(analysis_area.boundary, to_plane))
+    prefecture_distances = shapely.distance(endpoints, shapely.transform(search_area_polygon.boundary, to_plane))
+    cut = (area_distances < BOUNDARY_MARGIN_METERS) & (prefecture_distances > area_distances + 1)
+    return cut[:len(geometries)] | cut[len(geometries):]
+
+
+# ターゲットがあり、マージの並び順に使うscoreを持っているか
+def has_score(prefecture_code: str) -> bool:
+    if not target_store.get_path(prefecture_code).exists():
+        return False
+    first = next(target_store.iter_records(prefecture_code, ["score"]), None)
+    return first is not None and "score" in first
+
+
+# ターゲットのgeometry_list([緯度, 経度]のリスト)をLineString(経度, 緯度)にする
+def generate_line(record: dict) -> shapely.LineString | None:
+    geometry_list = record.get("geometry_list") or []
+    if len(geometry_list) < 2:
+        return None
+    return shapely.LineString([(lng, lat) for lat, lng in geometry_list])
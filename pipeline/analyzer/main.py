@@ -3,460 +3,668 @@ from .analysis import graph_feather
 from .analysis import graph_all_feather
 from .analysis import graph_tunnel_feather
 from .analysis import graph_bridge_feather
+from .analysis import overpass_fallback
+from .analysis import osm_pbf
+from .analysis import overpass_cache
+from .analysis import overpass_scheduler
+from .analysis import tile_graph
+from .analysis import tile_partitioner
 from .analysis import column_generater
 from .analysis import remover
+from .analysis import turn_edge_spliter
 import osmnx as ox
 from geopandas import GeoDataFrame
 import os
+import shutil
+from functools import cache
 from .core.env import getEnv
 from datetime import datetime
 from shapely.geometry import Polygon, MultiPolygon
 from .analysis.turn_edge_spliter import split
+from .core.checkpoint import Stage, StageRunner, generate_input_key
+from .core import calc_steering_wheel_angle as steering_wheel_angle_calculator
+from .core import projection_service, distance_service, dem_prepare, target_store
+from .analysis.column_generater_module.core import calculate_angle_between_vectors, elevation_service, infra_matcher, ragged, smoother, segmnet, elevation_peaks, road_width_calculator, linstring_to_polygon
 
 from .core.terrain_elevation_generator import write_terrain_elevations_file, generate_file_path
 
+# target.ndjson(target.json)に出力する列。scoreは差分更新でマージする時の並び順に使う
+TARGET_COLUMNS = [
+    "length",
+    "highway",
+    "name",
+    "geometry_list",
+    "geometry_meter_list",
+    "elevation_height",
+    "elevation_smooth",
+    "elevation_segment_list",
+    "elevation_unevenness",
+    "elevation_unevenness_count",
+    "elevation_unevenness_sections",
+    "elevation_fluctuation",
+    "video_coords_segment_list",
+    "video_elevation_segment_list",
+    "angle_deltas",
+    "score_elevation",
+    "elevation_section",
+    "score_elevation_unevenness",
+    "score_width",
+    "score_length",
+    "score_corner_week",
+    "score_corner_medium",
+    "score_corner_strong",
+    "score_corner_none",
+    "score_corner_balance",
+    "score_building",
+    "score_tunnel_outside",
+    "score_center_line_section",
+    "score_claude_center_line_section",
+    "google_earth_url",
+    "street_view_url",
+    "lanes",
+    "turn_points",
+    "road_section",
+    "tunnel",
+    "bridge",
+    "steering_wheel_angle_info",
+    "steering_wheel_max_angle",
+    "steering_wheel_avg_angle",
+    # "locations",
+    "building_nearby_cnt",
+    "road_section_cnt",
+    "tunnel_length",
+    "tunnel_sections",
+    "bridge_sections",
+    "terrain_elevation_file_path",
+    "min_elevation",
+    "geometry_check_list",
+    "score",
+]
+
 # 指定したポリゴン内を対象に処理を行う。
-def main(search_area_polygon:Polygon|MultiPolygon, plane_epsg_code:str, prefecture_code:str) -> GeoDataFrame:
+# write_outputs=Falseの場合はCSVとtarget.ndjsonを書き出さずに結果を返す。
+# tileを指定した場合は呼び出し元(tiled)が範囲全体のグラフから取り出したタイルが担当するエッジだけを解析する(search_area_polygonはタイルの解析範囲)。
+# トンネル、橋も呼び出し元が取り出した担当するエッジに重なるものを使い、タイルの境界で切れないようにする。
+# use_checkpointを指定した場合はUSE_CHECKPOINTより優先する(差分更新の一時的な範囲の解析ではチェックポイントを作らない)。
+def main(search_area_polygon:Polygon|MultiPolygon, plane_epsg_code:str, prefecture_code:str, write_outputs: bool = True, tile: dict | None = None, use_checkpoint: bool | None = None) -> GeoDataFrame:
     env = getEnv()
+    # TILE_SIZE_DEGREEより広い範囲はタイルに分けて解析する
+    if tile is None and write_outputs and tile_partitioner.needs_split(search_area_polygon, env["TILE_SIZE_DEGREE"]):
+        from . import tiled
+        return tiled.run(search_area_polygon, plane_epsg_code, prefecture_code)
+
     consider_gsi_width = env["CONSIDER_GSI_WIDTH"]
     create_video = env["CREATE_VIDEO"]
     create_terrain = env["CREATE_TERRAIN"]
     refresh_cache = env["REFRESH_CACHE"]
-
-    execution_timer_ins = ExecutionTimer()
-    # ベースとなるグラフを取得する
-    execution_timer_ins.start("🗾 load openstreetmap data", ExecutionType.FETCH)
-    graph = graph_feather.fetch_graph(search_area_polygon, refresh_cache=refresh_cache)
-    execution_timer_ins.stop()
-
-    # グラフをGeoDataFrameに変換する
-    execution_timer_ins.start("💱 convert graph to GeoDataFrame")
-    gdf_edges = ox.graph_to_gdfs(graph, nodes=False, edges=True)
-    # gdf_edgesに列がない場合は追加する
-    if "lanes" not in gdf_edges.columns:
-        gdf_edges["lanes"] = 1
-    if "tunnel" not in gdf_edges.columns:
-        gdf_edges["tunnel"] = "no"
-    if "tunnel_length" not in gdf_edges.columns:
-        gdf_edges["tunnel_length"] = 0
-    if "bridge" not in gdf_edges.columns:
-        gdf_edges["bridge"] = "no"
-    if "name" not in gdf_edges.columns:
-        gdf_edges["name"] = ""
-    
-    # tunnelとbridgeの値がnanの場合はnoに変換する
-    gdf_edges["tunnel"] = gdf_edges["tunnel"].fillna("no")
-    gdf_edges["bridge"] = gdf_edges["bridge"].fillna("no")
-    print(f"  📑 row: {len(gdf_edges)}")
-    execution_timer_ins.stop()
-
-    # # LINESTRINGを緯度と経度のリストに変換する.coords[0]とcoords[1]を入り変えたリストを返す
-    gdf_edges["geometry_list"] = gdf_edges["geometry"].apply(
-        lambda x: list(map(lambda y: [y[1], y[0]], x.coords))
-    )
-    gdf_edges["geometry_meter_list"] = (
-        column_generater.geometry_meter_list.generate(gdf_edges, plane_epsg_code)
-    )
-
-    # 不要なエッジを削除
-    execution_timer_ins.start("🛣️ remove reverse edge")
-    count = len(gdf_edges)
-    gdf_edges = remover.reverse_edge.remove(gdf_edges)
-    print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
-    execution_timer_ins.stop()
-
-    # # geometry_listを滑らかにする
-    # execution_timer_ins.start("🌊 smooth geometry")
-    # gdf_edges["geometry"] = column_generater.geometry_smooth.generate(gdf_edges)
-    # print(gdf_edges["geometry"])
-    # execution_timer_ins.stop()
-
-    # 開始位置列を追加する
-    execution_timer_ins.start("📍 calc start_point")
-    gdf_edges["start_point"] = column_generater.start_point.generate(gdf_edges)
-    execution_timer_ins.stop()
-
-    execution_timer_ins.start("📍 calc end_point")
-    gdf_edges["end_point"] = column_generater.end_point.generate(gdf_edges)
-    execution_timer_ins.stop()
-
-    # 全graphを取得する
-    execution_timer_ins.start("🗾 load openstreetmap all data", ExecutionType.FETCH)
-    g_all = graph_all_feather.fetch_graph(search_area_polygon, refresh_cache=refresh_cache)
-    execution_timer_ins.stop()
-
-    # エッジ内のnodeから分岐数を取得する
-    execution_timer_ins.start("🌿 calc connection_node_cnt")
-    gdf_edges["connection_node_cnt"] = column_generater.connection_node_cnt.generate(
-        gdf_edges, g_all
-    )
-    execution_timer_ins.stop()
-
-    # 座標間の角度の変化量を求める
-    execution_timer_ins.start("📐 calc angle_deltas")
-    gdf_edges["angle_deltas"] = column_generater.angle_deltas.generate(gdf_edges)
-    execution_timer_ins.stop()
-
-    # 基準に満たないエッジを削除する
-    execution_timer_ins.start("🛣️ remove below standard edge")
-    count = len(gdf_edges)
-    gdf_edges = remover.filter_edge.remove(gdf_edges)
-    print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
-    execution_timer_ins.stop()
-    
-    # gdf_edgesがemptyの場合は終了する
-    if gdf_edges.empty:
-        print("gdf_edges is empty. exit process.")
-        return gdf_edges
-
-    # 曲がり角の候補を取得する
-    execution_timer_ins.start("🔁 calc turn_candidate_points")
-    gdf_edges["turn_candidate_points"] = (
-        column_generater.turn_candidate_points.generate(gdf_edges)
-    )
-    execution_timer_ins.stop()
-
-    # 曲がり角を取得する
-    execution_timer_ins.start("🔁 calc turn")
-    gdf_edges["turn_points"] = column_generater.turn.generate(gdf_edges, g_all)
-    execution_timer_ins.stop()
-
-    # 曲がり角を含むエッジを分割する
-    execution_timer_ins.start("🔁 split edge in turn")
-    gdf_edges = split(gdf_edges)
-    execution_timer_ins.stop()
-
-    # 座標間の角度の変化量を求める(分割したのでもう一回実行)
-    execution_timer_ins.start("📐 calc angle_deltas")
-    gdf_edges["angle_deltas"] = column_generater.angle_deltas.generate(gdf_edges)
-    execution_timer_ins.stop()
-
-    # 基準に満たないエッジを削除する(分割したのでもう一回実行)
-    execution_timer_ins.start("🗑️ remove below standard edge")
-    count = len(gdf_edges)
-    gdf_edges = remover.filter_edge.remove(gdf_edges)
-    print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
-    execution_timer_ins.stop()
-
-    # 座標毎の標高値を求める
-    tif_path = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/elevation.tif"
-    execution_timer_ins.start("🏔️ calc elevation")
-    gdf_edges["elevation"] = column_generater.elevation.generate(gdf_edges, tif_path)
-    execution_timer_ins.stop()
-
-    # 各ラインの最小標高値を求める
-    execution_timer_ins.start("🏔️ calc min_elevation")
-    gdf_edges["min_elevation"] = column_generater.min_elevation.generate_min_elevation(gdf_edges)
-    execution_timer_ins.stop()
+    use_checkpoint = env["USE_CHECKPOINT"] if use_checkpoint is None else use_checkpoint
+    building_nearby_cnt_mode = env["BUILDING_NEARBY_CNT_MODE"]
+    dem_interpolation = env["DEM_INTERPOLATION"]
+    dem_mmap = env["DEM_MMAP"]
+    target_legacy_json = env["TARGET_LEGACY_JSON"]
+    osm_source = env["OSM_SOURCE"]
+
+    # 標高はdem_prepareで変換済みのCOGだけを読み取り専用で使う(元のelevation.tifは書き換えない)
+    tif_path = dem_prepare.get_checked_prepared_path(dem_prepare.SOURCE_TIF_PATH)
+
+    execution_timer_ins = ExecutionTimer(prefecture_code)
+
+    # チェックポイントを使う場合、REFRESH_CACHE=1の取得し直しはステージのキーを求める時(get_cache_version)に行い、ステージではそのキャッシュを読む
+    fetch_refresh_cache = refresh_cache and not use_checkpoint
+    # 全graphを取得する(チェックポイントから再開した場合は不要なので必要になった時点で取得する)
+    @cache
+    def get_graph_all():
+        execution_timer_ins.start("🗾 load openstreetmap all data", ExecutionType.FETCH)
+        g_all = graph_all_feather.fetch_graph(search_area_polygon, refresh_cache=fetch_refresh_cache)
+        execution_timer_ins.stop()
+        return g_all
 
     # トンネルのデータを取得する
-    execution_timer_ins.start("🗾 load osm tunnel data", ExecutionType.FETCH)
-    graph_tunnel = graph_tunnel_feather.fetch_graph(search_area_polygon, refresh_cache=refresh_cache)
-    in_tunnel = graph_tunnel is not None and len(graph_tunnel.edges) >= 1
-    if in_tunnel:
-        gdf_tunnel_edges = ox.graph_to_gdfs(graph_tunnel, nodes=False, edges=True)
-    execution_timer_ins.stop()
-
-    if in_tunnel:
+    @cache
+    def get_tunnel_edges() -> GeoDataFrame | None:
+        execution_timer_ins.start("🗾 load osm tunnel data", ExecutionType.FETCH)
+        if tile is None:
+            graph_tunnel = graph_tunnel_feather.fetch_graph(search_area_polygon, refresh_cache=fetch_refresh_cache)
+            in_tunnel = graph_tunnel is not None and len(graph_tunnel.edges) >= 1
+            gdf_tunnel_edges = ox.graph_to_gdfs(graph_tunnel, nodes=False, edges=True) if in_tunnel else None
+        else:
+            # タイル分割時は呼び出し元で範囲全体のグラフから取り出したエッジ(範囲全体にない場合はNone)
+            gdf_tunnel_edges = tile["tunnel_edges"]
+        execution_timer_ins.stop()
+        if gdf_tunnel_edges is None:
+            return None
+
         execution_timer_ins.start("🛣️ remove reverse tunnel edge")
         count = len(gdf_tunnel_edges)
         gdf_tunnel_edges = remover.reverse_edge.remove(gdf_tunnel_edges)
         print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_tunnel_edges)}")
         execution_timer_ins.stop()
+        return gdf_tunnel_edges
 
-        # トンネル内の標高を調整する
-        execution_timer_ins.start("🏔️ calc elevation_tunnel_regulator")
-        gdf_edges["elevation"] = column_generater.elevation_infra_regulator.generate(
-            gdf_edges, gdf_tunnel_edges, column_generater.elevation_infra_regulator.InfraType.TUNNEL
-        )
+    # 橋のデータを取得する
+    @cache
+    def get_bridge_edges() -> GeoDataFrame | None:
+        execution_timer_ins.start("🌉 load osm bridge data", ExecutionType.FETCH)
+        if tile is None:
+            graph_bridge = graph_bridge_feather.fetch_graph(search_area_polygon, refresh_cache=fetch_refresh_cache)
+            in_bridge = graph_bridge is not None and len(graph_bridge.edges) >= 1
+            gdf_bridge_edges = ox.graph_to_gdfs(graph_bridge, nodes=False, edges=True) if in_bridge else None
+        else:
+            # タイル分割時は呼び出し元で範囲全体のグラフから取り出したエッジ(範囲全体にない場合はNone)
+            gdf_bridge_edges = tile["bridge_edges"]
+        execution_timer_ins.stop()
+        if gdf_bridge_edges is None:
+            return None
+
+        execution_timer_ins.start("🗑️ remove reverse edge")
+        count = len(gdf_bridge_edges)
+        gdf_bridge_edges = remover.reverse_edge.remove(gdf_bridge_edges)
+        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_bridge_edges)}")
+        execution_timer_ins.stop()
+        return gdf_bridge_edges
+
+    def load_edges(_) -> GeoDataFrame:
+        # ベースとなるグラフを取得する
+        execution_timer_ins.start("🗾 load openstreetmap data", ExecutionType.FETCH)
+        if tile is None:
+            graph = graph_feather.fetch_graph(search_area_polygon, refresh_cache=fetch_refresh_cache)
         execution_timer_ins.stop()
 
-        # トンネルの距離を求める
-        execution_timer_ins.start("🏔️ calc tunnel_length")
-        gdf_edges["tunnel_length"] = column_generater.tunnel_length.generate(
-            gdf_edges, gdf_tunnel_edges
+        # グラフをGeoDataFrameに変換する
+        execution_timer_ins.start("💱 convert graph to GeoDataFrame")
+        if tile is None:
+            gdf_edges = ox.graph_to_gdfs(graph, nodes=False, edges=True)
+        else:
+            # タイル分割時は呼び出し元で範囲全体のグラフから取り出した担当するエッジを使う(タイルの境界で道路を切らない)
+            gdf_edges = tile["edges"].copy()
+        # gdf_edgesに列がない場合は追加する
+        if "lanes" not in gdf_edges.columns:
+            gdf_edges["lanes"] = 1
+        if "tunnel" not in gdf_edges.columns:
+            gdf_edges["tunnel"] = "no"
+        if "tunnel_length" not in gdf_edges.columns:
+            gdf_edges["tunnel_length"] = 0
+        if "bridge" not in gdf_edges.columns:
+            gdf_edges["bridge"] = "no"
+        if "name" not in gdf_edges.columns:
+            gdf_edges["name"] = ""
+
+        # tunnelとbridgeの値がnanの場合はnoに変換する
+        gdf_edges["tunnel"] = gdf_edges["tunnel"].fillna("no")
+        gdf_edges["bridge"] = gdf_edges["bridge"].fillna("no")
+        print(f"  📑 row: {len(gdf_edges)}")
+        execution_timer_ins.stop()
+
+        # # LINESTRINGを緯度と経度のリストに変換する.coords[0]とcoords[1]を入り変えたリストを返す
+        gdf_edges["geometry_list"] = gdf_edges["geometry"].apply(
+            lambda x: list(map(lambda y: [y[1], y[0]], x.coords))
+        )
+        gdf_edges["geometry_meter_list"] = (
+            column_generater.geometry_meter_list.generate(gdf_edges, plane_epsg_code)
         )
+
+        # 不要なエッジを削除
+        execution_timer_ins.start("🛣️ remove reverse edge")
+        count = len(gdf_edges)
+        gdf_edges = remover.reverse_edge.remove(gdf_edges)
+        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
         execution_timer_ins.stop()
 
-        # トンネル区間の座標リストを生成する
-        execution_timer_ins.start("🚇 calc tunnel_sections")
-        gdf_edges["tunnel_sections"] = column_generater.infra_sections.generate(
-            gdf_edges, gdf_tunnel_edges
+        # # geometry_listを滑らかにする
+        # execution_timer_ins.start("🌊 smooth geometry")
+        # gdf_edges["geometry"] = column_generater.geometry_smooth.generate(gdf_edges)
+        # print(gdf_edges["geometry"])
+        # execution_timer_ins.stop()
+
+        # 開始位置列を追加する
+        execution_timer_ins.start("📍 calc start_point")
+        gdf_edges["start_point"] = column_generater.start_point.generate(gdf_edges)
+        execution_timer_ins.stop()
+
+        execution_timer_ins.start("📍 calc end_point")
+        gdf_edges["end_point"] = column_generater.end_point.generate(gdf_edges)
+        execution_timer_ins.stop()
+        return gdf_edges
+
+    def calc_connection_node_cnt(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        g_all = get_graph_all()
+
+        # エッジ内のnodeから分岐数を取得する
+        execution_timer_ins.start("🌿 calc connection_node_cnt")
+        gdf_edges["connection_node_cnt"] = column_generater.connection_node_cnt.generate(
+            gdf_edges, g_all
         )
         execution_timer_ins.stop()
+        return gdf_edges
 
-    if "tunnel_sections" not in gdf_edges.columns:
-        gdf_edges["tunnel_sections"] = [[] for _ in range(len(gdf_edges))]
+    def calc_angle_deltas(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # 座標間の角度の変化量を求める
+        execution_timer_ins.start("📐 calc angle_deltas")
+        gdf_edges["angle_deltas"] = column_generater.angle_deltas.generate(gdf_edges)
+        execution_timer_ins.stop()
 
-    # 橋のデータを取得する
-    execution_timer_ins.start("🌉 load osm bridge data", ExecutionType.FETCH)
-    graph_bridge = graph_bridge_feather.fetch_graph(search_area_polygon, refresh_cache=refresh_cache)
-    in_bridge = graph_bridge is not None and len(graph_bridge.edges) >= 1
-    if in_bridge:
-        gdf_bridge_edges = ox.graph_to_gdfs(graph_bridge, nodes=False, edges=True)
-    execution_timer_ins.stop()
-
-    if graph_bridge is not None:
-        execution_timer_ins.start("🗑️ remove reverse edge")
-        count = len(gdf_bridge_edges)
-        gdf_bridge_edges = remover.reverse_edge.remove(gdf_bridge_edges)
-        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_bridge_edges)}")
+        # 基準に満たないエッジを削除する
+        execution_timer_ins.start("🛣️ remove below standard edge")
+        count = len(gdf_edges)
+        gdf_edges = remover.filter_edge.remove(gdf_edges)
+        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
         execution_timer_ins.stop()
+        return gdf_edges
+
+    def calc_turn(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        g_all = get_graph_all()
 
-        # 橋の標高を調整する
-        execution_timer_ins.start("🌉 calc elevation_bridge_regulator")
-        gdf_edges["elevation"] = column_generater.elevation_infra_regulator.generate(
-            gdf_edges, gdf_bridge_edges, column_generater.elevation_infra_regulator.InfraType.BRIDGE
+        # 曲がり角の候補を取得する
+        execution_timer_ins.start("🔁 calc turn_candidate_points")
+        gdf_edges["turn_candidate_points"] = (
+            column_generater.turn_candidate_points.generate(gdf_edges)
         )
         execution_timer_ins.stop()
 
-        # 橋区間の座標リストを生成する
-        execution_timer_ins.start("🌉 calc bridge_sections")
-        gdf_edges["bridge_sections"] = column_generater.infra_sections.generate(
-            gdf_edges, gdf_bridge_edges
+        # 曲がり角を取得する
+        execution_timer_ins.start("🔁 calc turn")
+        gdf_edges["turn_points"] = column_generater.turn.generate(gdf_edges, g_all)
+        execution_timer_ins.stop()
+        return gdf_edges
+
+    def split_edge(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # 曲がり角を含むエッジを分割する
+        execution_timer_ins.start("🔁 split edge in turn")
+        gdf_split_edges = split(gdf_edges, plane_epsg_code)
+        # 分割でできたエッジ(分割点のnode_idを含むので元のエッジにないindexになる)
+        split_targets = ~gdf_split_edges.index.isin(gdf_edges.index)
+        gdf_edges = gdf_split_edges
+        execution_timer_ins.stop()
+
+        # 座標間の角度の変化量を求める(分割でできたエッジだけもう一回実行)
+        execution_timer_ins.start("📐 calc angle_deltas")
+        gdf_edges["angle_deltas"] = column_generater.angle_deltas.update(gdf_edges, split_targets)
+        execution_timer_ins.stop(int(split_targets.sum()))
+
+        # 基準に満たないエッジを削除する(分割したのでもう一回実行)
+        execution_timer_ins.start("🗑️ remove below standard edge")
+        count = len(gdf_edges)
+        gdf_edges = remover.filter_edge.remove(gdf_edges)
+        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
+        execution_timer_ins.stop()
+        return gdf_edges
+
+    def calc_elevation(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # 座標毎の標高値を求める
+        execution_timer_ins.start("🏔️ calc elevation")
+        gdf_edges["elevation"] = column_generater.elevation.generate(
+            gdf_edges, tif_path, dem_interpolation == "bilinear", dem_mmap
         )
         execution_timer_ins.stop()
 
-    if "bridge_sections" not in gdf_edges.columns:
-        gdf_edges["bridge_sections"] = [[] for _ in range(len(gdf_edges))]
+        # 各ラインの最小標高値を求める
+        execution_timer_ins.start("🏔️ calc min_elevation")
+        gdf_edges["min_elevation"] = column_generater.min_elevation.generate_min_elevation(gdf_edges)
+        execution_timer_ins.stop()
+        return gdf_edges
 
-    # 国の基準に合わせて傾斜を調整する
-    execution_timer_ins.start("🏔️ calc elevation_adjuster")
-    gdf_edges["elevation"] = column_generater.elevation_adjuster.generate(
-        gdf_edges
-    )
-    execution_timer_ins.stop()
+    def calc_tunnel(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        gdf_tunnel_edges = get_tunnel_edges()
+        if gdf_tunnel_edges is not None:
+            # 道路と重なるトンネルのエッジを求める(標高の調整、距離、区間で共通して使う)
+            execution_timer_ins.start("🚇 match tunnel edges")
+            tunnel_matches = infra_matcher.match(gdf_edges, gdf_tunnel_edges)
+            execution_timer_ins.stop()
+
+            # トンネル内の標高を調整する
+            execution_timer_ins.start("🏔️ calc elevation_tunnel_regulator")
+            gdf_edges["elevation"] = column_generater.elevation_infra_regulator.generate(
+                gdf_edges, tunnel_matches, column_generater.elevation_infra_regulator.InfraType.TUNNEL
+            )
+            execution_timer_ins.stop()
+
+            # トンネルの距離を求める
+            execution_timer_ins.start("🏔️ calc tunnel_length")
+            gdf_edges["tunnel_length"] = column_generater.tunnel_length.generate(
+                gdf_edges, gdf_tunnel_edges, tunnel_matches
+            )
+            execution_timer_ins.stop()
+
+            # トンネル区間の座標リストを生成する
+            execution_timer_ins.start("🚇 calc tunnel_sections")
+            gdf_edges["tunnel_sections"] = column_generater.infra_sections.generate(
+                gdf_edges, gdf_tunnel_edges, tunnel_matches
+            )
+            execution_timer_ins.stop()
+
+        if "tunnel_sections" not in gdf_edges.columns:
+            gdf_edges["tunnel_sections"] = [[] for _ in range(len(gdf_edges))]
+        return gdf_edges
 
-    # 標高の平準化を行う
-    execution_timer_ins.start("🏔️ calc elevation_smooth")
-    gdf_edges["elevation_smooth"] = column_generater.elevation_smooth.generate(
-        gdf_edges
-    )
-    execution_timer_ins.stop()
+    def calc_bridge(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        gdf_bridge_edges = get_bridge_edges()
+        if gdf_bridge_edges is not None:
+            # 道路と重なる橋のエッジを求める(標高の調整、区間で共通して使う)
+            execution_timer_ins.start("🌉 match bridge edges")
+            bridge_matches = infra_matcher.match(gdf_edges, gdf_bridge_edges)
+            execution_timer_ins.stop()
+
+            # 橋の標高を調整する
+            execution_timer_ins.start("🌉 calc elevation_bridge_regulator")
+            gdf_edges["elevation"] = column_generater.elevation_infra_regulator.generate(
+                gdf_edges, bridge_matches, column_generater.elevation_infra_regulator.InfraType.BRIDGE
+            )
+            execution_timer_ins.stop()
+
+            # 橋区間の座標リストを生成する
+            execution_timer_ins.start("🌉 calc bridge_sections")
+            gdf_edges["bridge_sections"] = column_generater.infra_sections.generate(
+                gdf_edges, gdf_bridge_edges, bridge_matches
+            )
+            execution_timer_ins.stop()
+
+        if "bridge_sections" not in gdf_edges.columns:
+            gdf_edges["bridge_sections"] = [[] for _ in range(len(gdf_edges))]
+        return gdf_edges
 
-    # 標高の高さ(最小値と最大値の差)を求める
-    execution_timer_ins.start("🏔️ calc elevation_height")
-    gdf_edges["elevation_height"] = column_generater.elevation_height.generate(
-        gdf_edges
-    )
-    execution_timer_ins.stop()
+    def calc_elevation_profile(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # 傾斜の補正、平準化、高さ、アップダウン量、50m毎の標高リスト、500m毎の勾配区間をまとめて求める
+        execution_timer_ins.start("🏔️ calc elevation_profile")
+        elevation_profile = column_generater.elevation_profile.generate(gdf_edges)
+        for column in elevation_profile.columns:
+            gdf_edges[column] = elevation_profile[column]
+        execution_timer_ins.stop()
 
-    # 標高のアップダウン量を求める
-    execution_timer_ins.start("🏔️ calc elevation_fluctuation")
-    fluctuation_up, fluctuation_down = column_generater.elevation_fluctuation.generate(
-        gdf_edges
-    )
-    gdf_edges["elevation_fluctuation"] = list(
-        zip(fluctuation_up.round(2), fluctuation_down.round(2))
-    )
-    execution_timer_ins.stop()
+        # 指定単位の標高の区間リストを生成する(ジオメトリの座標リスト)
+        if create_video:
+            execution_timer_ins.start("🏔️ calc video_coords_segment_list")
+            gdf_edges["video_coords_segment_list"] = column_generater.video_coords_segment_list.generate(
+                gdf_edges
+            )
+            execution_timer_ins.stop()
+        else:
+            # 動画を作成しない場合は空リストを設定して重い処理をスキップ
+            gdf_edges["video_coords_segment_list"] = [[] for _ in range(len(gdf_edges))]
+
+        # 指定単位の標高の区間リストを生成する(ジオメトリの標高リスト)
+        if create_video:
+            execution_timer_ins.start("🏔️ calc video_elevation_segment_list")
+            gdf_edges["video_elevation_segment_list"] = column_generater.video_elevation_segment_list.generate(
+                gdf_edges
+            )
+            execution_timer_ins.stop()
+        else:
+            gdf_edges["video_elevation_segment_list"] = [[] for _ in range(len(gdf_edges))]
+
+        # 上り下りのポイントを求める
+        execution_timer_ins.start("🏔️ calc elevation_unevenness")
+        elevation_unevenness = column_generater.elevation_unevenness.generate(
+            gdf_edges
+        )
+        gdf_edges["elevation_unevenness"] = elevation_unevenness
+        execution_timer_ins.stop()
 
-    # 指定単位の標高の区間リストを生成する(z軸の凹凸の判定に使用)
-    execution_timer_ins.start("🏔️ calc elevation_segment_list")
-    gdf_edges["elevation_segment_list"] = column_generater.elevation_segment_list.generate(
-        gdf_edges
-    )
-    execution_timer_ins.stop()
+        # 標高のバンプ数求める。
+        execution_timer_ins.start("🏔️ calc elevation_unevenness_count")
+        elevation_unevenness_count = column_generater.elevation_unevenness_count.generate(
+            gdf_edges
+        )
+        gdf_edges["elevation_unevenness_count"] = elevation_unevenness_count
+        execution_timer_ins.stop()
 
-    # 指定単位の標高の区間リストを生成する(ジオメトリの座標リスト)
-    if create_video:
-        execution_timer_ins.start("🏔️ calc video_coords_segment_list")
-        gdf_edges["video_coords_segment_list"] = column_generater.video_coords_segment_list.generate(
+        # 上り区間・下り区間のリストを生成する
+        execution_timer_ins.start("🏔️ calc elevation_unevenness_sections")
+        gdf_edges["elevation_unevenness_sections"] = column_generater.elevation_unevenness_sections.generate(
             gdf_edges
         )
         execution_timer_ins.stop()
-    else:
-        # 動画を作成しない場合は空リストを設定して重い処理をスキップ
-        gdf_edges["video_coords_segment_list"] = [[] for _ in range(len(gdf_edges))]
+        return gdf_edges
+
+    def calc_width(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        execution_timer_ins.start("🛣️ calc width")
+        if consider_gsi_width:
+            # gsiの道幅を取得する
+            avg_width, min_width = column_generater.width_gsi.generate(gdf_edges, plane_epsg_code)
+            gdf_edges["gsi_min_width"] = min_width
+            gdf_edges["gsi_avg_width"] = avg_width
+            execution_timer_ins.stop()
+
+            # gsiの道幅が6m未満のエッジを削除する. 酷道は4~5m程度の道幅があり、地元の峠道は道幅が6.3mの道幅があるため。
+            execution_timer_ins.start("🛣️ remove gsi_avg_width edge")
+            count = len(gdf_edges)
+            gdf_edges = gdf_edges[gdf_edges["gsi_avg_width"] >= 6]
+            print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
+            execution_timer_ins.stop()
+        else:
+            gdf_edges["gsi_min_width"] = 0
+            gdf_edges["gsi_avg_width"] = 0
+        # alpsmapの道幅を取得する
+        execution_timer_ins.start("🛣️ calc alpsmap width")
+        gdf_edges["is_alpsmap"] = column_generater.is_alpsmap.generate(gdf_edges)
+        avg_width, min_width = column_generater.width_alpsmap.generate(gdf_edges)
+        gdf_edges["alpsmap_min_width"] = min_width
+        gdf_edges["alpsmap_avg_width"] = avg_width
+        execution_timer_ins.stop()
+        return gdf_edges
+
+    def fetch_locations(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # 自作した位置データを取得のデータを取得
+        execution_timer_ins.start("🛣️ fetch locations")
+        gdf_edges['locations'] = column_generater.locations.generate(gdf_edges)
+        execution_timer_ins.stop()
+
+        # locationsをJSON形式に変換してlocations_jsonフィールドに追加
+        execution_timer_ins.start("📊 create locations_json")
+        gdf_edges['locations_json'] = gdf_edges['locations'].to_json(orient="records")
+        execution_timer_ins.stop()
+
+        # alpsmapの道幅が3m以下のエッジを削除する
+        count = len(gdf_edges)
+        execution_timer_ins.start("🛣️ remove alpsmap_min_width edge")
+        gdf_edges = gdf_edges[
+            ~((gdf_edges["is_alpsmap"] == 1) & (gdf_edges["alpsmap_min_width"] <= 3))
+        ]
+        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
+        execution_timer_ins.stop()
+        return gdf_edges
+
+    def calc_steering_wheel_angle(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # ステアリングホイールの角度を計算する
+        execution_timer_ins.start("🛞 calc steering_wheel_angle")
+        gdf_edges["steering_wheel_angle_info"] = column_generater.steering_wheel_angle.generate(
+            gdf_edges, plane_epsg_code
+        )
+        execution_timer_ins.stop()
+
+        # ステアリングホイールの最大角度を計算する
+        execution_timer_ins.start("🛞 calc steering_wheel_max_angle")
+        gdf_edges["steering_wheel_max_angle"] = gdf_edges["steering_wheel_angle_info"].apply(
+            lambda angle_info_list: max(item['steering_angle'] for item in angle_info_list) if angle_info_list else None
+        )
+        execution_timer_ins.stop()
+
+        # ステアリングホイールの平均角度を計算する
+        execution_timer_ins.start("🛞 calc steering_wheel_avg_angle")
+        gdf_edges["steering_wheel_avg_angle"] = gdf_edges["steering_wheel_angle_info"].apply(
+            lambda angle_info_list: sum(item['steering_angle'] for item in angle_info_list) / len(angle_info_list) if angle_info_list else None
+        )
+        execution_timer_ins.stop()
+        return gdf_edges
 
-    # 指定単位の標高の区間リストを生成する(ジオメトリの標高リスト)
-    if create_video:
-        execution_timer_ins.start("🏔️ calc video_elevation_segment_list")
-        gdf_edges["video_elevation_segment_list"] = column_generater.video_elevation_segment_list.generate(
+    def calc_road_section(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # 道の区間情報を取得する
+        execution_timer_ins.start("🛞 calc road_section")
+        gdf_edges["road_section"] = column_generater.road_section.generate(
             gdf_edges
         )
+        gdf_edges["road_section_cnt"] = gdf_edges["road_section"].apply(lambda x: len(x))
         execution_timer_ins.stop()
-    else:
-        gdf_edges["video_elevation_segment_list"] = [[] for _ in range(len(gdf_edges))]
 
-    # 上り下りのポイントを求める
-    execution_timer_ins.start("🏔️ calc elevation_unevenness")
-    elevation_unevenness = column_generater.elevation_unevenness.generate(
-        gdf_edges
-    )
-    gdf_edges["elevation_unevenness"] = elevation_unevenness
-    execution_timer_ins.stop()
+        # 道の区間数が少ないエッジを削除する
+        execution_timer_ins.start("🛞 remove road_section_small_count")
+        count = len(gdf_edges)
+        gdf_edges = remover.remove_road_section_small_count.remove(gdf_edges)
+        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
+        execution_timer_ins.stop()
 
-    # 標高のバンプ数求める。
-    execution_timer_ins.start("🏔️ calc elevation_unevenness_count")
-    elevation_unevenness_count = column_generater.elevation_unevenness_count.generate(
-        gdf_edges
-    )
-    gdf_edges["elevation_unevenness_count"] = elevation_unevenness_count
-    execution_timer_ins.stop()
+        # コーナーがないエッジを削除する
+        execution_timer_ins.start("🛞 remove no corner edge")
+        count = len(gdf_edges)
+        gdf_edges = gdf_edges[gdf_edges['road_section'].apply(lambda x: any(d.get('section_type') != 'straight' for d in x))]
+        print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
+        execution_timer_ins.stop()
+        return gdf_edges
 
-    # 上り区間・下り区間のリストを生成する
-    execution_timer_ins.start("🏔️ calc elevation_unevenness_sections")
-    gdf_edges["elevation_unevenness_sections"] = column_generater.elevation_unevenness_sections.generate(
-        gdf_edges
-    )
-    execution_timer_ins.stop()
+    def calc_building_nearby_cnt(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # 周辺の建物の数をカウント
+        execution_timer_ins.start("🏚️ calc building_nearby_cnt")
+        gdf_edges["building_nearby_cnt"] = column_generater.building_nearby_cnt.generate(gdf_edges, building_nearby_cnt_mode)
+        execution_timer_ins.stop()
+        return gdf_edges
 
-    execution_timer_ins.start("🛣️ calc width")
-    if consider_gsi_width:
-        # gsiの道幅を取得する
-        avg_width, min_width = column_generater.width_gsi.generate(gdf_edges)
-        gdf_edges["gsi_min_width"] = min_width
-        gdf_edges["gsi_avg_width"] = avg_width
+    def calc_score(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # スコアを求める
+        execution_timer_ins.start("🏆 calc score")
+        gdf_edges["score_elevation_unevenness"] = (
+            column_generater.score_elevation_unevenness.generate(gdf_edges)
+        )
+        gdf_edges["score_elevation"] = column_generater.score_elevation.generate(gdf_edges)
+        gdf_edges["score_length"] = column_generater.score_length.generate(gdf_edges)
+        gdf_edges["score_width"] = column_generater.score_width.generate(gdf_edges)
+        gdf_edges["score_center_line_section"] = column_generater.score_center_line_section.generate(gdf_edges)
+        gdf_edges["score_claude_center_line_section"] = column_generater.score_claude_center_line_section_detail.generate(gdf_edges)
+        # gdf_edges["score_width"] = 1
+        score_corner_week, score_corner_medium, score_corner_strong, score_corner_none = column_generater.score_corner_level.generate(gdf_edges)
+        gdf_edges["score_corner_week"] = score_corner_week
+        gdf_edges["score_corner_medium"] = score_corner_medium
+        gdf_edges["score_corner_strong"] = score_corner_strong
+        gdf_edges["score_corner_none"] = score_corner_none
+        gdf_edges["score_corner_balance"] = column_generater.score_corner_balance.generate(gdf_edges)
+        gdf_edges["score_building"] = column_generater.score_building.generate(gdf_edges)
+        gdf_edges["score_tunnel_outside"] = column_generater.score_tunnel_outside.generate(gdf_edges)
+
+        gdf_edges["score"] = column_generater.score.generate(gdf_edges)
         execution_timer_ins.stop()
 
-        # gsiの道幅が6m未満のエッジを削除する. 酷道は4~5m程度の道幅があり、地元の峠道は道幅が6.3mの道幅があるため。
-        execution_timer_ins.start("🛣️ remove gsi_avg_width edge")
+        # 低いスコアのデータを削除する
+        execution_timer_ins.start("🛣️ remove low score")
         count = len(gdf_edges)
-        gdf_edges = gdf_edges[gdf_edges["gsi_avg_width"] >= 6]
+        gdf_edges = gdf_edges[gdf_edges["score"] >= 0.5]
         print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
         execution_timer_ins.stop()
-    else:
-        gdf_edges["gsi_min_width"] = 0
-        gdf_edges["gsi_avg_width"] = 0
-    # alpsmapの道幅を取得する
-    execution_timer_ins.start("🛣️ calc alpsmap width")
-    gdf_edges["is_alpsmap"] = column_generater.is_alpsmap.generate(gdf_edges)
-    avg_width, min_width = column_generater.width_alpsmap.generate(gdf_edges)
-    gdf_edges["alpsmap_min_width"] = min_width
-    gdf_edges["alpsmap_avg_width"] = avg_width
-    execution_timer_ins.stop()
-
-    # 自作した位置データを取得のデータを取得
-    execution_timer_ins.start("🛣️ fetch locations")
-    gdf_edges['locations'] = column_generater.locations.generate(gdf_edges)
-    execution_timer_ins.stop()
-
-    # locationsをJSON形式に変換してlocations_jsonフィールドに追加
-    execution_timer_ins.start("📊 create locations_json")
-    gdf_edges['locations_json'] = gdf_edges['locations'].to_json(orient="records")
-    execution_timer_ins.stop()
-
-    # alpsmapの道幅が3m以下のエッジを削除する
-    count = len(gdf_edges)
-    execution_timer_ins.start("🛣️ remove alpsmap_min_width edge")
-    gdf_edges = gdf_edges[
-        ~((gdf_edges["is_alpsmap"] == 1) & (gdf_edges["alpsmap_min_width"] <= 3))
-    ]
-    print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
-    execution_timer_ins.stop()
+        return gdf_edges
 
-    # print(gdf_edges["geometry_list"].iloc[0])
-    # print(gdf_edges["geometry"].iloc[0])
+    def create_urls(gdf_edges: GeoDataFrame) -> GeoDataFrame:
+        # geometry_check_list
+        execution_timer_ins.start("🔗 create geometry_check_list")
+        gdf_edges["geometry_check_list"] = column_generater.geometry_check_list.generate(
+            gdf_edges
+        )
+        gdf_edges["street_view_url_list"] = gdf_edges["geometry_check_list"]
+        execution_timer_ins.stop()
 
-    # ステアリングホイールの角度を計算する
-    execution_timer_ins.start("🛞 calc steering_wheel_angle")
-    gdf_edges["steering_wheel_angle_info"] = column_generater.steering_wheel_angle.generate(
-        gdf_edges
-    )
-    execution_timer_ins.stop()
+        # google earth urlを生成する
+        execution_timer_ins.start("🔗 create google_earth_url")
+        gdf_edges["google_earth_url"] = column_generater.google_earth_url.generate(
+            gdf_edges
+        )
+        execution_timer_ins.stop()
 
-    # ステアリングホイールの最大角度を計算する
-    execution_timer_ins.start("🛞 calc steering_wheel_max_angle")
-    gdf_edges["steering_wheel_max_angle"] = gdf_edges["steering_wheel_angle_info"].apply(
-        lambda angle_info_list: max(item['steering_angle'] for item in angle_info_list) if angle_info_list else None
-    )
-    execution_timer_ins.stop()
+        # street view urlを生成する
+        execution_timer_ins.start("🔗 create street_view_url")
+        gdf_edges["street_view_url"] = column_generater.street_view_url.generate(gdf_edges)
+        execution_timer_ins.stop()
+        return gdf_edges
 
-    # ステアリングホイールの平均角度を計算する
-    execution_timer_ins.start("🛞 calc steering_wheel_avg_angle")
-    gdf_edges["steering_wheel_avg_angle"] = gdf_edges["steering_wheel_angle_info"].apply(
-        lambda angle_info_list: sum(item['steering_angle'] for item in angle_info_list) / len(angle_info_list) if angle_info_list else None
-    )
-    execution_timer_ins.stop()
-    
-    # 道の区間情報を取得する
-    execution_timer_ins.start("🛞 calc road_section")
-    gdf_edges["road_section"] = column_generater.road_section.generate(
-        gdf_edges
-    )
-    gdf_edges["road_section_cnt"] = gdf_edges["road_section"].apply(lambda x: len(x))
-    execution_timer_ins.stop()
-
-    # 道の区間数が少ないエッジを削除する
-    execution_timer_ins.start("🛞 remove road_section_small_count")
-    count = len(gdf_edges)
-    gdf_edges = remover.remove_road_section_small_count.remove(gdf_edges)
-    print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
-    execution_timer_ins.stop()
-
-    # コーナーがないエッジを削除する
-    execution_timer_ins.start("🛞 remove no corner edge")
-    count = len(gdf_edges)
-    gdf_edges = gdf_edges[gdf_edges['road_section'].apply(lambda x: any(d.get('section_type') != 'straight' for d in x))]
-    print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
-    execution_timer_ins.stop()
-
-    # 周辺の建物の数をカウント
-    execution_timer_ins.start("🏚️ calc building_nearby_cnt")
-    gdf_edges["building_nearby_cnt"] = column_generater.building_nearby_cnt.generate(gdf_edges)
-    execution_timer_ins.stop()
-
-    # スコアを求める
-    execution_timer_ins.start("🏆 calc score")
-    gdf_edges["score_elevation_unevenness"] = (
-        column_generater.score_elevation_unevenness.generate(gdf_edges)
-    )
-    gdf_edges["score_elevation"] = column_generater.score_elevation.generate(gdf_edges)
-    gdf_edges["elevation_section"] = column_generater.elevation_section.generate(gdf_edges)
-    gdf_edges["score_length"] = column_generater.score_length.generate(gdf_edges)
-    gdf_edges["score_width"] = column_generater.score_width.generate(gdf_edges)
-    gdf_edges["score_center_line_section"] = column_generater.score_center_line_section.generate(gdf_edges)
-    gdf_edges["score_claude_center_line_section"] = column_generater.score_claude_center_line_section_detail.generate(gdf_edges)
-    # gdf_edges["score_width"] = 1
-    score_corner_week, score_corner_medium, score_corner_strong, score_corner_none = column_generater.score_corner_level.generate(gdf_edges)
-    gdf_edges["score_corner_week"] = score_corner_week
-    gdf_edges["score_corner_medium"] = score_corner_medium
-    gdf_edges["score_corner_strong"] = score_corner_strong
-    gdf_edges["score_corner_none"] = score_corner_none
-    gdf_edges["score_corner_balance"] = column_generater.score_corner_balance.generate(gdf_edges)
-    gdf_edges["score_building"] = column_generater.score_building.generate(gdf_edges)
-    gdf_edges["score_tunnel_outside"] = column_generater.score_tunnel_outside.generate(gdf_edges)
-
-    gdf_edges["score"] = column_generater.score.generate(gdf_edges)
-    execution_timer_ins.stop()
-
-    # 低いスコアのデータを削除する
-    execution_timer_ins.start("🛣️ remove low score")
-    count = len(gdf_edges)
-    gdf_edges = gdf_edges[gdf_edges["score"] >= 0.5]
-    print(f"  📑 row: {count}, 🗑️ deleted: {count - len(gdf_edges)}")
-    execution_timer_ins.stop()
-
-    # geometry_check_list
-    execution_timer_ins.start("🔗 create geometry_check_list")
-    gdf_edges["geometry_check_list"] = column_generater.geometry_check_list.generate(
-        gdf_edges
-    )
-    gdf_edges["street_view_url_list"] = gdf_edges["geometry_check_list"]
-    execution_timer_ins.stop()
+    # ステージが読む外部データのバージョン(ステージのキーに含める)。同じデータを読むステージが複数あるので1回だけ求める
+    # Overpassのグラフはキャッシュのキーと作成日時で、キャッシュがない、有効期限を過ぎている場合はここで取得する
+    # タイル分割時の道路、トンネル、橋のグラフは呼び出し元でタイル毎のキャッシュのバージョンを求めてある
+    @cache
+    def get_cache_version(module, polygon) -> str:
+        return overpass_fallback.generate_cache_version(
+            ox.graph_from_polygon, polygon, refresh_cache=refresh_cache, **module.GRAPH_OPTIONS
+        )
 
-    # google earth urlを生成する
-    execution_timer_ins.start("🔗 create google_earth_url")
-    gdf_edges["google_earth_url"] = column_generater.google_earth_url.generate(
-        gdf_edges
+    def get_graph_version() -> str:
+        return get_cache_version(graph_feather, search_area_polygon) if tile is None else tile["graph_versions"]["graph"]
+
+    def get_graph_all_version() -> str:
+        return get_cache_version(graph_all_feather, search_area_polygon)
+
+    def get_graph_tunnel_version() -> str:
+        return get_cache_version(graph_tunnel_feather, search_area_polygon) if tile is None else tile["graph_versions"]["tunnel"]
+
+    def get_graph_bridge_version() -> str:
+        return get_cache_version(graph_bridge_feather, search_area_polygon) if tile is None else tile["graph_versions"]["bridge"]
+
+    # locations, 建物はDBの範囲内の件数と最終更新日時
+    def get_locations_version() -> str:
+        return column_generater.locations.generate_data_version(search_area_polygon)
+
+    def get_buildings_version() -> str:
+        return column_generater.building_nearby_cnt.generate_data_version(search_area_polygon)
+
+    stages = [
+        Stage("edges", load_edges, [graph_feather, tile_graph, tile_partitioner, overpass_fallback, overpass_scheduler, overpass_cache, osm_pbf, column_generater.geometry_meter_list, projection_service, remover.reverse_edge, column_generater.start_point, column_generater.end_point], data=[get_graph_version]),
+        Stage("connection_node_cnt", calc_connection_node_cnt, [graph_all_feather, column_generater.connection_node_cnt], data=[get_graph_all_version]),
+        Stage("angle_deltas", calc_angle_deltas, [column_generater.angle_deltas, calculate_angle_between_vectors, ragged, remover.filter_edge]),
+        Stage("turn", calc_turn, [graph_all_feather, column_generater.turn_candidate_points, calculate_angle_between_vectors, ragged, column_generater.turn, remover.reverse_edge, distance_service], data=[get_graph_all_version]),
+        Stage("split", split_edge, [turn_edge_spliter, projection_service, column_generater.angle_deltas, calculate_angle_between_vectors, ragged, remover.filter_edge]),
+        Stage("elevation", calc_elevation, [column_generater.elevation, elevation_service, column_generater.min_elevation], [tif_path]),
+        Stage("tunnel", calc_tunnel, [graph_tunnel_feather, tile_graph, tile_partitioner, infra_matcher, column_generater.elevation_infra_regulator, column_generater.tunnel_length, column_generater.infra_sections, distance_service], data=[get_graph_tunnel_version]),
+        Stage("bridge", calc_bridge, [graph_bridge_feather, tile_graph, tile_partitioner, infra_matcher, column_generater.elevation_infra_regulator, column_generater.infra_sections], data=[get_graph_bridge_version]),
+        Stage("elevation_profile", calc_elevation_profile, [
+            column_generater.elevation_profile, ragged, distance_service, column_generater.video_coords_segment_list, column_generater.video_elevation_segment_list,
+            column_generater.elevation_unevenness, column_generater.elevation_unevenness_count, column_generater.elevation_unevenness_sections,
+            smoother, segmnet, elevation_peaks,
+        ]),
+        Stage("width", calc_width, [column_generater.width_gsi, road_width_calculator, projection_service, column_generater.is_alpsmap, column_generater.width_alpsmap], column_generater.width_gsi.get_source_files() if consider_gsi_width else []),
+        Stage("locations", fetch_locations, [column_generater.locations], data=[get_locations_version]),
+        Stage("steering_wheel_angle", calc_steering_wheel_angle, [column_generater.steering_wheel_angle, steering_wheel_angle_calculator, projection_service]),
+        Stage("road_section", calc_road_section, [column_generater.road_section, remover.remove_road_section_small_count, distance_service]),
+        Stage("building_nearby_cnt", calc_building_nearby_cnt, [column_generater.building_nearby_cnt, linstring_to_polygon, distance_service], data=[get_buildings_version]),
+        Stage("score", calc_score, [
+            column_generater.score_elevation_unevenness, column_generater.score_elevation, column_generater.score_length, column_generater.score_width,
+            column_generater.score_center_line_section, column_generater.score_claude_center_line_section_detail, column_generater.score_corner_level,
+            column_generater.score_corner_balance, column_generater.score_building, column_generater.score_tunnel_outside, column_generater.score, distance_service,
+        ]),
+        Stage("urls", create_urls, [column_generater.geometry_check_list, distance_service, column_generater.google_earth_url, column_generater.street_view_url]),
+    ]
+
+    # ステージ毎にチェックポイントを保存し、最後に有効なチェックポイントから再開する
+    # ローカルのpbfを使う場合はファイルを置き換えたら再計算する(Overpassの場合は従来と同じキー)
+    osm_source_inputs = [osm_pbf.generate_source_key(env["OSM_PBF_PATH"])] if osm_source == "pbf" else []
+    # タイル分割時はタイル毎のキー(タイルの位置。グラフはステージのキーにタイル毎のキャッシュのバージョンが入る)
+    tile_inputs = [tile["origin"], tile["size"], tile["index"]] if tile is not None else []
+    input_key = generate_input_key(search_area_polygon, plane_epsg_code, prefecture_code, consider_gsi_width, create_video, building_nearby_cnt_mode, dem_interpolation, *osm_source_inputs, *tile_inputs)
+    checkpoint_max_gb = env["CHECKPOINT_MAX_GB"]
+    runner = StageRunner(
+        prefecture_code, input_key, enabled=use_checkpoint, refresh=refresh_cache,
+        max_bytes=int(checkpoint_max_gb * 1024 ** 3) if checkpoint_max_gb is not None else None,
     )
-    execution_timer_ins.stop()
+    gdf_edges = runner.run(stages)
 
-    # street view urlを生成する
-    execution_timer_ins.start("🔗 create street_view_url")
-    gdf_edges["street_view_url"] = column_generater.street_view_url.generate(gdf_edges)
-    execution_timer_ins.stop()
+    # gdf_edgesがemptyの場合は終了する(計測結果は次の県に持ち越さないようにここで書き出す)
+    if gdf_edges.empty:
+        execution_timer_ins.finish()
+        return gdf_edges
 
     # 地形データを出力する
     if create_terrain:
         execution_timer_ins.start("🏔️ write terrain_elevation file")
         gdf_edges["terrain_elevation_file_path"] = generate_file_path(gdf_edges, prefecture_code)
-        write_terrain_elevations_file(gdf_edges, tif_path, plane_epsg_code)
+        write_terrain_elevations_file(gdf_edges, tif_path, plane_epsg_code, dem_mmap)
         execution_timer_ins.stop()
     else:
         gdf_edges["terrain_elevation_file_path"] = ""
 
+    # 差分更新では範囲内の結果だけを返し、県全体の出力へのマージは呼び出し元(incremental)で行う
+    if not write_outputs:
+        execution_timer_ins.finish()
+        return gdf_edges.sort_values("score", ascending=False)
+
+    gdf_edges = write_targets(gdf_edges, prefecture_code, target_legacy_json)
+    execution_timer_ins.finish()
+    return gdf_edges
+
+
+# ランキングのCSV(standard.csv等)、review.csv、target.ndjsonを書き出し、scoreの大きい順に並べた結果を返す
+def write_targets(gdf_edges: GeoDataFrame, prefecture_code: str, target_legacy_json: bool) -> GeoDataFrame:
     # csvに変換して出力する
     output_columns = [
         "length",
@@ -475,24 +683,26 @@ def main(search_area_polygon:Polygon|MultiPolygon, plane_epsg_code:str, prefectu
         "locations_json"
     ]
 
+    # 並列実行時に他県の出力を上書きしないように県毎のディレクトリに出力する
+    os.makedirs(f"{os.path.dirname(os.path.abspath(__file__))}/../../data/targets/{prefecture_code}", exist_ok=True)
     gdf_edges_balance = gdf_edges[(gdf_edges["score_corner_balance"] >= 0.5) & (gdf_edges['score_building'] >= 0.3)].sort_values("score", ascending=False).head(200)
-    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/standard.csv"
+    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/targets/{prefecture_code}/standard.csv"
     gdf_edges_balance[output_columns].to_csv(output_dir, index=False)
 
     gdf_edges_week = gdf_edges[(gdf_edges["score_corner_week"] >= 0.35) & (gdf_edges["road_section_cnt"] >= 16) & (gdf_edges['score_building'] >= 0.3)].sort_values("score", ascending=False).head(200)
-    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/week_corner.csv"
+    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/targets/{prefecture_code}/week_corner.csv"
     gdf_edges_week[output_columns].to_csv(output_dir, index=False)
 
     gdf_edges_medium = gdf_edges[(gdf_edges["score_corner_medium"] >= 0.2) & (gdf_edges['score_building'] >= 0.3)].sort_values("score", ascending=False).head(200)
-    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/medium_corner.csv"
+    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/targets/{prefecture_code}/medium_corner.csv"
     gdf_edges_medium[output_columns].to_csv(output_dir, index=False)
 
     gdf_edges_strong = gdf_edges[(gdf_edges["score_corner_strong"] >= 0.2) & (gdf_edges['score_building'] >= 0.3)].sort_values("score", ascending=False).head(200)
-    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/strong_corner.csv"
+    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/targets/{prefecture_code}/strong_corner.csv"
     gdf_edges_strong[output_columns].to_csv(output_dir, index=False)
 
     gdf_edges_elevation_unevenness = gdf_edges[(gdf_edges["elevation_unevenness_count"] >= 2) & (gdf_edges['score_building'] >= 0.3)].sort_values("elevation_unevenness_count", ascending=False).head(200)
-    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/elevation_unevenness.csv"
+    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/targets/{prefecture_code}/elevation_unevenness.csv"
     gdf_edges_elevation_unevenness[output_columns].to_csv(output_dir, index=False)
 
     import pandas as pd
@@ -522,70 +732,22 @@ def main(search_area_polygon:Polygon|MultiPolygon, plane_epsg_code:str, prefectu
     review[output_columns].to_csv(review_path, index=False)
     print(f"  📋 review.csv: {len(review)} rows -> {review_path}")
 
-    execution_timer_ins.finish()
-
     # gdf_edgesをscoreの大きい順に並び替える
     gdf_edges = gdf_edges.sort_values("score", ascending=False)
 
     # jsonに変換して出力する
-    output_columns = [
-        "length",
-        "highway",
-        "name",
-        "geometry_list",
-        "geometry_meter_list",
-        "elevation_height",
-        "elevation_smooth",
-        "elevation_segment_list",
-        "elevation_unevenness",
-        "elevation_unevenness_count",
-        "elevation_unevenness_sections",
-        "elevation_fluctuation",
-        "video_coords_segment_list",
-        "video_elevation_segment_list",
-        "angle_deltas",
-        "score_elevation",
-        "elevation_section",
-        "score_elevation_unevenness",
-        "score_width",
-        "score_length",
-        "score_corner_week",
-        "score_corner_medium",
-        "score_corner_strong",
-        "score_corner_none",
-        "score_corner_balance",
-        "score_building",
-        "score_tunnel_outside",
-        "score_center_line_section",
-        "score_claude_center_line_section",
-        "google_earth_url",
-        "street_view_url",
-        "lanes",
-        "turn_points",
-        "road_section",
-        "tunnel",
-        "bridge",
-        "steering_wheel_angle_info",
-        "steering_wheel_max_angle",
-        "steering_wheel_avg_angle",
-        # "locations",
-        "building_nearby_cnt",
-        "road_section_cnt",
-        "tunnel_length",
-        "tunnel_sections",
-        "bridge_sections",
-        "terrain_elevation_file_path",
-        "min_elevation",
-        "geometry_check_list"
-    ]
 
-    output_dir = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/targets/{prefecture_code}/target.json"
-    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
-    print(output_dir)
-    gdf_edges[output_columns].to_json(output_dir, orient="records")
+    # 1行1ルートのNDJSONで書き出し、バックアップはファイルをコピーする
+    output_path = target_store.get_path(prefecture_code)
+    print(output_path)
+    target_store.write(gdf_edges[TARGET_COLUMNS], output_path)
+
+    output_path_bk = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/json_bk/{datetime.now().strftime('%Y-%m-%d-%H-%M')}_{prefecture_code}.ndjson"
+    os.makedirs(os.path.dirname(output_path_bk), exist_ok=True)
+    shutil.copyfile(output_path, output_path_bk)
 
-    output_dir_bk = f"{os.path.dirname(os.path.abspath(__file__))}/../../data/json_bk/{datetime.now().strftime('%Y-%m-%d-%H-%M')}.json"
-    os.makedirs(os.path.dirname(output_dir_bk), exist_ok=True)
-    gdf_edges[output_columns].to_json(output_dir_bk, orient="records")
+    # 従来のtarget.jsonを読むツール向けに変換して書き出す
+    if target_legacy_json:
+        target_store.export_legacy_json(output_path, target_store.get_legacy_path(prefecture_code))
 
     return gdf_edges
@@ -0,0 +1,117 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import osmnx as ox
+from geopandas import GeoDataFrame
+from shapely.geometry import Polygon, MultiPolygon
+from .analysis import graph_feather, graph_tunnel_feather, graph_bridge_feather, tile_graph, tile_partitioner, remover
+from .core.env import getEnv
+from .core.execution_timer import ExecutionTimer, ExecutionType
+
+# 広い範囲(北海道等)をタイルに分けて解析し、結果を1つにまとめて書き出す
+# 道路、トンネル、橋のグラフはタイル毎にOverpassから取得して範囲全体で1つのグラフにし(tile_graph)、タイルの境界で切らない。
+# タイルには担当するエッジと、それに重なるトンネル、橋のエッジだけを渡し、それ以外(全道路、建物、標高等)はタイル毎に取得、計算する。
+# タイルの分け方と重なる部分の扱いはtile_partitionerを参照。TILE_WORKERS > 1の場合はタイルを子プロセスで並列に解析する。
+
+
+# 範囲をタイルに分けて解析し、CSVとtarget.ndjsonを書き出す
+def run(search_area_polygon: Polygon | MultiPolygon, plane_epsg_code: str, prefecture_code: str) -> GeoDataFrame:
+    from .main import write_targets
+
+    env = getEnv()
+    execution_timer_ins = ExecutionTimer(prefecture_code)
+
+    # 道路、トンネル、橋のグラフを作り、道路のエッジからタイルを決める
+    execution_timer_ins.start("🧩 split search area into tiles", ExecutionType.FETCH)
+    tiles = generate_tiles(search_area_polygon, plane_epsg_code, env["TILE_SIZE_DEGREE"], env["TILE_OVERLAP_METERS"], env["REFRESH_CACHE"])
+    print(f"  🧩 tiles: {len(tiles)}, edges: {sum(x['edge_count'] for x in tiles)}, tile size: {env['TILE_SIZE_DEGREE']}°, overlap: {env['TILE_OVERLAP_METERS']}m")
+    execution_timer_ins.stop()
+
+    workers = min(env["TILE_WORKERS"], len(tiles))
+    if workers > 1:
+        # spawnで起動してfork時のGDAL/スレッド状態の引き継ぎを避ける。1タイル毎にプロセスを作り直してメモリを解放する。
+        # エッジの多いタイルから投入し、結果はタイルの順に並べる
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=1,
+        ) as executor:
+            futures = {
+                i: executor.submit(run_tile, tile, plane_epsg_code, prefecture_code)
+                for i, tile in sorted(enumerate(tiles), key=lambda x: x[1]["edge_count"], reverse=True)
+            }
+            results = [futures[i].result() for i in range(len(tiles))]
+    else:
+        results = [run_tile(tile, plane_epsg_code, prefecture_code) for tile in tiles]
+
+    execution_timer_ins.start("🧩 stitch tiles")
+    gdf_edges = tile_partitioner.stitch(results)
+    print(f"  📑 row: {len(gdf_edges)}")
+    execution_timer_ins.stop(len(gdf_edges))
+    if gdf_edges.empty:
+        execution_timer_ins.finish()
+        return gdf_edges
+
+    gdf_edges = write_targets(gdf_edges, prefecture_code, env["TARGET_LEGACY_JSON"])
+    execution_timer_ins.finish()
+    return gdf_edges
+
+
+# 1タイル分の解析を行う。並列実行時は子プロセスで実行される
+def run_tile(tile: dict, plane_epsg_code: str, prefecture_code: str) -> GeoDataFrame:
+    from .main import main
+
+    print(f"[tile] {tile['index']} edges: {tile['edge_count']}")
+    return main(tile["analysis_area"], plane_epsg_code, prefecture_code, write_outputs=False, tile=tile)
+
+
+# タイル毎に{"index", "origin", "size", "edge_count", "analysis_area", "edges", "tunnel_edges", "bridge_edges", "graph_versions"}を返す
+# 逆方向のエッジは範囲全体で削除してから分ける(平行なエッジが別のタイルになっても削除の結果が範囲全体の場合と変わらない)
+def generate_tiles(
+    search_area_polygon: Polygon | MultiPolygon, plane_epsg_code: str, tile_size_degree: float, overlap_meters: float, refresh_cache: bool = False
+) -> list[dict]:
+    graph_feather.add_useful_tags()
+    graph = tile_graph.fetch_graph(search_area_polygon, graph_feather.GRAPH_OPTIONS, tile_size_degree, refresh_cache)
+    if len(graph.edges) == 0:
+        return []
+    gdf_edges = remover.reverse_edge.remove(ox.graph_to_gdfs(graph, nodes=False, edges=True))
+    del graph
+    gdf_tunnel_edges = fetch_infra_edges(graph_tunnel_feather, search_area_polygon, tile_size_degree, refresh_cache)
+    gdf_bridge_edges = fetch_infra_edges(graph_bridge_feather, search_area_polygon, tile_size_degree, refresh_cache)
+    # チェックポイントのキーに含めるタイル毎のキャッシュのバージョン(取得済みなので取得し直さない)
+    graph_versions = {
+        name: tile_graph.generate_version(search_area_polygon, module.GRAPH_OPTIONS, tile_size_degree)
+        for name, module in [("graph", graph_feather), ("tunnel", graph_tunnel_feather), ("bridge", graph_bridge_feather)]
+    }
+
+    geometries = gdf_edges.geometry.values
+    tiles = []
+    for tile in tile_partitioner.generate_tiles(geometries, search_area_polygon, plane_epsg_code, tile_size_degree, overlap_meters):
+        if tile["analysis_area"] is None:
+            continue
+        tile_edges = gdf_edges[tile_partitioner.select_tile_edges(geometries, tile)]
+        tiles.append({
+            **tile,
+            "edges": tile_edges,
+            "tunnel_edges": select_context_edges(gdf_tunnel_edges, tile_edges),
+            "bridge_edges": select_context_edges(gdf_bridge_edges, tile_edges),
+            "graph_versions": graph_versions,
+        })
+    return tiles
+
+
+# トンネル、橋のエッジ(逆方向のエッジは削除済み)。グラフがない場合はNone(graph_tunnel_feather等のfetch_graphと同じ)
+def fetch_infra_edges(module, search_area_polygon: Polygon | MultiPolygon, tile_size_degree: float, refresh_cache: bool) -> GeoDataFrame | None:
+    try:
+        graph = tile_graph.fetch_graph(search_area_polygon, module.GRAPH_OPTIONS, tile_size_degree, refresh_cache)
+    except Exception:
+        return None
+    if len(graph.edges) == 0:
+        return None
+    return remover.reverse_edge.remove(ox.graph_to_gdfs(graph, nodes=False, edges=True))
+
+
+# タイルが担当するエッジに重なるトンネル、橋のエッジ。範囲全体にない場合はNoneのまま(重なるエッジがなくても空のGeoDataFrameにする)
+def select_context_edges(gdf_context_edges: GeoDataFrame | None, tile_edges: GeoDataFrame) -> GeoDataFrame | None:
+    if gdf_context_edges is None:
+        return None
+    return gdf_context_edges[tile_partitioner.select_context_edges(gdf_context_edges.geometry.values, tile_edges.geometry.values)]
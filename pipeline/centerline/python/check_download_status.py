@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """Check download status of Street View images per prefecture."""
 
-import json
 import os
-import psycopg2
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from analyzer.core import db, target_store  # noqa: E402
 
 TARGETS_DIR = "/home/ubuntu/speedio/data/targets"
 IMAGE_DIR = "/home/ubuntu/speedio/pipeline/centerline/tmp"
@@ -24,7 +27,7 @@ def build_image_index():
 
 
 def check_targets():
-    """Check each prefecture's target.json for downloaded images."""
+    """Check each prefecture's target.ndjson (or legacy target.json) for downloaded images."""
     image_index = build_image_index()
     print(f"Total unique (lat, lng) pairs in image cache: {len(image_index)}")
     print()
@@ -32,40 +35,39 @@ def check_targets():
     results = []
 
     for pref_code in sorted(os.listdir(TARGETS_DIR)):
-        target_file = os.path.join(TARGETS_DIR, pref_code, "target.json")
-        if not os.path.exists(target_file):
-            continue
-
-        try:
-            with open(target_file) as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"  Error reading {target_file}: {e}")
+        if not target_store.exists(pref_code, TARGETS_DIR):
             continue
 
+        entry_count = 0
         total_coords = 0
         downloaded = 0
 
-        for entry in data:
-            check_list = entry.get("geometry_check_list", [])
-            for coord in check_list:
-                lat, lng = coord[0], coord[1]
-                total_coords += 1
-                if (str(lat), str(lng)) in image_index:
-                    downloaded += 1
+        try:
+            for entry in target_store.iter_records(pref_code, ["geometry_check_list"], TARGETS_DIR):
+                entry_count += 1
+                check_list = entry.get("geometry_check_list", [])
+                for coord in check_list:
+                    lat, lng = coord[0], coord[1]
+                    total_coords += 1
+                    if (str(lat), str(lng)) in image_index:
+                        downloaded += 1
+        except Exception as e:
+            print(f"  Error reading {target_store.get_path(pref_code, TARGETS_DIR)}: {e}")
+            continue
 
         pct = (downloaded / total_coords * 100) if total_coords > 0 else 0
-        results.append((pref_code, len(data), total_coords, downloaded, pct))
+        results.append((pref_code, entry_count, total_coords, downloaded, pct))
 
     return results
 
 
 def check_db():
     """Check DB locations table for center_line data."""
-    conn = psycopg2.connect(
-        host="localhost", database="speedia",
-        user="postgres", password="postgres"
-    )
+    with db.get_connection() as conn:
+        return _check_db(conn)
+
+
+def _check_db(conn):
     cur = conn.cursor()
 
     cur.execute("""
@@ -94,14 +96,13 @@ def check_db():
     labeled_stats = cur.fetchone()
 
     cur.close()
-    conn.close()
     return overall, labeled_stats
 
 
 def main():
     # ---- Target-based image download status ----
     print("=" * 105)
-    print("STREET VIEW IMAGE DOWNLOAD STATUS (from target.json / geometry_check_list)")
+    print("STREET VIEW IMAGE DOWNLOAD STATUS (from target.ndjson / geometry_check_list)")
     print("=" * 105)
     print(f"{'Pref':>4}  {'Roads':>6}  {'CheckPts':>10}  {'Downloaded':>10}  {'Pct':>7}  {'Status'}")
     print("-" * 105)
@@ -1,6 +1,7 @@
 """設定管理"""
 
 import os
+import sys
 from pathlib import Path
 
 import torch
@@ -13,13 +14,8 @@ load_dotenv(Path(__file__).parent.parent / ".env")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 
 # Database
-DB_CONFIG = {
-    "host": "localhost",
-    "port": 5432,
-    "database": "speedia",
-    "user": "postgres",
-    "password": "postgres",
-}
+# 接続先と接続プールは analyzer/core/db.py で共通管理する(DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_SIZE)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
 # Paths
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -20,20 +20,20 @@ from datetime import datetime
 from pathlib import Path
 
 from config import TARGETS_DIR, TMP_DIR, IMAGE_CONFIG
+from analyzer.core import target_store
+
+# ターゲットから読む列
+TARGET_COLUMNS = ["geometry_check_list"]
 
 
 def count_target_images(pref_code: str) -> int:
-    """target.jsonからダウンロード対象の座標数を取得"""
-    target_path = TARGETS_DIR / pref_code / "target.json"
-    if not target_path.exists():
+    """target.ndjson(なければtarget.json)からダウンロード対象の座標数を取得"""
+    if not target_store.exists(pref_code, TARGETS_DIR):
         return 0
 
     try:
-        with open(target_path, "r", encoding="utf-8") as f:
-            entries = json.load(f)
-
         coords = set()
-        for entry in entries:
+        for entry in target_store.iter_records(pref_code, TARGET_COLUMNS, TARGETS_DIR):
             check_list = entry.get("geometry_check_list", [])
             if len(check_list) < 3:
                 continue
@@ -45,21 +45,17 @@ def count_target_images(pref_code: str) -> int:
 
 
 def count_existing_images(pref_code: str) -> int:
-    """既にダウンロード済みの画像数を概算（target.jsonの座標とマッチ）"""
-    target_path = TARGETS_DIR / pref_code / "target.json"
-    if not target_path.exists():
+    """既にダウンロード済みの画像数を概算（target.ndjsonの座標とマッチ）"""
+    if not target_store.exists(pref_code, TARGETS_DIR):
         return 0
 
     try:
-        with open(target_path, "r", encoding="utf-8") as f:
-            entries = json.load(f)
-
         width = IMAGE_CONFIG["width"]
         height = IMAGE_CONFIG["height"]
         count = 0
         seen = set()
 
-        for entry in entries:
+        for entry in target_store.iter_records(pref_code, TARGET_COLUMNS, TARGETS_DIR):
             check_list = entry.get("geometry_check_list", [])
             if len(check_list) < 3:
                 continue
@@ -151,9 +147,8 @@ def main():
     pref_status = []
 
     for pref in pref_codes:
-        target_path = TARGETS_DIR / pref / "target.json"
-        if not target_path.exists():
-            print(f"  {pref}  {PREF_NAMES.get(pref, '???'):<6} target.json なし - スキップ")
+        if not target_store.exists(pref, TARGETS_DIR):
+            print(f"  {pref}  {PREF_NAMES.get(pref, '???'):<6} target.ndjson なし - スキップ")
             continue
 
         targets = count_target_images(pref)
@@ -3,47 +3,31 @@
 import argparse
 from pathlib import Path
 
-import psycopg2
-from psycopg2.extras import execute_batch
 import torch
 from tqdm import tqdm
 
-from config import DATA_DIR, MODELS_DIR, DB_CONFIG, get_device
+from config import DATA_DIR, MODELS_DIR, get_device
 from dataset import CenterLineDataset, get_transforms
 from model import CenterLineClassifier
 from train import calculate_metrics
+from analyzer.core import db
+import location_db
 
 
 def write_results_to_db(samples: list):
     """推論結果をDBのclaude_center_lineカラムに書き込み"""
     print("\nWriting results to database (claude_center_line)...")
 
-    conn = psycopg2.connect(**DB_CONFIG)
-    cursor = conn.cursor()
+    update_data = [
+        (s["pred"] >= 0.5, s["lat"], s["lng"])
+        for s in samples
+    ]
 
-    try:
-        update_query = """
-            UPDATE locations
-            SET claude_center_line = %s
-            WHERE ST_Y(point) = %s AND ST_X(point) = %s
-        """
+    # COPYで一時テーブルに書き込み、1回のUPDATEで反映する
+    with db.get_connection() as conn:
+        location_db.update_by_point(conn, {"claude_center_line": "boolean"}, update_data)
 
-        update_data = [
-            (s["pred"] >= 0.5, s["lat"], s["lng"])
-            for s in samples
-        ]
-
-        execute_batch(cursor, update_query, update_data, page_size=100)
-        conn.commit()
-
-        print(f"  Updated: {len(samples)} records")
-
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cursor.close()
-        conn.close()
+    print(f"  Updated: {len(samples)} records")
 
 
 def evaluate_model(model_path: str = None, split: str = "test", batch_size: int = 16):
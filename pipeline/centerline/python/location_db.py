@@ -0,0 +1,30 @@
+"""locationsテーブルの読み書き"""
+
+import config  # noqa: F401  analyzer/core/db.pyをimportできるようにする
+from analyzer.core import db
+
+# 座標が完全に一致するlocationsを空間インデックスを使って探す条件
+POINT_MATCH = "t.point && ST_SetSRID(ST_MakePoint(s.lng, s.lat), 4326) AND ST_Y(t.point) = s.lat AND ST_X(t.point) = s.lng"
+
+
+def fetch_points(query: str) -> list:
+    """サーバーサイドカーソルでlocationsを読み込む"""
+    with db.get_connection() as conn:
+        return list(db.stream(conn, query))
+
+
+def update_by_point(conn, columns: dict, rows: list) -> int:
+    """(値..., lat, lng)の行をCOPYでまとめて書き込み、座標が一致するlocationsを更新する
+
+    columnsは更新する{列名: 型}。rowsの各行はcolumnsの順の値の後にlat, lngを並べる。
+    updated_atも更新する(analyzerのチェックポイントはlocationsの最終更新日時が変わると再計算する)。
+    """
+    with conn.cursor() as cur:
+        return db.copy_update(
+            cur,
+            "locations",
+            {**columns, "lat": "float8", "lng": "float8"},
+            rows,
+            {**{name: f"s.{name}" for name in columns}, "updated_at": "now()"},
+            POINT_MATCH,
+        )
@@ -1,21 +1,23 @@
 """学習済みモデルで推論し、結果をDBに書き込むスクリプト"""
 
 import argparse
-import json
 import math
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from queue import Queue
 
-import psycopg2
-from psycopg2.extras import execute_batch
 import torch
 from PIL import Image
 from tqdm import tqdm
 
-from config import MODELS_DIR, TMP_DIR, TARGETS_DIR, IMAGE_CONFIG, DB_CONFIG, get_device
+from config import MODELS_DIR, TMP_DIR, TARGETS_DIR, IMAGE_CONFIG, get_device
 from dataset import get_transforms
 from model import CenterLineClassifier
+from analyzer.core import db, target_store
+import location_db
+
+# ターゲットから読む列
+TARGET_COLUMNS = ["geometry_list", "geometry_check_list"]
 
 
 def coord_key(lat: float, lng: float) -> str:
@@ -59,19 +61,15 @@ def get_image_path(lat: float, lng: float, heading: float) -> Path:
 
 
 def load_targets(pref_code: str):
-    """target.jsonから座標とgeometry情報をロード"""
-    target_path = TARGETS_DIR / pref_code / "target.json"
-    if not target_path.exists():
-        raise FileNotFoundError(f"target.json not found: {target_path}")
-
-    print(f"Loading targets from {target_path}...")
-    with open(target_path, "r", encoding="utf-8") as f:
-        entries = json.load(f)
+    """target.ndjson(なければtarget.json)から座標とgeometry情報をロード"""
+    if not target_store.exists(pref_code, TARGETS_DIR):
+        raise FileNotFoundError(f"target not found: {target_store.get_path(pref_code, TARGETS_DIR)}")
 
+    print(f"Loading targets from {TARGETS_DIR / pref_code}...")
     geometry_map = {}
     coords = []
 
-    for entry in entries:
+    for entry in target_store.iter_records(pref_code, TARGET_COLUMNS, TARGETS_DIR):
         geometry_list = entry.get("geometry_list", [])
         geometry_check_list = entry.get("geometry_check_list", [])
 
@@ -153,17 +151,11 @@ def predict_to_db(pref_code: str, batch_size: int = 128, write_db: bool = False,
     false_count = 0
     total_updated = 0
 
+    # 書き込みはプールから借りた接続でCOPYを使ってバッチ毎にまとめて行う
     conn = None
-    cursor = None
     if write_db:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-    update_query = """
-        UPDATE locations
-        SET claude_center_line = %s, claude_center_line_score = %s
-        WHERE ST_Y(point) = %s AND ST_X(point) = %s
-    """
+        conn = db.get_pool().getconn()
+    update_columns = {"claude_center_line": "boolean", "claude_center_line_score": "float8"}
 
     NUM_LOAD_WORKERS = 4
 
@@ -211,7 +203,7 @@ def predict_to_db(pref_code: str, batch_size: int = 128, write_db: bool = False,
                     batch_data.append((has_cl, prob, item["lat"], item["lng"]))
 
                 if write_db:
-                    execute_batch(cursor, update_query, batch_data, page_size=100)
+                    location_db.update_by_point(conn, update_columns, batch_data)
                     conn.commit()
                     total_updated += len(batch_data)
 
@@ -230,10 +222,8 @@ def predict_to_db(pref_code: str, batch_size: int = 128, write_db: bool = False,
             conn.rollback()
         raise e
     finally:
-        if cursor:
-            cursor.close()
         if conn:
-            conn.close()
+            db.get_pool().putconn(conn)
 
     print("\n=== 完了 ===")
 
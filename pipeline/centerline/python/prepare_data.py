@@ -8,18 +8,20 @@ import random
 from pathlib import Path
 
 import pandas as pd
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from tqdm import tqdm
 
 from config import (
-    DB_CONFIG,
     TMP_DIR,
     DATA_DIR,
     TARGETS_DIR,
     IMAGE_CONFIG,
     TRAIN_CONFIG,
 )
+from analyzer.core import db, target_store
+
+# ターゲットから読む列
+TARGET_COLUMNS = ["geometry_list", "geometry_check_list"]
 
 
 def coord_key(lat: float, lng: float) -> str:
@@ -46,7 +48,7 @@ def calculate_heading(from_lat: float, from_lng: float, to_lat: float, to_lng: f
 
 
 def build_geometry_lookup(pref_codes: list = None) -> dict:
-    """target.jsonからgeometry_listをロード"""
+    """target.ndjson(なければtarget.json)からgeometry_listをロード"""
     geometry_map = {}
     valid_coords = set()
 
@@ -66,15 +68,11 @@ def build_geometry_lookup(pref_codes: list = None) -> dict:
     print(f"{len(pref_dirs)}個の都道府県ディレクトリを処理")
 
     for pref in tqdm(pref_dirs, desc="Loading targets"):
-        target_path = TARGETS_DIR / pref / "target.json"
-        if not target_path.exists():
+        if not target_store.exists(pref, TARGETS_DIR):
             continue
 
         try:
-            with open(target_path, "r", encoding="utf-8") as f:
-                entries = json.load(f)
-
-            for entry in entries:
+            for entry in target_store.iter_records(pref, TARGET_COLUMNS, TARGETS_DIR):
                 geometry_list = entry.get("geometry_list", [])
                 geometry_check_list = entry.get("geometry_check_list", [])
 
@@ -129,19 +127,13 @@ def get_image_path(lat: float, lng: float, heading: float) -> Path:
 
 def fetch_samples_from_db() -> list:
     """PostgreSQLからhas_center_line付きレコードを取得"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
     query = """
         SELECT ST_X(point) AS lng, ST_Y(point) AS lat, has_center_line
         FROM locations
         WHERE has_center_line IS NOT NULL
     """
-    cursor.execute(query)
-    rows = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
+    with db.get_connection() as conn:
+        rows = list(db.stream(conn, query, cursor_factory=RealDictCursor))
 
     return rows
 
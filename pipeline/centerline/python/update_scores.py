@@ -8,15 +8,15 @@ import argparse
 import os
 from pathlib import Path
 
-import psycopg2
-from psycopg2.extras import execute_batch
 import torch
 from PIL import Image
 from tqdm import tqdm
 
-from config import DB_CONFIG, TMP_DIR, MODELS_DIR, get_device
+from config import TMP_DIR, MODELS_DIR, get_device
 from dataset import get_transforms
 from model import CenterLineClassifier
+from analyzer.core import db
+import location_db
 
 
 def build_image_index(tmp_dir: Path) -> dict:
@@ -47,15 +47,11 @@ def main():
 
     # 2. DBからclaude_center_lineが設定済み & scoreが未設定のレコードを取得
     print("\nQuerying DB for records with claude_center_line but no score...")
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    cur.execute("""
+    rows = location_db.fetch_points("""
         SELECT ST_Y(point) as lat, ST_X(point) as lng
         FROM locations
         WHERE claude_center_line_score IS NULL
     """)
-    rows = cur.fetchall()
-    cur.close()
     print(f"  対象レコード: {len(rows)}")
 
     # 3. 画像とマッチング
@@ -78,7 +74,6 @@ def main():
 
     if not items:
         print("推論対象がありません")
-        conn.close()
         return
 
     # 4. モデルロード
@@ -130,29 +125,20 @@ def main():
     # 7. DB書き込み
     if not args.dry_run:
         print("\nWriting scores to database...")
-        cur = conn.cursor()
-        try:
-            update_query = """
-                UPDATE locations
-                SET claude_center_line = %s, claude_center_line_score = %s
-                WHERE ST_Y(point) = %s AND ST_X(point) = %s
-            """
-            update_data = [
-                (r["has_center_line"], r["probability"], r["lat"], r["lng"])
-                for r in results
-            ]
-            execute_batch(cur, update_query, update_data, page_size=100)
-            conn.commit()
-            print(f"  Updated: {len(results)} records")
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cur.close()
+        update_data = [
+            (r["has_center_line"], r["probability"], r["lat"], r["lng"])
+            for r in results
+        ]
+        with db.get_connection() as conn:
+            location_db.update_by_point(
+                conn,
+                {"claude_center_line": "boolean", "claude_center_line_score": "float8"},
+                update_data,
+            )
+        print(f"  Updated: {len(results)} records")
     else:
         print("\n[DRY RUN] --dry-run を外すとDBに書き込みます")
 
-    conn.close()
     print("\n=== 完了 ===")
 
 
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 """
-S3上の targets/{pref}/target.json からビュワー(index_3.html)用の軽量版
+data/targets/{pref}/target.ndjson(なければtarget.json) からビュワー(index_3.html)用の軽量版
 target.slim.json を生成し、gzip圧縮(+Content-Encoding: gzip)でS3に併置する。
 
-- 元の target.json は変更しない（バックアップ: targets_bk_20260611/）
+- 元の target.ndjson / target.json は変更しない（バックアップ: targets_bk_20260611/）
+- ビュワーで使う列(SOURCE_COLUMNS)だけを1ルートずつ読み込む
 - CloudFrontの自動圧縮は10MB超で効かないため、事前gzipで配信する
 - 座標は小数5桁(≈1m精度)に丸める
 
@@ -22,12 +23,12 @@ import urllib.request
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-import psycopg2
-from shapely import wkt
+import shapely
 from shapely.geometry import LineString
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 from analyzer.analysis.column_generater_module.core.linstring_to_polygon import create_vertical_polygon
+from analyzer.core import db, target_store
 
 
 BUCKET = "speedio-old-viewer-788594208758"
@@ -44,6 +45,14 @@ PREFECTURES = {
     "43":"熊本県","44":"大分県","45":"宮崎県","46":"鹿児島県","47":"沖縄県",
 }
 
+# target.ndjsonから読む列(slim_tougeで使う列)
+SOURCE_COLUMNS = [
+    "length", "highway", "name", "geometry_list", "elevation_height", "elevation_smooth", "elevation_fluctuation",
+    "elevation_section", "elevation_unevenness", "elevation_unevenness_count", "elevation_unevenness_sections",
+    "score_elevation", "score_elevation_unevenness", "score_width", "score_length", "score_building", "score_tunnel_outside",
+    "score_corner_week", "score_corner_medium", "score_corner_strong", "score_corner_none", "score_corner_balance",
+    "score_claude_center_line_section", "road_section", "tunnel_sections", "bridge_sections",
+]
 CITY_CONCURRENCY = 10
 CITY_CACHE_FILE = Path(__file__).resolve().parent / "city_cache.json"
 _city_cache = {}
@@ -173,15 +182,17 @@ def fetch_buildings_nearby(cur, geometry_list, buffer_m=15):
     line_coords = [(p[1], p[0]) for p in geometry_list]  # (lng, lat) for shapely
     polygon = create_vertical_polygon(line_coords, buffer_m)
 
-    cur.execute("""
-        SELECT ST_AsText(geometry)
+    # ルート毎に実行するのでプリペアドステートメントにしてWKBで受け取る
+    db.prepare(cur, "buildings_in_bbox", """
+        SELECT ST_AsBinary(geometry)
         FROM buildings
-        WHERE ST_Intersects(geometry, ST_MakeEnvelope(%s, %s, %s, %s, 4326))
-    """, (min(lngs), min(lats), max(lngs), max(lats)))
+        WHERE ST_Intersects(geometry, ST_MakeEnvelope($1, $2, $3, $4, 4326))
+    """)
+    db.execute_prepared(cur, "buildings_in_bbox", (min(lngs), min(lats), max(lngs), max(lats)))
 
     result = []
-    for (wkt_str,) in cur:
-        geom = wkt.loads(wkt_str)
+    for (wkb,) in cur:
+        geom = shapely.from_wkb(bytes(wkb))
         if not geom.intersects(polygon):
             continue
         if geom.geom_type == "Polygon":
@@ -261,20 +272,19 @@ def main():
     local_mode = "--local" in args
     refresh_null = "--refresh-null" in args
     prefs = [a for a in args if not a.startswith("--")] or PREFS
-    conn = psycopg2.connect(host="localhost", dbname="speedia", user="postgres", password="postgres")
+    conn = db.get_pool().getconn()
     cur = conn.cursor()
 
     _load_city_cache(refresh_null=refresh_null)
 
-    # Phase 1: 全県のtarget.jsonを読み込み、全ユニーク座標を収集してAPI一括取得
+    # Phase 1: 全県のターゲットを読み込み、全ユニーク座標を収集してAPI一括取得
     all_data = {}
     all_coord_keys = []
     for code in prefs:
-        raw_path = LOCAL_TARGETS / code / "target.json"
-        if not raw_path.exists():
-            print(f"[{code}] SKIP (local target.json not found)", flush=True)
+        if not target_store.exists(code, LOCAL_TARGETS):
+            print(f"[{code}] SKIP (local target.ndjson not found)", flush=True)
             continue
-        data = json.loads(raw_path.read_text())
+        data = list(target_store.iter_records(code, SOURCE_COLUMNS, LOCAL_TARGETS))
         all_data[code] = data
         for t in data:
             geo = t.get("geometry_list") or []
@@ -307,10 +317,11 @@ def main():
                         "--cache-control", "public, max-age=2592000",
                         "--only-show-errors",
                     ], check=True)
-                print(f"[{code}] {raw_path.stat().st_size/1e6:6.1f}MB -> slim {len(body)/1e6:5.2f}MB -> gzip {len(gzip.compress(body,9))/1e6:5.2f}MB ({len(slim)}件)", flush=True)
+                print(f"[{code}] slim {len(body)/1e6:5.2f}MB -> gzip {len(gzip.compress(body,9))/1e6:5.2f}MB ({len(slim)}件)", flush=True)
     finally:
         cur.close()
-        conn.close()
+        conn.rollback()
+        db.get_pool().putconn(conn)
 
 
 if __name__ == "__main__":
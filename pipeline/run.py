@@ -11,6 +11,9 @@ from analyzer.core.prefecture_polygon import find_prefecture_polygon
 import os
 import osmnx as ox
 from analyzer.core.prefecture import prefecture_codes
+from analyzer.core import prefecture_scheduler, dem_prepare
+from analyzer import incremental
+from analyzer.analysis import overpass_fallback
 
 # OSMキャッシュは実行ディレクトリに依存させず data/cache に固定する
 ox.settings.cache_folder = f"{os.path.dirname(os.path.abspath(__file__))}/../data/cache"
@@ -20,6 +23,11 @@ def run():
 
     execution_timer_ins = ExecutionTimer()
 
+    # 標高TIFを解析用のCOGに変換する(変換済みで変換元が変わっていなければ何もしない)
+    execution_timer_ins.start("🏔️ prepare elevation tif", ExecutionType.PROC)
+    dem_prepare.prepare()
+    execution_timer_ins.stop()
+
     search_all_prefectures = env["SEARCH_ALL_PREFECTURES"]
     if(not search_all_prefectures):
         area_prefecture_name = env["AREA_PREFECTURE_NAME"]
@@ -54,21 +62,47 @@ def run():
             search_area_polygon = find_prefecture_polygon(prefectures_geojson_path, area_prefecture_name)
         execution_timer_ins.stop()
 
+        # 差分更新の場合はOSMの変更箇所だけを再解析してtarget.ndjsonにマージする
+        if env["INCREMENTAL"]:
+            incremental.run(search_area_polygon, plane_epsg_code, prefecture_code, env["OSM_CHANGE_FILE"])
+            return
+
         # メインロジック
         gdf = main(search_area_polygon, plane_epsg_code, prefecture_code)
+    elif env["PARALLEL_WORKERS"] > 1:
+        # 都道府県毎に子プロセスで並列に解析する
+        prefectures_geojson_path = f"{os.path.dirname(os.path.abspath(__file__))}/../data/prefectures.geojson"
+        prefecture_scheduler.run_all(
+            prefecture_codes,
+            prefectures_geojson_path,
+            ox.settings.cache_folder,
+            env["PARALLEL_WORKERS"],
+            env["PARALLEL_MEMORY_GB"],
+            env["INCREMENTAL"],
+            env["OSM_CHANGE_FILE"],
+        )
+        return
     else:
-        for prefecture_name, prefecture_code in prefecture_codes.items():
+        prefectures_geojson_path = f"{os.path.dirname(os.path.abspath(__file__))}/../data/prefectures.geojson"
+        prefecture_items = list(prefecture_codes.items())
+        for i, (prefecture_name, prefecture_code) in enumerate(prefecture_items):
             execution_timer_ins.start("📍 get plane epsg code", ExecutionType.PROC)
             plane_epsg_code = generate_epsg_code(prefecture_name)
             print(f"  prefecture_name: {prefecture_name}, prefecture_code: {prefecture_code}, plane_epsg_code: {plane_epsg_code}")
             execution_timer_ins.stop()
 
             execution_timer_ins.start("🗾 get target area polygon", ExecutionType.PROC)
-            prefectures_geojson_path = f"{os.path.dirname(os.path.abspath(__file__))}/../data/prefectures.geojson"
             search_area_polygon = find_prefecture_polygon(prefectures_geojson_path, prefecture_name)
             execution_timer_ins.stop()
 
-            gdf = main(search_area_polygon, plane_epsg_code, prefecture_code)
+            if env["INCREMENTAL"]:
+                incremental.run(search_area_polygon, plane_epsg_code, prefecture_code, env["OSM_CHANGE_FILE"])
+            else:
+                # 解析中に次の県のグラフを取得しておく
+                if i + 1 < len(prefecture_items):
+                    overpass_fallback.prefetch_graphs(find_prefecture_polygon(prefectures_geojson_path, prefecture_items[i + 1][0]))
+                gdf = main(search_area_polygon, plane_epsg_code, prefecture_code)
+        overpass_fallback.shutdown_prefetch()
         return
 
     if env["SHOW_CORNER"]:
@@ -148,4 +182,5 @@ def run():
     return gdf
 
 
-run()
+if __name__ == "__main__":
+    run()
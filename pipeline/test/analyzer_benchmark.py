@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+解析の列の生成(column_generater)のベンチマーク
+
+benchmark_fixtures.pyの固定データ(small, medium, large)を使い、main()と同じ順番で各列を生成して処理時間を計測する。
+ネットワークとDBは使わない(グラフ、標高、建物、位置データ、国土地理院の道幅は固定データから読む)。
+  - DBを使う列(building_nearby_cnt, locations)はDBから取得した後の処理だけを計測し、locationsは固定データの位置データを座標で結び付ける
+  - 各列はREPEAT回実行して最小と中央値を記録する。前の列の結果を次の列の入力にし、main()と同じ条件でエッジを削除する
+結果はdata/benchmarks/history.jsonlにgitのコミット毎に追記し、同じ固定データで前のコミットの結果と比較して
+REGRESSION_RATIO倍以上遅くなった列を表示する。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/analyzer_benchmark.py [small|medium|large ...]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+import numpy as np
+import geopandas as gpd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+
+import osmnx as ox
+import benchmark_fixtures
+from analyzer.analysis import column_generater, remover
+from analyzer.analysis.turn_edge_spliter import split
+from analyzer.analysis.column_generater_module import building_nearby_cnt
+from analyzer.analysis.column_generater_module.core import infra_matcher, road_width_calculator
+
+# ===== 調整パラメータ =====
+REPEAT = 3                # 各列の実行回数
+REGRESSION_RATIO = 1.2    # 前のコミットより何倍遅くなったら知らせるか
+NOISE_SECONDS = 0.05      # これより短い差は無視する
+HISTORY_PATH = Path(__file__).resolve().parents[2] / "data" / "benchmarks" / "history.jsonl"
+DEFAULT_SIZES = ["small", "medium"]
+
+
+# funcをREPEAT回実行して(最後の結果, 処理時間のリスト)を返す。入力は毎回コピーする
+def measure(func, gdf):
+    seconds = []
+    result = None
+    for _ in range(REPEAT):
+        target = gdf.copy()
+        st = time.perf_counter()
+        result = func(target)
+        seconds.append(time.perf_counter() - st)
+    return result, seconds
+
+
+# main()のload_edgesと同じ前処理(取得以外)
+def load_edges(fixture) -> gpd.GeoDataFrame:
+    gdf_edges = ox.graph_to_gdfs(fixture["graphs"]["graph"], nodes=False, edges=True)
+    for column, value in [("lanes", 1), ("tunnel", "no"), ("tunnel_length", 0), ("bridge", "no"), ("name", "")]:
+        if column not in gdf_edges.columns:
+            gdf_edges[column] = value
+    gdf_edges["tunnel"] = gdf_edges["tunnel"].fillna("no")
+    gdf_edges["bridge"] = gdf_edges["bridge"].fillna("no")
+    gdf_edges["geometry_list"] = gdf_edges["geometry"].apply(lambda x: list(map(lambda y: [y[1], y[0]], x.coords)))
+    gdf_edges["geometry_meter_list"] = column_generater.geometry_meter_list.generate(gdf_edges, fixture["plane_epsg_code"])
+    gdf_edges = remover.reverse_edge.remove(gdf_edges)
+    gdf_edges["start_point"] = column_generater.start_point.generate(gdf_edges)
+    gdf_edges["end_point"] = column_generater.end_point.generate(gdf_edges)
+    return gdf_edges
+
+
+# DBのlocationsとの結合の代わりに、座標が一致する位置データをエッジ毎に並べる
+def generate_locations(gdf_edges, locations) -> list[list[dict]]:
+    records = locations.to_dict(orient="records")
+    index = {(x["longitude"], x["latitude"]): x for x in records}
+    return [
+        [index[xy] for xy in map(tuple, np.asarray(geometry.coords).tolist()) if xy in index]
+        for geometry in gdf_edges.geometry.values
+    ]
+
+
+# main()と同じ順番の列の生成。(名前, 計測する処理, 計測後にmain()と同じ条件でエッジを削除する処理)
+def generate_steps(fixture, work_dir):
+    plane_epsg_code = fixture["plane_epsg_code"]
+    g_all = fixture["graphs"]["graph_all"]
+    gdf_tunnel_edges = None
+    if fixture["graphs"]["graph_tunnel"] is not None and len(fixture["graphs"]["graph_tunnel"].edges) > 0:
+        gdf_tunnel_edges = remover.reverse_edge.remove(ox.graph_to_gdfs(fixture["graphs"]["graph_tunnel"], nodes=False, edges=True))
+    calculator = road_width_calculator.RoadWidthCalculator.from_geoseries(
+        gpd.GeoSeries(fixture["gsi_centers"]), gpd.GeoSeries(fixture["gsi_edges"]), plane_epsg_code,
+    )
+
+    def assign(column, generate):
+        def func(gdf):
+            gdf[column] = generate(gdf)
+            return gdf
+        return func
+
+    # main()のsplit_edgeと同じく、分割でできたエッジだけangle_deltasを計算し直す
+    split_targets = []
+
+    def split_edge(gdf):
+        gdf_split_edges = split(gdf, plane_epsg_code)
+        split_targets[:] = [~gdf_split_edges.index.isin(gdf.index)]
+        return gdf_split_edges
+
+    def calc_elevation_tunnel(gdf):
+        if gdf_tunnel_edges is None:
+            gdf["tunnel_sections"] = [[] for _ in range(len(gdf))]
+            return gdf
+        tunnel_matches = infra_matcher.match(gdf, gdf_tunnel_edges)
+        gdf["elevation"] = column_generater.elevation_infra_regulator.generate(
+            gdf, tunnel_matches, column_generater.elevation_infra_regulator.InfraType.TUNNEL
+        )
+        gdf["tunnel_length"] = column_generater.tunnel_length.generate(gdf, gdf_tunnel_edges, tunnel_matches)
+        gdf["tunnel_sections"] = column_generater.infra_sections.generate(gdf, gdf_tunnel_edges, tunnel_matches)
+        return gdf
+
+    def calc_elevation_profile(gdf):
+        elevation_profile = column_generater.elevation_profile.generate(gdf)
+        for column in elevation_profile.columns:
+            gdf[column] = elevation_profile[column]
+        gdf["video_coords_segment_list"] = [[] for _ in range(len(gdf))]
+        gdf["video_elevation_segment_list"] = [[] for _ in range(len(gdf))]
+        return gdf
+
+    def calc_width_gsi(gdf):
+        # width_gsiは確認用のgeojsonをカレントディレクトリに書き出すので作業ディレクトリで実行する
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            avg_width, min_width = column_generater.width_gsi.generate(gdf, plane_epsg_code, calculator)
+        finally:
+            os.chdir(cwd)
+        gdf["gsi_min_width"] = min_width
+        gdf["gsi_avg_width"] = avg_width
+        return gdf
+
+    def calc_width_alpsmap(gdf):
+        gdf["is_alpsmap"] = column_generater.is_alpsmap.generate(gdf)
+        avg_width, min_width = column_generater.width_alpsmap.generate(gdf)
+        gdf["alpsmap_min_width"] = min_width
+        gdf["alpsmap_avg_width"] = avg_width
+        return gdf
+
+    def calc_steering_wheel_angle(gdf):
+        gdf["steering_wheel_angle_info"] = column_generater.steering_wheel_angle.generate(gdf, plane_epsg_code)
+        gdf["steering_wheel_max_angle"] = gdf["steering_wheel_angle_info"].apply(lambda x: max(item["steering_angle"] for item in x) if x else None)
+        gdf["steering_wheel_avg_angle"] = gdf["steering_wheel_angle_info"].apply(lambda x: sum(item["steering_angle"] for item in x) / len(x) if x else None)
+        return gdf
+
+    def calc_road_section(gdf):
+        gdf["road_section"] = column_generater.road_section.generate(gdf)
+        gdf["road_section_cnt"] = gdf["road_section"].apply(lambda x: len(x))
+        return gdf
+
+    def remove_road_section(gdf):
+        gdf = remover.remove_road_section_small_count.remove(gdf)
+        return gdf[gdf["road_section"].apply(lambda x: any(d.get("section_type") != "straight" for d in x))]
+
+    def calc_building_nearby_cnt(gdf):
+        gdf["building_nearby_cnt"] = building_nearby_cnt.count_nearby(fixture["buildings"], gdf.geometry.values)
+        return gdf
+
+    def calc_score(gdf):
+        gdf["score_elevation_unevenness"] = column_generater.score_elevation_unevenness.generate(gdf)
+        gdf["score_elevation"] = column_generater.score_elevation.generate(gdf)
+        gdf["score_length"] = column_generater.score_length.generate(gdf)
+        gdf["score_width"] = column_generater.score_width.generate(gdf)
+        gdf["score_center_line_section"] = column_generater.score_center_line_section.generate(gdf)
+        gdf["score_claude_center_line_section"] = column_generater.score_claude_center_line_section_detail.generate(gdf)
+        week, medium, strong, none = column_generater.score_corner_level.generate(gdf)
+        gdf["score_corner_week"] = week
+        gdf["score_corner_medium"] = medium
+        gdf["score_corner_strong"] = strong
+        gdf["score_corner_none"] = none
+        gdf["score_corner_balance"] = column_generater.score_corner_balance.generate(gdf)
+        gdf["score_building"] = column_generater.score_building.generate(gdf)
+        gdf["score_tunnel_outside"] = column_generater.score_tunnel_outside.generate(gdf)
+        gdf["score"] = column_generater.score.generate(gdf)
+        return gdf
+
+    def add_locations(gdf):
+        gdf["locations"] = generate_locations(gdf, fixture["locations"])
+        return gdf
+
+    return [
+        ("connection_node_cnt", assign("connection_node_cnt", lambda gdf: column_generater.connection_node_cnt.generate(gdf, g_all)), None),
+        ("angle_deltas", assign("angle_deltas", column_generater.angle_deltas.generate), remover.filter_edge.remove),
+        ("turn_candidate_points", assign("turn_candidate_points", column_generater.turn_candidate_points.generate), None),
+        ("turn", assign("turn_points", lambda gdf: column_generater.turn.generate(gdf, g_all)), None),
+        ("split", split_edge, None),
+        ("angle_deltas(split)", assign("angle_deltas", lambda gdf: column_generater.angle_deltas.update(gdf, split_targets[0])), remover.filter_edge.remove),
+        ("elevation", assign("elevation", lambda gdf: column_generater.elevation.generate(gdf, fixture["dem_path"])), None),
+        ("min_elevation", assign("min_elevation", column_generater.min_elevation.generate_min_elevation), None),
+        ("elevation_tunnel", calc_elevation_tunnel, None),
+        ("elevation_profile", calc_elevation_profile, None),
+        ("elevation_unevenness", assign("elevation_unevenness", column_generater.elevation_unevenness.generate), None),
+        ("elevation_unevenness_count", assign("elevation_unevenness_count", column_generater.elevation_unevenness_count.generate), None),
+        ("elevation_unevenness_sections", assign("elevation_unevenness_sections", column_generater.elevation_unevenness_sections.generate), None),
+        ("width_gsi", calc_width_gsi, None),
+        ("width_alpsmap", calc_width_alpsmap, add_locations),
+        ("steering_wheel_angle", calc_steering_wheel_angle, None),
+        ("road_section", calc_road_section, remove_road_section),
+        ("building_nearby_cnt", calc_building_nearby_cnt, None),
+        ("score", calc_score, None),
+    ]
+
+
+def run(size: str) -> list[dict]:
+    fixture = benchmark_fixtures.load(size)
+    gdf_edges = load_edges(fixture)
+    print(f"[{size}] fixture: {fixture['fixture_hash']}, edges: {len(gdf_edges)}")
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, func, after in generate_steps(fixture, work_dir):
+            rows = len(gdf_edges)
+            gdf_edges, seconds = measure(func, gdf_edges)
+            if after is not None:
+                gdf_edges = after(gdf_edges)
+            results.append({
+                "size": size,
+                "fixture_hash": fixture["fixture_hash"],
+                "name": name,
+                "rows": rows,
+                "min_seconds": round(min(seconds), 5),
+                "median_seconds": round(statistics.median(seconds), 5),
+            })
+    if len(gdf_edges) == 0:
+        print(f"  ⚠️ no edges left after filtering ({size})")
+    return results
+
+
+def get_commit() -> tuple[str, bool]:
+    root = Path(__file__).resolve().parents[2]
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True, check=True).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return "", False
+    return commit, dirty
+
+
+# 同じ固定データ、同じ列の前のコミットの結果
+def load_previous(commit: str) -> dict:
+    previous = {}
+    if not HISTORY_PATH.exists():
+        return previous
+    for line in HISTORY_PATH.read_text().splitlines():
+        record = json.loads(line)
+        if record["commit"] != commit or record["dirty"]:
+            previous[(record["size"], record["fixture_hash"], record["name"])] = record
+    return previous
+
+
+def main():
+    sizes = [x for x in sys.argv[1:] if x in benchmark_fixtures.SIZES] or DEFAULT_SIZES
+    commit, dirty = get_commit()
+    previous = load_previous(commit)
+
+    results = [result for size in sizes for result in run(size)]
+    regressions = []
+    print(f"{'size':7} {'name':30} {'rows':>6} {'min(s)':>9} {'median(s)':>10} {'rows/s':>10}  previous")
+    for result in results:
+        before = previous.get((result["size"], result["fixture_hash"], result["name"]))
+        compared = ""
+        if before is not None:
+            ratio = result["min_seconds"] / before["min_seconds"] if before["min_seconds"] > 0 else 1.0
+            compared = f"x{ratio:.2f} ({before['commit'][:8]})"
+            if ratio >= REGRESSION_RATIO and result["min_seconds"] - before["min_seconds"] >= NOISE_SECONDS:
+                regressions.append(result)
+                compared += " ⚠️"
+        rows_per_second = result["rows"] / result["min_seconds"] if result["min_seconds"] > 0 else 0
+        print(f"{result['size']:7} {result['name']:30} {result['rows']:>6} {result['min_seconds']:>9.4f} {result['median_seconds']:>10.4f} {rows_per_second:>10.0f}  {compared}")
+
+    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(HISTORY_PATH, "a") as f:
+        for result in results:
+            f.write(json.dumps({"commit": commit, "dirty": dirty, "created_at": time.time(), "repeat": REPEAT, **result}) + "\n")
+    print(f"history: {HISTORY_PATH} (commit {commit[:8]}{', dirty' if dirty else ''})")
+    if regressions:
+        print("❌ regression: " + ", ".join(f"{x['size']}/{x['name']}" for x in regressions))
+    else:
+        print("✅ no regression")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+angle_deltas, turn_candidate_points(座標を1本の配列にしてまとめて角度を計算する版)の確認
+
+benchmark_fixtures.pyの固定データと、短いエッジや同じ座標が続くエッジ等の端のケースで、
+エッジ毎にcalculate_angle_between_vectorsを呼ぶ元の実装と結果が完全に一致するか、処理時間を比較する。
+  - angle_deltas:          隣り合う3点のなす角の合計
+  - turn_candidate_points: 2つ前の点、点、2つ先の点のなす角が80度を超える点(a, b, c, angle_ab_bc)
+  - angle_deltas.update:   分割後に分割でできたエッジだけ計算し直した結果が、全エッジを計算し直した結果と一致するか
+元の実装は長さ0のベクトルがあるとturn_candidate_pointsでTypeErrorになるので、その組は飛ばす(Noneの判定の意図通り)。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/angle_vectorize_check.py [small|medium|large ...]
+"""
+import os
+import sys
+import time
+import numpy as np
+import osmnx as ox
+from geopandas import GeoDataFrame
+from shapely.geometry import LineString
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+
+import benchmark_fixtures
+from analyzer.analysis import column_generater, remover
+from analyzer.analysis.turn_edge_spliter import split
+from analyzer.analysis.column_generater_module.core.calculate_angle_between_vectors import calculate_angle_between_vectors
+
+# ===== 調整パラメータ =====
+DEFAULT_SIZES = ["large"]
+REPEAT = 3
+EDGE_CASES = [
+    [(0, 0), (1, 0)],
+    [(0, 0), (1, 0), (1, 1)],
+    [(0, 0), (1, 0), (1, 0), (2, 0), (2, 1)],
+    [(0, 0), (1, 0), (0, 0), (1, 0), (0, 0), (1, 1)],
+    [(0, 0), (1, 0), (2, 0), (1, 0), (0, 0), (0, 1), (0, 2)],
+    [(137.0, 35.0), (137.001, 35.0), (137.002, 35.001), (137.002, 35.002), (137.001, 35.003), (137.0, 35.003)],
+]
+
+
+# 元の実装(エッジ毎に座標をリストにしてPythonで計算する)
+def generate_angle_deltas_per_row(gdf):
+    def func(row):
+        coords = list(row.geometry.coords)
+        angle_total = 0
+        for i in range(1, len(coords) - 1):
+            result = calculate_angle_between_vectors(coords[i - 1], coords[i], coords[i + 1])
+            if result is None:
+                continue
+            angle_total += result[0]
+        return angle_total
+    return [func(row) for _, row in gdf.iterrows()]
+
+
+def generate_turn_candidate_points_per_row(gdf):
+    def func(row):
+        candidates = []
+        coords = list(row.geometry.coords)
+        if len(coords) < 5:
+            return candidates
+        for j in range(2, len(coords) - 2):
+            a, b, c = coords[j - 2], coords[j], coords[j + 2]
+            result = calculate_angle_between_vectors(a, b, c)
+            if result is None:
+                continue
+            if result[0] > 80:
+                candidates.append({"a": a, "b": b, "c": c, "angle_ab_bc": result[0]})
+        return candidates
+    return [func(row) for _, row in gdf.iterrows()]
+
+
+def measure(func, gdf):
+    seconds = []
+    result = None
+    for _ in range(REPEAT):
+        st = time.perf_counter()
+        result = func(gdf)
+        seconds.append(time.perf_counter() - st)
+    return result, min(seconds)
+
+
+def compare(name, gdf) -> bool:
+    expected_deltas, per_row_seconds = measure(generate_angle_deltas_per_row, gdf)
+    deltas, seconds = measure(column_generater.angle_deltas.generate, gdf)
+    ok = np.array_equal(np.asarray(expected_deltas, dtype=float), deltas.to_numpy()) and deltas.index.equals(gdf.index)
+    print(f"  {name:8} angle_deltas          rows {len(gdf):5} per row {per_row_seconds:.4f}s, vectorized {seconds:.4f}s {'ok' if ok else 'ng'}")
+
+    expected_candidates, per_row_seconds = measure(generate_turn_candidate_points_per_row, gdf)
+    candidates, seconds = measure(column_generater.turn_candidate_points.generate, gdf)
+    matched = [str(x) for x in expected_candidates] == [str(x) for x in candidates]
+    count = sum(len(x) for x in candidates)
+    print(f"  {name:8} turn_candidate_points rows {len(gdf):5} per row {per_row_seconds:.4f}s, vectorized {seconds:.4f}s, candidates {count} {'ok' if matched else 'ng'}")
+    return ok and matched
+
+
+# main()と同じ順番で分割まで行い、分割でできたエッジだけ計算し直した結果と全エッジを計算し直した結果を比較する
+def compare_split(size, fixture) -> bool:
+    g_all = fixture["graphs"]["graph_all"]
+    gdf_edges = ox.graph_to_gdfs(fixture["graphs"]["graph"], nodes=False, edges=True)
+    gdf_edges["geometry_list"] = gdf_edges["geometry"].apply(lambda x: list(map(lambda y: [y[1], y[0]], x.coords)))
+    gdf_edges["geometry_meter_list"] = column_generater.geometry_meter_list.generate(gdf_edges, fixture["plane_epsg_code"])
+    gdf_edges = remover.reverse_edge.remove(gdf_edges)
+    gdf_edges["connection_node_cnt"] = column_generater.connection_node_cnt.generate(gdf_edges, g_all)
+    gdf_edges["angle_deltas"] = column_generater.angle_deltas.generate(gdf_edges)
+    gdf_edges = remover.filter_edge.remove(gdf_edges)
+    gdf_edges["turn_candidate_points"] = column_generater.turn_candidate_points.generate(gdf_edges)
+    gdf_edges["turn_points"] = column_generater.turn.generate(gdf_edges, g_all)
+
+    gdf_split_edges = split(gdf_edges, fixture["plane_epsg_code"])
+    split_targets = ~gdf_split_edges.index.isin(gdf_edges.index)
+    expected, full_seconds = measure(column_generater.angle_deltas.generate, gdf_split_edges)
+    updated, seconds = measure(lambda gdf: column_generater.angle_deltas.update(gdf, split_targets), gdf_split_edges)
+    ok = np.array_equal(expected.to_numpy(), updated.to_numpy())
+    ok &= len(remover.filter_edge.remove(gdf_split_edges.assign(angle_deltas=updated))) == len(remover.filter_edge.remove(gdf_split_edges.assign(angle_deltas=expected)))
+    print(
+        f"  {size:8} split: rows {len(gdf_edges)} -> {len(gdf_split_edges)} (new {int(split_targets.sum())}), "
+        f"all {full_seconds:.4f}s, new only {seconds:.4f}s {'ok' if ok else 'ng'}"
+    )
+    return ok and bool(split_targets.any())
+
+
+def main():
+    sizes = [x for x in sys.argv[1:] if x in benchmark_fixtures.SIZES] or DEFAULT_SIZES
+    ok = True
+
+    gdf = GeoDataFrame({"name": range(len(EDGE_CASES))}, geometry=[LineString(x) for x in EDGE_CASES])
+    ok &= compare("edge", gdf)
+    ok &= compare("empty", gdf.iloc[:0])
+
+    for size in sizes:
+        fixture = benchmark_fixtures.load(size)
+        gdf_edges = remover.reverse_edge.remove(ox.graph_to_gdfs(fixture["graphs"]["graph"], nodes=False, edges=True))
+        ok &= compare(size, gdf_edges)
+        ok &= compare_split(size, fixture)
+    print("✅ parity ok" if ok else "❌ parity ng")
+
+
+if __name__ == "__main__":
+    main()
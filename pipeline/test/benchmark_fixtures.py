@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク(analyzer_benchmark.py)用の固定データ
+
+実際の県の切り出しではなく、山道を想定した曲がりくねった道路網を乱数のシードから作った合成データ。
+(OSM、DEM、DBの建物、位置データを含めた県の切り出しはライセンスと容量の都合でリポジトリに置けないため)
+解析に必要なデータを<size>/に書き出して固定する(一度作ったら--forceを付けない限り作り直さない)。
+  - small:         リポジトリのpipeline/test/fixtures/benchmark/small/ に作成済みのものを置いている(作り直さない)
+  - medium, large: 容量が大きいので初回にdata/benchmark_fixtures/<size>/ に作る
+各ファイルの内容のチェックサムをbenchmark_fixtures.sha256.jsonでリポジトリに置き、読み込み時に照合する。
+依存ライブラリの更新等で同じデータが作れなくなった場合は読み込みでエラーにする(別のデータで結果を比較しない)。
+意図して作り直した場合は--update-checksumsでチェックサムを更新してコミットする。
+  - graph, graph_all, graph_tunnel, graph_bridge: pbfからOSM_SOURCE=pbfで作ったグラフ(overpass_cacheの形式)
+  - dem.tif:        範囲を切り出した標高(EPSG:4326, タイル化したGeoTIFF)
+  - buildings.npz:  道路沿いの建物(WKB)。DBのbuildingsの代わり
+  - locations.npz:  道路の座標の位置データ。DBのlocationsの代わり
+  - gsi.npz:        国土地理院の中央線と道路縁(平面直角座標系のWKB)。_center, _rdedgの代わり
+  - fixture.json:   生成条件と各ファイルのチェックサム
+チェックサムはグラフ以外はファイルのSHA-256、グラフはzipの作成日時等を除くためにノードとエッジの内容から作ったSHA-256。
+ベンチマークの結果はチェックサムをまとめたハッシュ(fixture_hash)毎に比較する。
+作成にはpyosmium(osmium)とrasterioが必要。読み込み(load)はネットワークもDBも使わない。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/benchmark_fixtures.py [small|medium|large ...] [--force] [--update-checksums]
+"""
+import os
+import sys
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import box
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+
+from analyzer.analysis import overpass_cache
+from analyzer.core import projection_service
+
+# ===== 調整パラメータ =====
+FIXTURE_DIR = Path(__file__).resolve().parents[2] / "data" / "benchmark_fixtures"
+# リポジトリに置いている固定データ
+COMMITTED_FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "benchmark"
+COMMITTED_SIZES = ["small"]
+CHECKSUMS_PATH = Path(__file__).resolve().with_name("benchmark_fixtures.sha256.json")
+# 生成処理を変えた場合は上げる(固定データを作り直す)
+FIXTURE_VERSION = 2
+# junctions: 交差点の格子の縦横の数(道路の数は約2×junctions^2本)
+SIZES = {
+    "small": {"junctions": 4, "seed": 0},
+    "medium": {"junctions": 8, "seed": 1},
+    "large": {"junctions": 16, "seed": 2},
+}
+ORIGIN = (137.8, 35.9)        # 格子の南西端(経度, 緯度)。長野県の山間部
+PLANE_EPSG_CODE = 6676        # 平面直角座標系VIII系
+JUNCTION_STEP_DEGREE = 0.02   # 交差点の間隔(度)
+MARGIN_DEGREE = 0.008         # 範囲の外側の余白(度)
+POINT_STEP_METERS = 15        # 道路の座標の間隔(m)
+DEM_RESOLUTION_DEGREE = 0.0002
+GRAPH_NAMES = ["graph", "graph_all", "graph_tunnel", "graph_bridge"]
+ROAD_WIDTH_TYPES = ["TWO_LANE", "TWO_LANE_SHOULDER", "ONE_LANE_SPACIOUS", "ONE_LANE"]
+MAIN_HIGHWAYS = ["primary", "secondary", "tertiary"]
+SIDE_HIGHWAYS = ["residential", "unclassified", "service"]
+
+METERS_PER_DEGREE_LAT = 110540.0
+METERS_PER_DEGREE_LON = 111320.0 * np.cos(np.radians(ORIGIN[1]))
+
+
+def get_fixture_dir(size: str) -> Path:
+    return (COMMITTED_FIXTURE_DIR if size in COMMITTED_SIZES else FIXTURE_DIR) / size
+
+
+def get_bounds(size: str) -> tuple[float, float, float, float]:
+    span = (SIZES[size]["junctions"] - 1) * JUNCTION_STEP_DEGREE
+    return (ORIGIN[0] - MARGIN_DEGREE, ORIGIN[1] - MARGIN_DEGREE, ORIGIN[0] + span + MARGIN_DEGREE, ORIGIN[1] + span + MARGIN_DEGREE)
+
+
+# ===== 道路網 =====
+# 2点間を左右に蛇行する道路の座標(経度緯度)。大きなカーブに細かいカーブを重ね、端点では蛇行しない
+def generate_winding_road(rng, st, ed) -> np.ndarray:
+    dx = (ed[0] - st[0]) * METERS_PER_DEGREE_LON
+    dy = (ed[1] - st[1]) * METERS_PER_DEGREE_LAT
+    length = np.hypot(dx, dy)
+    t = np.linspace(0, 1, max(int(length / POINT_STEP_METERS), 2) + 1)
+    lateral = np.zeros_like(t)
+    for k in range(1, 25):
+        lateral += rng.normal(0, 220 / k**1.2) * np.sin(k * np.pi * t)
+    lateral = np.clip(lateral, -450, 450)
+    # 進行方向に直交する向きにずらす
+    nx, ny = -dy / length, dx / length
+    x = t * dx + lateral * nx
+    y = t * dy + lateral * ny
+    return np.column_stack([st[0] + x / METERS_PER_DEGREE_LON, st[1] + y / METERS_PER_DEGREE_LAT])
+
+
+# 交差点の格子の隣同士を結ぶ幹線(一部はトンネル、橋の区間を持つ)と、幹線から分岐する行き止まりの脇道のway
+# 座標はpbfに書き込む精度(1e-7度)に丸める
+def generate_network(size: str):
+    rng = np.random.default_rng(SIZES[size]["seed"])
+    n = SIZES[size]["junctions"]
+    jitter = rng.uniform(-0.2, 0.2, size=(n, n, 2)) * JUNCTION_STEP_DEGREE
+    junctions = {
+        (i, j): (ORIGIN[0] + j * JUNCTION_STEP_DEGREE + jitter[i, j, 0], ORIGIN[1] + i * JUNCTION_STEP_DEGREE + jitter[i, j, 1])
+        for i in range(n) for j in range(n)
+    }
+    coords = {}
+    node_ids = {}
+    next_node_id = 1
+    for key, coord in junctions.items():
+        node_ids[key] = next_node_id
+        coords[next_node_id] = coord
+        next_node_id += 1
+
+    ways = []
+    roads = []
+    for (i, j) in junctions:
+        for di, dj in ((0, 1), (1, 0)):
+            if (i + di, j + dj) not in junctions or rng.random() < 0.15:
+                continue
+            st_coord, ed_coord = junctions[(i, j)], junctions[(i + di, j + dj)]
+            # 3割の道路は途中の交差点で大きく曲がる(曲がった先には脇道がまっすぐ続く)
+            corner = None
+            if rng.random() < 0.3:
+                side = rng.choice([-1, 1]) * 0.6
+                corner = (
+                    (st_coord[0] + ed_coord[0]) / 2 - (ed_coord[1] - st_coord[1]) * side * METERS_PER_DEGREE_LAT / METERS_PER_DEGREE_LON,
+                    (st_coord[1] + ed_coord[1]) / 2 + (ed_coord[0] - st_coord[0]) * side * METERS_PER_DEGREE_LON / METERS_PER_DEGREE_LAT,
+                )
+                first = generate_winding_road(rng, st_coord, corner)
+                points = np.concatenate([first, generate_winding_road(rng, corner, ed_coord)[1:]])
+                corner_index = len(first) - 1
+            else:
+                points = generate_winding_road(rng, st_coord, ed_coord)
+            points = np.round(points, 7)
+            nodes = [node_ids[(i, j)]]
+            for point in points[1:-1]:
+                coords[next_node_id] = tuple(point)
+                nodes.append(next_node_id)
+                next_node_id += 1
+            nodes.append(node_ids[(i + di, j + dj)])
+            if corner is not None:
+                corner_node = nodes[corner_index]
+                direction = np.array(corner) - np.array(st_coord)
+                end = tuple(np.array(coords[corner_node]) + direction / np.linalg.norm(direction) * 0.004)
+                side_points = np.round(generate_winding_road(rng, coords[corner_node], end), 7)
+                side_nodes = [corner_node]
+                for point in side_points[1:]:
+                    coords[next_node_id] = tuple(point)
+                    side_nodes.append(next_node_id)
+                    next_node_id += 1
+                ways.append((len(ways) + 1, side_nodes, {"highway": str(rng.choice(SIDE_HIGHWAYS))}))
+            tags = {"highway": str(rng.choice(MAIN_HIGHWAYS)), "lanes": "2", "name": f"road {len(roads)}"}
+            if rng.random() < 0.2:
+                tags["yh:WIDTH"] = str(rng.choice(["5.5m〜13.0m", "3.0m〜5.5m"]))
+                tags["source"] = "YahooJapan/ALPSMAP"
+            # 道路の途中をトンネルまたは橋の区間にする
+            cut = None
+            infra = rng.random()
+            if infra < 0.25 and len(nodes) > 20:
+                st = int(rng.integers(5, len(nodes) // 2))
+                cut = (st, min(st + int(rng.integers(5, 40)), len(nodes) - 5), "tunnel" if infra < 0.15 else "bridge")
+            if cut is None:
+                ways.append((len(ways) + 1, nodes, tags))
+            else:
+                st, ed, infra_tag = cut
+                ways.append((len(ways) + 1, nodes[:st + 1], tags))
+                ways.append((len(ways) + 1, nodes[st:ed + 1], {**tags, infra_tag: "yes", "layer": "-1" if infra_tag == "tunnel" else "1"}))
+                ways.append((len(ways) + 1, nodes[ed:], tags))
+            roads.append(nodes)
+
+            # 脇道(全道路のグラフにだけ入る)
+            for _ in range(int(rng.integers(0, 4))):
+                branch = nodes[int(rng.integers(3, len(nodes) - 3))]
+                angle = rng.uniform(0, 2 * np.pi)
+                branch_length = rng.uniform(150, 600)
+                end = (
+                    coords[branch][0] + np.cos(angle) * branch_length / METERS_PER_DEGREE_LON,
+                    coords[branch][1] + np.sin(angle) * branch_length / METERS_PER_DEGREE_LAT,
+                )
+                side_points = np.round(generate_winding_road(rng, coords[branch], end), 7)
+                side_nodes = [branch]
+                for point in side_points[1:]:
+                    coords[next_node_id] = tuple(point)
+                    side_nodes.append(next_node_id)
+                    next_node_id += 1
+                ways.append((len(ways) + 1, side_nodes, {"highway": str(rng.choice(SIDE_HIGHWAYS))}))
+    return ways, coords, roads
+
+
+def write_pbf(path, ways, coords):
+    import osmium
+
+    with osmium.SimpleWriter(str(path)) as writer:
+        for node_id, (lon, lat) in coords.items():
+            writer.add_node(osmium.osm.mutable.Node(id=node_id, location=(lon, lat), tags={}))
+        for way_id, nodes, tags in ways:
+            writer.add_way(osmium.osm.mutable.Way(id=way_id, nodes=nodes, tags=tags))
+
+
+# pbfからパイプラインと同じ取得条件でグラフを作る
+# 単純化でまとめた属性のリストはsetを経由して作られ、プロセス毎に文字列のハッシュが変わると順番が変わるので並べ替えて固定する
+def generate_graphs(pbf_path, polygon) -> dict:
+    os.environ["OSM_SOURCE"] = "pbf"
+    os.environ["OSM_PBF_PATH"] = str(pbf_path)
+    from analyzer.analysis import graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_feather
+
+    graphs = {
+        "graph": graph_feather.fetch_graph(polygon),
+        "graph_all": graph_all_feather.fetch_graph(polygon),
+        "graph_tunnel": graph_tunnel_feather.fetch_graph(polygon),
+        "graph_bridge": graph_bridge_feather.fetch_graph(polygon),
+    }
+    for graph in graphs.values():
+        if graph is None:
+            continue
+        for _, _, data in graph.edges(data=True):
+            for key, value in data.items():
+                if isinstance(value, list):
+                    data[key] = sorted(value, key=str)
+    return graphs
+
+
+# ===== 標高、建物、位置データ、道幅 =====
+# 尾根と谷がある地形(m)。格子の座標(度)から求める
+def generate_elevation(rng, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    x = (lons - ORIGIN[0]) * METERS_PER_DEGREE_LON
+    y = (lats - ORIGIN[1]) * METERS_PER_DEGREE_LAT
+    elevation = 900 + 0.02 * y + np.zeros_like(x)
+    for _ in range(12):
+        wavelength = rng.uniform(600, 6000)
+        direction = rng.uniform(0, 2 * np.pi)
+        phase = rng.uniform(0, 2 * np.pi)
+        elevation += rng.uniform(20, 250) * wavelength / 6000 * np.sin(2 * np.pi * (x * np.cos(direction) + y * np.sin(direction)) / wavelength + phase)
+    return elevation
+
+
+def write_dem(path, rng, bounds):
+    import rasterio
+    from rasterio.transform import from_origin
+
+    west, south, east, north = bounds
+    width = int(np.ceil((east - west) / DEM_RESOLUTION_DEGREE))
+    height = int(np.ceil((north - south) / DEM_RESOLUTION_DEGREE))
+    lons = west + (np.arange(width) + 0.5) * DEM_RESOLUTION_DEGREE
+    lats = north - (np.arange(height) + 0.5) * DEM_RESOLUTION_DEGREE
+    elevation = generate_elevation(rng, lons[np.newaxis, :], lats[:, np.newaxis]).astype(np.float32)
+    with rasterio.open(
+        path, "w", driver="GTiff", width=width, height=height, count=1, dtype="float32", crs="EPSG:4326",
+        transform=from_origin(west, north, DEM_RESOLUTION_DEGREE, DEM_RESOLUTION_DEGREE),
+        tiled=True, blockxsize=512, blockysize=512, compress="deflate", nodata=-9999,
+    ) as dst:
+        dst.write(elevation, 1)
+
+
+# 道路の座標から8〜40m離れた位置に建物(8〜14m四方)を置く
+def generate_buildings(rng, road_coords: np.ndarray) -> np.ndarray:
+    count = len(road_coords) // 20
+    base = road_coords[rng.integers(0, len(road_coords), size=count)]
+    angle = rng.uniform(0, 2 * np.pi, size=count)
+    distance = rng.uniform(8, 40, size=count)
+    half = rng.uniform(4, 7, size=count)
+    center_x = base[:, 0] + np.cos(angle) * distance / METERS_PER_DEGREE_LON
+    center_y = base[:, 1] + np.sin(angle) * distance / METERS_PER_DEGREE_LAT
+    return shapely.box(
+        center_x - half / METERS_PER_DEGREE_LON, center_y - half / METERS_PER_DEGREE_LAT,
+        center_x + half / METERS_PER_DEGREE_LON, center_y + half / METERS_PER_DEGREE_LAT,
+    )
+
+
+# 幹線の座標の6割に位置データを付ける
+def generate_locations(rng, road_coords: np.ndarray) -> dict[str, np.ndarray]:
+    selected = road_coords[rng.random(len(road_coords)) < 0.6]
+    count = len(selected)
+    scores = rng.uniform(0, 1, size=count)
+    return {
+        "longitude": selected[:, 0],
+        "latitude": selected[:, 1],
+        "road_width_type": rng.choice(ROAD_WIDTH_TYPES, size=count),
+        "has_center_line": rng.random(count) < 0.5,
+        "claude_center_line": rng.random(count) < 0.5,
+        "claude_center_line_score": np.where(rng.random(count) < 0.8, scores, np.nan),
+        "claude_road_width_type": rng.choice(ROAD_WIDTH_TYPES, size=count),
+    }
+
+
+# 幹線の8割に中央線と、その両側に道幅(4.5〜9m)の半分ずらした道路縁を作る(平面直角座標系)
+def generate_gsi(rng, roads: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    centers = []
+    edges = []
+    for coords in roads:
+        if rng.random() >= 0.8:
+            continue
+        xs, ys = projection_service.to_plane(coords[:, 0], coords[:, 1], PLANE_EPSG_CODE)
+        center = shapely.LineString(np.column_stack([xs, ys]))
+        width = rng.uniform(4.5, 9)
+        centers.append(center)
+        edges.append(shapely.offset_curve(center, width / 2))
+        edges.append(shapely.offset_curve(center, -width / 2))
+    return np.array(centers, dtype=object), np.array(edges, dtype=object)
+
+
+def save_geometries(path, **geometries):
+    arrays = {}
+    for name, values in geometries.items():
+        wkbs = shapely.to_wkb(values)
+        arrays[f"{name}_wkb"] = np.frombuffer(b"".join(wkbs), dtype=np.uint8)
+        arrays[f"{name}_offsets"] = np.concatenate([[0], np.cumsum([len(x) for x in wkbs])]).astype(np.int64)
+    np.savez_compressed(path, **arrays)
+
+
+def load_geometries(path, name: str) -> np.ndarray:
+    with np.load(path) as data:
+        wkb = data[f"{name}_wkb"].tobytes()
+        offsets = data[f"{name}_offsets"]
+    return shapely.from_wkb([wkb[st:ed] for st, ed in zip(offsets[:-1], offsets[1:])])
+
+
+def generate_sha256(path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+# グラフの内容(ノード、エッジと属性)のSHA-256。zipの作成日時やリストの属性の順番では変わらない
+def generate_graph_sha256(graph) -> str:
+    sha256 = hashlib.sha256()
+    for node, data in sorted(graph.nodes(data=True)):
+        sha256.update(repr((node, sorted((key, str(value)) for key, value in data.items()))).encode())
+    for u, v, k, data in sorted(graph.edges(keys=True, data=True), key=lambda x: x[:3]):
+        values = sorted(
+            (key, value.wkb_hex if key == "geometry" else str(sorted(map(str, value)) if isinstance(value, list) else value))
+            for key, value in data.items()
+        )
+        sha256.update(repr((u, v, k, values)).encode())
+    return sha256.hexdigest()
+
+
+def generate_checksums(fixture_dir: Path) -> dict[str, str]:
+    checksums = {}
+    for path in sorted(fixture_dir.iterdir()):
+        if path.name == "fixture.json":
+            continue
+        if path.name.endswith(overpass_cache.FILE_SUFFIX):
+            checksums[path.name] = generate_graph_sha256(overpass_cache.load(path.name[:-len(overpass_cache.FILE_SUFFIX)], cache_dir=fixture_dir))
+        else:
+            checksums[path.name] = generate_sha256(path)
+    return checksums
+
+
+def load_committed_checksums() -> dict:
+    return json.loads(CHECKSUMS_PATH.read_text()) if CHECKSUMS_PATH.exists() else {}
+
+
+# 作った固定データのチェックサムをリポジトリのbenchmark_fixtures.sha256.jsonに書き込む
+def update_checksums(size: str) -> None:
+    checksums = load_committed_checksums()
+    checksums[size] = json.loads((get_fixture_dir(size) / "fixture.json").read_text())["files"]
+    CHECKSUMS_PATH.write_text(json.dumps(dict(sorted(checksums.items())), indent=2) + "\n")
+    print(f"  checksums: {CHECKSUMS_PATH}")
+
+
+# ===== 作成と読み込み =====
+def freeze(size: str, force: bool = False) -> Path:
+    fixture_dir = get_fixture_dir(size)
+    manifest_path = fixture_dir / "fixture.json"
+    if not force and manifest_path.exists() and json.loads(manifest_path.read_text()).get("version") == FIXTURE_VERSION:
+        return fixture_dir
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    print(f"[freeze] {size} -> {fixture_dir}")
+
+    ways, coords, roads = generate_network(size)
+    bounds = get_bounds(size)
+    polygon = box(*bounds)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pbf_path = Path(tmp_dir) / "fixture.osm.pbf"
+        write_pbf(pbf_path, ways, coords)
+        graphs = generate_graphs(pbf_path, polygon)
+    for name, graph in graphs.items():
+        if graph is not None:
+            overpass_cache.store(name, graph, cache_dir=fixture_dir)
+        else:
+            overpass_cache.get_path(name, fixture_dir).unlink(missing_ok=True)
+
+    rng = np.random.default_rng(SIZES[size]["seed"] + 1000)
+    write_dem(fixture_dir / "dem.tif", rng, bounds)
+    road_coords = [np.array([coords[x] for x in nodes]) for nodes in roads]
+    all_road_coords = np.concatenate(road_coords)
+    save_geometries(fixture_dir / "buildings.npz", buildings=generate_buildings(rng, all_road_coords))
+    np.savez_compressed(fixture_dir / "locations.npz", **generate_locations(rng, all_road_coords))
+    centers, edges = generate_gsi(rng, road_coords)
+    save_geometries(fixture_dir / "gsi.npz", centers=centers, edges=edges)
+
+    manifest = {
+        "version": FIXTURE_VERSION,
+        "synthetic": True,
+        "size": size,
+        **SIZES[size],
+        "bounds": bounds,
+        "plane_epsg_code": PLANE_EPSG_CODE,
+        "ways": len(ways),
+        "nodes": len(coords),
+        "files": generate_checksums(fixture_dir),
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n")
+    print(f"  ways: {len(ways)}, nodes: {len(coords)}, edges: {len(graphs['graph'].edges)}")
+    return fixture_dir
+
+
+# 固定データを読み込む(ない場合は作る)。fixture_hashは固定データのチェックサムをまとめたもの
+# リポジトリのチェックサムと一致しない場合(依存ライブラリの更新等で同じデータが作れなかった場合)はValueError
+def load(size: str) -> dict:
+    fixture_dir = freeze(size)
+    manifest = json.loads((fixture_dir / "fixture.json").read_text())
+    for name in manifest["files"]:
+        if not (fixture_dir / name).exists():
+            raise FileNotFoundError(f"{fixture_dir / name} is missing. run: benchmark_fixtures.py {size} --force")
+    expected = load_committed_checksums().get(size)
+    if expected is None:
+        raise ValueError(f"no checksums for {size} in {CHECKSUMS_PATH.name}. run: benchmark_fixtures.py {size} --update-checksums")
+    checksums = generate_checksums(fixture_dir)
+    if checksums != expected:
+        mismatched = sorted(name for name in expected.keys() | checksums.keys() if checksums.get(name) != expected.get(name))
+        raise ValueError(
+            f"{fixture_dir} does not match {CHECKSUMS_PATH.name}: {mismatched}. "
+            f"if the fixture was regenerated on purpose, run: benchmark_fixtures.py {size} --force --update-checksums"
+        )
+
+    with np.load(fixture_dir / "locations.npz") as data:
+        locations = pd.DataFrame({name: data[name] for name in data.files})
+    locations["claude_center_line_score"] = locations["claude_center_line_score"].astype(object).where(locations["claude_center_line_score"].notna(), None)
+
+    return {
+        "size": size,
+        "fixture_hash": hashlib.sha256(json.dumps(expected, sort_keys=True).encode()).hexdigest()[:16],
+        "plane_epsg_code": manifest["plane_epsg_code"],
+        "polygon": box(*manifest["bounds"]),
+        "graphs": {name: overpass_cache.load(name, cache_dir=fixture_dir) for name in GRAPH_NAMES},
+        "dem_path": str(fixture_dir / "dem.tif"),
+        "buildings": load_geometries(fixture_dir / "buildings.npz", "buildings"),
+        "locations": locations,
+        "gsi_centers": load_geometries(fixture_dir / "gsi.npz", "centers"),
+        "gsi_edges": load_geometries(fixture_dir / "gsi.npz", "edges"),
+    }
+
+
+if __name__ == "__main__":
+    args = [x for x in sys.argv[1:] if not x.startswith("--")]
+    for size in args or list(SIZES):
+        freeze(size, force="--force" in sys.argv)
+        if "--update-checksums" in sys.argv:
+            update_checksums(size)
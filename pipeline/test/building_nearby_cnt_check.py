@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+周辺の建物数(building_nearby_cnt.count_nearby)の確認
+
+benchmark_fixtures.pyの固定データ(道路のグラフと建物)で、1エッジ毎に計算していた元の実装と件数が完全に一致するか、処理時間を比較する。
+  - 元の実装: エッジのbboxに重なる建物を取得し、create_vertical_polygonで作ったポリゴンに重なるものを数える
+  - count_nearby: 全エッジのbboxをSTRtreeでまとめて絞り込み、create_vertical_polygonsで作ったポリゴンとの重なりをまとめて判定する
+create_vertical_polygonsのポリゴンがエッジ毎のcreate_vertical_polygonと同じ座標になるかも確認する。
+DBのbuildingsの代わりに固定データの建物を使う。
+dbを指定した場合は、固定データのエッジについてDBのbuildingsで数えたmode="db"(PostGIS側で数える)の件数が、
+DBから取得した建物で数えた元の実装の件数と一致するかも確認する(DBに接続できる環境で実行する)。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/building_nearby_cnt_check.py [small|medium|large ...] [db]
+"""
+import os
+import sys
+import time
+import numpy as np
+import osmnx as ox
+import shapely
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+
+import benchmark_fixtures
+from analyzer.analysis import remover
+from analyzer.analysis.column_generater_module import building_nearby_cnt
+from analyzer.analysis.column_generater_module.core.linstring_to_polygon import create_vertical_polygon, create_vertical_polygons
+
+# ===== 調整パラメータ =====
+DEFAULT_SIZES = ["small", "large"]
+
+
+# 元の実装(エッジ毎にbboxに重なる建物を探し、ポリゴンとの重なりを判定する)
+def count_nearby_per_row(buildings, geometries):
+    tree = shapely.STRtree(buildings)
+    counts = []
+    for geometry in geometries:
+        bbox = shapely.box(*geometry.bounds)
+        polygon = create_vertical_polygon(geometry.coords, building_nearby_cnt.DISTANCE)
+        candidates = buildings[tree.query(bbox, predicate="intersects")]
+        counts.append(sum(1 for b in candidates if b.intersects(polygon)))
+    return np.array(counts, dtype=int)
+
+
+# DBのbuildingsで、PostGIS側で数えた件数と元の実装の件数を比べる
+def check_db(geometries) -> bool:
+    from sqlalchemy import text
+    from analyzer.core.db import get_db_session
+
+    min_longitude, min_latitude, max_longitude, max_latitude = shapely.total_bounds(geometries)
+    query = text("""
+    SELECT ST_AsBinary(geometry) as geometry
+    FROM buildings
+    WHERE ST_Intersects(geometry, ST_MakeEnvelope(:min_longitude, :min_latitude, :max_longitude, :max_latitude, 4326));
+    """)
+    session = get_db_session()
+    try:
+        result = session.execute(query, {
+            'min_longitude': float(min_longitude),
+            'min_latitude': float(min_latitude),
+            'max_longitude': float(max_longitude),
+            'max_latitude': float(max_latitude),
+        })
+        buildings = shapely.from_wkb([bytes(row[0]) for row in result])
+        expected = count_nearby_per_row(buildings, geometries)
+        st = time.perf_counter()
+        counts = building_nearby_cnt._count_db(session, geometries)
+        seconds = time.perf_counter() - st
+    finally:
+        session.close()
+    matched = np.array_equal(expected, counts)
+    print(f"  {'db':8} edges {len(geometries):5} buildings {len(buildings):5} counted {int(counts.sum()):6} db {seconds:.4f}s, counts {'ok' if matched else 'ng'}")
+    return matched
+
+
+def main():
+    sizes = [x for x in sys.argv[1:] if x in benchmark_fixtures.SIZES] or DEFAULT_SIZES
+    use_db = "db" in sys.argv[1:]
+    ok = True
+    for size in sizes:
+        fixture = benchmark_fixtures.load(size)
+        gdf_edges = remover.reverse_edge.remove(ox.graph_to_gdfs(fixture["graphs"]["graph"], nodes=False, edges=True))
+        geometries = gdf_edges.geometry.values
+        buildings = fixture["buildings"]
+
+        polygons = create_vertical_polygons(geometries, building_nearby_cnt.DISTANCE)
+        expected_polygons = [create_vertical_polygon(x.coords, building_nearby_cnt.DISTANCE) for x in geometries]
+        same_polygons = all(shapely.equals_exact(a, b, tolerance=0) for a, b in zip(polygons, expected_polygons))
+
+        st = time.perf_counter()
+        expected = count_nearby_per_row(buildings, geometries)
+        per_row_seconds = time.perf_counter() - st
+        st = time.perf_counter()
+        counts = building_nearby_cnt.count_nearby(buildings, geometries)
+        seconds = time.perf_counter() - st
+        matched = np.array_equal(expected, counts)
+        print(
+            f"  {size:8} edges {len(geometries):5} buildings {len(buildings):5} counted {int(counts.sum()):6} "
+            f"per row {per_row_seconds:.4f}s, vectorized {seconds:.4f}s, polygons {'ok' if same_polygons else 'ng'}, counts {'ok' if matched else 'ng'}"
+        )
+        ok &= same_polygons and matched and counts.sum() > 0
+        if use_db:
+            ok &= check_db(geometries)
+    print("✅ parity ok" if ok else "❌ parity ng")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+距離計算(distance_service)のベンチマーク
+
+geopyのgeodesicを1座標ずつ呼ぶ従来の計算と、distance_serviceの配列毎の計算の
+処理時間と誤差を比較する。道路を想定して10m間隔の座標列を北海道〜沖縄の範囲で生成する。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/distance_benchmark.py
+"""
+import os
+import sys
+import time
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from analyzer.core import distance_service
+
+# ===== 調整パラメータ =====
+LINE_COUNT = 200      # 座標列の数
+POINT_COUNT = 200     # 1つの座標列の座標数
+STEP_METERS = 10      # 座標間の距離(m)
+OFFSET_METERS = 15    # オフセットする距離(m)
+# 許容誤差(geodesicとの差)
+MAX_DISTANCE_ERROR = 1e-6  # m
+MAX_OFFSET_ERROR = 1e-9    # 度
+
+
+# 10m間隔で方向がゆるやかに変わる座標列(経度, 緯度)を生成する
+def generate_lines() -> list[np.ndarray]:
+    rng = np.random.default_rng(0)
+    lines = []
+    for _ in range(LINE_COUNT):
+        lon = rng.uniform(123.0, 146.0)
+        lat = rng.uniform(24.0, 45.5)
+        bearing = rng.uniform(0, 360) + np.cumsum(rng.normal(0, 5, POINT_COUNT - 1))
+        lons, lats = [lon], [lat]
+        for b in bearing:
+            lons_, lats_ = distance_service.destinations(lons[-1], lats[-1], STEP_METERS, b)
+            lons.append(float(lons_))
+            lats.append(float(lats_))
+        lines.append(np.column_stack([lons, lats]))
+    return lines
+
+
+def measure(name: str, func):
+    started_at = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started_at
+    print(f"  {name}: {round(seconds, 4)} seconds")
+    return result, seconds
+
+
+def main():
+    lines = generate_lines()
+    print(f"lines: {LINE_COUNT}, points: {LINE_COUNT * POINT_COUNT}")
+
+    # 座標間の距離
+    print("[segment distances]")
+    old, old_seconds = measure("geodesic", lambda: [
+        [geodesic((line[i][1], line[i][0]), (line[i + 1][1], line[i + 1][0])).meters for i in range(len(line) - 1)]
+        for line in lines
+    ])
+    new, new_seconds = measure("distance_service", lambda: [distance_service.segment_distances(line) for line in lines])
+    distance_error = max(np.abs(np.array(o) - n).max() for o, n in zip(old, new))
+    haversine_error = max(
+        np.abs(np.array(o) - distance_service.haversine_distances(line[:-1, 0], line[:-1, 1], line[1:, 0], line[1:, 1]) ).max() / STEP_METERS
+        for o, line in zip(old, lines)
+    )
+    print(f"  max error: {distance_error} m, speedup: x{round(old_seconds / new_seconds, 1)}")
+    print(f"  (参考) haversineの最大誤差: {round(haversine_error * 100, 4)}%")
+
+    # オフセット
+    print("[offset]")
+    old, old_seconds = measure("geodesic", lambda: [
+        [(d.longitude, d.latitude) for d in (geodesic(meters=OFFSET_METERS).destination((lat, lon), 90) for lon, lat in line)]
+        for line in lines
+    ])
+    new, new_seconds = measure("distance_service", lambda: [
+        np.column_stack(distance_service.destinations(line[:, 0], line[:, 1], OFFSET_METERS, 90)) for line in lines
+    ])
+    offset_error = max(np.abs(np.array(o) - n).max() for o, n in zip(old, new))
+    print(f"  max error: {offset_error} degree, speedup: x{round(old_seconds / new_seconds, 1)}")
+
+    ok = distance_error <= MAX_DISTANCE_ERROR and offset_error <= MAX_OFFSET_ERROR
+    print("✅ parity ok" if ok else "❌ parity ng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
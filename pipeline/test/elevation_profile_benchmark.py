@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+標高の一括処理(elevation_profile.generate)のベンチマーク
+
+山道を想定したランダムなエッジを生成し、従来の列毎のgdf.applyの実装
+(elevation_adjuster → elevation_smooth → elevation_height → elevation_fluctuation → elevation_segment_list → elevation_section)
+と結果と処理時間を比較する。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/elevation_profile_benchmark.py
+"""
+import os
+import sys
+import math
+import time
+import numpy as np
+import pandas as pd
+import shapely
+from geopandas import GeoDataFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from analyzer.analysis.column_generater_module import elevation_profile
+from analyzer.analysis.column_generater_module.core.segmnet import generate_segment_original_index_list
+from analyzer.analysis.column_generater_module.core.smoother import generate_moving_average
+from analyzer.core import distance_service
+
+# ===== 調整パラメータ =====
+EDGE_COUNT = 3000       # エッジ数
+POINT_MIN = 5           # エッジの座標数の下限
+POINT_MAX = 400         # エッジの座標数の上限
+STEP_DEGREE = 0.0002    # 座標間の移動量(度)
+COLUMNS = elevation_profile.COLUMNS
+
+
+# ===== 従来の実装 =====
+def adjuster_old(row):
+    elevations = list(row.elevation)
+    distances = distance_service.segment_distances(row.geometry.coords).tolist()
+    for index, distance in enumerate(distances):
+        elevation = elevations[index]
+        next_point_elevation = elevations[index + 1]
+        slope_per_meter = abs(elevation - next_point_elevation) / distance
+        if slope_per_meter > elevation_profile.METER_AND_ELEVATION_RATIO:
+            if elevation < next_point_elevation:
+                adjust_next_elevation = elevation + (distance * elevation_profile.METER_AND_ELEVATION_RATIO)
+            else:
+                adjust_next_elevation = elevation - (distance * elevation_profile.METER_AND_ELEVATION_RATIO)
+                if adjust_next_elevation < 0:
+                    adjust_next_elevation = 0
+            elevations[index + 1] = adjust_next_elevation
+    return elevations
+
+
+def smooth_old(row):
+    return [round(x, 1) for x in generate_moving_average(pd.Series(row.elevation), 5).to_list()]
+
+
+def fluctuation_old(row):
+    total_up = 0
+    total_down = 0
+    prev = None
+    for elevation in row.elevation_smooth:
+        if prev is not None:
+            diff = elevation - prev
+            if diff > 0:
+                total_up += abs(diff)
+            else:
+                total_down += abs(diff)
+        prev = elevation
+    return total_up, total_down
+
+
+def segment_list_old(row):
+    indexes = generate_segment_original_index_list(row.geometry, 50, row.length)
+    series = pd.Series([row.elevation_smooth[i] for i in indexes])
+    return [round(x, 1) for x in generate_moving_average(series, 5).to_list()]
+
+
+def section_old(row):
+    geo = row.geometry_list
+    elev = row.elevation_smooth
+    if len(geo) < 2 or len(elev) < 2:
+        return []
+    cum = [0.0]
+    for i in range(1, len(geo)):
+        p0, p1 = geo[i - 1], geo[i]
+        dlat = (p1[0] - p0[0]) * 111320
+        dlng = (p1[1] - p0[1]) * 111320 * math.cos(p0[0] * math.pi / 180)
+        cum.append(cum[-1] + math.sqrt(dlat * dlat + dlng * dlng))
+
+    def interpolate(target):
+        for i in range(1, len(cum)):
+            if cum[i] >= target:
+                if cum[i] == cum[i - 1]:
+                    return elev[i]
+                return elev[i - 1] + (elev[i] - elev[i - 1]) * ((target - cum[i - 1]) / (cum[i] - cum[i - 1]))
+        return elev[-1]
+
+    sections = []
+    for i in range(max(1, int(cum[-1] // 500))):
+        d0 = i * 500
+        d1 = min((i + 1) * 500, cum[-1])
+        grad = abs(interpolate(d1) - interpolate(d0)) / (d1 - d0) * 100 if d1 - d0 > 0 else 0
+        level = "flat" if grad < 1.0 else "gentle" if grad < 3.0 else "moderate" if grad < 7.0 else "steep"
+        sections.append({"level": level})
+    return sections
+
+
+def generate_old(gdf: GeoDataFrame) -> pd.DataFrame:
+    gdf = gdf.copy()
+    gdf["elevation"] = gdf.apply(adjuster_old, axis=1)
+    gdf["elevation_smooth"] = gdf.apply(smooth_old, axis=1)
+    gdf["elevation_height"] = gdf.apply(lambda row: pd.Series(row.elevation_smooth).max() - pd.Series(row.elevation_smooth).min(), axis=1)
+    fluctuation = gdf.apply(fluctuation_old, axis=1)
+    gdf["elevation_fluctuation"] = list(zip(fluctuation.apply(lambda x: x[0]).round(2), fluctuation.apply(lambda x: x[1]).round(2)))
+    gdf["elevation_segment_list"] = gdf.apply(segment_list_old, axis=1)
+    gdf["elevation_section"] = gdf.apply(section_old, axis=1)
+    return gdf[COLUMNS]
+
+
+# 山道のようなエッジを生成する(標高はランダムウォークに時々tif範囲外のような跳ねを入れる)
+def generate_edges(count: int) -> GeoDataFrame:
+    rng = np.random.default_rng(0)
+    rows = []
+    for _ in range(count):
+        n = int(rng.integers(POINT_MIN, POINT_MAX))
+        headings = np.cumsum(rng.normal(0, 0.4, n))
+        steps = np.column_stack([np.cos(headings), np.sin(headings)]) * STEP_DEGREE * rng.uniform(0.2, 1.0, (n, 1))
+        coords = np.cumsum(steps, axis=0) + rng.uniform([138.0, 35.0], [140.0, 37.0])
+        elevation = np.abs(np.cumsum(rng.normal(0, 3, n)) + rng.uniform(0, 1500))
+        spikes = rng.random(n) < 0.02
+        elevation[spikes] += rng.uniform(-200, 200, spikes.sum())
+        geometry = shapely.LineString(coords)
+        rows.append({
+            "geometry": geometry,
+            "length": distance_service.path_length(coords),
+            "elevation": np.maximum(elevation, 0).astype(np.float32).tolist(),
+            "geometry_list": [[y, x] for x, y in coords.tolist()],
+        })
+    return GeoDataFrame(rows, crs="EPSG:4326")
+
+
+def same_value(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+def main():
+    gdf = generate_edges(EDGE_COUNT)
+    print(f"[edges] rows: {len(gdf)}, points: {sum(len(x) for x in gdf['elevation'])}")
+
+    started_at = time.perf_counter()
+    old = generate_old(gdf)
+    old_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    new = elevation_profile.generate(gdf)
+    new_seconds = time.perf_counter() - started_at
+
+    ok = True
+    for column in COLUMNS:
+        mismatches = sum(1 for a, b in zip(old[column], new[column]) if not same_value(a, b))
+        ok = ok and mismatches == 0
+        print(f"  {column}: mismatched rows: {mismatches}")
+    print(f"[time] old: {round(old_seconds, 3)} seconds, new: {round(new_seconds, 3)} seconds, speedup: x{round(old_seconds / new_seconds, 1)}")
+
+    print("✅ parity ok" if ok else "❌ parity ng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
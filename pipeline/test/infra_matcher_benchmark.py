@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+トンネル、橋の対応付け(infra_matcher.match)のベンチマーク
+
+ランダムな道路と、道路の一部の座標を共有するトンネルのエッジを生成し、
+従来の道路毎に空間インデックスを引いて座標をリストで探す実装
+(elevation_infra_regulator, tunnel_length.get_tunnel_edges, infra_sections)と結果と処理時間を比較する。
+従来の実装は空間インデックスが返した順にトンネルを処理していたため、比較では行番号順に並べ替える。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/infra_matcher_benchmark.py
+"""
+import os
+import sys
+import time
+import numpy as np
+import shapely
+from shapely.geometry import Point
+from geopandas import GeoDataFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from analyzer.analysis.column_generater_module import elevation_infra_regulator, tunnel_length, infra_sections
+from analyzer.analysis.column_generater_module.core import infra_matcher
+from analyzer.core import distance_service
+
+# ===== 調整パラメータ =====
+ROAD_COUNT = 5000       # 道路数
+POINT_MIN = 4           # 道路の座標数の下限
+POINT_MAX = 200         # 道路の座標数の上限
+TUNNEL_RATIO = 0.3      # トンネルを含む道路の割合
+STEP_DEGREE = 0.0002    # 座標間の移動量(度)
+
+
+# ===== 従来の実装 =====
+def get_infra_edges_old(row, infra_edges, sindex):
+    base_edge_coords = list(row.geometry.coords)
+    candidates = sorted(sindex.intersection(row.geometry.bounds))
+    infra_in_bbox = infra_edges.iloc[candidates]
+    target = []
+    for idx, infra_edge in infra_in_bbox.iterrows():
+        if sum([1 for coord in infra_edge.geometry.coords if coord in base_edge_coords]) >= 2:
+            target.append(idx)
+    return infra_in_bbox.loc[target]
+
+
+def nearest_outside_old(road_coords, point, infra_coords):
+    if road_coords == infra_coords:
+        return min(road_coords, key=lambda x: Point(x).distance(Point(point)))
+    middle = infra_coords[1:-1]
+    candidates = [coord for coord in road_coords if coord not in middle] if middle else road_coords
+    return min(candidates, key=lambda x: Point(x).distance(Point(point)))
+
+
+def generate_old(gdf, infra_edges):
+    sindex = infra_edges["geometry"].sindex
+    elevations, lengths, sections = [], [], []
+    for _, row in gdf.iterrows():
+        target = get_infra_edges_old(row, infra_edges, sindex)
+        road_coords = list(row.geometry.coords)
+        elevation = row.elevation
+        if len(target) and any(x in row['tunnel'] for x in ['yes']):
+            elevation = elevation.copy()
+            for _, infra_edge in target.iterrows():
+                infra_coords = list(infra_edge.geometry.coords)
+                a_idx = road_coords.index(nearest_outside_old(road_coords, infra_coords[0], infra_coords))
+                b_idx = road_coords.index(nearest_outside_old(road_coords, infra_coords[-1], infra_coords))
+                elevation = elevation_infra_regulator.linear_interpolation(elevation, min(a_idx, b_idx), max(a_idx, b_idx))
+        elevations.append(elevation)
+        lengths.append(float(distance_service.line_lengths(target.geometry.values).sum()) if len(target) else 0)
+        sections.append([[[c[1], c[0]] for c in infra_edge.geometry.coords] for _, infra_edge in target.iterrows()])
+    return elevations, lengths, sections
+
+
+def generate_new(gdf, infra_edges):
+    matches = infra_matcher.match(gdf, infra_edges)
+    elevations = elevation_infra_regulator.generate(gdf, matches, elevation_infra_regulator.InfraType.TUNNEL)
+    lengths = tunnel_length.generate(gdf, infra_edges, matches)
+    sections = infra_sections.generate(gdf, infra_edges, matches)
+    return elevations.tolist(), lengths.tolist(), sections.tolist()
+
+
+# 道路と、道路の一部(先頭や末尾からはみ出す場合もある)を通るトンネルを生成する
+def generate_edges(count: int) -> tuple[GeoDataFrame, GeoDataFrame]:
+    rng = np.random.default_rng(0)
+    roads, tunnels = [], []
+    for _ in range(count):
+        n = int(rng.integers(POINT_MIN, POINT_MAX))
+        headings = np.cumsum(rng.normal(0, 0.3, n))
+        steps = np.column_stack([np.cos(headings), np.sin(headings)]) * STEP_DEGREE
+        coords = np.round(np.cumsum(steps, axis=0) + rng.uniform([138.0, 35.0], [140.0, 37.0]), 7)
+        roads.append({
+            "geometry": shapely.LineString(coords),
+            "elevation": rng.uniform(0, 1500, n).tolist(),
+            "tunnel": "yes" if rng.random() < TUNNEL_RATIO else "no",
+            "bridge": "no",
+        })
+        if roads[-1]["tunnel"] == "yes":
+            for _ in range(int(rng.integers(1, 3))):
+                st = int(rng.integers(0, n - 1))
+                ed = int(rng.integers(st + 2, n + 1))
+                tunnel_coords = coords[st:ed]
+                # 道路の外にはみ出すトンネル
+                if rng.random() < 0.2:
+                    tunnel_coords = np.vstack([tunnel_coords, tunnel_coords[-1] + [STEP_DEGREE, STEP_DEGREE]])
+                tunnels.append({"geometry": shapely.LineString(tunnel_coords)})
+    return GeoDataFrame(roads, crs="EPSG:4326"), GeoDataFrame(tunnels, crs="EPSG:4326")
+
+
+def main():
+    gdf, tunnel_edges = generate_edges(ROAD_COUNT)
+    print(f"[edges] roads: {len(gdf)}, tunnels: {len(tunnel_edges)}")
+
+    started_at = time.perf_counter()
+    old = generate_old(gdf, tunnel_edges)
+    old_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    new = generate_new(gdf, tunnel_edges)
+    new_seconds = time.perf_counter() - started_at
+
+    ok = True
+    for name, a, b in zip(["elevation", "tunnel_length", "tunnel_sections"], old, new):
+        mismatches = sum(1 for x, y in zip(a, b) if x != y)
+        ok = ok and mismatches == 0
+        print(f"  {name}: mismatched rows: {mismatches}")
+    print(f"[time] old: {round(old_seconds, 3)} seconds, new: {round(new_seconds, 3)} seconds, speedup: x{round(old_seconds / new_seconds, 1)}")
+
+    print("✅ parity ok" if ok else "❌ parity ng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+テスト用のOverpass APIのモックサーバー
+
+格子状の道路(タグはランダム)を持ち、/<エンドポイント名>/api/interpreter へのOverpassのクエリに応答する。
+osmnxのグラフ取得のクエリ(way[フィルタ](poly:'lat lon ...');>;);out;)は、
+フィルタを満たし、nodeが1つでもpolyに含まれるwayとその全nodeを返す。ヘルスチェック(out count)には常に200を返す。
+エンドポイント毎に応答の仕方(mode)を切り替えられる。
+  ok:   すぐに応答する
+  slow: delay_seconds秒待ってから応答する
+  fail: 応答せずに接続を切る(クライアントではConnectionErrorになる)
+エンドポイント毎のヘルスチェックとデータの問い合わせの回数、同時に処理した最大数を記録する。
+
+usage: overpass_scheduler_check.py から MockOverpassServer を起動して使う
+"""
+import os
+import re
+import sys
+import json
+import time
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from analyzer.analysis import osm_pbf
+
+# ===== 調整パラメータ =====
+GRID_SIZE = 60           # 格子の縦横のnode数
+STEP_DEGREE = 0.001      # node間の距離(度)
+ORIGIN = (137.0, 35.0)   # 格子の南西端(経度, 緯度)
+SEED = 0
+
+HIGHWAYS = ["primary", "secondary", "tertiary", "trunk_link", "residential", "footway", "service"]
+QUERY_PATTERN = re.compile(r"way(.*?)\(poly:'([^']*)'\)")
+
+
+# 格子の各行、列を区間に分けてランダムなタグを付けたwayを作る
+def generate_ways(rng):
+    ways = []
+    way_id = 1
+    for i in range(GRID_SIZE):
+        for is_row in (True, False):
+            nodes = [i * GRID_SIZE + j + 1 if is_row else j * GRID_SIZE + i + 1 for j in range(GRID_SIZE)]
+            cuts = np.sort(rng.choice(np.arange(1, GRID_SIZE - 1), size=4, replace=False))
+            for st, ed in zip([0, *cuts], [*cuts, GRID_SIZE - 1]):
+                tags = {"highway": str(rng.choice(HIGHWAYS)), "name": f"road {way_id}"}
+                if rng.random() < 0.3:
+                    tags["lanes"] = str(rng.choice(["1", "2"]))
+                if rng.random() < 0.2:
+                    tags["tunnel"] = "yes"
+                elif rng.random() < 0.2:
+                    tags["bridge"] = "yes"
+                if rng.random() < 0.1:
+                    tags["yh:WIDTH"] = "5.5m〜13.0m"
+                ways.append((way_id, nodes[st:ed + 1], tags))
+                way_id += 1
+    return ways
+
+
+class MockOverpassServer:
+    def __init__(self, modes: dict[str, str], delay_seconds: float = 0.5):
+        self.modes = dict(modes)
+        self.delay_seconds = delay_seconds
+        self.ways = generate_ways(np.random.default_rng(SEED))
+        self.coords = {
+            i * GRID_SIZE + j + 1: (ORIGIN[0] + j * STEP_DEGREE, ORIGIN[1] + i * STEP_DEGREE)
+            for i in range(GRID_SIZE) for j in range(GRID_SIZE)
+        }
+        self.lock = threading.Lock()
+        self.counts = {name: {"health": 0, "data": 0, "in_flight": 0, "max_in_flight": 0} for name in modes}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.generate_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    # 格子全体を覆う範囲
+    def get_bounds(self):
+        return (ORIGIN[0], ORIGIN[1], ORIGIN[0] + (GRID_SIZE - 1) * STEP_DEGREE, ORIGIN[1] + (GRID_SIZE - 1) * STEP_DEGREE)
+
+    def get_endpoint(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{name}/api"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def generate_response(self, query: str) -> dict:
+        match = QUERY_PATTERN.search(query)
+        clauses = osm_pbf.parse_filter(match.group(1))
+        values = [float(x) for x in match.group(2).split()]
+        # Overpassのpolyは"lat lon"の並び
+        polygon = Polygon(list(zip(values[1::2], values[0::2])))
+        selected = []
+        for way_id, nodes, tags in self.ways:
+            if not osm_pbf.match_filter(tags, clauses):
+                continue
+            lons = [self.coords[x][0] for x in nodes]
+            lats = [self.coords[x][1] for x in nodes]
+            if shapely.contains_xy(polygon, lons, lats).any():
+                selected.append((way_id, nodes, tags))
+        node_ids = sorted({x for _, nodes, _ in selected for x in nodes})
+        return {"elements": [
+            *({"type": "node", "id": x, "lon": self.coords[x][0], "lat": self.coords[x][1]} for x in node_ids),
+            *({"type": "way", "id": w, "nodes": nodes, "tags": tags} for w, nodes, tags in selected),
+        ]}
+
+    def generate_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                name = self.path.strip("/").split("/")[0]
+                length = int(self.headers.get("Content-Length", 0))
+                query = parse_qs(self.rfile.read(length).decode()).get("data", [""])[0]
+                if name not in mock.modes:
+                    self.send_error(404)
+                    return
+                if "out count" in query:
+                    with mock.lock:
+                        mock.counts[name]["health"] += 1
+                    self.send_json({"elements": []})
+                    return
+
+                with mock.lock:
+                    counts = mock.counts[name]
+                    counts["data"] += 1
+                    counts["in_flight"] += 1
+                    counts["max_in_flight"] = max(counts["max_in_flight"], counts["in_flight"])
+                try:
+                    mode = mock.modes[name]
+                    if mode == "fail":
+                        # 応答せずに接続を切る
+                        self.close_connection = True
+                        self.connection.close()
+                        return
+                    if mode == "slow":
+                        time.sleep(mock.delay_seconds)
+                    self.send_json(mock.generate_response(query))
+                finally:
+                    with mock.lock:
+                        mock.counts[name]["in_flight"] -= 1
+
+            def send_json(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    server = MockOverpassServer({"ok": "ok"}).start()
+    print(f"mock overpass: {server.get_endpoint('ok')}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+ローカルのpbf(OSM_SOURCE=pbf)からのグラフ取得の確認
+
+格子状の道路にランダムなタグ(highway, lanes, tunnel, bridge, access)を付けたpbfを生成し、
+graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_featherのグラフを
+Overpassの応答(取得条件を満たし、nodeが1つでも取得範囲に含まれるwayとその全node)を
+フィルタ文字列を使わずに作ってosmnxに渡した場合のグラフと比較する。
+pbfを1回だけ読んでいることも確認する。pyosmium(osmium)が必要。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/osm_pbf_check.py
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from shapely.geometry import Point, box
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+os.environ["OSM_SOURCE"] = "pbf"
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+
+import osmium
+import osmnx as ox
+from osmnx import _overpass
+from analyzer.analysis import osm_pbf, graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_feather
+
+# ===== 調整パラメータ =====
+GRID_SIZE = 120          # 格子の縦横のnode数
+STEP_DEGREE = 0.001      # node間の距離(度)
+ORIGIN = (137.0, 35.0)   # 格子の南西端(経度, 緯度)
+SEED = 0
+
+HIGHWAYS = ["primary", "secondary", "tertiary", "trunk_link", "residential", "footway", "service"]
+MAIN_HIGHWAYS = {"primary", "secondary", "tertiary", "trunk_link"}
+
+
+def generate_ways(rng):
+    ways = []
+    way_id = 1
+    for i in range(GRID_SIZE):
+        for is_row in (True, False):
+            nodes = [i * GRID_SIZE + j + 1 if is_row else j * GRID_SIZE + i + 1 for j in range(GRID_SIZE)]
+            # 1本の道路を区間に分け、区間毎にタグを変える
+            cuts = np.sort(rng.choice(np.arange(1, GRID_SIZE - 1), size=5, replace=False))
+            for st, ed in zip([0, *cuts], [*cuts, GRID_SIZE - 1]):
+                tags = {"highway": str(rng.choice(HIGHWAYS))}
+                if rng.random() < 0.3:
+                    tags["lanes"] = str(rng.choice(["1", "2"]))
+                if rng.random() < 0.2:
+                    tags["tunnel"] = "yes"
+                elif rng.random() < 0.2:
+                    tags["bridge"] = "yes"
+                if rng.random() < 0.1:
+                    tags["access"] = "private"
+                ways.append((way_id, nodes[st:ed + 1], tags))
+                way_id += 1
+    return ways
+
+
+def write_pbf(path, ways):
+    with osmium.SimpleWriter(path) as writer:
+        for i in range(GRID_SIZE):
+            for j in range(GRID_SIZE):
+                writer.add_node(osmium.osm.mutable.Node(
+                    id=i * GRID_SIZE + j + 1, location=(ORIGIN[0] + j * STEP_DEGREE, ORIGIN[1] + i * STEP_DEGREE), tags={},
+                ))
+        for way_id, nodes, tags in ways:
+            writer.add_way(osmium.osm.mutable.Way(id=way_id, nodes=nodes, tags=tags))
+
+
+# エッジの(u, v, key, 属性)のリスト(ジオメトリはWKT)
+def generate_edges(graph):
+    return [
+        (u, v, k, sorted((key, value.wkt if key == "geometry" else str(value)) for key, value in data.items()))
+        for u, v, k, data in graph.edges(keys=True, data=True)
+    ]
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    ways = generate_ways(rng)
+    coords = {
+        i * GRID_SIZE + j + 1: (ORIGIN[0] + j * STEP_DEGREE, ORIGIN[1] + i * STEP_DEGREE)
+        for i in range(GRID_SIZE) for j in range(GRID_SIZE)
+    }
+    # 格子の中央部分を取得範囲にする
+    margin = GRID_SIZE // 4 * STEP_DEGREE
+    polygon = box(
+        ORIGIN[0] + margin, ORIGIN[1] + margin,
+        ORIGIN[0] + (GRID_SIZE - 1) * STEP_DEGREE - margin, ORIGIN[1] + (GRID_SIZE - 1) * STEP_DEGREE - margin,
+    )
+
+    def is_main(tags):
+        return tags["highway"] in MAIN_HIGHWAYS and tags.get("lanes") != "1"
+
+    # 取得条件毎のwayの条件(Overpassのフィルタを使わずに書いたもの)
+    predicates = {
+        graph_feather.GRAPH_OPTIONS["custom_filter"]: is_main,
+        None: lambda tags: tags["highway"] not in ("footway", "service") and tags.get("access") != "private",
+        f'{graph_feather.GRAPH_OPTIONS["custom_filter"]}["tunnel"="yes"]': lambda tags: is_main(tags) and tags.get("tunnel") == "yes",
+        f'{graph_feather.GRAPH_OPTIONS["custom_filter"]}["bridge"="yes"]': lambda tags: is_main(tags) and tags.get("bridge") == "yes",
+    }
+
+    # Overpassの代わり: 条件を満たし、nodeが1つでも範囲に含まれるwayとその全nodeを返す
+    def download_overpass_network(query_polygon, network_type, custom_filter):
+        selected = [
+            (w, nodes, tags) for w, nodes, tags in ways
+            if predicates[custom_filter](tags) and any(query_polygon.contains(Point(coords[x])) for x in nodes)
+        ]
+        node_ids = sorted({x for _, nodes, _ in selected for x in nodes})
+        yield {"elements": [
+            *({"type": "node", "id": x, "lon": coords[x][0], "lat": coords[x][1]} for x in node_ids),
+            *({"type": "way", "id": w, "nodes": nodes, "tags": tags} for w, nodes, tags in sorted(selected, key=lambda x: x[0])),
+        ]}
+
+    def fetch_graphs():
+        return {
+            "graph": graph_feather.fetch_graph(polygon),
+            "graph_all": graph_all_feather.fetch_graph(polygon),
+            "graph_tunnel": graph_tunnel_feather.fetch_graph(polygon),
+            "graph_bridge": graph_bridge_feather.fetch_graph(polygon),
+        }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "grid.osm.pbf")
+        write_pbf(path, ways)
+        os.environ["OSM_PBF_PATH"] = path
+        print(f"ways: {len(ways)}, nodes: {len(coords)}")
+
+        read_count = 0
+        read_pbf = osm_pbf.read_pbf
+
+        def counted_read_pbf(*args, **kwargs):
+            nonlocal read_count
+            read_count += 1
+            return read_pbf(*args, **kwargs)
+
+        osm_pbf.read_pbf = counted_read_pbf
+        st = time.time()
+        graphs = fetch_graphs()
+        print(f"pbf: fetch 4 graphs {time.time() - st:.2f}s, pbf reads: {read_count}")
+        osm_pbf.read_pbf = read_pbf
+
+    download_network = _overpass._download_overpass_network
+    _overpass._download_overpass_network = download_overpass_network
+    try:
+        st = time.time()
+        expected_graphs = {
+            name: ox.graph_from_polygon(polygon, **options)
+            for name, options in {
+                "graph": graph_feather.GRAPH_OPTIONS,
+                "graph_all": {"network_type": "drive", "simplify": True, "retain_all": True},
+                "graph_tunnel": {**graph_feather.GRAPH_OPTIONS, "custom_filter": f'{graph_feather.GRAPH_OPTIONS["custom_filter"]}["tunnel"="yes"]'},
+                "graph_bridge": {**graph_feather.GRAPH_OPTIONS, "custom_filter": f'{graph_feather.GRAPH_OPTIONS["custom_filter"]}["bridge"="yes"]'},
+            }.items()
+        }
+        print(f"oracle: fetch 4 graphs {time.time() - st:.2f}s")
+    finally:
+        _overpass._download_overpass_network = download_network
+
+    ok = read_count == 1
+    for name, graph in graphs.items():
+        edges = generate_edges(graph)
+        expected = generate_edges(expected_graphs[name])
+        matched = edges == expected and list(graph.nodes(data=True)) == list(expected_graphs[name].nodes(data=True))
+        ok &= matched
+        print(f"{name}: edges {len(edges)} / expected {len(expected)} {'ok' if matched else 'ng'}")
+    print("✅ parity ok" if ok else "❌ parity ng")
+
+
+if __name__ == "__main__":
+    main()
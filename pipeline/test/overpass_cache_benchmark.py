@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Overpassのキャッシュ(overpass_cache)のベンチマーク
+
+格子状の道路をOverpassの応答の形式でosmnxに渡して単純化したグラフを作り、
+従来のpickleと、overpass_cacheの形式(列毎のJSON + ジオメトリの座標配列をzipで圧縮)の
+書き込み、読み込みの時間とファイルサイズを比較する。読み込んだグラフが元のグラフと一致するかも確認する。
+読み込みがpickleより速くない場合は失敗にする(読み込みはREAD_REPEAT回の最小値で比べる)。
+容量の上限を超えた場合に最終利用日時の古いものから削除されることも確認する。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/overpass_cache_benchmark.py
+"""
+import os
+import sys
+import time
+import pickle
+import tempfile
+import numpy as np
+from shapely.geometry import box
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+import osmnx as ox
+from osmnx import _overpass
+from analyzer.analysis import overpass_cache
+
+# ===== 調整パラメータ =====
+GRID_SIZE = 300          # 格子の縦横のnode数
+STEP_DEGREE = 0.0005     # node間の距離(度)
+JITTER_DEGREE = 0.0001   # nodeの位置のばらつき(度)
+KEEP_RATIO = 0.7         # 格子の辺を道路にする割合(単純化で曲線のエッジができるようにする)
+ORIGIN = (137.0, 35.0)   # 格子の南西端(経度, 緯度)
+SEED = 0
+READ_REPEAT = 3          # 読み込みの計測回数(最小値を使う)
+HIGHWAYS = ["primary", "secondary", "tertiary", "trunk_link"]
+
+
+def generate_response(rng):
+    node_id = lambda i, j: i * GRID_SIZE + j + 1
+    jitter = rng.uniform(-JITTER_DEGREE, JITTER_DEGREE, size=(GRID_SIZE, GRID_SIZE, 2))
+    elements = [
+        {"type": "node", "id": node_id(i, j), "lon": ORIGIN[0] + j * STEP_DEGREE + jitter[i, j, 0], "lat": ORIGIN[1] + i * STEP_DEGREE + jitter[i, j, 1]}
+        for i in range(GRID_SIZE) for j in range(GRID_SIZE)
+    ]
+    way_id = 1
+    for i in range(GRID_SIZE):
+        for is_row in (True, False):
+            nodes = [node_id(i, j) if is_row else node_id(j, i) for j in range(GRID_SIZE)]
+            keep = rng.random(GRID_SIZE - 1) < KEEP_RATIO
+            st = 0
+            for j in range(1, GRID_SIZE):
+                if j == GRID_SIZE - 1 or not keep[j]:
+                    if j - st >= 1:
+                        tags = {"highway": str(rng.choice(HIGHWAYS)), "name": f"road {way_id}"}
+                        if rng.random() < 0.3:
+                            tags["lanes"] = str(rng.choice(["2", "4"]))
+                        if rng.random() < 0.2:
+                            tags["oneway"] = "yes"
+                        elements.append({"type": "way", "id": way_id, "nodes": nodes[st:j + 1], "tags": tags})
+                        way_id += 1
+                    st = j + 1
+    return {"elements": elements}
+
+
+def generate_graph(response):
+    download_network = _overpass._download_overpass_network
+    _overpass._download_overpass_network = lambda polygon, network_type, custom_filter: iter([response])
+    try:
+        polygon = box(ORIGIN[0], ORIGIN[1], ORIGIN[0] + GRID_SIZE * STEP_DEGREE, ORIGIN[1] + GRID_SIZE * STEP_DEGREE)
+        return ox.graph_from_polygon(polygon, network_type="drive", simplify=True, retain_all=True)
+    finally:
+        _overpass._download_overpass_network = download_network
+
+
+# エッジの(u, v, key, 属性)のリスト(ジオメトリはWKT)
+def generate_edges(graph):
+    return [
+        (u, v, k, {key: value.wkt if key == "geometry" else value for key, value in data.items()})
+        for u, v, k, data in graph.edges(keys=True, data=True)
+    ]
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    graph = generate_graph(generate_response(rng))
+    print(f"nodes: {len(graph.nodes)}, edges: {len(graph.edges)}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 従来: pickle
+        pickle_path = os.path.join(tmp_dir, "legacy.pkl")
+        st = time.time()
+        with open(pickle_path, "wb") as f:
+            f.write(pickle.dumps(graph))
+        pickle_write = time.time() - st
+        pickle_read = float("inf")
+        for _ in range(READ_REPEAT):
+            st = time.time()
+            with open(pickle_path, "rb") as f:
+                pickle_graph = pickle.loads(f.read())
+            pickle_read = min(pickle_read, time.time() - st)
+
+        # overpass_cache
+        st = time.time()
+        path = overpass_cache.store("bench", graph, tmp_dir)
+        cache_write = time.time() - st
+        cache_read = float("inf")
+        for _ in range(READ_REPEAT):
+            st = time.time()
+            cache_graph = overpass_cache.load("bench", cache_dir=tmp_dir)
+            cache_read = min(cache_read, time.time() - st)
+
+        print(f"pickle: write {pickle_write:.3f}s, read {pickle_read:.3f}s, size {os.path.getsize(pickle_path) / 1024 ** 2:.1f}MB")
+        print(f"cache : write {cache_write:.3f}s, read {cache_read:.3f}s, size {os.path.getsize(path) / 1024 ** 2:.1f}MB")
+        read_speedup = pickle_read / cache_read
+        print(f"read speedup: x{read_speedup:.2f}")
+        faster = read_speedup > 1
+        if not faster:
+            print("❌ cache read is not faster than pickle")
+
+        ok = (
+            list(cache_graph.nodes(data=True)) == list(pickle_graph.nodes(data=True))
+            and generate_edges(cache_graph) == generate_edges(pickle_graph)
+            and cache_graph.graph == pickle_graph.graph
+            and list(ox.graph_to_gdfs(cache_graph, nodes=False).index) == list(ox.graph_to_gdfs(pickle_graph, nodes=False).index)
+        )
+        ok &= faster
+
+        # 容量の上限: 1番古いものを削除し、最後に使ったものを残す
+        # meta.jsonの作成日時で1バイト程度サイズが変わるので、上限は2件分に余裕を持たせる(3件目は入らない)
+        size = os.path.getsize(path)
+        for i, key in enumerate(["old", "recent"]):
+            overpass_cache.store(key, graph, tmp_dir)
+            os.utime(overpass_cache.get_path(key, tmp_dir), (time.time() - 100 + i, time.time() - 100 + i))
+        overpass_cache.load("old", cache_dir=tmp_dir)
+        overpass_cache.evict(int(size * 2.5), tmp_dir)
+        remaining = sorted(p.name.split(".")[0] for p in overpass_cache.get_path("x", tmp_dir).parent.glob(f"*{overpass_cache.FILE_SUFFIX}"))
+        print(f"after evict: {remaining}")
+        ok &= remaining == ["bench", "old"]
+
+        # 有効期限: 残っているキャッシュが期限切れでは読まれず、期限なしでは読まれる
+        ok &= overpass_cache.get_path("old", tmp_dir).exists()
+        expired = overpass_cache.load("old", ttl_seconds=0, cache_dir=tmp_dir) is None
+        loaded = overpass_cache.load("old", cache_dir=tmp_dir) is not None
+        print(f"ttl: expired {expired}, loaded without ttl {loaded}")
+        ok &= expired and loaded
+        print(f"metrics: {overpass_cache.format_metrics()}")
+
+    print("✅ parity ok" if ok else "❌ parity ng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
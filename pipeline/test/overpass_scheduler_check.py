@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Overpassの問い合わせの振り分けと先読み(overpass_scheduler)の確認
+
+mock_overpass_server.pyのモックサーバーに複数のエンドポイントを立てて、以下を確認する。
+  - 先読み: 2つの範囲の4つのグラフ(道路、全道路、トンネル、橋)を子プロセスで並列に取得し、
+    1つのエンドポイントに順番に問い合わせる場合と時間を比較する。キャッシュから読んだグラフが直接取得したグラフと一致するか
+  - 振り分け: 問い合わせが複数のエンドポイントに分散し、エンドポイント毎の同時実行数の上限を守るか
+  - ヘルスチェック: 有効期間内は結果を使い回すか
+  - サーキットブレーカー: 接続できないエンドポイントはFAILURE_THRESHOLD回失敗した後に使わなくなるか
+  - 問い合わせの間隔: 同じエンドポイントへの問い合わせの開始がmin_interval_seconds以上空くか
+  - プロセス間の共有: 並列実行時の県毎のプロセスを想定して、別々のプロセスのEndpointPoolでlock_dirを共有した場合に
+    先読み中のグラフを別のプロセスが取得し直さず(問い合わせは1回)、同時実行数の上限をプロセス全体で守るか
+    ロックを取った後にもキャッシュを確認し、確認からロックまでの間に保存されたグラフを取得し直さないか
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/overpass_scheduler_check.py
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from shapely.geometry import box
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+
+import osmnx as ox
+from mock_overpass_server import MockOverpassServer
+from analyzer.analysis import overpass_scheduler, overpass_cache, overpass_fallback
+from analyzer.analysis import graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_feather
+
+# ===== 調整パラメータ =====
+DELAY_SECONDS = 1.0      # slowのエンドポイントの応答時間(秒)
+PREFETCH_WORKERS = 4     # 先読みのプロセス数
+SHARED_WORKERS = 3       # プロセス間の共有の確認で起動する県のプロセス数
+MAX_CONCURRENCY = 2      # エンドポイント毎の同時実行数の上限
+MIN_INTERVAL_SECONDS = 0.2
+
+
+# エッジの(u, v, key, 属性)のリスト(ジオメトリはWKT)
+# 単純化でまとめた属性のリストはsetを経由して作られ、プロセス毎に文字列のハッシュが変わると順番が変わるので並べ替える
+def generate_edges(graph):
+    return [
+        (u, v, k, sorted(
+            (key, value.wkt if key == "geometry" else str(sorted(map(str, value)) if isinstance(value, list) else value))
+            for key, value in data.items()
+        ))
+        for u, v, k, data in graph.edges(keys=True, data=True)
+    ]
+
+
+# 子プロセスを起動しておく(起動時間を取得時間に含めない。osmnxはこのスクリプトの読み込み時に読み込まれる)
+def warm_up():
+    time.sleep(0.5)
+
+
+# 県のプロセスでの取得(call_with_fallbackと同じく、キャッシュがない場合だけfetch_to_cacheで取得する)
+# 戻り値は(エッジのリスト、キャッシュから読んだか)。取得できなかった場合はエッジのリストがNone
+def fetch_in_worker(endpoint, lock_dir, cache_dir, request):
+    func, args, kwargs = request
+    graph_feather.add_useful_tags()
+    pool = overpass_scheduler.EndpointPool(
+        [endpoint], lambda endpoint: True, max_concurrency=1, min_interval_seconds=MIN_INTERVAL_SECONDS, lock_dir=lock_dir,
+    )
+    key = overpass_cache.generate_key(func, args, kwargs)
+    load = lambda: overpass_cache.load(key, cache_dir=cache_dir)
+    result = load()
+    if result is not None:
+        return generate_edges(result), True
+    try:
+        result, cached = overpass_scheduler.fetch_to_cache(pool, func, args, kwargs, key, 1, load, cache_dir)
+    except Exception:
+        return None, False
+    return generate_edges(result), cached
+
+
+def check_prefetch(server, polygons, cache_dir) -> bool:
+    requests = [
+        (ox.graph_from_polygon, (polygon,), module.GRAPH_OPTIONS)
+        for polygon in polygons
+        for module in [graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_feather]
+    ]
+
+    # 先読み: 3つのエンドポイントに振り分けて子プロセスで並列に取得する
+    pool = overpass_scheduler.EndpointPool(
+        [server.get_endpoint(name) for name in ["a", "b", "c"]], overpass_fallback._health_check,
+        max_concurrency=MAX_CONCURRENCY, min_interval_seconds=MIN_INTERVAL_SECONDS, health_ttl_seconds=60,
+    )
+    prefetcher = overpass_scheduler.Prefetcher(pool, workers=PREFETCH_WORKERS, cache_dir=cache_dir)
+    for future in [prefetcher.processes.submit(warm_up) for _ in range(PREFETCH_WORKERS)]:
+        future.result()
+    st = time.time()
+    statuses = [future.result() for future in prefetcher.prefetch(requests)]
+    prefetch_seconds = time.time() - st
+    # キャッシュ済みのものは先読みしない
+    skipped = len(prefetcher.prefetch(requests)) == 0
+    prefetcher.shutdown()
+    print(f"prefetch: {len(requests)} graphs {prefetch_seconds:.2f}s (workers {PREFETCH_WORKERS}), status: {statuses}")
+    print(f"  {pool.format_stats()}")
+
+    # 比較: 1つのエンドポイントに順番に問い合わせる
+    graph_feather.add_useful_tags()
+    sequential_pool = overpass_scheduler.EndpointPool([server.get_endpoint("d")], overpass_fallback._health_check, min_interval_seconds=0)
+    st = time.time()
+    expected = []
+    for func, args, kwargs in requests:
+        try:
+            expected.append(overpass_scheduler.fetch(sequential_pool, func, args, kwargs, 1))
+        except Exception:
+            expected.append(None)
+    sequential_seconds = time.time() - st
+    print(f"sequential: {len(requests)} graphs {sequential_seconds:.2f}s, speedup: x{sequential_seconds / prefetch_seconds:.2f}")
+
+    ok = skipped and all(status in ("ok", "error") for status in statuses)
+    for (func, args, kwargs), graph in zip(requests, expected):
+        cached = overpass_cache.load(overpass_cache.generate_key(func, args, kwargs), cache_dir=cache_dir)
+        if graph is None:
+            ok &= cached is None
+            continue
+        ok &= cached is not None and generate_edges(cached) == generate_edges(graph) and list(cached.nodes(data=True)) == list(graph.nodes(data=True))
+
+    counts = server.counts
+    print(f"  server: { {name: counts[name] for name in ['a', 'b', 'c']} }")
+    # 3つのエンドポイント全てに振り分け、同時実行数の上限を守り、ヘルスチェックは1回だけ
+    ok &= all(counts[name]["data"] >= 1 for name in ["a", "b", "c"])
+    ok &= all(counts[name]["max_in_flight"] <= MAX_CONCURRENCY for name in ["a", "b", "c"])
+    ok &= all(counts[name]["health"] == 1 for name in ["a", "b", "c"])
+    ok &= prefetch_seconds < sequential_seconds
+    return ok
+
+
+def check_circuit_breaker(server, polygon) -> bool:
+    retry_delay = overpass_scheduler.RETRY_DELAY_SECONDS
+    overpass_scheduler.RETRY_DELAY_SECONDS = 0
+    try:
+        pool = overpass_scheduler.EndpointPool(
+            [server.get_endpoint("down"), server.get_endpoint("e")], overpass_fallback._health_check, min_interval_seconds=0,
+        )
+        results = [
+            overpass_scheduler.fetch(pool, ox.graph_from_polygon, (polygon,), graph_all_feather.GRAPH_OPTIONS, 6)
+            for _ in range(6)
+        ]
+    finally:
+        overpass_scheduler.RETRY_DELAY_SECONDS = retry_delay
+    down = pool.states[server.get_endpoint("down")]
+    print(f"circuit breaker: {pool.format_stats()}")
+    return len(results) == 6 and server.counts["down"]["data"] == overpass_scheduler.FAILURE_THRESHOLD and down["opened"] == 1
+
+
+def check_rate_limit() -> bool:
+    health_checks = []
+    pool = overpass_scheduler.EndpointPool(
+        ["x"], lambda endpoint: health_checks.append(endpoint) or True,
+        max_concurrency=2, min_interval_seconds=MIN_INTERVAL_SECONDS, health_ttl_seconds=60,
+    )
+    starts = []
+    in_flight = []
+    lock = threading.Lock()
+
+    def request():
+        endpoint = pool.acquire()
+        with lock:
+            starts.append(time.monotonic())
+            in_flight.append(pool.states[endpoint]["in_flight"])
+        time.sleep(0.1)
+        pool.release(endpoint, ok=True)
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    starts.sort()
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    print(f"rate limit: min gap {min(gaps):.3f}s (limit {MIN_INTERVAL_SECONDS}s), max in flight {max(in_flight)}, health checks {len(health_checks)}")
+    return min(gaps) >= MIN_INTERVAL_SECONDS - 0.01 and max(in_flight) <= 2 and len(health_checks) == 1
+
+
+def check_shared(server, polygons, cache_dir) -> bool:
+    lock_dir = overpass_cache.get_lock_dir(cache_dir)
+    request = (ox.graph_from_polygon, (polygons[0],), graph_feather.GRAPH_OPTIONS)
+    processes = ProcessPoolExecutor(max_workers=SHARED_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for future in [processes.submit(warm_up) for _ in range(SHARED_WORKERS)]:
+            future.result()
+
+        # 親プロセスが先読みしている間に、県のプロセスが同じグラフを取得する
+        pool = overpass_scheduler.EndpointPool(
+            [server.get_endpoint("f")], lambda endpoint: True, max_concurrency=1, min_interval_seconds=MIN_INTERVAL_SECONDS, lock_dir=lock_dir,
+        )
+        prefetcher = overpass_scheduler.Prefetcher(pool, workers=1, cache_dir=cache_dir)
+        for future in [prefetcher.processes.submit(warm_up)]:
+            future.result()
+        prefetch_futures = prefetcher.prefetch([request])
+        futures = [processes.submit(fetch_in_worker, server.get_endpoint("f"), lock_dir, cache_dir, request) for _ in range(SHARED_WORKERS)]
+        statuses = [future.result() for future in prefetch_futures]
+        results = [future.result() for future in futures]
+        prefetcher.shutdown()
+        expected = generate_edges(overpass_cache.load(overpass_cache.generate_key(*request), cache_dir=cache_dir))
+        cached = sum(1 for _, x in results if x)
+        print(f"shared key: prefetch {statuses}, workers {SHARED_WORKERS} (cached {cached}), server: {server.counts['f']}")
+        ok = server.counts["f"]["data"] == 1 and all(status in ("ok", "skipped") for status in statuses)
+        ok &= all(edges == expected for edges, _ in results)
+
+        # キャッシュを確認してからロックを取るまでに他のプロセスが保存した場合は取得し直さない。refresh_cache=Trueの場合は取得し直す
+        key = overpass_cache.generate_key(*request)
+        load = lambda: overpass_cache.load(key, cache_dir=cache_dir)
+        _, cached = overpass_scheduler.fetch_to_cache(pool, *request, key, 1, load, cache_dir)
+        ok &= cached and server.counts["f"]["data"] == 1
+        graph_feather.add_useful_tags()
+        _, refreshed = overpass_scheduler.fetch_to_cache(pool, *request, key, 1, load, cache_dir, refresh_cache=True)
+        print(f"shared key recheck: cached {cached}, refreshed {not refreshed}, server: {server.counts['f']}")
+        ok &= not refreshed and server.counts["f"]["data"] == 2
+
+        # 別々のグラフを取得する県のプロセスで、エンドポイント毎の同時実行数の上限(1)を共有する
+        requests = [
+            (ox.graph_from_polygon, (polygons[1],), module.GRAPH_OPTIONS)
+            for module in [graph_feather, graph_all_feather, graph_tunnel_feather, graph_bridge_feather]
+        ]
+        st = time.time()
+        results = list(processes.map(fetch_in_worker, *zip(*[(server.get_endpoint("g"), lock_dir, cache_dir, x) for x in requests])))
+        print(f"shared limit: {len(requests)} graphs {time.time() - st:.2f}s, server: {server.counts['g']}")
+        ok &= server.counts["g"]["data"] == len(requests) and server.counts["g"]["max_in_flight"] == 1
+        ok &= not any(cached for _, cached in results)
+    finally:
+        processes.shutdown()
+    return ok
+
+
+def main():
+    server = MockOverpassServer(
+        {"a": "slow", "b": "slow", "c": "slow", "d": "slow", "e": "ok", "f": "slow", "g": "slow", "down": "fail"}, delay_seconds=DELAY_SECONDS,
+    ).start()
+    west, south, east, north = server.get_bounds()
+    middle = (west + east) / 2
+    polygons = [box(west, south, middle, north), box(middle, south, east, north)]
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ok = check_prefetch(server, polygons, cache_dir)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ok &= check_shared(server, polygons, cache_dir)
+        ok &= check_circuit_breaker(server, polygons[0])
+        ok &= check_rate_limit()
+    finally:
+        server.stop()
+    print("✅ parity ok" if ok else "❌ parity ng")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+逆方向のエッジ削除(reverse_edge.remove)のベンチマーク
+
+osmnxのエッジと同じく(u, v, k)をindexに持ち、各道路が往復2本のエッジになっているテーブルを生成し、
+従来のiterrows + リストの実装と比較する。従来の実装は2乗で遅くなるので小さいテーブルだけで比較する。
+同じ2点間の平行なエッジ(key>=1、key=0より前に出てくるものを含む)と、indexが重複する行も混ぜて、残る行が完全に一致するかを確認する。
+generate_keep_mask(turnで使うリスト版)も同じテーブルで比較する。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/reverse_edge_benchmark.py
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from geopandas import GeoDataFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from analyzer.analysis.remover_module import reverse_edge
+
+# ===== 調整パラメータ =====
+OLD_SIZES = [1000, 5000, 20000]  # 従来の実装と比較するエッジ数
+NEW_SIZES = [200000, 1000000]    # 県単位(北海道で数十万件)を想定したエッジ数
+ONE_WAY_RATIO = 0.1              # 一方通行(逆方向のエッジがない)の割合
+PARALLEL_RATIO = 0.05            # 平行なエッジ(key>=1)を追加する道路の割合
+DUPLICATE_RATIO = 0.01           # indexが重複する行の割合
+
+
+# 従来の実装
+def remove_old(gdf: GeoDataFrame) -> GeoDataFrame:
+    drop_target = []
+    for index, row in gdf.iterrows():
+        if (index[1], index[0], 0) in drop_target:
+            continue
+        if (index[0], index[1], 0) in drop_target:
+            continue
+        drop_target.append(index)
+    return gdf[gdf.index.isin(drop_target)]
+
+
+# 往復のエッジを持つテーブルを生成する。往路と復路はランダムな順番で並べる。
+def generate_edges(size: int) -> GeoDataFrame:
+    rng = np.random.default_rng(0)
+    road_count = size // 2
+    u = rng.choice(10**10, road_count, replace=False)
+    v = u + rng.integers(1, 10**6, road_count)
+    one_way = rng.random(road_count) < ONE_WAY_RATIO
+    us = np.concatenate([u, v[~one_way]])
+    vs = np.concatenate([v, u[~one_way]])
+    ks = np.zeros(len(us), dtype=int)
+    # 平行なエッジ(向きはランダム、key=1, 2)
+    parallel = rng.random(road_count) < PARALLEL_RATIO
+    for key in (1, 2):
+        reverse = rng.random(int(parallel.sum())) < 0.5
+        us = np.concatenate([us, np.where(reverse, v[parallel], u[parallel])])
+        vs = np.concatenate([vs, np.where(reverse, u[parallel], v[parallel])])
+        ks = np.concatenate([ks, np.full(int(parallel.sum()), key)])
+    # indexが重複する行
+    duplicate = rng.choice(len(us), int(len(us) * DUPLICATE_RATIO), replace=False)
+    us, vs, ks = np.concatenate([us, us[duplicate]]), np.concatenate([vs, vs[duplicate]]), np.concatenate([ks, ks[duplicate]])
+    order = rng.permutation(len(us))
+    index = pd.MultiIndex.from_arrays([us[order], vs[order], ks[order]], names=["u", "v", "key"])
+    return GeoDataFrame({"length": rng.random(len(us))}, index=index)
+
+
+def measure(func, gdf):
+    started_at = time.perf_counter()
+    result = func(gdf)
+    return result, time.perf_counter() - started_at
+
+
+def main():
+    ok = True
+    print("[parity]")
+    for size in OLD_SIZES:
+        gdf = generate_edges(size)
+        old, old_seconds = measure(remove_old, gdf)
+        new, new_seconds = measure(reverse_edge.remove, gdf)
+        same = old.index.equals(new.index)
+        same_mask = gdf[reverse_edge.generate_keep_mask(list(gdf.index))].index.equals(old.index)
+        ok = ok and same and same_mask
+        print(
+            f"  rows: {len(gdf)}, kept: {len(new)}, same: {same}, same mask: {same_mask}, "
+            f"old: {round(old_seconds, 4)} seconds, new: {round(new_seconds, 4)} seconds, speedup: x{round(old_seconds / new_seconds, 1)}"
+        )
+
+    print("[scale]")
+    for size in NEW_SIZES:
+        gdf = generate_edges(size)
+        new, new_seconds = measure(reverse_edge.remove, gdf)
+        print(f"  rows: {len(gdf)}, kept: {len(new)}, new: {round(new_seconds, 4)} seconds")
+
+    print("✅ parity ok" if ok else "❌ parity ng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+セクション分割(road_section.generate)のベンチマーク
+
+山道を想定したランダムなエッジのステアリング角から、従来の行毎のgdf.applyの実装
+(group_continuous_section → merge_min_straight_section → merge_continuous_section_section)
+と結果と処理時間を比較する。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/road_section_benchmark.py
+"""
+import os
+import sys
+import copy
+import time
+import numpy as np
+import shapely
+from geopandas import GeoDataFrame
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from analyzer.analysis.column_generater_module import road_section, steering_wheel_angle
+from analyzer.core import distance_service
+
+# ===== 調整パラメータ =====
+EDGE_COUNT = 3000       # エッジ数
+POINT_MIN = 3           # エッジの座標数の下限
+POINT_MAX = 300         # エッジの座標数の上限
+STEP_DEGREE = 0.0002    # 座標間の移動量(度)
+PLANE_EPSG_CODE = 6677  # 平面直角座標系(IX系)
+
+
+# ===== 従来の実装 =====
+def group_old(target):
+    old_direction = target[0]['direction']
+    sections = []
+    section_work = [target[0]]
+    for i in range(1, len(target)):
+        current_segment = target[i]
+        direction = current_segment['direction']
+        if current_segment['steering_angle'] < road_section.STRAIGHT_ANGLE:
+            direction = 'straight'
+        if direction == old_direction:
+            section_work.append(current_segment)
+        else:
+            sections.append({'type': old_direction, 'steering_angle_info': section_work})
+            section_work = [current_segment]
+            old_direction = direction
+    if len(section_work) > 0:
+        sections.append({'type': old_direction, 'steering_angle_info': section_work})
+    return sections
+
+
+def merge_min_straight_old(sections):
+    adjusted_sections = copy.deepcopy(sections)
+    while True:
+        min_straights = [
+            x for x in adjusted_sections
+            if x['type'] == 'straight' and sum([y['distance'] for y in x['steering_angle_info']]) < road_section.STRAIGHT_DISTANCE
+        ]
+        if len(min_straights) == 0:
+            break
+        min_straight_first = min_straights[0]
+        index = adjusted_sections.index(min_straight_first)
+        info = min_straight_first['steering_angle_info']
+        if index == 0:
+            next_section = copy.deepcopy(adjusted_sections[index + 1])
+            next_section['steering_angle_info'] = info + next_section['steering_angle_info']
+            adjusted_sections[index + 1] = next_section
+        elif index == len(adjusted_sections) - 1:
+            previous_section = copy.deepcopy(adjusted_sections[index - 1])
+            previous_section['steering_angle_info'] += info
+            adjusted_sections[index - 1] = previous_section
+        elif len(info) >= 2:
+            previous_section = copy.deepcopy(adjusted_sections[index - 1])
+            next_section = copy.deepcopy(adjusted_sections[index + 1])
+            previous_section['steering_angle_info'] += info[:len(info)//2]
+            next_section['steering_angle_info'] = info[len(info)//2:] + next_section['steering_angle_info']
+            adjusted_sections[index - 1] = previous_section
+            adjusted_sections[index + 1] = next_section
+        else:
+            previous_section = copy.deepcopy(adjusted_sections[index - 1])
+            previous_section['steering_angle_info'] += info
+            adjusted_sections[index - 1] = previous_section
+        adjusted_sections.remove(min_straight_first)
+    return adjusted_sections
+
+
+def merge_continuous_old(road_sections):
+    merged_lst = []
+    i = 0
+    while i < len(road_sections):
+        current_section = road_sections[i].copy()
+        while i + 1 < len(road_sections) and road_sections[i]['type'] == road_sections[i + 1]['type']:
+            current_section['steering_angle_info'] += road_sections[i + 1]['steering_angle_info']
+            i += 1
+        merged_lst.append(current_section)
+        i += 1
+    return merged_lst
+
+
+def adjust_old(steering_angle, points, elevation, distance, coords):
+    coords = list(coords)
+    index_st = coords.index(points[1])
+    index_end = coords.index(points[-2])
+    elevation_section = elevation[index_st:index_end+1]
+    elevation_section.insert(0, (elevation[index_st - 1] + elevation[index_st]) / 2)
+    elevation_section.append((elevation[index_end + 1] + elevation[index_end]) / 2)
+    elevation_height = max(elevation_section) - min(elevation_section)
+    return steering_angle * road_section.scale_to_range(elevation_height / distance), elevation_height
+
+
+def generate_old(gdf: GeoDataFrame):
+    def func(row):
+        sections = merge_continuous_old(merge_min_straight_old(group_old(row['steering_wheel_angle_info'])))
+        datas = []
+        for section in sections:
+            info = section['steering_angle_info']
+            points = []
+            for x in info:
+                points.append(x['start'])
+                points.append(x['center'])
+                points.append(x['end'])
+            points = list(dict.fromkeys(points))
+            distance = distance_service.path_length(points)
+            max_steering_angle = max(info, key=lambda x: x['steering_angle'])['steering_angle']
+            adjusted_steering_angle, elevation_height = adjust_old(max_steering_angle, points, row.elevation, distance, row.geometry.coords)
+            datas.append({
+                'max_steering_angle': max_steering_angle,
+                'avg_steering_angle': sum([x['steering_angle'] for x in info]) / len(info),
+                'adjusted_steering_angle': adjusted_steering_angle,
+                'elevation_height_and_distance_ratio': elevation_height / distance,
+                'section_type': section['type'],
+                'steering_direction': info[0]['direction'],
+                'points': points,
+                'section_info': info,
+                'corner_level': road_section.generate_corner_level(max_steering_angle),
+                'distance': distance,
+                'elevation_height': elevation_height,
+            })
+        return datas
+    return gdf.apply(func, axis=1)
+
+
+# 山道のようなエッジを生成する(カーブと直線を交互に入れる)
+def generate_edges(count: int) -> GeoDataFrame:
+    rng = np.random.default_rng(0)
+    rows = []
+    for _ in range(count):
+        n = int(rng.integers(POINT_MIN, POINT_MAX))
+        turns = rng.normal(0, 0.3, n) * (rng.random(n) < 0.5)
+        headings = np.cumsum(turns)
+        steps = np.column_stack([np.cos(headings), np.sin(headings)]) * STEP_DEGREE * rng.uniform(0.2, 1.0, (n, 1))
+        coords = np.cumsum(steps, axis=0) + rng.uniform([138.5, 35.5], [139.5, 36.5])
+        elevation = np.abs(np.cumsum(rng.normal(0, 3, n)) + rng.uniform(0, 1500))
+        rows.append({
+            "geometry": shapely.LineString(coords),
+            "elevation": elevation.tolist(),
+        })
+    gdf = GeoDataFrame(rows, crs="EPSG:4326")
+    gdf["steering_wheel_angle_info"] = steering_wheel_angle.generate(gdf, PLANE_EPSG_CODE)
+    # ステアリング角がないエッジは対象外(従来の実装は空のリストを扱えない)
+    return gdf[gdf["steering_wheel_angle_info"].apply(len) > 0]
+
+
+def main():
+    gdf = generate_edges(EDGE_COUNT)
+    print(f"[edges] rows: {len(gdf)}, steering angles: {sum(len(x) for x in gdf['steering_wheel_angle_info'])}")
+
+    started_at = time.perf_counter()
+    old = generate_old(gdf)
+    old_seconds = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    new = road_section.generate(gdf)
+    new_seconds = time.perf_counter() - started_at
+
+    mismatches = sum(1 for a, b in zip(old, new) if a != b)
+    print(f"  sections: {sum(len(x) for x in new)}, mismatched rows: {mismatches}")
+    print(f"[time] old: {round(old_seconds, 3)} seconds, new: {round(new_seconds, 3)} seconds, speedup: x{round(old_seconds / new_seconds, 1)}")
+
+    ok = mismatches == 0
+    print("✅ parity ok" if ok else "❌ parity ng")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
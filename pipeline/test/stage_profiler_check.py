@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+ステージ毎の計測(stage_profiler, PROFILE)の確認
+
+StageRunnerで以下の3つのステージを実行し、data/profiles/の代わりに一時ディレクトリに書き出したJSON, CSV, Chromeのトレースを確認する。
+  - edges:  ROWS行のGeoDataFrameを作る(入力なし)
+  - heavy:  ALLOC_MB分の配列を確保して計算する(最大RSSの増加量とCPU時間が記録されるか)。PROFILE_STAGEでcProfileも取る
+  - filter: 半分の行を残す(入出力の行数)
+ExecutionTimerの区間(step)がステージの中に入れ子で記録されること、計測1回あたりのオーバーヘッドも確認する。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/stage_profiler_check.py
+"""
+import os
+import csv
+import sys
+import json
+import time
+import tempfile
+from pathlib import Path
+import numpy as np
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+os.environ["PROFILE"] = "1"
+os.environ["PROFILE_TRACE"] = "1"
+os.environ["PROFILE_STAGE"] = "heavy"
+os.environ["PROFILE_STAGE_PROFILER"] = "cprofile"
+
+from analyzer.core import stage_profiler
+from analyzer.core.checkpoint import Stage, StageRunner
+from analyzer.core.execution_timer import ExecutionTimer, ExecutionType
+
+# ===== 調整パラメータ =====
+ROWS = 2000
+ALLOC_MB = 200
+PREFECTURE_CODE = "99"
+OVERHEAD_LOOPS = 2000
+
+
+def main():
+    execution_timer_ins = ExecutionTimer(PREFECTURE_CODE)
+
+    def load_edges(_):
+        execution_timer_ins.start("🗾 load edges", ExecutionType.FETCH)
+        gdf = GeoDataFrame({"value": np.arange(ROWS)}, geometry=[Point(i, i) for i in range(ROWS)])
+        execution_timer_ins.stop(len(gdf))
+        return gdf
+
+    def heavy(gdf):
+        execution_timer_ins.start("🔥 allocate")
+        values = np.ones(ALLOC_MB * 1024**2 // 8)
+        for _ in range(5):
+            values = np.sqrt(values + 1.0)
+        gdf["heavy"] = float(values[:10].sum())
+        execution_timer_ins.stop()
+        return gdf
+
+    def filter_rows(gdf):
+        return gdf[gdf["value"] % 2 == 0]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stage_profiler.PROFILE_DIR = Path(tmp_dir)
+        runner = StageRunner(PREFECTURE_CODE, "stage_profiler_check", enabled=False)
+        gdf = runner.run([Stage("edges", load_edges), Stage("heavy", heavy), Stage("filter", filter_rows)])
+        execution_timer_ins.finish()
+
+        output_dir = Path(tmp_dir) / PREFECTURE_CODE
+        json_paths = sorted(output_dir.glob("*_[0-9]*.json"))
+        json_paths = [x for x in json_paths if not x.name.endswith(".trace.json")]
+        records = json.loads(json_paths[0].read_text())["records"]
+        with open(json_paths[0].with_suffix(".csv")) as f:
+            csv_rows = list(csv.DictReader(f))
+        trace = json.loads(Path(f"{json_paths[0].with_suffix('')}.trace.json").read_text())
+        prof_paths = list(output_dir.glob("*_heavy.prof"))
+
+    for record in records:
+        print(
+            f"  {record['kind']:5} {record['name']:14} wall {record['wall_seconds']:.3f}s cpu {record['cpu_seconds']:.3f}s "
+            f"rss +{record['peak_rss_delta_mb']}MB rows {record['rows_in']} -> {record['rows_out']} ({record['rows_per_second']}/s)"
+        )
+    stages = {x["name"]: x for x in records if x["kind"] == "stage"}
+    steps = [x for x in records if x["kind"] == "step"]
+
+    ok = len(gdf) == ROWS // 2
+    ok &= list(stages) == ["edges", "heavy", "filter"]
+    ok &= stages["edges"]["rows_in"] is None and stages["edges"]["rows_out"] == ROWS
+    ok &= stages["filter"]["rows_in"] == ROWS and stages["filter"]["rows_out"] == ROWS // 2
+    ok &= all(x["prefecture_code"] == PREFECTURE_CODE for x in records)
+    # 配列の確保で最大RSSが増え、計算でCPU時間が記録される
+    ok &= stages["heavy"]["peak_rss_delta_mb"] >= ALLOC_MB * 0.9
+    ok &= stages["heavy"]["cpu_seconds"] > 0 and stages["heavy"]["cpu_seconds"] <= stages["heavy"]["wall_seconds"] * 1.5 + 0.05
+    # 区間はステージの中に入る
+    ok &= len(steps) == 2 and steps[0]["type"] == "FETCH" and steps[0]["rows_out"] == ROWS
+    for step, stage in zip(steps, [stages["edges"], stages["heavy"]]):
+        ok &= stage["started_at"] <= step["started_at"] and step["wall_seconds"] <= stage["wall_seconds"]
+    ok &= len(csv_rows) == len(records) and list(csv_rows[0]) == stage_profiler.CSV_COLUMNS
+    ok &= len(trace["traceEvents"]) == len(records) and all(x["ph"] == "X" for x in trace["traceEvents"])
+    ok &= len(prof_paths) == 1 and stages["heavy"].get("profile_path") is not None
+    # 書き出した後は溜めた結果が消える
+    ok &= len(stage_profiler.get_records()) == 0
+
+    # 計測1回あたりのオーバーヘッド
+    st = time.perf_counter()
+    for _ in range(OVERHEAD_LOOPS):
+        stage_profiler.stop(stage_profiler.start("overhead", PREFECTURE_CODE))
+    overhead_us = (time.perf_counter() - st) / OVERHEAD_LOOPS * 1e6
+    stage_profiler._records.clear()
+    print(f"overhead: {overhead_us:.1f}us / measurement")
+    ok &= overhead_us < 1000
+    print("✅ parity ok" if ok else "❌ parity ng")
+
+
+if __name__ == "__main__":
+    main()
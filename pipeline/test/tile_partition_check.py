@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+タイル分割(tile_partitioner, TILE_SIZE_DEGREE)の確認
+
+格子状の道路(座標にばらつきを付けて曲がり角を作る)のpbfを生成してOSM_SOURCE=pbfで読み込み、
+範囲全体で解析した場合と、タイルに分けて解析して結果をまとめた場合のグラフに依存する列を比較する。
+  - tile_graph: タイル毎の取得から作った道路、トンネルのグラフが、範囲全体を1回で取得したグラフとnode, エッジ(順番も)が同じか
+    (タイルをいくつもまたぐ、途中にnodeのない長い道路も入れる。全道路のグラフはタイルの解析範囲で取得するので、
+     解析範囲より長い区間が比較で差にならないように長い道路はaccess=privateにして全道路(drive)のグラフには入れない)
+  - load_edges: 道路のエッジ(タイルの境界をまたぐエッジも1本のまま、どのタイルにも重複せずに入るか)
+  - connection_node_cnt, turn_candidate_points, turn_points: 全道路のグラフはタイルの解析範囲で取得したものを使う
+  - split: 曲がり角でのエッジの分割(分割点のnode_idはタイル毎に振られるので比較しない)
+  - tunnel_length, tunnel_sections: トンネルはタイルが担当するエッジに重なるエッジだけを使う
+標高、道幅、建物等はエッジ毎に独立した計算なので比較しない(DEMとDBが必要)。pyosmium(osmium)が必要。
+
+usage: uv run --directory pipeline/analyzer python pipeline/test/tile_partition_check.py
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import shapely
+from shapely.geometry import box
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+os.environ["OSM_SOURCE"] = "pbf"
+os.environ.setdefault("CUSTOM_AREA_POINT_ST", "0,0")
+os.environ.setdefault("CUSTOM_AREA_POINT_ED", "0,0")
+
+import osmium
+import osmnx as ox
+from analyzer import tiled
+from analyzer.analysis import graph_feather, graph_all_feather, graph_tunnel_feather, column_generater, remover, tile_graph, tile_partitioner
+from analyzer.analysis.turn_edge_spliter import split, NEW_NODE_ID_START
+from analyzer.analysis.column_generater_module.core import infra_matcher
+
+# ===== 調整パラメータ =====
+GRID_SIZE = 120          # 格子の縦横のnode数
+STEP_DEGREE = 0.001      # node間の距離(度)
+JITTER_DEGREE = 0.0004   # nodeの位置のばらつき(度)
+ORIGIN = (137.0, 35.0)   # 格子の南西端(経度, 緯度)
+PLANE_EPSG_CODE = 6675   # 平面直角座標系VII系
+TILE_SIZE_DEGREE = 0.03
+OVERLAP_METERS = 1000
+LONG_WAYS = 8           # 途中にnodeのない長い道路の数
+SEED = 0
+
+HIGHWAYS = ["primary", "secondary", "tertiary", "residential", "service"]
+
+
+def generate_ways(rng):
+    ways = []
+    way_id = 1
+    for i in range(GRID_SIZE):
+        for is_row in (True, False):
+            nodes = [i * GRID_SIZE + j + 1 if is_row else j * GRID_SIZE + i + 1 for j in range(GRID_SIZE)]
+            # 1本の道路を区間に分け、区間毎にタグを変える。一部の区間は道路にしない(長いエッジと行き止まりを作る)
+            cuts = np.sort(rng.choice(np.arange(1, GRID_SIZE - 1), size=6, replace=False))
+            for st, ed in zip([0, *cuts], [*cuts, GRID_SIZE - 1]):
+                if rng.random() < 0.3:
+                    continue
+                tags = {"highway": str(rng.choice(HIGHWAYS))}
+                if rng.random() < 0.15:
+                    tags["tunnel"] = "yes"
+                ways.append((way_id, nodes[st:ed + 1], tags))
+                way_id += 1
+    # 格子のnodeを2つ選んで直線で結ぶ(生のOSMの区間がタイルより長い)
+    for _ in range(LONG_WAYS):
+        a, b = rng.choice(GRID_SIZE * GRID_SIZE, size=2, replace=False) + 1
+        ways.append((way_id, [int(a), int(b)], {"highway": "primary", "access": "private"}))
+        way_id += 1
+    return ways
+
+
+def write_pbf(path, ways, coords):
+    with osmium.SimpleWriter(path) as writer:
+        for node_id, (lon, lat) in coords.items():
+            writer.add_node(osmium.osm.mutable.Node(id=node_id, location=(lon, lat), tags={}))
+        for way_id, nodes, tags in ways:
+            writer.add_way(osmium.osm.mutable.Way(id=way_id, nodes=nodes, tags=tags))
+
+
+# main()のグラフに依存するステージと同じ処理。area: 全道路を取得する範囲、tile: tiled.generate_tilesのタイル
+def analyze(search_area_polygon, area, tile):
+    if tile is None:
+        gdf_edges = ox.graph_to_gdfs(graph_feather.fetch_graph(search_area_polygon), nodes=False, edges=True)
+        gdf_tunnel_edges = ox.graph_to_gdfs(graph_tunnel_feather.fetch_graph(search_area_polygon), nodes=False, edges=True)
+    else:
+        gdf_edges = tile["edges"].copy()
+        gdf_tunnel_edges = tile["tunnel_edges"]
+    gdf_edges["geometry_list"] = gdf_edges["geometry"].apply(lambda x: list(map(lambda y: [y[1], y[0]], x.coords)))
+    gdf_edges["geometry_meter_list"] = column_generater.geometry_meter_list.generate(gdf_edges, PLANE_EPSG_CODE)
+    gdf_edges = remover.reverse_edge.remove(gdf_edges)
+
+    g_all = graph_all_feather.fetch_graph(area)
+    gdf_edges["connection_node_cnt"] = column_generater.connection_node_cnt.generate(gdf_edges, g_all)
+    gdf_edges["angle_deltas"] = column_generater.angle_deltas.generate(gdf_edges)
+    gdf_edges["turn_candidate_points"] = column_generater.turn_candidate_points.generate(gdf_edges)
+    gdf_edges["turn_points"] = column_generater.turn.generate(gdf_edges, g_all)
+    gdf_edges = split(gdf_edges, PLANE_EPSG_CODE)
+
+    gdf_tunnel_edges = remover.reverse_edge.remove(gdf_tunnel_edges)
+    tunnel_matches = infra_matcher.match(gdf_edges, gdf_tunnel_edges)
+    gdf_edges["tunnel_length"] = column_generater.tunnel_length.generate(gdf_edges, gdf_tunnel_edges, tunnel_matches)
+    gdf_edges["tunnel_sections"] = column_generater.infra_sections.generate(gdf_edges, gdf_tunnel_edges, tunnel_matches)
+    return gdf_edges
+
+
+# 比較用に行を(座標, 列の値)の文字列にして並べる(分割点のnode_idは除く)
+def generate_rows(gdf_edges):
+    columns = ["length", "connection_node_cnt", "angle_deltas", "turn_points", "tunnel_length", "tunnel_sections"]
+    u = gdf_edges.index.get_level_values(0).to_numpy()
+    v = gdf_edges.index.get_level_values(1).to_numpy()
+    rows = [
+        (uu if uu < NEW_NODE_ID_START else -1, vv if vv < NEW_NODE_ID_START else -1, geometry.wkt, *(str(gdf_edges[c].values[i]) for c in columns))
+        for i, (uu, vv, geometry) in enumerate(zip(u, v, gdf_edges.geometry.values))
+    ]
+    return sorted(rows, key=str)
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    ways = generate_ways(rng)
+    jitter = rng.uniform(-JITTER_DEGREE, JITTER_DEGREE, size=(GRID_SIZE * GRID_SIZE, 2))
+    coords = {
+        i * GRID_SIZE + j + 1: (ORIGIN[0] + j * STEP_DEGREE + jitter[i * GRID_SIZE + j, 0], ORIGIN[1] + i * STEP_DEGREE + jitter[i * GRID_SIZE + j, 1])
+        for i in range(GRID_SIZE) for j in range(GRID_SIZE)
+    }
+    margin = 5 * STEP_DEGREE
+    polygon = box(ORIGIN[0] + margin, ORIGIN[1] + margin, ORIGIN[0] + (GRID_SIZE - 6) * STEP_DEGREE, ORIGIN[1] + (GRID_SIZE - 6) * STEP_DEGREE)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "grid.osm.pbf")
+        write_pbf(path, ways, coords)
+        os.environ["OSM_PBF_PATH"] = path
+        print(f"ways: {len(ways)}, nodes: {len(coords)}")
+
+        st = time.time()
+        expected = analyze(polygon, polygon, None)
+        print(f"single: rows {len(expected)}, {time.time() - st:.2f}s")
+
+        st = time.time()
+        tiles = tiled.generate_tiles(polygon, PLANE_EPSG_CODE, TILE_SIZE_DEGREE, OVERLAP_METERS)
+        results = [analyze(polygon, tile["analysis_area"], tile) for tile in tiles]
+        stitched = tile_partitioner.stitch(results)
+        print(f"tiled: {len(tiles)} tiles, fetch areas {len(tile_graph.generate_fetch_areas(polygon, TILE_SIZE_DEGREE))}, rows {len(stitched)}, {time.time() - st:.2f}s")
+
+        # タイル毎の取得から作ったグラフが範囲全体を1回で取得したグラフと同じか
+        same_graphs = True
+        for module in [graph_feather, graph_tunnel_feather]:
+            graph = module.fetch_graph(polygon)
+            tiled_graph = tile_graph.fetch_graph(polygon, module.GRAPH_OPTIONS, TILE_SIZE_DEGREE)
+            same_graphs &= list(graph.nodes(data=True)) == list(tiled_graph.nodes(data=True))
+            same_graphs &= list(graph.edges(keys=True, data=True)) == list(tiled_graph.edges(keys=True, data=True))
+        gdf_single = remover.reverse_edge.remove(ox.graph_to_gdfs(graph_feather.fetch_graph(polygon), nodes=False, edges=True))
+    print(f"graphs: {'ok' if same_graphs else 'ng'}")
+
+    # 担当するエッジが全エッジを重複なく分けているか
+    geometries = gdf_single.geometry.values
+    owned = [x for tile in tiles for x in tile["edges"].index]
+    # タイルの境界をまたぐエッジ(座標が複数のタイルにある)の数
+    points, rows = shapely.get_coordinates(geometries, return_index=True)
+    cells = np.floor((points - np.array(polygon.bounds[:2])) / TILE_SIZE_DEGREE).astype(np.int64)
+    crossing = len(np.unique(rows[np.r_[False, (np.diff(rows) == 0) & (np.diff(cells, axis=0) != 0).any(axis=1)]]))
+    long_edges = int(gdf_single["osmid"].apply(lambda x: max(x) if isinstance(x, list) else x).gt(len(ways) - LONG_WAYS).sum())
+    print(f"edges: {len(geometries)}, crossing tile borders: {crossing}, long: {long_edges}")
+    ok = same_graphs and crossing > 0 and long_edges > 0 and sorted(owned) == sorted(gdf_single.index) and sum(tile["edge_count"] for tile in tiles) == len(geometries)
+    ok &= not stitched.index.duplicated().any()
+
+    rows = generate_rows(stitched)
+    expected_rows = generate_rows(expected)
+    matched = rows == expected_rows
+    ok &= matched
+    print(f"rows: {len(rows)} / expected {len(expected_rows)} {'ok' if matched else 'ng'}")
+    if not matched:
+        for a, b in zip(rows, expected_rows):
+            if a != b:
+                print(f"  tiled:  {a}\n  single: {b}")
+                break
+    print("✅ parity ok" if ok else "❌ parity ng")
+
+
+if __name__ == "__main__":
+    main()